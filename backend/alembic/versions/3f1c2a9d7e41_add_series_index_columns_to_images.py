@@ -0,0 +1,53 @@
+"""Add series_instance_uid and instance_number index columns to images
+
+Revision ID: 3f1c2a9d7e41
+Revises: 8082d55138c8
+Create Date: 2026-10-19 09:12:03.114520
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3f1c2a9d7e41'
+down_revision: Union[str, None] = '8082d55138c8'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('images', sa.Column('series_instance_uid', sa.String(), nullable=True))
+    op.add_column('images', sa.Column('instance_number', sa.Integer(), nullable=True))
+    op.create_index(op.f('ix_images_series_instance_uid'), 'images', ['series_instance_uid'], unique=False)
+
+    # Backfill from the stored Orthanc metadata so existing stacks get a scroll order
+    images = sa.table(
+        'images',
+        sa.column('id', sa.Integer),
+        sa.column('dicom_metadata', sa.JSON),
+        sa.column('series_instance_uid', sa.String),
+        sa.column('instance_number', sa.Integer),
+    )
+    conn = op.get_bind()
+    rows = conn.execute(sa.select(images.c.id, images.c.dicom_metadata)).fetchall()
+    for row in rows:
+        metadata = row.dicom_metadata or {}
+        try:
+            instance_number = int(str(metadata.get('InstanceNumber')).strip())
+        except (TypeError, ValueError):
+            instance_number = None
+        conn.execute(
+            images.update().where(images.c.id == row.id).values(
+                series_instance_uid=metadata.get('SeriesInstanceUID'),
+                instance_number=instance_number,
+            )
+        )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_images_series_instance_uid'), table_name='images')
+    op.drop_column('images', 'instance_number')
+    op.drop_column('images', 'series_instance_uid')
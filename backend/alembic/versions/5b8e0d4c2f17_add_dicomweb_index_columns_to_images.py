@@ -0,0 +1,59 @@
+"""Add DICOMweb query index columns to images
+
+Revision ID: 5b8e0d4c2f17
+Revises: 3f1c2a9d7e41
+Create Date: 2026-10-19 11:40:27.503118
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '5b8e0d4c2f17'
+down_revision: Union[str, None] = '3f1c2a9d7e41'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+NEW_COLUMNS = {
+    'study_instance_uid': 'StudyInstanceUID',
+    'sop_instance_uid': 'SOPInstanceUID',
+    'patient_id': 'PatientID',
+    'study_date': 'StudyDate',
+    'modality': 'Modality',
+    'accession_number': 'AccessionNumber',
+}
+INDEXED_COLUMNS = ('study_instance_uid', 'sop_instance_uid', 'patient_id')
+
+
+def upgrade() -> None:
+    for column in NEW_COLUMNS:
+        op.add_column('images', sa.Column(column, sa.String(), nullable=True))
+    for column in INDEXED_COLUMNS:
+        op.create_index(op.f(f'ix_images_{column}'), 'images', [column], unique=False)
+
+    # Backfill from the stored Orthanc metadata so QIDO can answer for existing images
+    images = sa.table(
+        'images',
+        sa.column('id', sa.Integer),
+        sa.column('dicom_metadata', sa.JSON),
+        *[sa.column(column, sa.String) for column in NEW_COLUMNS],
+    )
+    conn = op.get_bind()
+    rows = conn.execute(sa.select(images.c.id, images.c.dicom_metadata)).fetchall()
+    for row in rows:
+        metadata = row.dicom_metadata or {}
+        values = {}
+        for column, keyword in NEW_COLUMNS.items():
+            value = metadata.get(keyword)
+            values[column] = str(value).strip() or None if value is not None else None
+        conn.execute(images.update().where(images.c.id == row.id).values(**values))
+
+
+def downgrade() -> None:
+    for column in INDEXED_COLUMNS:
+        op.drop_index(op.f(f'ix_images_{column}'), table_name='images')
+    for column in NEW_COLUMNS:
+        op.drop_column('images', column)
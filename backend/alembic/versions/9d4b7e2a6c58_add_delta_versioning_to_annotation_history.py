@@ -0,0 +1,81 @@
+"""Add delta versioning to annotation_history
+
+Revision ID: 9d4b7e2a6c58
+Revises: 7c2e4f9a1b63
+Create Date: 2026-10-19 16:22:41.906517
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d4b7e2a6c58'
+down_revision: Union[str, None] = '7c2e4f9a1b63'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('annotation_history', sa.Column('version', sa.Integer(), nullable=True))
+    op.add_column('annotation_history', sa.Column('is_snapshot', sa.Boolean(), nullable=True))
+    op.add_column('annotation_history', sa.Column('patch', sa.JSON(), nullable=True))
+    op.alter_column('annotation_history', 'data_snapshot', existing_type=sa.JSON(), nullable=True)
+
+    history = sa.table(
+        'annotation_history',
+        sa.column('id', sa.Integer),
+        sa.column('annotation_id', sa.Integer),
+        sa.column('version', sa.Integer),
+        sa.column('is_snapshot', sa.Boolean),
+        sa.column('data_snapshot', sa.JSON),
+        sa.column('changed_by', sa.Integer),
+        sa.column('changed_at', sa.DateTime(timezone=True)),
+    )
+    annotations = sa.table(
+        'annotations',
+        sa.column('id', sa.Integer),
+        sa.column('user_id', sa.Integer),
+        sa.column('version', sa.Integer),
+        sa.column('data', sa.JSON),
+        sa.column('updated_at', sa.DateTime(timezone=True)),
+    )
+    conn = op.get_bind()
+
+    # Any existing rows are full snapshots; number them per annotation in insertion order
+    rows = conn.execute(sa.select(history.c.id, history.c.annotation_id).order_by(history.c.id)).fetchall()
+    counters = {}
+    for row in rows:
+        counters[row.annotation_id] = counters.get(row.annotation_id, 0) + 1
+        conn.execute(history.update().where(history.c.id == row.id).values(
+            version=counters[row.annotation_id], is_snapshot=True
+        ))
+
+    # Seed a snapshot of the current data for annotations that have no history yet
+    conn.execute(history.insert().from_select(
+        ['annotation_id', 'version', 'is_snapshot', 'data_snapshot', 'changed_by', 'changed_at'],
+        sa.select(
+            annotations.c.id,
+            sa.func.coalesce(annotations.c.version, 1),
+            sa.true(),
+            annotations.c.data,
+            annotations.c.user_id,
+            annotations.c.updated_at,
+        ).where(~sa.exists().where(history.c.annotation_id == annotations.c.id))
+    ))
+
+    op.alter_column('annotation_history', 'version', existing_type=sa.Integer(), nullable=False)
+    op.alter_column('annotation_history', 'is_snapshot', existing_type=sa.Boolean(), nullable=False)
+    op.create_index('ix_annotation_history_annotation_version', 'annotation_history', ['annotation_id', 'version'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_annotation_history_annotation_version', table_name='annotation_history')
+    # Delta rows carry no snapshot and cannot satisfy the old NOT NULL constraint
+    op.execute("DELETE FROM annotation_history WHERE data_snapshot IS NULL")
+    op.alter_column('annotation_history', 'data_snapshot', existing_type=sa.JSON(), nullable=False)
+    op.drop_column('annotation_history', 'patch')
+    op.drop_column('annotation_history', 'is_snapshot')
+    op.drop_column('annotation_history', 'version')
@@ -0,0 +1,48 @@
+"""Add annotation_masks table
+
+Revision ID: a1f5c3e8d204
+Revises: 9d4b7e2a6c58
+Create Date: 2026-10-19 18:47:03.552871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a1f5c3e8d204'
+down_revision: Union[str, None] = '9d4b7e2a6c58'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('annotation_masks',
+    sa.Column('annotation_id', sa.Integer(), nullable=False),
+    sa.Column('shape', sa.JSON(), nullable=False),
+    sa.Column('dtype', sa.String(), nullable=False),
+    sa.Column('encoding', sa.String(), nullable=False),
+    sa.Column('sha256', sa.String(length=64), nullable=False),
+    sa.Column('nbytes', sa.BigInteger(), nullable=False),
+    sa.Column('payload', sa.LargeBinary(), nullable=False),
+    sa.Column('created_by', sa.Integer(), nullable=False),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['annotation_id'], ['annotations.id'], ),
+    sa.ForeignKeyConstraint(['created_by'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_annotation_masks_id'), 'annotation_masks', ['id'], unique=False)
+    op.create_index(op.f('ix_annotation_masks_annotation_id'), 'annotation_masks', ['annotation_id'], unique=False)
+    op.create_index('ix_annotation_masks_annotation_sha256', 'annotation_masks', ['annotation_id', 'sha256'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_annotation_masks_annotation_sha256', table_name='annotation_masks')
+    op.drop_index(op.f('ix_annotation_masks_annotation_id'), table_name='annotation_masks')
+    op.drop_index(op.f('ix_annotation_masks_id'), table_name='annotation_masks')
+    op.drop_table('annotation_masks')
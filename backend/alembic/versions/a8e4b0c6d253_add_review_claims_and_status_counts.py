@@ -0,0 +1,54 @@
+"""Add review claims and per-project review status counts
+
+Revision ID: a8e4b0c6d253
+Revises: f7d3a9b5c142
+Create Date: 2026-10-20 03:24:41.207935
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a8e4b0c6d253'
+down_revision: Union[str, None] = 'f7d3a9b5c142'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('annotations', sa.Column('review_claimed_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index(op.f('ix_annotations_review_status'), 'annotations', ['review_status'], unique=False)
+    op.create_table('review_status_counts',
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_review_status_counts_id'), 'review_status_counts', ['id'], unique=False)
+    op.create_index('ix_review_status_counts_project_status', 'review_status_counts', ['project_id', 'status'], unique=True)
+
+    # Counters for existing annotations; the enum column stores member names, counters store values
+    op.execute(
+        """
+        INSERT INTO review_status_counts (project_id, status, count, is_active)
+        SELECT images.project_id, lower(CAST(annotations.review_status AS VARCHAR)), count(*), true
+        FROM annotations JOIN images ON images.id = annotations.image_id
+        GROUP BY images.project_id, annotations.review_status
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_review_status_counts_project_status', table_name='review_status_counts')
+    op.drop_index(op.f('ix_review_status_counts_id'), table_name='review_status_counts')
+    op.drop_table('review_status_counts')
+    op.drop_index(op.f('ix_annotations_review_status'), table_name='annotations')
+    op.drop_column('annotations', 'review_claimed_at')
@@ -0,0 +1,28 @@
+"""Index annotation listing columns
+
+Revision ID: b3e9d6f1a7c2
+Revises: a1f5c3e8d204
+Create Date: 2026-10-19 20:11:37.184502
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b3e9d6f1a7c2'
+down_revision: Union[str, None] = 'a1f5c3e8d204'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_index(op.f('ix_annotations_image_id'), 'annotations', ['image_id'], unique=False)
+    op.create_index(op.f('ix_images_project_id'), 'images', ['project_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_images_project_id'), table_name='images')
+    op.drop_index(op.f('ix_annotations_image_id'), table_name='annotations')
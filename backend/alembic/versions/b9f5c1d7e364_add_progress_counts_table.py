@@ -0,0 +1,59 @@
+"""Add progress counts table
+
+Revision ID: b9f5c1d7e364
+Revises: a8e4b0c6d253
+Create Date: 2026-10-20 05:02:37.914286
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b9f5c1d7e364'
+down_revision: Union[str, None] = 'a8e4b0c6d253'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('progress_counts',
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('folder_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('images', sa.Integer(), nullable=False),
+    sa.Column('annotated', sa.Integer(), nullable=False),
+    sa.Column('approved', sa.Integer(), nullable=False),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_progress_counts_id'), 'progress_counts', ['id'], unique=False)
+    op.create_index('ix_progress_counts_project_folder_user', 'progress_counts', ['project_id', 'folder_id', 'user_id'], unique=True)
+
+    # Counters for existing images; the enum column stores member names
+    op.execute(
+        """
+        INSERT INTO progress_counts (project_id, folder_id, user_id, images, annotated, approved, is_active)
+        SELECT images.project_id, coalesce(images.folder_id, 0), coalesce(images.assigned_user_id, 0), count(*),
+            sum(CASE WHEN EXISTS (SELECT 1 FROM annotations WHERE annotations.image_id = images.id) THEN 1 ELSE 0 END),
+            sum(CASE WHEN EXISTS (
+                SELECT 1 FROM annotations
+                WHERE annotations.image_id = images.id AND annotations.review_status = 'APPROVED'
+            ) THEN 1 ELSE 0 END),
+            true
+        FROM images
+        GROUP BY images.project_id, coalesce(images.folder_id, 0), coalesce(images.assigned_user_id, 0)
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index('ix_progress_counts_project_folder_user', table_name='progress_counts')
+    op.drop_index(op.f('ix_progress_counts_id'), table_name='progress_counts')
+    op.drop_table('progress_counts')
@@ -0,0 +1,28 @@
+"""Mark annotations written by the pre-labeler
+
+Revision ID: c1a7e3f9b485
+Revises: b9f5c1d7e364
+Create Date: 2026-10-20 09:41:52.530418
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c1a7e3f9b485'
+down_revision: Union[str, None] = 'b9f5c1d7e364'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('annotations', sa.Column('is_prelabel', sa.Boolean(), server_default=sa.false(), nullable=False))
+    # Pre-labels written so far carry their model output under data.prelabel
+    op.execute("UPDATE annotations SET is_prelabel = true WHERE CAST(data AS jsonb) -> 'prelabel' IS NOT NULL")
+
+
+def downgrade() -> None:
+    op.drop_column('annotations', 'is_prelabel')
@@ -0,0 +1,78 @@
+"""Add tags vocabulary table
+
+Revision ID: c4a8f2d6e913
+Revises: b3e9d6f1a7c2
+Create Date: 2026-10-19 21:36:52.407719
+
+"""
+import unicodedata
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4a8f2d6e913'
+down_revision: Union[str, None] = 'b3e9d6f1a7c2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _normalize(tag) -> str:
+    # Same folding as app.services.tag_vocabulary.normalize_tag at the time of writing
+    return " ".join(unicodedata.normalize("NFKC", str(tag)).split()).casefold()
+
+
+def upgrade() -> None:
+    op.create_table('tags',
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('normalized', sa.String(), nullable=False),
+    sa.Column('usage_count', sa.Integer(), nullable=False),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_tags_id'), 'tags', ['id'], unique=False)
+    op.create_index('ix_tags_project_normalized', 'tags', ['project_id', 'normalized'], unique=True)
+    op.create_index('ix_tags_project_updated_at', 'tags', ['project_id', 'updated_at'], unique=False)
+
+    # Count existing annotations once per distinct tag
+    annotations = sa.table('annotations', sa.column('image_id', sa.Integer), sa.column('tags', sa.JSON))
+    images = sa.table('images', sa.column('id', sa.Integer), sa.column('project_id', sa.Integer))
+    conn = op.get_bind()
+    counts = {}
+    rows = conn.execution_options(yield_per=1000).execute(
+        sa.select(images.c.project_id, annotations.c.tags).select_from(
+            annotations.join(images, images.c.id == annotations.c.image_id)
+        )
+    )
+    for project_id, tags in rows:
+        seen = set()
+        for tag in tags or []:
+            key = _normalize(tag)
+            if key and key not in seen:
+                seen.add(key)
+                entry = counts.setdefault((project_id, key), [" ".join(str(tag).split()), 0])
+                entry[1] += 1
+    if counts:
+        tags_table = sa.table(
+            'tags',
+            sa.column('project_id', sa.Integer), sa.column('name', sa.String), sa.column('normalized', sa.String),
+            sa.column('usage_count', sa.Integer), sa.column('is_active', sa.Boolean),
+        )
+        op.bulk_insert(tags_table, [
+            {"project_id": project_id, "name": name, "normalized": key, "usage_count": count, "is_active": True}
+            for (project_id, key), (name, count) in counts.items()
+        ])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_tags_project_updated_at', table_name='tags')
+    op.drop_index('ix_tags_project_normalized', table_name='tags')
+    op.drop_index(op.f('ix_tags_id'), table_name='tags')
+    op.drop_table('tags')
@@ -0,0 +1,45 @@
+"""Recount progress without pre-label annotations
+
+Revision ID: d3b9f5a1c607
+Revises: c1a7e3f9b485
+Create Date: 2026-10-20 10:17:06.284913
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd3b9f5a1c607'
+down_revision: Union[str, None] = 'c1a7e3f9b485'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Same counts as app.services.progress.rebuild_progress, now that pre-labels are marked
+    op.execute("DELETE FROM progress_counts")
+    op.execute(
+        """
+        INSERT INTO progress_counts (project_id, folder_id, user_id, images, annotated, approved, is_active)
+        SELECT images.project_id, coalesce(images.folder_id, 0), coalesce(images.assigned_user_id, 0), count(*),
+            sum(CASE WHEN EXISTS (
+                SELECT 1 FROM annotations
+                WHERE annotations.image_id = images.id AND NOT annotations.is_prelabel
+            ) THEN 1 ELSE 0 END),
+            sum(CASE WHEN EXISTS (
+                SELECT 1 FROM annotations
+                WHERE annotations.image_id = images.id AND NOT annotations.is_prelabel
+                    AND annotations.review_status = 'APPROVED'
+            ) THEN 1 ELSE 0 END),
+            true
+        FROM images
+        GROUP BY images.project_id, coalesce(images.folder_id, 0), coalesce(images.assigned_user_id, 0)
+        """
+    )
+
+
+def downgrade() -> None:
+    pass
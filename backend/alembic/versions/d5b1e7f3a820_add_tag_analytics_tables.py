@@ -0,0 +1,108 @@
+"""Add tag pair and per-user tag count tables
+
+Revision ID: d5b1e7f3a820
+Revises: c4a8f2d6e913
+Create Date: 2026-10-19 23:12:05.318204
+
+"""
+import unicodedata
+from itertools import combinations
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd5b1e7f3a820'
+down_revision: Union[str, None] = 'c4a8f2d6e913'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _normalize(tag) -> str:
+    # Same folding as app.services.tag_vocabulary.normalize_tag at the time of writing
+    return " ".join(unicodedata.normalize("NFKC", str(tag)).split()).casefold()
+
+
+def _common_columns():
+    return [
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('is_active', sa.Boolean(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+    ]
+
+
+def upgrade() -> None:
+    op.create_table('tag_pair_counts',
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('tag_a', sa.String(), nullable=False),
+    sa.Column('tag_b', sa.String(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+    *_common_columns()
+    )
+    op.create_index(op.f('ix_tag_pair_counts_id'), 'tag_pair_counts', ['id'], unique=False)
+    op.create_index('ix_tag_pair_counts_project_pair', 'tag_pair_counts', ['project_id', 'tag_a', 'tag_b'], unique=True)
+    op.create_table('user_tag_counts',
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('normalized', sa.String(), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['project_id'], ['projects.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    *_common_columns()
+    )
+    op.create_index(op.f('ix_user_tag_counts_id'), 'user_tag_counts', ['id'], unique=False)
+    op.create_index('ix_user_tag_counts_project_user_tag', 'user_tag_counts', ['project_id', 'user_id', 'normalized'], unique=True)
+
+    # Count existing annotations, once per distinct tag
+    annotations = sa.table(
+        'annotations', sa.column('image_id', sa.Integer), sa.column('user_id', sa.Integer), sa.column('tags', sa.JSON)
+    )
+    images = sa.table('images', sa.column('id', sa.Integer), sa.column('project_id', sa.Integer))
+    conn = op.get_bind()
+    pairs = {}
+    users = {}
+    rows = conn.execution_options(yield_per=1000).execute(
+        sa.select(images.c.project_id, annotations.c.user_id, annotations.c.tags).select_from(
+            annotations.join(images, images.c.id == annotations.c.image_id)
+        )
+    )
+    for project_id, user_id, tags in rows:
+        keys = sorted({key for key in (_normalize(tag) for tag in tags or []) if key})
+        for key in keys:
+            users[(project_id, user_id, key)] = users.get((project_id, user_id, key), 0) + 1
+        for tag_a, tag_b in combinations(keys, 2):
+            pairs[(project_id, tag_a, tag_b)] = pairs.get((project_id, tag_a, tag_b), 0) + 1
+    if pairs:
+        pair_table = sa.table(
+            'tag_pair_counts',
+            sa.column('project_id', sa.Integer), sa.column('tag_a', sa.String), sa.column('tag_b', sa.String),
+            sa.column('count', sa.Integer), sa.column('is_active', sa.Boolean),
+        )
+        op.bulk_insert(pair_table, [
+            {"project_id": project_id, "tag_a": tag_a, "tag_b": tag_b, "count": count, "is_active": True}
+            for (project_id, tag_a, tag_b), count in pairs.items()
+        ])
+    if users:
+        user_table = sa.table(
+            'user_tag_counts',
+            sa.column('project_id', sa.Integer), sa.column('user_id', sa.Integer), sa.column('normalized', sa.String),
+            sa.column('count', sa.Integer), sa.column('is_active', sa.Boolean),
+        )
+        op.bulk_insert(user_table, [
+            {"project_id": project_id, "user_id": user_id, "normalized": key, "count": count, "is_active": True}
+            for (project_id, user_id, key), count in users.items()
+        ])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_tag_counts_project_user_tag', table_name='user_tag_counts')
+    op.drop_index(op.f('ix_user_tag_counts_id'), table_name='user_tag_counts')
+    op.drop_table('user_tag_counts')
+    op.drop_index('ix_tag_pair_counts_project_pair', table_name='tag_pair_counts')
+    op.drop_index(op.f('ix_tag_pair_counts_id'), table_name='tag_pair_counts')
+    op.drop_table('tag_pair_counts')
@@ -0,0 +1,36 @@
+"""Recount review statuses without pre-label annotations
+
+Revision ID: e4c0a6b2d718
+Revises: d3b9f5a1c607
+Create Date: 2026-10-21 09:42:13.507216
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e4c0a6b2d718'
+down_revision: Union[str, None] = 'd3b9f5a1c607'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # The enum column stores member names, counters store values
+    op.execute("DELETE FROM review_status_counts")
+    op.execute(
+        """
+        INSERT INTO review_status_counts (project_id, status, count, is_active)
+        SELECT images.project_id, lower(CAST(annotations.review_status AS VARCHAR)), count(*), true
+        FROM annotations JOIN images ON images.id = annotations.image_id
+        WHERE NOT annotations.is_prelabel
+        GROUP BY images.project_id, annotations.review_status
+        """
+    )
+
+
+def downgrade() -> None:
+    pass
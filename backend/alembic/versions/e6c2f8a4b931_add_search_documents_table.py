@@ -0,0 +1,57 @@
+"""Add search documents table
+
+Revision ID: e6c2f8a4b931
+Revises: d5b1e7f3a820
+Create Date: 2026-10-20 00:41:27.905116
+
+The table starts empty; fill it with `python -m app.services.search_index`.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6c2f8a4b931'
+down_revision: Union[str, None] = 'd5b1e7f3a820'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    postgres = op.get_bind().dialect.name == "postgresql"
+    op.create_table('search_documents',
+    sa.Column('kind', sa.String(), nullable=False),
+    sa.Column('object_id', sa.Integer(), nullable=False),
+    sa.Column('project_id', sa.Integer(), nullable=False),
+    sa.Column('image_id', sa.Integer(), nullable=True),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('search_vector', postgresql.TSVECTOR() if postgres else sa.Text(), nullable=True),
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_search_documents_id'), 'search_documents', ['id'], unique=False)
+    op.create_index('ix_search_documents_kind_object', 'search_documents', ['kind', 'object_id'], unique=True)
+    op.create_index('ix_search_documents_project', 'search_documents', ['project_id'], unique=False)
+    op.create_index('ix_search_documents_image', 'search_documents', ['image_id'], unique=False)
+    if postgres:
+        op.create_index('ix_search_documents_vector', 'search_documents', ['search_vector'], unique=False, postgresql_using='gin')
+    else:
+        op.execute("CREATE VIRTUAL TABLE search_documents_fts USING fts5(content, tokenize='porter unicode61')")
+
+
+def downgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        op.drop_index('ix_search_documents_vector', table_name='search_documents')
+    else:
+        op.execute("DROP TABLE IF EXISTS search_documents_fts")
+    op.drop_index('ix_search_documents_image', table_name='search_documents')
+    op.drop_index('ix_search_documents_project', table_name='search_documents')
+    op.drop_index('ix_search_documents_kind_object', table_name='search_documents')
+    op.drop_index(op.f('ix_search_documents_id'), table_name='search_documents')
+    op.drop_table('search_documents')
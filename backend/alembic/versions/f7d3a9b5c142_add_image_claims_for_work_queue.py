@@ -0,0 +1,28 @@
+"""Add image claims for the work queue
+
+Revision ID: f7d3a9b5c142
+Revises: e6c2f8a4b931
+Create Date: 2026-10-20 01:58:13.660471
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f7d3a9b5c142'
+down_revision: Union[str, None] = 'e6c2f8a4b931'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('images', sa.Column('claimed_at', sa.DateTime(timezone=True), nullable=True))
+    op.create_index(op.f('ix_images_assigned_user_id'), 'images', ['assigned_user_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_images_assigned_user_id'), table_name='images')
+    op.drop_column('images', 'claimed_at')
@@ -0,0 +1,38 @@
+from fastapi import HTTPException
+from sqlalchemy.orm import Session
+
+from app.models.annotation import Annotation
+from app.models.image import Image
+from app.models.project import project_users
+from app.models.user import User
+
+
+def is_project_member(db: Session, project_id: int, current_user: User) -> bool:
+    return db.query(project_users.c.project_id).filter(
+        project_users.c.project_id == project_id,
+        project_users.c.user_id == current_user.id
+    ).first() is not None
+
+
+def require_project_member(db: Session, project_id: int, current_user: User) -> None:
+    if not is_project_member(db, project_id, current_user):
+        raise HTTPException(status_code=404, detail="Project not found")
+
+
+def get_accessible_image(db: Session, image_id: int, current_user: User) -> Image:
+    """Load an image, raising 404 unless the user is a member of its project"""
+    image = db.query(Image).filter(Image.id == image_id).first()
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found")
+    if not is_project_member(db, image.project_id, current_user):
+        raise HTTPException(status_code=404, detail="Access denied")
+    return image
+
+
+def get_accessible_annotation(db: Session, annotation_id: int, current_user: User) -> Annotation:
+    """Load an annotation, raising 404 unless the user is a member of its image's project"""
+    ann = db.query(Annotation).filter(Annotation.id == annotation_id).first()
+    if not ann:
+        raise HTTPException(status_code=404, detail="Annotation not found")
+    get_accessible_image(db, ann.image_id, current_user)
+    return ann
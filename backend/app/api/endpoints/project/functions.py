@@ -6,8 +6,15 @@ from typing import List, Optional, Dict, Any
 from app.models import project as ProjectModel
 from app.models import user as UserModel
 from app.models import image as ImageModel
+from app.models import annotation as AnnotationModel
+from app.models import folder as FolderModel
 from app.schemas.project import ProjectCreate, ProjectUpdate, ProjectInvite
 from app.schemas.user import User
+from app.services.export_jobs import remove_project_exports
+from app.services.progress import progress_snapshot, record_progress, remove_project_progress
+from app.services.review_counts import remove_project_review_counts
+from app.services.search_index import remove_project_documents
+from app.services.tag_vocabulary import remove_project_tags
 
 def format_project_response(project: ProjectModel.Project, db: Session) -> Dict[str, Any]:
     """Format project data with member information for API response"""
@@ -145,10 +152,29 @@ def delete_project(db: Session, project_id: int, current_user: User) -> bool:
     if not project:
         return False
     
-    # Delete all images in the project
+    # Delete everything derived from the project's annotations
+    remove_project_documents(db, project_id)
+    remove_project_progress(db, project_id)
+    remove_project_exports(db, project_id)
+    remove_project_tags(db, project_id)
+    remove_project_review_counts(db, project_id)
+
+    # Delete all annotations, images and folders in the project
+    image_ids = db.query(ImageModel.Image.id).filter(ImageModel.Image.project_id == project_id)
+    annotation_ids = db.query(AnnotationModel.Annotation.id).filter(
+        AnnotationModel.Annotation.image_id.in_(image_ids)
+    )
+    for model in (AnnotationModel.AnnotationMask, AnnotationModel.AnnotationHistory):
+        db.query(model).filter(model.annotation_id.in_(annotation_ids)).delete(synchronize_session=False)
+    db.query(AnnotationModel.Annotation).filter(
+        AnnotationModel.Annotation.image_id.in_(image_ids)
+    ).delete(synchronize_session=False)
     db.query(ImageModel.Image).filter(
         ImageModel.Image.project_id == project_id
     ).delete()
+    db.query(FolderModel.Folder).filter(
+        FolderModel.Folder.project_id == project_id
+    ).delete()
     
     # Delete project
     db.delete(project)
@@ -261,10 +287,13 @@ def assign_unknown_images(db: Session, project_id: int, assigned_user_id: int, c
         ImageModel.Image.project_id == project_id,
         ImageModel.Image.folder_id.is_(None)
     ).all()
+    image_ids = [image.id for image in unknown_images]
+    progress = progress_snapshot(db, image_ids)
     
     for image in unknown_images:
         image.assigned_user_id = assigned_user_id
     
+    record_progress(db, progress, image_ids)
     db.commit()
     
     return {
@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List
+from app.core.dependencies import get_db
+from app.api.endpoints.user.functions import get_current_user
+from app.api.deps import require_project_member
+from app.models.project import Project
+from app.models.user import User
+from app.services.tag_analytics import (
+    annotator_label_rates,
+    cooccurrence_matrix,
+    label_distribution,
+    rebuild_tag_analytics,
+)
+
+router = APIRouter(prefix="/analytics", tags=["analytics"])
+
+@router.get("/projects/{project_id}/labels")
+def get_label_distribution(
+    project_id: int,
+    limit: int = Query(50, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+) -> dict:
+    """Tag counts and their share of the project's annotations, most used first"""
+    require_project_member(db, project_id, current_user)
+    return label_distribution(db, project_id, limit)
+
+@router.get("/projects/{project_id}/cooccurrence")
+def get_cooccurrence(
+    project_id: int,
+    limit: int = Query(20, ge=1, le=200),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+) -> dict:
+    """Co-occurrence matrix of the project's most used tags, read from precomputed pair counts"""
+    require_project_member(db, project_id, current_user)
+    return cooccurrence_matrix(db, project_id, limit)
+
+@router.get("/projects/{project_id}/annotators")
+def get_annotator_label_rates(
+    project_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+) -> List[dict]:
+    """How often each annotator used each tag, relative to their annotation count"""
+    require_project_member(db, project_id, current_user)
+    return annotator_label_rates(db, project_id)
+
+@router.post("/projects/{project_id}/rebuild")
+def rebuild_analytics(
+    project_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+) -> dict:
+    """Recompute the project's tag aggregates from its annotations (project owner only)"""
+    project = db.query(Project).filter(Project.id == project_id).first()
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if project.owner_id != current_user.id:
+        raise HTTPException(status_code=403, detail="Only the project owner can rebuild analytics")
+    return rebuild_tag_analytics(db, project_id)
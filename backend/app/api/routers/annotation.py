@@ -1,115 +1,567 @@
-from fastapi import APIRouter, Depends, HTTPException, Response
-from sqlalchemy.orm import Session
-from typing import List
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Request, Response, WebSocket, WebSocketDisconnect, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from sqlalchemy import String, cast, func
+from sqlalchemy.orm import Query as OrmQuery, Session, defer, load_only
+from typing import List, Optional
 from app.schemas.annotation import (
-    AnnotationCreate, AnnotationUpdate, AnnotationResponse, AnnotationHistoryResponse
+    AnnotationCreate, AnnotationUpdate, AnnotationResponse, AnnotationHistoryResponse, AnnotationVersionResponse,
+    AnnotationMaskResponse, AnnotationBulkRequest, AnnotationBulkResponse, AnnotationPage
 )
 from app.core.dependencies import get_db, oauth2_scheme
-from app.core.settings import ORTHANC_PASSWORD, ORTHANC_URL, ORTHANC_USERNAME
-from app.models.annotation import Annotation, AnnotationHistory, ReviewStatus
+from app.models.annotation import Annotation, AnnotationHistory, AnnotationMask, ReviewStatus
 from app.models.user import User
 from app.models.image import Image
 from app.api.endpoints.user.functions import get_current_user
-import json
-import zipfile
+from app.api.endpoints.project.functions import get_project
+from app.api.deps import get_accessible_annotation, get_accessible_image, is_project_member
+from app.services.annotation_export import (
+    folder_subtree_ids,
+    iter_bulk_export_zip,
+    iter_image_with_dicom_zip,
+    member_image_ids,
+    serialize_annotation,
+)
+from app.services.annotation_bulk import MAX_BULK_ITEMS, bulk_write_annotations
+from app.services.annotation_events import (
+    ANNOTATION_CREATED,
+    ANNOTATION_REVIEWED,
+    ANNOTATION_UPDATED,
+    get_event_broker,
+    image_channel,
+    publish_annotation_event,
+)
+from app.services.annotation_versions import (
+    VersionConflict,
+    record_initial_version,
+    record_new_version,
+    reconstruct_version,
+)
+from app.services.detection_export import annotation_boxes, iter_coco_json, iter_yolo_zip
+from app.services.dicom_seg import (
+    SegmentationError,
+    SegSource,
+    build_segmentation,
+    read_source_header,
+    segmentation_bytes,
+)
+from app.services.mask_store import (
+    MaskFormatError,
+    decode_mask,
+    load_npy,
+    load_raw,
+    mask_reference,
+    store_mask,
+    to_npy,
+)
+from app.api.routers.image import upload_to_orthanc
+from app.services.progress import progress_snapshot, record_progress
+from app.services.review_claims import review_status_error
+from app.services.review_counts import record_review_changes
+from app.services.search_index import index_documents
+from app.services.tag_vocabulary import record_tag_usage
+from app.utils.jsonpatch import JsonPatchError, apply_patch
+from app.utils.rle import compact_arrays, expand_arrays
+from app.utils.orthanc import get_orthanc_client
+import csv
 import io
+import asyncio
+import hashlib
+import itertools
+import json
 from datetime import datetime
-import requests
-import struct
-
-def get_orthanc_instance(orthanc_id: str) -> bytes:
-    """Download DICOM file from Orthanc server"""
-    url = f"{ORTHANC_URL}/instances/{orthanc_id}/file"
-    auth = (ORTHANC_USERNAME, ORTHANC_PASSWORD)
-    
-    try:
-        print(f"Attempting to download DICOM from Orthanc: {url}")
-        response = requests.get(url, auth=auth, timeout=30)
-        response.raise_for_status()
-        print(f"Successfully downloaded DICOM from Orthanc, size: {len(response.content)} bytes")
-        return response.content
-    except requests.exceptions.ConnectionError as e:
-        print(f"Connection error to Orthanc server: {e}")
-        raise Exception(f"Failed to connect to Orthanc server at {ORTHANC_URL}. Please check if Orthanc is running.")
-    except requests.exceptions.Timeout as e:
-        print(f"Timeout error to Orthanc server: {e}")
-        raise Exception(f"Timeout connecting to Orthanc server. Please check if Orthanc is running.")
-    except requests.exceptions.HTTPError as e:
-        print(f"HTTP error from Orthanc server: {e}")
-        if response.status_code == 404:
-            raise Exception(f"DICOM instance {orthanc_id} not found in Orthanc server.")
-        else:
-            raise Exception(f"Orthanc server returned error {response.status_code}: {response.text}")
-    except requests.exceptions.RequestException as e:
-        print(f"Request error to Orthanc server: {e}")
-        raise Exception(f"Failed to download from Orthanc server: {str(e)}")
-    except Exception as e:
-        print(f"Unexpected error downloading from Orthanc: {e}")
-        raise Exception(f"Unexpected error: {str(e)}")
 
 router = APIRouter(prefix="/annotations", tags=["annotations"])
 
+MAX_HISTORY_PAGE_SIZE = 200
+MAX_LISTING_PAGE_SIZE = 500
+MAX_MASK_UPLOAD_BYTES = 256 * 1024 * 1024
+
 @router.post("/", response_model=AnnotationResponse)
 def create_annotation(
     annotation: AnnotationCreate,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
+    # Counters and events below are keyed by this image's project
+    image = get_accessible_image(db, annotation.image_id, current_user)
     ann = Annotation(
         image_id=annotation.image_id,
         user_id=current_user.id,
-        data=annotation.data,
+        data=compact_arrays(annotation.data),
         dicom_metadata=annotation.dicom_metadata,
         tags=annotation.tags,
         version=1,
         review_status=ReviewStatus.PENDING,
         timestamp=None,
     )
+    progress = progress_snapshot(db, [annotation.image_id])
     db.add(ann)
+    db.flush()
+    record_initial_version(db, ann, current_user.id)
+    record_tag_usage(db, [(image.project_id, current_user.id, None, ann.tags)])
+    record_review_changes(db, [(image.project_id, None, ann.review_status)])
+    record_progress(db, progress, [annotation.image_id])
+    index_documents(db, annotation_ids=[ann.id])
     db.commit()
     db.refresh(ann)
+    publish_annotation_event(ANNOTATION_CREATED, ann, current_user.id)
     return ann
 
+@router.post("/bulk", response_model=AnnotationBulkResponse)
+def bulk_write_annotations_endpoint(
+    request: AnnotationBulkRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Create and update up to MAX_BULK_ITEMS annotations in one transaction.
+
+    Items without `id` are created; the others are updated like a PATCH.
+    Each item gets its own result (created, updated, error or skipped) in
+    request order; with `atomic: true` nothing is written if any item fails.
+    """
+    if len(request.items) > MAX_BULK_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BULK_ITEMS} items per request")
+    results = bulk_write_annotations(db, request.items, current_user.id, atomic=request.atomic)
+    return {
+        "created": sum(1 for result in results if result["status"] == "created"),
+        "updated": sum(1 for result in results if result["status"] == "updated"),
+        "failed": sum(1 for result in results if result["status"] == "error"),
+        "results": results
+    }
+
+def listing_etag(db: Session, query: OrmQuery) -> str:
+    """Weak ETag over the rows a listing selects, computed without loading their data.
+
+    Row count, the sum of versions and max(updated_at) together change on
+    every create, save and delete, even several within one clock tick.
+    """
+    rows = query.with_entities(Annotation.id, Annotation.version, Annotation.updated_at).subquery()
+    count, version_total, last_updated = db.query(
+        func.count(rows.c.id), func.sum(rows.c.version), func.max(rows.c.updated_at)
+    ).one()
+    digest = hashlib.sha1(f"{count}:{version_total or 0}:{last_updated}".encode("utf-8")).hexdigest()
+    return f'W/"{digest[:24]}"'
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    # Weak comparison, as required for If-None-Match
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+def not_modified(etag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+
 @router.get("/image/{image_id}", response_model=List[AnnotationResponse])
 def get_annotations_for_image(
     image_id: int,
+    response: Response,
+    if_none_match: Optional[str] = Header(default=None),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """All annotations of an image. Send the ETag back as If-None-Match to get 304 while nothing changed."""
+    get_accessible_image(db, image_id, current_user)
+    query = db.query(Annotation).filter(Annotation.image_id == image_id)
+    etag = listing_etag(db, query)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return query.order_by(Annotation.id).all()
+
+@router.get("/project/{project_id}", response_model=AnnotationPage)
+def list_project_annotations(
+    project_id: int,
+    response: Response,
+    limit: int = Query(100, ge=1, le=MAX_LISTING_PAGE_SIZE),
+    after_id: Optional[int] = None,
+    review_status: Optional[ReviewStatus] = None,
+    user_id: Optional[int] = None,
+    tag: Optional[str] = None,
+    image_id: Optional[int] = None,
+    folder_id: Optional[int] = None,
+    if_none_match: Optional[str] = Header(default=None),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    anns = db.query(Annotation).filter(Annotation.image_id == image_id).all()
-    return anns
+    """Annotations of a whole project in id order, a page at a time.
+
+    Pass `next_after_id` of a page as `after_id` to get the next one; pages
+    are found by index seek, not OFFSET, so deep pages cost the same as the
+    first. Filters narrow by review status, author, tag, image or folder
+    subtree. Each page carries an ETag and answers If-None-Match with 304.
+    """
+    if not is_project_member(db, project_id, current_user):
+        raise HTTPException(status_code=404, detail="Project not found")
+    
+    query = db.query(Annotation).join(Image, Image.id == Annotation.image_id).filter(Image.project_id == project_id)
+    if after_id is not None:
+        query = query.filter(Annotation.id > after_id)
+    if review_status is not None:
+        query = query.filter(Annotation.review_status == review_status)
+    if user_id is not None:
+        query = query.filter(Annotation.user_id == user_id)
+    if image_id is not None:
+        query = query.filter(Annotation.image_id == image_id)
+    if folder_id is not None:
+        query = query.filter(Image.folder_id.in_(folder_subtree_ids(folder_id)))
+    if tag:
+        # Tags are a JSON list; match the quoted element in its serialized form
+        escaped = json.dumps(tag).replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        query = query.filter(cast(Annotation.tags, String).like(f"%{escaped}%", escape="\\"))
+    # One extra row tells whether another page follows
+    page = query.order_by(Annotation.id).limit(limit + 1)
+    
+    etag = listing_etag(db, page)
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    rows = page.all()
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+    return {
+        "items": rows[:limit],
+        "next_after_id": rows[limit - 1].id if len(rows) > limit else None
+    }
+
+def authorize_image_socket(db: Session, image_id: int, token: Optional[str]) -> List[dict]:
+    """Authenticate a socket and load the image's current annotations"""
+    current_user = get_current_user(token, db)
+    get_accessible_image(db, image_id, current_user)
+    anns = db.query(Annotation).filter(Annotation.image_id == image_id).order_by(Annotation.id).all()
+    return [jsonable_encoder(AnnotationResponse.model_validate(ann)) for ann in anns]
+
+@router.websocket("/image/{image_id}/ws")
+async def annotation_events_socket(
+    websocket: WebSocket,
+    image_id: int,
+    token: Optional[str] = None,
+    db: Session = Depends(get_db)
+):
+    """Live annotation changes for one image, replacing polling of /image/{image_id}.
+
+    Browsers cannot set headers on a WebSocket, so the access token is passed
+    as `?token=`. The first message is a snapshot of the image's annotations;
+    after that every create, update and review is pushed with its version.
+    Rapid saves to one annotation are coalesced into the newest version, and a
+    client that falls too far behind gets a `resync` message and should
+    reload. Events may overlap the snapshot; keep the higher version.
+    """
+    if token is None:
+        authorization = websocket.headers.get("authorization", "")
+        if authorization.lower().startswith("bearer "):
+            token = authorization[7:]
+    if not token:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    
+    broker = get_event_broker()
+    # Subscribe before reading the snapshot so nothing saved in between is missed
+    subscription = broker.subscribe(image_channel(image_id))
+    try:
+        try:
+            annotations = await run_in_threadpool(authorize_image_socket, db, image_id, token)
+        except HTTPException:
+            await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+            return
+        finally:
+            # Nothing else is read for the life of the socket
+            db.close()
+        
+        await websocket.accept()
+        await websocket.send_json({"type": "snapshot", "image_id": image_id, "annotations": annotations})
+        
+        async def forward_events():
+            while True:
+                for event in await subscription.next_events():
+                    await websocket.send_json(event)
+        
+        async def wait_for_disconnect():
+            # Incoming messages are not used; reading them notices the client leaving
+            try:
+                while True:
+                    await websocket.receive_text()
+            except WebSocketDisconnect:
+                pass
+        
+        tasks = [asyncio.create_task(forward_events()), asyncio.create_task(wait_for_disconnect())]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        for task in done:
+            error = task.exception()
+            if error is not None and not isinstance(error, WebSocketDisconnect):
+                print(f"Annotation socket for image {image_id} failed: {error}")
+    finally:
+        broker.unsubscribe(subscription)
+
+def annotation_etag(ann: Annotation) -> str:
+    return f'"{ann.version}"'
+
+def parse_if_match(if_match: Optional[str]) -> Optional[List[int]]:
+    """Versions listed in an If-Match header; None when absent or '*'"""
+    if not if_match or if_match.strip() == "*":
+        return None
+    versions = []
+    for tag in if_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        try:
+            versions.append(int(tag.strip('"')))
+        except ValueError:
+            raise HTTPException(status_code=400, detail=f"Invalid If-Match value: {tag}")
+    return versions
+
+def version_conflict(db: Session, annotation_id: int, current_version: Optional[int]) -> HTTPException:
+    """409 carrying the server's current version and annotation so the client can merge without re-fetching"""
+    current = db.query(Annotation).filter(Annotation.id == annotation_id).first()
+    return HTTPException(
+        status_code=409,
+        detail={
+            "message": "Annotation was modified by someone else",
+            "current_version": current_version,
+            "annotation": jsonable_encoder(AnnotationResponse.model_validate(current)) if current else None
+        },
+        headers={"ETag": f'"{current_version}"'}
+    )
+
+@router.get("/{annotation_id}", response_model=AnnotationResponse)
+def get_annotation(
+    annotation_id: int,
+    response: Response,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    ann = get_accessible_annotation(db, annotation_id, current_user)
+    response.headers["ETag"] = annotation_etag(ann)
+    return ann
 
 @router.patch("/{annotation_id}", response_model=AnnotationResponse)
 def update_annotation(
     annotation_id: int,
     annotation: AnnotationUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(default=None),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    ann = db.query(Annotation).filter(Annotation.id == annotation_id).first()
-    if not ann:
-        raise HTTPException(status_code=404, detail="Annotation not found")
-    # TODO: Add versioning and audit log
-    if annotation.data is not None:
-        ann.data = annotation.data
+    """Save a new version of an annotation.
+
+    The version being edited is taken from If-Match (the ETag returned on
+    read) or from `version` in the body. The write is a conditional UPDATE
+    on that version, so if another save got there first this returns 409
+    with the current state instead of overwriting it.
+
+    Instead of the whole `data`, clients can send `patch`: JSON Patch
+    operations applied server-side to the current version. Long integer
+    arrays such as brush labelmaps are stored run-length encoded.
+    """
+    ann = get_accessible_annotation(db, annotation_id, current_user)
+    
+    expected_versions = parse_if_match(if_match)
+    if expected_versions is None and annotation.version is not None:
+        expected_versions = [annotation.version]
+    if expected_versions is not None and ann.version not in expected_versions:
+        raise version_conflict(db, annotation_id, ann.version)
+    
+    if annotation.patch is not None:
+        if annotation.data is not None:
+            raise HTTPException(status_code=400, detail="Send either data or patch, not both")
+        # A patch only makes sense against the version it was computed from
+        if expected_versions is None:
+            raise HTTPException(status_code=428, detail="Patching requires If-Match or version")
+        try:
+            new_data = apply_patch(expand_arrays(ann.data), [operation.model_dump() for operation in annotation.patch])
+        except JsonPatchError as e:
+            raise HTTPException(status_code=422, detail=f"Patch could not be applied: {str(e)}")
+        if not isinstance(new_data, dict):
+            raise HTTPException(status_code=422, detail="Patched data must be an object")
+    elif annotation.data is not None:
+        new_data = annotation.data
+    else:
+        new_data = ann.data
+    
+    changes = {}
     if annotation.dicom_metadata is not None:
-        ann.dicom_metadata = annotation.dicom_metadata
+        changes["dicom_metadata"] = annotation.dicom_metadata
     if annotation.tags is not None:
-        ann.tags = annotation.tags
-    if annotation.review_status is not None:
-        ann.review_status = annotation.review_status
+        changes["tags"] = annotation.tags
+    # Repeating the current status changes nothing, and leaves the reviewer and claim alone
+    if annotation.review_status is not None and ReviewStatus(annotation.review_status.value) != ann.review_status:
+        status = ReviewStatus(annotation.review_status.value)
+        message = review_status_error(ann, status, current_user.id)
+        if message is not None:
+            raise HTTPException(status_code=403, detail=message)
+        changes["review_status"] = status
+        if status != ReviewStatus.REVISED:
+            changes["reviewer_id"] = current_user.id
+        changes["review_claimed_at"] = None
+    
+    # Every save is a new version; the data change is kept as a delta in the history
+    old_tags = ann.tags
+    old_status = ann.review_status
+    if "review_status" in changes:
+        progress = progress_snapshot(db, [ann.image_id])
+    try:
+        record_new_version(db, ann, compact_arrays(new_data), current_user.id, changes)
+    except VersionConflict as e:
+        raise version_conflict(db, annotation_id, e.current_version)
+    if "tags" in changes or "review_status" in changes:
+        project_id = db.query(Image.project_id).filter(Image.id == ann.image_id).scalar()
+    if "tags" in changes:
+        author_id = None if ann.is_prelabel else ann.user_id
+        record_tag_usage(db, [(project_id, author_id, old_tags, changes["tags"])])
+    if "review_status" in changes:
+        if not ann.is_prelabel:
+            record_review_changes(db, [(project_id, old_status, changes["review_status"])])
+        record_progress(db, progress, [ann.image_id])
+    index_documents(db, annotation_ids=[annotation_id])
     db.commit()
     db.refresh(ann)
+    publish_annotation_event(ANNOTATION_REVIEWED if "review_status" in changes else ANNOTATION_UPDATED, ann, current_user.id)
+    response.headers["ETag"] = annotation_etag(ann)
     return ann
 
 @router.get("/{annotation_id}/history", response_model=List[AnnotationHistoryResponse])
 def get_annotation_history(
     annotation_id: int,
+    limit: int = Query(50, ge=1, le=MAX_HISTORY_PAGE_SIZE),
+    before_version: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """List versions newest first, a page at a time; pass the last version seen as before_version.
+
+    Only version metadata is read; use /versions/{version} for the data itself.
+    """
+    get_accessible_annotation(db, annotation_id, current_user)
+    query = db.query(AnnotationHistory).options(
+        load_only(
+            AnnotationHistory.id, AnnotationHistory.annotation_id, AnnotationHistory.version,
+            AnnotationHistory.is_snapshot, AnnotationHistory.changed_by, AnnotationHistory.changed_at
+        )
+    ).filter(AnnotationHistory.annotation_id == annotation_id)
+    if before_version is not None:
+        query = query.filter(AnnotationHistory.version < before_version)
+    return query.order_by(AnnotationHistory.version.desc()).limit(limit).all()
+
+@router.get("/{annotation_id}/versions/{version}", response_model=AnnotationVersionResponse)
+def get_annotation_version(
+    annotation_id: int,
+    version: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Rebuild the data of an earlier version from the nearest snapshot and the deltas after it"""
+    ann = get_accessible_annotation(db, annotation_id, current_user)
+    if version == ann.version:
+        return {"annotation_id": ann.id, "version": version, "data": ann.data}
+    data = reconstruct_version(db, annotation_id, version)
+    if data is None:
+        raise HTTPException(status_code=404, detail="Version not found")
+    return {"annotation_id": ann.id, "version": version, "data": data}
+
+async def read_mask_body(request: Request) -> bytes:
+    declared = request.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > MAX_MASK_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Mask is too large")
+    body = bytearray()
+    async for chunk in request.stream():
+        body.extend(chunk)
+        if len(body) > MAX_MASK_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="Mask is too large")
+    return bytes(body)
+
+def mask_response(mask: AnnotationMask) -> AnnotationMaskResponse:
+    response = AnnotationMaskResponse.model_validate(mask)
+    response.reference = mask_reference(mask)
+    return response
+
+@router.post("/{annotation_id}/masks", response_model=AnnotationMaskResponse, status_code=201)
+async def upload_annotation_mask(
+    annotation_id: int,
+    request: Request,
+    shape: Optional[str] = None,
+    dtype: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Store a segmentation mask as compressed binary outside the annotation JSON.
+
+    Send a .npy file (Content-Type: application/x-npy), or raw little-endian
+    bytes (application/octet-stream) with `shape` (e.g. 512,512) and `dtype`.
+    Put the returned `reference` into the annotation data in place of the
+    pixel array. Uploading the same mask again returns the stored one.
+    """
+    await run_in_threadpool(get_accessible_annotation, db, annotation_id, current_user)
+    body = await read_mask_body(request)
+    content_type = request.headers.get("content-type", "").split(";")[0].strip()
+    
+    def store():
+        if content_type == "application/x-npy":
+            array = load_npy(body)
+        elif shape and dtype:
+            array = load_raw(body, shape, dtype)
+        else:
+            raise MaskFormatError("Send application/x-npy, or raw bytes with shape and dtype")
+        return store_mask(db, annotation_id, array, current_user.id)
+    
+    try:
+        mask = await run_in_threadpool(store)
+    except MaskFormatError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return mask_response(mask)
+
+@router.get("/{annotation_id}/masks", response_model=List[AnnotationMaskResponse])
+def list_annotation_masks(
+    annotation_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    get_accessible_annotation(db, annotation_id, current_user)
+    masks = db.query(AnnotationMask).options(defer(AnnotationMask.payload)).filter(
+        AnnotationMask.annotation_id == annotation_id
+    ).order_by(AnnotationMask.id).all()
+    return [mask_response(mask) for mask in masks]
+
+@router.get("/masks/{mask_id}")
+def download_annotation_mask(
+    mask_id: int,
+    format: str = "npy",
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    history = db.query(AnnotationHistory).filter(AnnotationHistory.annotation_id == annotation_id).all()
-    return history
+    """Fetch a mask as binary: `npy` (default), `raw` decoded bytes, or `packed` as stored.
+
+    Shape, dtype and encoding are also sent as X-Mask-* headers. Masks are
+    immutable, so responses can be cached by their ETag.
+    """
+    mask = db.query(AnnotationMask).filter(AnnotationMask.id == mask_id).first()
+    if not mask:
+        raise HTTPException(status_code=404, detail="Mask not found")
+    get_accessible_annotation(db, mask.annotation_id, current_user)
+    
+    headers = {
+        "X-Mask-Shape": ",".join(str(dim) for dim in mask.shape),
+        "X-Mask-Dtype": mask.dtype,
+        "X-Mask-Encoding": mask.encoding,
+        "ETag": f'"{mask.sha256}"',
+        "Cache-Control": "private, max-age=31536000, immutable"
+    }
+    if format == "packed":
+        return Response(content=mask.payload, media_type="application/octet-stream", headers=headers)
+    try:
+        array = decode_mask(mask)
+    except MaskFormatError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if format == "raw":
+        return Response(content=array.tobytes(), media_type="application/octet-stream", headers=headers)
+    if format == "npy":
+        return Response(content=to_npy(array), media_type="application/x-npy", headers=headers)
+    raise HTTPException(status_code=400, detail="Unsupported format. Use 'npy', 'raw' or 'packed'")
 
 @router.get("/image/{image_id}/download")
 def download_image_annotations(
@@ -121,9 +573,7 @@ def download_image_annotations(
     """Download annotations for a specific image in various formats"""
     
     # Get image and verify access
-    image = db.query(Image).filter(Image.id == image_id).first()
-    if not image:
-        raise HTTPException(status_code=404, detail="Image not found")
+    image = get_accessible_image(db, image_id, current_user)
     
     # Get annotations
     annotations = db.query(Annotation).filter(Annotation.image_id == image_id).all()
@@ -134,18 +584,7 @@ def download_image_annotations(
             "image_id": image_id,
             "orthanc_id": image.orthanc_id,
             "exported_at": datetime.utcnow().isoformat(),
-            "annotations": [
-                {
-                    "id": ann.id,
-                    "user_id": ann.user_id,
-                    "version": ann.version,
-                    "bounding_boxes": ann.bounding_boxes,
-                    "tags": ann.tags,
-                    "review_status": ann.review_status.value,
-                    "timestamp": ann.timestamp.isoformat() if ann.timestamp else None
-                }
-                for ann in annotations
-            ]
+            "annotations": [serialize_annotation(ann) for ann in annotations]
         }
         
         return Response(
@@ -155,15 +594,22 @@ def download_image_annotations(
         )
     
     elif format == "csv":
-        # Export as CSV
-        csv_content = "annotation_id,user_id,version,x,y,w,h,label,tags,review_status,timestamp\n"
+        # Export as CSV, one row per box drawn in the annotation data
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(["annotation_id", "user_id", "version", "x", "y", "w", "h", "label", "tags", "review_status", "timestamp"])
         
         for ann in annotations:
-            for box in ann.bounding_boxes:
-                csv_content += f"{ann.id},{ann.user_id},{ann.version},{box.get('x', '')},{box.get('y', '')},{box.get('w', '')},{box.get('h', '')},{box.get('label', '')},{','.join(ann.tags or [])},{ann.review_status.value},{ann.timestamp.isoformat() if ann.timestamp else ''}\n"
+            for (x1, y1, x2, y2), label in annotation_boxes(ann):
+                writer.writerow([
+                    ann.id, ann.user_id, ann.version,
+                    min(x1, x2), min(y1, y2), abs(x2 - x1), abs(y2 - y1), label,
+                    ",".join(ann.tags or []), ann.review_status.value,
+                    ann.timestamp.isoformat() if ann.timestamp else ""
+                ])
         
         return Response(
-            content=csv_content,
+            content=output.getvalue(),
             media_type="text/csv",
             headers={"Content-Disposition": f"attachment; filename=annotations_image_{image_id}.csv"}
         )
@@ -171,157 +617,143 @@ def download_image_annotations(
     else:
         raise HTTPException(status_code=400, detail="Unsupported format. Use 'json' or 'csv'")
 
-@router.get("/image/{image_id}/export-dicom-seg")
-def export_dicom_seg(
-    image_id: int,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
-):
-    """Export annotations as DICOM-SEG file"""
-    
-    # Get image and verify access
-    image = db.query(Image).filter(Image.id == image_id).first()
-    if not image:
-        raise HTTPException(status_code=404, detail="Image not found")
-    
-    # Get annotations
-    annotations = db.query(Annotation).filter(Annotation.image_id == image_id).all()
-    
-    if not annotations:
-        raise HTTPException(status_code=404, detail="No annotations found for this image")
+def dicom_seg_response(db: Session, images: List[Image], store: bool, description: str):
+    """Build a DICOM-SEG for annotated images of one series, then download it or store it in Orthanc"""
+    image_ids = [image.id for image in images]
+    annotations_by_image = {image_id: [] for image_id in image_ids}
+    for ann in db.query(Annotation).filter(Annotation.image_id.in_(image_ids)).order_by(Annotation.id):
+        annotations_by_image[ann.image_id].append(ann)
+    annotated = [image for image in images if annotations_by_image[image.id]]
+    if not annotated:
+        raise HTTPException(status_code=404, detail="No annotations found for these images")
     
     try:
-        # Get original DICOM from Orthanc
-        dicom_data = get_orthanc_instance(image.orthanc_id)
-        
-        # Create a basic DICOM-SEG file structure
-        # This is a simplified implementation - in production you'd use pydicom
-        
-        # Create a minimal DICOM-SEG file with basic metadata
-        seg_data = bytearray()
-        
-        # DICOM file header (128 bytes of 0x00 + 'DICM')
-        seg_data.extend(b'\x00' * 128)
-        seg_data.extend(b'DICM')
-        
-        # Basic DICOM elements (simplified)
-        # File Meta Information Group Length
-        seg_data.extend(b'\x02\x00\x00\x00')  # Group 0002, Element 0000
-        seg_data.extend(b'UL')  # VR
-        seg_data.extend(b'\x00\x00')  # Reserved
-        seg_data.extend(b'\x04\x00\x00\x00')  # Length
-        seg_data.extend(b'\x00\x00\x00\x00')  # Value (placeholder)
-        
-        # Media Storage SOP Class UID
-        seg_data.extend(b'\x02\x00\x02\x00')  # Group 0002, Element 0002
-        seg_data.extend(b'UI')  # VR
-        seg_data.extend(b'\x00\x00')  # Reserved
-        seg_data.extend(b'\x1A\x00\x00\x00')  # Length
-        seg_data.extend(b'1.2.840.10008.5.1.4.1.1.66.1')  # DICOM-SEG SOP Class UID
-        
-        # Add annotation data as a custom element
-        annotation_json = json.dumps([
-            {
-                "id": ann.id,
-                "user_id": ann.user_id,
-                "version": ann.version,
-                "bounding_boxes": ann.bounding_boxes,
-                "tags": ann.tags,
-                "review_status": ann.review_status.value,
-                "timestamp": ann.timestamp.isoformat() if ann.timestamp else None
-            }
-            for ann in annotations
-        ], indent=2)
-        
-        # Custom element for annotations (Group 9999)
-        seg_data.extend(b'\x99\x99\x01\x00')  # Group 9999, Element 0001
-        seg_data.extend(b'LT')  # VR (Long Text)
-        seg_data.extend(b'\x00\x00')  # Reserved
-        length_bytes = struct.pack('<I', len(annotation_json))
-        seg_data.extend(length_bytes)
-        seg_data.extend(annotation_json.encode('utf-8'))
-        
+        sources = [
+            SegSource(read_source_header(image.orthanc_id), annotations_by_image[image.id])
+            for image in annotated
+        ]
+        seg = build_segmentation(sources, series_description=description)
+    except SegmentationError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to export DICOM-SEG: {str(e)}")
+    
+    data = segmentation_bytes(seg)
+    if not store:
         return Response(
-            content=bytes(seg_data),
+            content=data,
             media_type="application/dicom",
-            headers={"Content-Disposition": f"attachment; filename=segmentation_{image.orthanc_id}.dcm"}
+            headers={"Content-Disposition": f"attachment; filename=segmentation_{seg.SOPInstanceUID}.dcm"}
         )
-        
+    
+    try:
+        orthanc_id = upload_to_orthanc(io.BytesIO(data))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to export DICOM-SEG: {str(e)}")
+        raise HTTPException(status_code=502, detail=f"Failed to store DICOM-SEG in Orthanc: {str(e)}")
+    return {
+        "orthanc_id": orthanc_id,
+        "sop_instance_uid": str(seg.SOPInstanceUID),
+        "series_instance_uid": str(seg.SeriesInstanceUID),
+        "segments": [item.SegmentLabel for item in seg.SegmentSequence],
+        "frames": int(seg.NumberOfFrames),
+        "source_images": [image.id for image in annotated]
+    }
+
+@router.get("/image/{image_id}/export-dicom-seg")
+def export_dicom_seg(
+    image_id: int,
+    store: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Export the annotations on an image as a binary DICOM-SEG referencing the source instance.
+
+    With store=true the segmentation is also uploaded to Orthanc and its ids are returned.
+    """
+    image = get_accessible_image(db, image_id, current_user)
+    return dicom_seg_response(db, [image], store, "Annotations")
+
+@router.get("/series/{series_instance_uid}/export-dicom-seg")
+def export_series_dicom_seg(
+    series_instance_uid: str,
+    project_id: int,
+    store: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Export the annotations on every image of a series as one multi-frame DICOM-SEG"""
+    if not get_project(db, project_id, current_user):
+        raise HTTPException(status_code=404, detail="Project not found or access denied")
+    images = db.query(Image).filter(
+        Image.project_id == project_id,
+        Image.series_instance_uid == series_instance_uid
+    ).order_by(Image.instance_number, Image.id).all()
+    if not images:
+        raise HTTPException(status_code=404, detail="Series not found")
+    return dicom_seg_response(db, images, store, "Annotations")
 
 @router.post("/bulk-export")
 def bulk_export_annotations(
-    image_ids: List[int],
+    image_ids: List[int] = Body(default=[]),
     format: str = "zip",
+    project_id: Optional[int] = None,
+    include_dicom: bool = False,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Bulk export annotations for multiple images"""
+    """Bulk export annotations for multiple images, or a whole project when only project_id is given.
+
+    The archive is streamed while annotations are read in chunks, and DICOMs
+    (with include_dicom) are piped from Orthanc into it, so memory use does
+    not grow with the size of the export.
+    """
+    if format != "zip":
+        raise HTTPException(status_code=400, detail="Unsupported format. Use 'zip'")
+    if not image_ids and project_id is None:
+        raise HTTPException(status_code=400, detail="Provide image_ids or a project_id")
+    
+    selected_ids = member_image_ids(current_user.id, project_id=project_id, image_ids=image_ids)
     
     # Get images and verify access
-    images = db.query(Image).filter(Image.id.in_(image_ids)).all()
-    if not images:
+    if not db.query(Image.id).filter(Image.id.in_(selected_ids)).first():
         raise HTTPException(status_code=404, detail="No images found")
     
-    # Get annotations for all images
-    annotations = db.query(Annotation).filter(Annotation.image_id.in_(image_ids)).all()
+    return StreamingResponse(
+        iter_bulk_export_zip(db, selected_ids, include_dicom=include_dicom),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename=annotations_export_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.zip"}
+    )
+
+@router.get("/project/{project_id}/export")
+def export_project_detections(
+    project_id: int,
+    format: str = "coco",
+    folder_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Export the boxes of a project (or folder subtree) as a COCO JSON file or a YOLO label ZIP.
+
+    Boxes are read from annotation data a chunk of images at a time and
+    normalised in batches, and the file is streamed as it is produced.
+    """
+    if format not in ("coco", "yolo"):
+        raise HTTPException(status_code=400, detail="Unsupported format. Use 'coco' or 'yolo'")
+    if not get_project(db, project_id, current_user):
+        raise HTTPException(status_code=404, detail="Project not found or access denied")
     
-    if format == "zip":
-        # Create ZIP file with all annotations
-        zip_buffer = io.BytesIO()
-        
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            # Add JSON file with all annotations
-            all_annotations = {
-                "exported_at": datetime.utcnow().isoformat(),
-                "total_images": len(images),
-                "total_annotations": len(annotations),
-                "images": []
-            }
-            
-            for image in images:
-                image_annotations = [ann for ann in annotations if ann.image_id == image.id]
-                image_data = {
-                    "image_id": image.id,
-                    "orthanc_id": image.orthanc_id,
-                    "annotations": [
-                        {
-                            "id": ann.id,
-                            "user_id": ann.user_id,
-                            "version": ann.version,
-                            "bounding_boxes": ann.bounding_boxes,
-                            "tags": ann.tags,
-                            "review_status": ann.review_status.value,
-                            "timestamp": ann.timestamp.isoformat() if ann.timestamp else None
-                        }
-                        for ann in image_annotations
-                    ]
-                }
-                all_annotations["images"].append(image_data)
-                
-                # Add individual JSON file for each image
-                zip_file.writestr(
-                    f"annotations_image_{image.id}.json",
-                    json.dumps(image_data, indent=2)
-                )
-            
-            # Add summary file
-            zip_file.writestr(
-                "annotations_summary.json",
-                json.dumps(all_annotations, indent=2)
-            )
-        
-        zip_buffer.seek(0)
-        
-        return Response(
-            content=zip_buffer.getvalue(),
-            media_type="application/zip",
-            headers={"Content-Disposition": f"attachment; filename=annotations_export_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.zip"}
+    selected_ids = member_image_ids(current_user.id, project_id=project_id, folder_id=folder_id)
+    if format == "coco":
+        return StreamingResponse(
+            iter_coco_json(db, selected_ids),
+            media_type="application/json",
+            headers={"Content-Disposition": f"attachment; filename=project_{project_id}_coco.json"}
         )
-    
-    else:
-        raise HTTPException(status_code=400, detail="Unsupported format. Use 'zip'")
+    return StreamingResponse(
+        iter_yolo_zip(db, selected_ids),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename=project_{project_id}_yolo.zip"}
+    )
 
 @router.get("/image/{image_id}/download-with-dicom")
 def download_image_with_annotations(
@@ -332,55 +764,20 @@ def download_image_with_annotations(
     """Download DICOM image along with its annotations"""
     
     # Get image and verify access
-    image = db.query(Image).filter(Image.id == image_id).first()
-    if not image:
-        raise HTTPException(status_code=404, detail="Image not found")
+    image = get_accessible_image(db, image_id, current_user)
     
     # Get annotations
-    annotations = db.query(Annotation).filter(Annotation.image_id == image_id).all()
+    annotations = db.query(Annotation).filter(Annotation.image_id == image_id).order_by(Annotation.id).all()
     
     try:
-        # Get DICOM from Orthanc
-        dicom_data = get_orthanc_instance(image.orthanc_id)
-        
-        # Create ZIP with DICOM and annotations
-        zip_buffer = io.BytesIO()
-        
-        with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-            # Add DICOM file
-            zip_file.writestr(f"dicom_{image.orthanc_id}.dcm", dicom_data)
-            
-            # Add annotations JSON
-            annotation_data = {
-                "image_id": image_id,
-                "orthanc_id": image.orthanc_id,
-                "exported_at": datetime.utcnow().isoformat(),
-                "annotations": [
-                    {
-                        "id": ann.id,
-                        "user_id": ann.user_id,
-                        "version": ann.version,
-                        "bounding_boxes": ann.bounding_boxes,
-                        "tags": ann.tags,
-                        "review_status": ann.review_status.value,
-                        "timestamp": ann.timestamp.isoformat() if ann.timestamp else None
-                    }
-                    for ann in annotations
-                ]
-            }
-            
-            zip_file.writestr(
-                "annotations.json",
-                json.dumps(annotation_data, indent=2)
-            )
-        
-        zip_buffer.seek(0)
-        
-        return Response(
-            content=zip_buffer.getvalue(),
-            media_type="application/zip",
-            headers={"Content-Disposition": f"attachment; filename=image_{image_id}_with_annotations.zip"}
-        )
-        
+        # Open the Orthanc stream before responding so failures still surface as errors
+        dicom_chunks = get_orthanc_client().iter_dicom_file(image.orthanc_id)
+        first_chunk = next(dicom_chunks, b"")
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to download image with annotations: {str(e)}") 
+        raise HTTPException(status_code=500, detail=f"Failed to download image with annotations: {str(e)}")
+    
+    return StreamingResponse(
+        iter_image_with_dicom_zip(image, annotations, itertools.chain([first_chunk], dicom_chunks)),
+        media_type="application/zip",
+        headers={"Content-Disposition": f"attachment; filename=image_{image_id}_with_annotations.zip"}
+    )
@@ -0,0 +1,643 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy import distinct, func, select
+from sqlalchemy.orm import Session
+from typing import Any, Dict, List, Optional
+
+from app.core.dependencies import get_db
+from app.models.folder import Folder
+from app.models.image import Image
+from app.models.project import project_users
+from app.models.user import User
+from app.api.endpoints.user.functions import get_current_user
+from app.api.endpoints.project.functions import get_project
+from app.api.routers.image import fetch_dicom_metadata, upload_to_orthanc
+from app.services.frame_index import FrameIndexError, get_frame_index, iter_frames
+from app.services.instance_cache import get_instance_cache
+from app.services.progress import record_progress
+from app.services.search_index import index_documents
+from app.utils.dicom import (
+    INDEXED_ATTRIBUTES,
+    dicom_index_fields,
+    dicom_json_element,
+    resolve_tag,
+    to_dicom_json,
+)
+from app.utils.multipart import (
+    MultipartError,
+    aiter_multipart_parts,
+    iter_multipart_related,
+    multipart_related_media_type,
+    new_boundary,
+    parse_boundary,
+)
+from app.utils.orthanc import get_orthanc_client
+import pydicom
+from pydicom.datadict import keyword_for_tag
+
+router = APIRouter(prefix="/dicomweb", tags=["dicomweb"])
+
+DICOM_JSON = "application/dicom+json"
+DEFAULT_QIDO_LIMIT = 100
+MAX_QIDO_LIMIT = 1000
+MAX_STOW_PART_SIZE = 100 * 1024 * 1024
+PIXEL_DATA_TAG = 0x7FE00010
+
+# PS3.18 failure reasons used in STOW-RS responses
+STOW_PROCESSING_FAILURE = 0x0110
+STOW_STUDY_MISMATCH = 0xA900
+# Read from each part's header when the target study is given
+STOW_CHECKED_TAGS = ["StudyInstanceUID", "SOPClassUID", "SOPInstanceUID"]
+
+QIDO_RESERVED_PARAMS = {"limit", "offset", "includefield", "fuzzymatching", "project_id"}
+
+STUDY_ATTRIBUTES = [
+    "StudyDate", "StudyTime", "AccessionNumber", "ReferringPhysicianName", "PatientName",
+    "PatientID", "PatientBirthDate", "PatientSex", "StudyID", "StudyDescription", "StudyInstanceUID",
+]
+SERIES_ATTRIBUTES = [
+    "Modality", "SeriesDescription", "SeriesNumber", "SeriesInstanceUID", "StudyInstanceUID",
+    "PerformedProcedureStepStartDate", "PerformedProcedureStepStartTime",
+]
+INSTANCE_ATTRIBUTES = [
+    "SOPClassUID", "SOPInstanceUID", "InstanceNumber", "Rows", "Columns", "BitsAllocated",
+    "NumberOfFrames", "SeriesInstanceUID", "StudyInstanceUID",
+]
+
+LEVELS = {
+    "study": (Image.study_instance_uid, STUDY_ATTRIBUTES),
+    "series": (Image.series_instance_uid, SERIES_ATTRIBUTES),
+    "instance": (Image.sop_instance_uid, INSTANCE_ATTRIBUTES),
+}
+
+
+def _access_criteria(current_user: User, project_id: Optional[int] = None) -> list:
+    """Restrict images to projects the user is a member of"""
+    member_projects = select(project_users.c.project_id).where(project_users.c.user_id == current_user.id)
+    criteria = [Image.project_id.in_(member_projects)]
+    if project_id is not None:
+        criteria.append(Image.project_id == project_id)
+    return criteria
+
+
+def _base_url(request: Request) -> str:
+    return str(request.base_url).rstrip("/") + router.prefix
+
+
+def _match_criterion(column, value: str):
+    if column is Image.study_date and "-" in value:
+        start, _, end = value.partition("-")
+        clauses = []
+        if start:
+            clauses.append(column >= start)
+        if end:
+            clauses.append(column <= end)
+        return clauses
+    values = [v for v in value.replace("\\", ",").split(",") if v]
+    if len(values) > 1:
+        return [column.in_(values)]
+    if "*" in value or "?" in value:
+        return [column.like(value.replace("*", "%").replace("?", "_"))]
+    return [column == value]
+
+
+def _query_filters(request: Request) -> tuple:
+    """Translate QIDO query parameters into filters on the indexed Image columns"""
+    criteria = []
+    unsupported = []
+    for key, value in request.query_params.multi_items():
+        if key in QIDO_RESERVED_PARAMS or not value:
+            continue
+        tag = resolve_tag(key)
+        keyword = keyword_for_tag(tag) if tag is not None else None
+        column_name = INDEXED_ATTRIBUTES.get(keyword)
+        if column_name is None:
+            unsupported.append(key)
+            continue
+        criteria.extend(_match_criterion(getattr(Image, column_name), value))
+    return criteria, unsupported
+
+
+def _include_all(request: Request) -> bool:
+    return any(
+        field.lower() == "all"
+        for value in request.query_params.getlist("includefield")
+        for field in value.split(",")
+    )
+
+
+def _extra_attributes(request: Request) -> List[str]:
+    extra = []
+    for value in request.query_params.getlist("includefield"):
+        for field in value.split(","):
+            tag = resolve_tag(field.strip())
+            keyword = keyword_for_tag(tag) if tag is not None else None
+            if keyword:
+                extra.append(keyword)
+    return extra
+
+
+def _dicom_json_for(image: Image, attributes: Optional[List[str]]) -> Dict[str, Any]:
+    element = to_dicom_json(image.dicom_metadata, attributes)
+    # Indexed columns are authoritative even when the stored tag dict is incomplete
+    for keyword, column_name in INDEXED_ATTRIBUTES.items():
+        if attributes is not None and keyword not in attributes:
+            continue
+        value = getattr(image, column_name)
+        if value is not None:
+            element.update(to_dicom_json({keyword: value}))
+    return dict(sorted(element.items()))
+
+
+def _retrieve_url(request: Request, image: Image, level: str) -> str:
+    url = f"{_base_url(request)}/studies/{image.study_instance_uid}"
+    if level in ("series", "instance"):
+        url += f"/series/{image.series_instance_uid}"
+    if level == "instance":
+        url += f"/instances/{image.sop_instance_uid}"
+    return url
+
+
+def _qido(
+    request: Request,
+    db: Session,
+    current_user: User,
+    level: str,
+    scope: list,
+    limit: int,
+    offset: int,
+    project_id: Optional[int],
+) -> JSONResponse:
+    """Answer a QIDO-RS search from the local index, one representative image per result"""
+    key_column, attributes = LEVELS[level]
+    filters, unsupported = _query_filters(request)
+    criteria = _access_criteria(current_user, project_id) + scope + filters + [key_column.isnot(None)]
+
+    rows = db.query(
+        key_column,
+        func.min(Image.id).label("image_id"),
+        func.count(distinct(Image.series_instance_uid)).label("series_count"),
+        func.count(distinct(Image.sop_instance_uid)).label("instance_count"),
+    ).filter(*criteria).group_by(key_column).order_by(key_column).offset(offset).limit(limit).all()
+
+    representatives = {
+        image.id: image
+        for image in db.query(Image).filter(Image.id.in_([row.image_id for row in rows])).all()
+    }
+
+    modalities: Dict[str, List[str]] = {}
+    if level == "study" and rows:
+        study_uids = [row[0] for row in rows]
+        for study_uid, modality in db.query(Image.study_instance_uid, Image.modality).filter(
+            *_access_criteria(current_user, project_id),
+            Image.study_instance_uid.in_(study_uids),
+            Image.modality.isnot(None),
+        ).distinct().all():
+            modalities.setdefault(study_uid, []).append(modality)
+
+    selected = None if _include_all(request) else attributes + _extra_attributes(request)
+    results = []
+    for row in rows:
+        image = representatives[row.image_id]
+        element = _dicom_json_for(image, selected)
+        if level == "study":
+            element["00080061"] = dicom_json_element("CS", *sorted(modalities.get(row[0], [])))
+            element["00201206"] = dicom_json_element("IS", row.series_count)
+            element["00201208"] = dicom_json_element("IS", row.instance_count)
+        elif level == "series":
+            element["00201209"] = dicom_json_element("IS", row.instance_count)
+        element["00081190"] = dicom_json_element("UR", _retrieve_url(request, image, level))
+        results.append(dict(sorted(element.items())))
+
+    headers = {}
+    if unsupported:
+        headers["Warning"] = f'299 radiology-tagging-system: "Unsupported query attributes ignored: {", ".join(unsupported)}"'
+    return JSONResponse(results, media_type=DICOM_JSON, headers=headers)
+
+
+def _resolve_instances(
+    db: Session,
+    current_user: User,
+    study: str,
+    series: Optional[str] = None,
+    sop: Optional[str] = None,
+    project_id: Optional[int] = None,
+) -> List[Image]:
+    query = db.query(Image).filter(*_access_criteria(current_user, project_id), Image.study_instance_uid == study)
+    if series is not None:
+        query = query.filter(Image.series_instance_uid == series)
+    if sop is not None:
+        query = query.filter(Image.sop_instance_uid == sop)
+    images = query.order_by(Image.series_instance_uid, Image.instance_number, Image.id).all()
+
+    # The same instance can be filed in several projects or folders; serve it once
+    unique: Dict[str, Image] = {}
+    for image in images:
+        unique.setdefault(image.sop_instance_uid or image.orthanc_id, image)
+    if not unique:
+        raise HTTPException(status_code=404, detail="No matching instances found or access denied")
+    return list(unique.values())
+
+
+def _instances_response(request: Request, images: List[Image]) -> StreamingResponse:
+    cache = get_instance_cache()
+    cache.prefetch(image.orthanc_id for image in images)
+    boundary = new_boundary()
+    parts = (
+        (
+            {"Content-Type": "application/dicom", "Content-Location": _retrieve_url(request, image, "instance")},
+            cache.iter_file(image.orthanc_id),
+        )
+        for image in images
+    )
+    return StreamingResponse(iter_multipart_related(parts, boundary), media_type=multipart_related_media_type(boundary))
+
+
+def _metadata_response(request: Request, images: List[Image]) -> JSONResponse:
+    results = []
+    for image in images:
+        element = _dicom_json_for(image, None)
+        element["7FE00010"] = {
+            "vr": "OB",
+            "BulkDataURI": f"{_retrieve_url(request, image, 'instance')}/bulkdata/7FE00010",
+        }
+        results.append(dict(sorted(element.items())))
+    return JSONResponse(results, media_type=DICOM_JSON)
+
+
+def _number_of_frames(image: Image) -> int:
+    try:
+        return max(1, int(str((image.dicom_metadata or {}).get("NumberOfFrames", 1)).strip()))
+    except ValueError:
+        return 1
+
+
+def _parse_frame_list(frame_list: str) -> List[int]:
+    try:
+        frames = [int(frame) for frame in frame_list.split(",") if frame.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Frame list must be comma-separated frame numbers")
+    if not frames or any(frame < 1 for frame in frames):
+        raise HTTPException(status_code=400, detail="Frame numbers start at 1")
+    return frames
+
+
+def _frames_response(request: Request, image: Image, frames: List[int]) -> StreamingResponse:
+    instance_url = _retrieve_url(request, image, "instance")
+    boundary = new_boundary()
+    try:
+        index = get_frame_index(image.orthanc_id)
+    except FrameIndexError as e:
+        # Instances we cannot index in place (e.g. deflated) are framed by Orthanc instead
+        print(f"Falling back to Orthanc frames for {image.orthanc_id}: {e}")
+        index = None
+
+    available = index.number_of_frames if index else _number_of_frames(image)
+    if any(frame > available for frame in frames):
+        raise HTTPException(status_code=404, detail=f"Instance has {available} frame(s)")
+
+    if index:
+        media_type = index.media_type
+        bodies = iter_frames(image.orthanc_id, index, frames)
+    else:
+        media_type = "application/octet-stream"
+        client = get_orthanc_client()
+        bodies = (client.iter_instance_resource(image.orthanc_id, f"frames/{frame - 1}/raw") for frame in frames)
+    parts = (
+        ({"Content-Type": media_type, "Content-Location": f"{instance_url}/frames/{frame}"}, body)
+        for frame, body in zip(frames, bodies)
+    )
+    return StreamingResponse(
+        iter_multipart_related(parts, boundary),
+        media_type=multipart_related_media_type(boundary, media_type.split(";")[0]),
+    )
+
+# ======================= QIDO-RS =======================
+
+@router.get("/studies")
+def search_studies(
+    request: Request,
+    limit: int = Query(DEFAULT_QIDO_LIMIT, ge=1, le=MAX_QIDO_LIMIT),
+    offset: int = Query(0, ge=0),
+    project_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """QIDO-RS study search over the images the user can access"""
+    return _qido(request, db, current_user, "study", [], limit, offset, project_id)
+
+@router.get("/series")
+def search_all_series(
+    request: Request,
+    limit: int = Query(DEFAULT_QIDO_LIMIT, ge=1, le=MAX_QIDO_LIMIT),
+    offset: int = Query(0, ge=0),
+    project_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """QIDO-RS series search across all accessible studies"""
+    return _qido(request, db, current_user, "series", [], limit, offset, project_id)
+
+@router.get("/instances")
+def search_all_instances(
+    request: Request,
+    limit: int = Query(DEFAULT_QIDO_LIMIT, ge=1, le=MAX_QIDO_LIMIT),
+    offset: int = Query(0, ge=0),
+    project_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """QIDO-RS instance search across all accessible studies"""
+    return _qido(request, db, current_user, "instance", [], limit, offset, project_id)
+
+@router.get("/studies/{study}/series")
+def search_series(
+    study: str,
+    request: Request,
+    limit: int = Query(DEFAULT_QIDO_LIMIT, ge=1, le=MAX_QIDO_LIMIT),
+    offset: int = Query(0, ge=0),
+    project_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """QIDO-RS series search within a study"""
+    scope = [Image.study_instance_uid == study]
+    return _qido(request, db, current_user, "series", scope, limit, offset, project_id)
+
+@router.get("/studies/{study}/instances")
+def search_study_instances(
+    study: str,
+    request: Request,
+    limit: int = Query(DEFAULT_QIDO_LIMIT, ge=1, le=MAX_QIDO_LIMIT),
+    offset: int = Query(0, ge=0),
+    project_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """QIDO-RS instance search within a study"""
+    scope = [Image.study_instance_uid == study]
+    return _qido(request, db, current_user, "instance", scope, limit, offset, project_id)
+
+@router.get("/studies/{study}/series/{series}/instances")
+def search_series_instances(
+    study: str,
+    series: str,
+    request: Request,
+    limit: int = Query(DEFAULT_QIDO_LIMIT, ge=1, le=MAX_QIDO_LIMIT),
+    offset: int = Query(0, ge=0),
+    project_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """QIDO-RS instance search within a series"""
+    scope = [Image.study_instance_uid == study, Image.series_instance_uid == series]
+    return _qido(request, db, current_user, "instance", scope, limit, offset, project_id)
+
+# ======================= WADO-RS =======================
+
+@router.get("/studies/{study}")
+def retrieve_study(
+    study: str,
+    request: Request,
+    project_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """WADO-RS retrieve of every accessible instance in a study"""
+    return _instances_response(request, _resolve_instances(db, current_user, study, project_id=project_id))
+
+@router.get("/studies/{study}/metadata")
+def retrieve_study_metadata(
+    study: str,
+    request: Request,
+    project_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """WADO-RS metadata for a study, served from the local index"""
+    return _metadata_response(request, _resolve_instances(db, current_user, study, project_id=project_id))
+
+@router.get("/studies/{study}/series/{series}")
+def retrieve_series(
+    study: str,
+    series: str,
+    request: Request,
+    project_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """WADO-RS retrieve of every accessible instance in a series"""
+    images = _resolve_instances(db, current_user, study, series, project_id=project_id)
+    return _instances_response(request, images)
+
+@router.get("/studies/{study}/series/{series}/metadata")
+def retrieve_series_metadata(
+    study: str,
+    series: str,
+    request: Request,
+    project_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """WADO-RS metadata for a series, served from the local index"""
+    images = _resolve_instances(db, current_user, study, series, project_id=project_id)
+    return _metadata_response(request, images)
+
+@router.get("/studies/{study}/series/{series}/instances/{sop}")
+def retrieve_instance(
+    study: str,
+    series: str,
+    sop: str,
+    request: Request,
+    project_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """WADO-RS retrieve of a single instance"""
+    images = _resolve_instances(db, current_user, study, series, sop, project_id)
+    return _instances_response(request, images[:1])
+
+@router.get("/studies/{study}/series/{series}/instances/{sop}/metadata")
+def retrieve_instance_metadata(
+    study: str,
+    series: str,
+    sop: str,
+    request: Request,
+    project_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """WADO-RS metadata for a single instance"""
+    images = _resolve_instances(db, current_user, study, series, sop, project_id)
+    return _metadata_response(request, images[:1])
+
+@router.get("/studies/{study}/series/{series}/instances/{sop}/frames/{frame_list}")
+def retrieve_frames(
+    study: str,
+    series: str,
+    sop: str,
+    frame_list: str,
+    request: Request,
+    project_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """WADO-RS frame retrieval; frame numbers are 1-based and comma-separated"""
+    frames = _parse_frame_list(frame_list)
+    image = _resolve_instances(db, current_user, study, series, sop, project_id)[0]
+    return _frames_response(request, image, frames)
+
+@router.get("/studies/{study}/series/{series}/instances/{sop}/bulkdata/{tag}")
+def retrieve_bulkdata(
+    study: str,
+    series: str,
+    sop: str,
+    tag: str,
+    request: Request,
+    project_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """WADO-RS bulkdata retrieval for a top-level attribute of an instance"""
+    resolved = resolve_tag(tag)
+    if resolved is None:
+        raise HTTPException(status_code=400, detail=f"Unknown attribute: {tag}")
+    image = _resolve_instances(db, current_user, study, series, sop, project_id)[0]
+    if resolved == PIXEL_DATA_TAG:
+        return _frames_response(request, image, list(range(1, _number_of_frames(image) + 1)))
+
+    boundary = new_boundary()
+    group, element = f"{resolved:08x}"[:4], f"{resolved:08x}"[4:]
+    parts = [(
+        {"Content-Type": "application/octet-stream"},
+        get_orthanc_client().iter_instance_resource(image.orthanc_id, f"content/{group}-{element}"),
+    )]
+    return StreamingResponse(
+        iter_multipart_related(parts, boundary),
+        media_type=multipart_related_media_type(boundary, "application/octet-stream"),
+    )
+
+# ======================= STOW-RS =======================
+
+def _store_instance(db: Session, part, project_id: int, folder_id: int, current_user: User, study: Optional[str]) -> Dict[str, Any]:
+    """Push one STOW-RS part to Orthanc and index it in the project"""
+    if study is not None:
+        # Check the header before anything reaches Orthanc, so rejected instances are not stored
+        part.seek(0)
+        header = pydicom.dcmread(part, stop_before_pixels=True, specific_tags=STOW_CHECKED_TAGS)
+        if header.get("StudyInstanceUID") != study:
+            return {
+                "metadata": {keyword: str(header.get(keyword, "")) for keyword in ("SOPClassUID", "SOPInstanceUID")},
+                "failure": STOW_STUDY_MISMATCH
+            }
+    orthanc_id = upload_to_orthanc(part)
+    dicom_metadata = fetch_dicom_metadata(orthanc_id) or {}
+    index_fields = dicom_index_fields(dicom_metadata)
+
+    image = db.query(Image).filter(
+        Image.orthanc_id == orthanc_id,
+        Image.project_id == project_id,
+        Image.folder_id == folder_id
+    ).first()
+    if not image:
+        image = Image(
+            orthanc_id=orthanc_id,
+            uploader_id=current_user.id,
+            project_id=project_id,
+            folder_id=folder_id,
+            upload_time=None,
+            dicom_metadata=dicom_metadata,
+            thumbnail_url=None,
+            **index_fields,
+        )
+        db.add(image)
+        db.flush()
+        record_progress(db, {}, [image.id])
+        index_documents(db, image_ids=[image.id])
+        db.commit()
+        db.refresh(image)
+    return {"metadata": dicom_metadata, "image": image}
+
+def _referenced_sop(metadata: dict, failure: Optional[int] = None, url: Optional[str] = None) -> Dict[str, Any]:
+    item = to_dicom_json(metadata, ["SOPClassUID", "SOPInstanceUID"])
+    item = {
+        "00081150": item.get("00080016", {"vr": "UI"}),
+        "00081155": item.get("00080018", {"vr": "UI"}),
+    }
+    if failure is not None:
+        item["00081197"] = dicom_json_element("US", failure)
+    if url is not None:
+        item["00081190"] = dicom_json_element("UR", url)
+    return item
+
+@router.post("/studies")
+@router.post("/studies/{study}")
+async def store_instances(
+    request: Request,
+    project_id: int = Query(..., description="Project the stored instances are filed under"),
+    folder_id: int = Query(..., description="Folder the stored instances are filed under"),
+    study: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """STOW-RS ingest of a multipart/related stream of DICOM instances.
+
+    Parts are parsed and pushed to Orthanc one at a time as they arrive, so
+    memory use does not depend on how many instances a client sends.
+    """
+    project = await run_in_threadpool(get_project, db, project_id, current_user)
+    if not project:
+        raise HTTPException(status_code=404, detail="Project not found or access denied")
+    folder = await run_in_threadpool(
+        lambda: db.query(Folder).filter(Folder.id == folder_id, Folder.project_id == project_id).first()
+    )
+    if not folder:
+        raise HTTPException(status_code=404, detail="Folder not found or does not belong to this project")
+
+    try:
+        boundary = parse_boundary(request.headers.get("content-type"))
+    except MultipartError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+
+    referenced = []
+    failed = []
+    study_uid = study
+    try:
+        async for headers, part in aiter_multipart_parts(request.stream(), boundary, MAX_STOW_PART_SIZE):
+            with part:
+                content_type = headers.get("content-type", "").split(";")[0].strip().lower()
+                if content_type != "application/dicom":
+                    failed.append(_referenced_sop({}, STOW_PROCESSING_FAILURE))
+                    continue
+                try:
+                    result = await run_in_threadpool(_store_instance, db, part, project_id, folder_id, current_user, study)
+                except Exception as e:
+                    print(f"STOW-RS: failed to store instance: {e}")
+                    await run_in_threadpool(db.rollback)
+                    failed.append(_referenced_sop({}, STOW_PROCESSING_FAILURE))
+                    continue
+            if "failure" in result:
+                failed.append(_referenced_sop(result["metadata"], result["failure"]))
+                continue
+            image = result["image"]
+            study_uid = study_uid or image.study_instance_uid
+            referenced.append(_referenced_sop(result["metadata"], url=_retrieve_url(request, image, "instance")))
+    except MultipartError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    body: Dict[str, Any] = {}
+    if study_uid:
+        body["00081190"] = dicom_json_element("UR", f"{_base_url(request)}/studies/{study_uid}")
+    if failed:
+        body["00081198"] = dicom_json_element("SQ", *failed)
+    if referenced:
+        body["00081199"] = dicom_json_element("SQ", *referenced)
+
+    if referenced and not failed:
+        status_code = 200
+    elif referenced:
+        status_code = 202
+    else:
+        status_code = 409
+    return JSONResponse(body, status_code=status_code, media_type=DICOM_JSON)
@@ -0,0 +1,145 @@
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+from typing import List
+import os
+from app.core.dependencies import get_db
+from app.api.endpoints.user.functions import get_current_user
+from app.api.endpoints.project.functions import get_project
+from app.models.export_job import ExportJob, ExportStatus
+from app.models.folder import Folder
+from app.models.user import User
+from app.schemas.export_job import ExportJobCreate, ExportJobResponse, ExportKind
+from app.services import export_jobs
+
+router = APIRouter(prefix="/exports", tags=["exports"])
+
+def get_user_export_job(db: Session, job_id: int, current_user: User) -> ExportJob:
+    export_jobs.fail_stale_exports(db)
+    job = db.query(ExportJob).filter(ExportJob.id == job_id, ExportJob.user_id == current_user.id).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return job
+
+@router.post("/", response_model=ExportJobResponse, status_code=202)
+def create_export_job(
+    export: ExportJobCreate,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Queue a project export to be built in the background.
+
+    `annotations` builds a ZIP of annotation JSON (optionally with DICOMs);
+    `dataset` writes tar shards for ML training plus a manifest.
+    """
+    if not get_project(db, export.project_id, current_user):
+        raise HTTPException(status_code=404, detail="Project not found or access denied")
+    if export.folder_id is not None:
+        folder = db.query(Folder).filter(Folder.id == export.folder_id, Folder.project_id == export.project_id).first()
+        if not folder:
+            raise HTTPException(status_code=404, detail="Folder not found in this project")
+    export_jobs.purge_expired_exports(db)
+
+    params = {"image_ids": export.image_ids, "folder_id": export.folder_id}
+    if export.kind == ExportKind.DATASET:
+        params.update(shard_size=export.shard_size, sample_format=export.sample_format.value)
+    else:
+        params.update(include_dicom=export.include_dicom)
+    job = ExportJob(
+        user_id=current_user.id,
+        project_id=export.project_id,
+        kind=export.kind.value,
+        params=params,
+        status=ExportStatus.PENDING,
+        progress=0,
+        total=0
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+
+    export_jobs.submit_export_job(job.id)
+    db.refresh(job)
+    return job
+
+@router.get("/", response_model=List[ExportJobResponse])
+def list_export_jobs(
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    export_jobs.purge_expired_exports(db)
+    export_jobs.fail_stale_exports(db)
+    return db.query(ExportJob).filter(ExportJob.user_id == current_user.id).order_by(ExportJob.id.desc()).all()
+
+@router.get("/{job_id}", response_model=ExportJobResponse)
+def get_export_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    return get_user_export_job(db, job_id, current_user)
+
+def get_completed_export_job(db: Session, job_id: int, current_user: User) -> ExportJob:
+    export_jobs.purge_expired_exports(db)
+    job = get_user_export_job(db, job_id, current_user)
+    if job.status == ExportStatus.EXPIRED:
+        raise HTTPException(status_code=410, detail="Export has expired")
+    if job.status != ExportStatus.COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Export is {job.status.value}")
+    if not job.artifact_path or not os.path.exists(job.artifact_path):
+        raise HTTPException(status_code=410, detail="Export artifact is no longer available")
+    return job
+
+@router.get("/{job_id}/download")
+def download_export(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Serve a finished export; Range requests are honoured so large downloads can resume.
+
+    For dataset exports this is the manifest; shards are fetched from /files/{name}.
+    """
+    job = get_completed_export_job(db, job_id, current_user)
+    if os.path.isdir(job.artifact_path):
+        return FileResponse(os.path.join(job.artifact_path, "manifest.json"), media_type="application/json")
+
+    suffix = export_jobs.ARTIFACT_SUFFIXES.get(job.kind, ".zip")
+    return FileResponse(
+        job.artifact_path,
+        media_type=export_jobs.ARTIFACT_MEDIA_TYPES.get(job.kind, "application/zip"),
+        filename=f"project_{job.project_id}_{job.kind}_{job.id}{suffix}"
+    )
+
+@router.get("/{job_id}/files/{name}")
+def download_export_file(
+    job_id: int,
+    name: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Serve one shard (or the manifest) of a dataset export, with Range support"""
+    job = get_completed_export_job(db, job_id, current_user)
+    if not os.path.isdir(job.artifact_path):
+        raise HTTPException(status_code=404, detail="Export has no separate files")
+    if name != os.path.basename(name) or name.startswith("."):
+        raise HTTPException(status_code=400, detail="Invalid file name")
+    path = os.path.join(job.artifact_path, name)
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="File not found")
+    media_type = "application/json" if name.endswith(".json") else "application/x-tar"
+    return FileResponse(path, media_type=media_type, filename=name)
+
+@router.delete("/{job_id}")
+def delete_export_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    job = get_user_export_job(db, job_id, current_user)
+    if job.status in (ExportStatus.PENDING, ExportStatus.RUNNING):
+        raise HTTPException(status_code=409, detail="Export is still in progress")
+    export_jobs.remove_artifact(job)
+    db.delete(job)
+    db.commit()
+    return {"message": "Export job deleted"}
@@ -9,6 +9,8 @@ from app.models.project import Project
 from app.models.image import Image
 from app.api.endpoints.user.functions import get_current_user
 from app.api.endpoints.project.functions import get_project
+from app.services.progress import progress_snapshot, record_progress
+from app.services.search_index import index_documents, remove_folder_documents
 
 router = APIRouter(prefix="/folders", tags=["folders"])
 
@@ -61,6 +63,8 @@ def create_folder(
         parent_folder_id=folder.parent_folder_id
     )
     db.add(db_folder)
+    db.flush()
+    index_documents(db, folder_ids=[db_folder.id])
     db.commit()
     db.refresh(db_folder)
     
@@ -151,6 +155,8 @@ def update_folder(
         setattr(folder, key, value)
     
     db.add(folder)
+    db.flush()
+    index_documents(db, folder_ids=[folder.id])
     db.commit()
     db.refresh(folder)
     
@@ -175,11 +181,15 @@ def delete_folder(
     
     # Move all images to parent folder (or root if no parent)
     images_in_folder = db.query(Image).filter(Image.folder_id == folder_id).all()
+    image_ids = [image.id for image in images_in_folder]
+    progress = progress_snapshot(db, image_ids)
     for image in images_in_folder:
         image.folder_id = folder.parent_folder_id
     
     # Delete the folder
+    remove_folder_documents(db, [folder_id])
     db.delete(folder)
+    record_progress(db, progress, image_ids)
     db.commit()
     
     return {"message": f"Folder deleted. {len(images_in_folder)} images moved to parent folder."}
@@ -215,9 +225,12 @@ def assign_folder_images(
     
     # Update all images in the folder
     images_in_folder = db.query(Image).filter(Image.folder_id == folder_id).all()
+    image_ids = [image.id for image in images_in_folder]
+    progress = progress_snapshot(db, image_ids)
     for image in images_in_folder:
         image.assigned_user_id = assigned_user_id
     
+    record_progress(db, progress, image_ids)
     db.commit()
     
     return {
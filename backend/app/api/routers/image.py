@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, status, Form
+from fastapi import APIRouter, BackgroundTasks, Depends, UploadFile, File, HTTPException, status, Form, Query
 from sqlalchemy.orm import Session, joinedload
 from typing import List, Optional
 from app.schemas.image import ImageCreate, ImageResponse, ImageUpdate
@@ -6,18 +6,32 @@ from app.core.dependencies import get_db, oauth2_scheme
 from app.core.settings import ORTHANC_PASSWORD, ORTHANC_URL, ORTHANC_USERNAME
 from app.models.image import Image
 from app.models.user import User
-from app.models.project import Project
+from app.models.project import Project, project_users
 from app.models.folder import Folder
 from app.api.endpoints.user.functions import get_current_user
 from app.api.endpoints.project.functions import get_project
+from app.services.assignment import auto_assign_images
+from app.services.embedding_index import embed_instance, get_embedding_index, schedule_embedding
+from app.services.frame_index import FrameIndexError, get_frame_index, iter_frames, parse_frame_numbers
+from app.services.instance_cache import get_instance_cache, read_chunks
+from app.services.prelabel import schedule_prelabel
+from app.services.progress import progress_snapshot, record_progress
+from app.services.search_index import index_documents, remove_image_documents
+from app.services.tag_model import TagModelError
+from app.utils.dicom import dicom_index_fields
+from app.utils.multipart import iter_multipart_related, multipart_related_media_type, new_boundary
 import requests
 from fastapi.responses import StreamingResponse
+import os
 import uuid
 from io import BytesIO
 import struct
 
 router = APIRouter(prefix="/images", tags=["images"])
 
+MAX_WADO_BATCH_SIZE = 50
+MAX_PREFETCH_COUNT = 50
+
 def upload_to_orthanc(file):
     """Upload DICOM file to Orthanc server"""
     url = f"{ORTHANC_URL}/instances"
@@ -76,16 +90,25 @@ def get_orthanc_instance(orthanc_id):
         print(f"Unexpected error downloading from Orthanc: {e}")
         raise Exception(f"Unexpected error: {str(e)}")
 
-def get_orthanc_wado(orthanc_id):
-    """Get DICOM file from Orthanc for WADO-URI"""
-    url = f"{ORTHANC_URL}/instances/{orthanc_id}/file"
+def fetch_dicom_metadata(orthanc_id):
+    """Fetch simplified DICOM tags for an instance, or None if Orthanc cannot provide them"""
+    meta_url = f"{ORTHANC_URL}/instances/{orthanc_id}/tags?simplify"
     auth = (ORTHANC_USERNAME, ORTHANC_PASSWORD)
-    response = requests.get(url, auth=auth, stream=True)
-    response.raise_for_status()
-    return response
+    try:
+        print(f"Fetching DICOM metadata from: {meta_url}")
+        meta_resp = requests.get(meta_url, auth=auth, timeout=10)
+        if meta_resp.ok:
+            dicom_metadata = meta_resp.json()
+            print(f"Successfully extracted DICOM metadata with {len(dicom_metadata)} tags")
+            return dicom_metadata
+        print(f"Failed to fetch metadata for {orthanc_id}: {meta_resp.status_code}")
+    except Exception as e:
+        print(f"Warning: Could not fetch DICOM metadata for {orthanc_id}: {e}")
+    return None
 
 @router.post("/upload", response_model=ImageResponse)
 def upload_image(
+    background_tasks: BackgroundTasks,
     file: UploadFile = File(...),
     project_id: int = Form(...),
     folder_id: int = Form(...),
@@ -149,21 +172,8 @@ def upload_image(
                 detail=f"Image already exists in this folder within this project (Orthanc ID: {orthanc_id})"
             )
         
-        # Fetch DICOM metadata from Orthanc
-        dicom_metadata = None
-        try:
-            meta_url = f"{ORTHANC_URL}/instances/{orthanc_id}/tags?simplify"
-            auth = (ORTHANC_USERNAME, ORTHANC_PASSWORD)
-            print(f"Fetching DICOM metadata from: {meta_url}")
-            meta_resp = requests.get(meta_url, auth=auth, timeout=10)
-            if meta_resp.ok:
-                dicom_metadata = meta_resp.json()
-                print(f"Successfully extracted DICOM metadata with {len(dicom_metadata)} tags")
-            else:
-                print(f"Failed to fetch metadata: {meta_resp.status_code}")
-        except Exception as e:
-            print(f"Warning: Could not fetch DICOM metadata: {e}")
-            # Continue without metadata - not critical for upload
+        # Fetch DICOM metadata from Orthanc (not critical for upload)
+        dicom_metadata = fetch_dicom_metadata(orthanc_id)
         
         # Create image record
         image = Image(
@@ -175,8 +185,12 @@ def upload_image(
             upload_time=None,
             dicom_metadata=dicom_metadata,
             thumbnail_url=None,
+            **dicom_index_fields(dicom_metadata),
         )
         db.add(image)
+        db.flush()
+        record_progress(db, {}, [image.id])
+        index_documents(db, image_ids=[image.id])
         db.commit()
         db.refresh(image)
         
@@ -188,6 +202,8 @@ def upload_image(
         ).filter(Image.id == image.id).first()
         
         print(f"Successfully created image record with ID: {image.id} and Orthanc ID: {orthanc_id}")
+        schedule_prelabel(background_tasks, [image.id], current_user.id)
+        schedule_embedding(background_tasks, [image.id])
         return image
         
     except HTTPException:
@@ -250,6 +266,90 @@ def get_image(
     
     return image
 
+@router.get("/{image_id}/similar")
+def get_similar_images(
+    image_id: int,
+    top_k: int = Query(10, ge=1, le=100),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+) -> List[dict]:
+    """Images that look most like this one, from any project the user is a member of.
+
+    Scores are correlations of downsampled pixels (1 means the same picture).
+    An image uploaded before embeddings were enabled is embedded on its
+    first request.
+    """
+    image = db.query(Image).filter(Image.id == image_id).first()
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found")
+    project = get_project(db, image.project_id, current_user)
+    if not project:
+        raise HTTPException(status_code=404, detail="Access denied")
+
+    index = get_embedding_index()
+    vector = index.get(image.id)
+    if vector is None:
+        try:
+            with get_instance_cache().open(image.orthanc_id) as fp:
+                vector = embed_instance(fp, index.size)
+        except TagModelError as e:
+            raise HTTPException(status_code=422, detail=str(e))
+        except Exception as e:
+            print(f"Embedding failed for image {image_id}: {e}")
+            raise HTTPException(status_code=502, detail="Could not read image")
+        index.add([(image.id, image.project_id, vector)])
+
+    project_ids = [
+        project_id for (project_id,) in
+        db.query(project_users.c.project_id).filter(project_users.c.user_id == current_user.id)
+    ]
+    matches = index.search(vector, project_ids, top_k, exclude_image_id=image.id)
+    found = {
+        match.id: match for match in
+        db.query(Image).filter(Image.id.in_([match_id for match_id, _ in matches]))
+    }
+    return [
+        {
+            "image_id": match_id,
+            "project_id": found[match_id].project_id,
+            "folder_id": found[match_id].folder_id,
+            "orthanc_id": found[match_id].orthanc_id,
+            "score": score,
+        }
+        for match_id, score in matches if match_id in found
+    ]
+
+@router.post("/auto-assign")
+def auto_assign(
+    project_id: int,
+    folder_id: Optional[int] = None,
+    user_ids: Optional[List[int]] = Query(None),
+    limit: Optional[int] = Query(None, ge=1),
+    dry_run: bool = False,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Spread unassigned images across project members by workload and throughput.
+
+    Members with fewer open images and more annotations over the last
+    ASSIGNMENT_THROUGHPUT_DAYS get more. Restrict to some members with
+    `user_ids`, or see the plan without applying it with `dry_run`.
+    """
+    project = get_project(db, project_id, current_user)
+    if not project:
+        raise HTTPException(status_code=404, detail="Access denied")
+    member_role = db.execute(
+        project_users.select().where(
+            project_users.c.project_id == project_id,
+            project_users.c.user_id == current_user.id
+        )
+    ).first()
+    if not member_role or member_role.role not in ['owner', 'admin']:
+        raise HTTPException(status_code=403, detail="Only project owners and admins can assign images")
+    if folder_id is not None and not db.query(Folder.id).filter(Folder.id == folder_id, Folder.project_id == project_id).first():
+        raise HTTPException(status_code=404, detail="Folder not found or does not belong to this project")
+    return auto_assign_images(db, project_id, folder_id, user_ids, limit, dry_run)
+
 @router.patch("/{image_id}/assign", response_model=ImageResponse)
 def assign_image(
     image_id: int,
@@ -293,8 +393,10 @@ def assign_image(
     if not assigned_member:
         raise HTTPException(status_code=400, detail="Assigned user is not a member of this project")
     
+    progress = progress_snapshot(db, [image.id])
     image.assigned_user_id = assigned_user_id
     db.add(image)
+    record_progress(db, progress, [image.id])
     db.commit()
     db.refresh(image)
     
@@ -342,6 +444,90 @@ def download_image(
         print(f"Error downloading image {image_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to download image: {str(e)}")
 
+def get_next_slices(db: Session, image: Image, count: int) -> List[Image]:
+    """Images that follow `image` in scroll order (series + InstanceNumber, else folder + id)"""
+    if count <= 0:
+        return []
+    query = db.query(Image).filter(Image.project_id == image.project_id, Image.id != image.id)
+    if image.series_instance_uid and image.instance_number is not None:
+        query = query.filter(
+            Image.series_instance_uid == image.series_instance_uid,
+            (Image.instance_number > image.instance_number)
+            | ((Image.instance_number == image.instance_number) & (Image.id > image.id)),
+        ).order_by(Image.instance_number, Image.id)
+    else:
+        query = query.filter(Image.folder_id == image.folder_id, Image.id > image.id).order_by(Image.id)
+    return query.limit(count).all()
+
+@router.get("/wado/batch")
+def wado_batch(
+    ids: List[int] = Query(..., description="Image ids in the order they should be returned"),
+    prefetch: int = Query(0, ge=0, le=MAX_PREFETCH_COUNT, description="Warm the cache for this many following slices"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Serve several DICOM instances as one multipart/related response.
+
+    Access is checked once for every project the batch touches instead of
+    once per slice, and the following slices in scroll order are pulled into
+    the local instance cache so the viewer's next batch is served from disk.
+    """
+    unique_ids = list(dict.fromkeys(ids))
+    if len(unique_ids) > MAX_WADO_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_WADO_BATCH_SIZE} images can be requested per batch")
+    
+    images = db.query(Image).filter(Image.id.in_(unique_ids)).all()
+    images_by_id = {image.id: image for image in images}
+    if len(images_by_id) != len(unique_ids):
+        raise HTTPException(status_code=404, detail="Image not found")
+    
+    project_ids = {image.project_id for image in images}
+    member_project_ids = {
+        row.project_id for row in db.execute(
+            project_users.select().where(
+                project_users.c.user_id == current_user.id,
+                project_users.c.project_id.in_(project_ids)
+            )
+        )
+    }
+    if member_project_ids != project_ids:
+        raise HTTPException(status_code=404, detail="Access denied")
+    
+    ordered = [images_by_id[image_id] for image_id in unique_ids]
+    cache = get_instance_cache()
+    cache.prefetch(image.orthanc_id for image in ordered)
+    
+    prefetched_ids = []
+    if prefetch:
+        last = max(
+            ordered,
+            key=lambda img: (img.instance_number if img.instance_number is not None else -1, img.id)
+        )
+        next_slices = [img for img in get_next_slices(db, last, prefetch + len(ordered)) if img.id not in images_by_id]
+        next_slices = next_slices[:prefetch]
+        cache.prefetch(img.orthanc_id for img in next_slices)
+        prefetched_ids = [img.id for img in next_slices]
+    
+    boundary = new_boundary()
+    parts = (
+        (
+            {
+                "Content-Type": "application/dicom",
+                "Content-Location": f"/images/wado/{image.id}",
+            },
+            cache.iter_file(image.orthanc_id),
+        )
+        for image in ordered
+    )
+    headers = {}
+    if prefetched_ids:
+        headers["X-Prefetch-Image-Ids"] = ",".join(str(image_id) for image_id in prefetched_ids)
+    return StreamingResponse(
+        iter_multipart_related(parts, boundary),
+        media_type=multipart_related_media_type(boundary),
+        headers=headers,
+    )
+
 @router.get("/wado/{image_id}")
 def wado_image(
     image_id: int,
@@ -355,11 +541,76 @@ def wado_image(
     project = get_project(db, image.project_id, current_user)
     if not project:
         raise HTTPException(status_code=404, detail="Access denied")
-    response = get_orthanc_wado(image.orthanc_id)
-    return StreamingResponse(response.raw, media_type="application/dicom")
+    try:
+        # Open before responding so a later eviction cannot remove the file mid-stream
+        dicom_file = get_instance_cache().open(image.orthanc_id)
+    except Exception as e:
+        print(f"Error fetching DICOM for image {image_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to fetch image: {str(e)}")
+    return StreamingResponse(
+        read_chunks(dicom_file),
+        media_type="application/dicom",
+        headers={"Content-Length": str(os.fstat(dicom_file.fileno()).st_size)},
+    )
+
+@router.get("/{image_id}/frames/{frame_list}")
+def get_image_frames(
+    image_id: int,
+    frame_list: str,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Serve selected frames of a multi-frame instance ('3', '2-7' or '1,4,6-8').
+
+    Frames are located through the parsed frame offset table and read from a
+    memory map of the cached instance, so only the requested frames are sent.
+    A single frame is returned as-is; several frames as multipart/related.
+    """
+    image = db.query(Image).filter(Image.id == image_id).first()
+    if not image:
+        raise HTTPException(status_code=404, detail="Image not found")
+    project = get_project(db, image.project_id, current_user)
+    if not project:
+        raise HTTPException(status_code=404, detail="Access denied")
+    
+    try:
+        numbers = parse_frame_numbers(frame_list)
+    except FrameIndexError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        index = get_frame_index(image.orthanc_id)
+    except FrameIndexError as e:
+        raise HTTPException(status_code=422, detail=f"Cannot index frames of this instance: {str(e)}")
+    except Exception as e:
+        print(f"Error indexing frames for image {image_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to read image frames: {str(e)}")
+    
+    if max(numbers) > index.number_of_frames:
+        raise HTTPException(status_code=404, detail=f"Image has {index.number_of_frames} frame(s)")
+    
+    if len(numbers) == 1:
+        def single_frame():
+            for frame in iter_frames(image.orthanc_id, index, numbers):
+                yield from frame
+        return StreamingResponse(single_frame(), media_type=index.media_type, headers={
+            "Content-Length": str(index.frame_length(numbers[0]))
+        })
+    
+    boundary = new_boundary()
+    frames = iter_frames(image.orthanc_id, index, numbers)
+    parts = (
+        ({"Content-Type": index.media_type, "Content-Location": f"/images/{image_id}/frames/{number}"}, frame)
+        for number, frame in zip(numbers, frames)
+    )
+    return StreamingResponse(
+        iter_multipart_related(parts, boundary),
+        media_type=multipart_related_media_type(boundary, index.media_type.split(";")[0]),
+    )
 
 @router.post("/bulk-upload", response_model=List[ImageResponse])
 def bulk_upload_images(
+    background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(...),
     project_id: int = Form(...),
     folder_id: int = Form(...),
@@ -446,17 +697,7 @@ def bulk_upload_images(
                     continue
                 
                 # Fetch DICOM metadata from Orthanc
-                dicom_metadata = None
-                try:
-                    meta_url = f"{ORTHANC_URL}/instances/{orthanc_id}/tags?simplify"
-                    auth = (ORTHANC_USERNAME, ORTHANC_PASSWORD)
-                    meta_resp = requests.get(meta_url, auth=auth, timeout=10)
-                    if meta_resp.ok:
-                        dicom_metadata = meta_resp.json()
-                    else:
-                        print(f"Failed to fetch metadata for {file.filename}: {meta_resp.status_code}")
-                except Exception as e:
-                    print(f"Warning: Could not fetch DICOM metadata for {file.filename}: {e}")
+                dicom_metadata = fetch_dicom_metadata(orthanc_id)
                 
                 # Create image record
                 image = Image(
@@ -468,8 +709,12 @@ def bulk_upload_images(
                     upload_time=None,
                     dicom_metadata=dicom_metadata,
                     thumbnail_url=None,
+                    **dicom_index_fields(dicom_metadata),
                 )
                 db.add(image)
+                db.flush()
+                record_progress(db, {}, [image.id])
+                index_documents(db, image_ids=[image.id])
                 db.commit()
                 db.refresh(image)
                 
@@ -505,6 +750,8 @@ def bulk_upload_images(
         }
         
         print(f"Bulk upload completed. Uploaded: {len(uploaded_images)}, Skipped: {len(skipped_images)}, Failed: {len(failed_images)}")
+        schedule_prelabel(background_tasks, [image.id for image in uploaded_images], current_user.id)
+        schedule_embedding(background_tasks, [image.id for image in uploaded_images])
         
         # For now, return just the uploaded images to maintain compatibility
         # In the future, we could create a proper response model for bulk upload results
@@ -537,6 +784,8 @@ def update_image(
     if not project:
         raise HTTPException(status_code=404, detail="Access denied")
     
+    progress = progress_snapshot(db, [image_id])
+    
     # Update fields if provided
     if image_data.assigned_user_id is not None:
         # Validate assigned user is a project member
@@ -566,6 +815,7 @@ def update_image(
                 raise HTTPException(status_code=404, detail="Folder not found or does not belong to this project")
         image.folder_id = image_data.folder_id
     
+    record_progress(db, progress, [image_id])
     db.commit()
     db.refresh(image)
     
@@ -609,7 +859,11 @@ def delete_image(
         print(f"Warning: Could not delete from Orthanc: {e}")
     
     # Delete from database
+    progress = progress_snapshot(db, [image_id])
+    remove_image_documents(db, [image_id])
     db.delete(image)
+    record_progress(db, progress, [image_id])
     db.commit()
+    get_embedding_index().remove([image_id])
     
     return {"message": "Image deleted successfully"} 
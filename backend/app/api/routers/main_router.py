@@ -2,6 +2,13 @@ from fastapi import APIRouter
 from app.api.routers import user, project, image, folder, workspace
 from app.api.routers.annotation import router as annotation_router
 from app.api.routers.tag import router as tag_router
+from app.api.routers.analytics import router as analytics_router
+from app.api.routers.search import router as search_router
+from app.api.routers.queue import router as queue_router
+from app.api.routers.review import router as review_router
+from app.api.routers.progress import router as progress_router
+from app.api.routers.dicomweb import router as dicomweb_router
+from app.api.routers.export import router as export_router
 
 router = APIRouter()
 
@@ -12,5 +19,12 @@ router.include_router(folder.router)
 router.include_router(workspace.router)
 router.include_router(annotation_router)
 router.include_router(tag_router)
+router.include_router(analytics_router)
+router.include_router(search_router)
+router.include_router(queue_router)
+router.include_router(review_router)
+router.include_router(progress_router)
+router.include_router(dicomweb_router)
+router.include_router(export_router)
 
 
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+from app.core.dependencies import get_db
+from app.api.endpoints.user.functions import get_current_user
+from app.api.deps import require_project_member
+from app.models.user import User
+from app.services.progress import project_progress
+
+router = APIRouter(prefix="/progress", tags=["progress"])
+
+@router.get("/projects/{project_id}")
+def get_project_progress(
+    project_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+) -> dict:
+    """Images total, assigned, annotated and approved for the project, each folder and each assignee.
+
+    Read from counters maintained with every image and annotation write, so
+    the cost grows with the number of folders, not images.
+    """
+    require_project_member(db, project_id, current_user)
+    return project_progress(db, project_id)
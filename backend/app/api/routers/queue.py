@@ -0,0 +1,49 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy.orm import Session, joinedload
+from typing import Optional
+from app.core.dependencies import get_db
+from app.core.settings import QUEUE_PREFETCH_COUNT
+from app.api.endpoints.user.functions import get_current_user
+from app.models.image import Image
+from app.models.user import User
+from app.schemas.image import QueueNextResponse
+from app.services.work_queue import claim_next_image, release_image
+
+router = APIRouter(prefix="/queue", tags=["queue"])
+
+MAX_PREFETCH = 50
+
+@router.post("/next", response_model=QueueNextResponse, responses={204: {"description": "Nothing left to annotate"}})
+def next_image(
+    project_id: Optional[int] = None,
+    prefetch: int = Query(QUEUE_PREFETCH_COUNT, ge=0, le=MAX_PREFETCH),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Claim the next unannotated image assigned to you, plus the ids after it for prefetching.
+
+    Each call claims a different image. An image comes back once it has
+    been claimed for QUEUE_CLAIM_MINUTES without an annotation, or right
+    away after POST /queue/{image_id}/release.
+    """
+    claim = claim_next_image(db, current_user.id, project_id, prefetch)
+    if claim is None:
+        return Response(status_code=204)
+    image_id, claimed_until, prefetch_ids = claim
+    image = db.query(Image).options(
+        joinedload(Image.uploader),
+        joinedload(Image.assigned_user),
+        joinedload(Image.folder)
+    ).filter(Image.id == image_id).first()
+    return {"image": image, "claimed_until": claimed_until, "prefetch_ids": prefetch_ids}
+
+@router.post("/{image_id}/release")
+def release(
+    image_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Return a claimed image to your queue (e.g. when skipping it)"""
+    if not release_image(db, current_user.id, image_id):
+        raise HTTPException(status_code=404, detail="No claim on this image")
+    return {"message": "Image released"}
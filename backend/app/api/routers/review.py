@@ -0,0 +1,81 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List
+from app.core.dependencies import get_db
+from app.api.endpoints.user.functions import get_current_user
+from app.api.deps import require_project_member
+from app.models.annotation import Annotation
+from app.models.user import User
+from app.schemas.annotation import AnnotationBulkResponse, AnnotationResponse, ReviewDecisionRequest
+from app.services.review_counts import review_counts
+from app.services.review_queue import MAX_REVIEW_BATCH, ReviewClaimError, claim_reviews, decide_reviews, release_review
+
+router = APIRouter(prefix="/reviews", tags=["reviews"])
+
+@router.post("/claim", response_model=List[AnnotationResponse])
+def claim(
+    project_id: int,
+    count: int = Query(20, ge=1, le=MAX_REVIEW_BATCH),
+    shards: int = Query(1, ge=1),
+    shard: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Claim a batch of annotations awaiting review (pending or revised), oldest first.
+
+    Concurrent reviewers get disjoint batches and never their own
+    annotations. Claims you still hold are returned again; a claim lapses
+    after REVIEW_CLAIM_MINUTES without a decision. `shards`/`shard` restrict
+    the batch to annotations whose id modulo `shards` equals `shard`.
+    """
+    require_project_member(db, project_id, current_user)
+    if shard >= shards:
+        raise HTTPException(status_code=422, detail="shard must be less than shards")
+    annotation_ids = claim_reviews(db, current_user.id, project_id, count, shards, shard)
+    if not annotation_ids:
+        return []
+    return db.query(Annotation).filter(Annotation.id.in_(annotation_ids)).order_by(Annotation.id).all()
+
+@router.post("/decisions", response_model=AnnotationBulkResponse)
+def decide(
+    request: ReviewDecisionRequest,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Approve or reject claimed annotations; all decisions are written in one transaction or none are"""
+    if len(request.decisions) > MAX_REVIEW_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_REVIEW_BATCH} decisions per request")
+    try:
+        results = decide_reviews(
+            db, current_user.id,
+            [(decision.annotation_id, decision.status) for decision in request.decisions]
+        )
+    except ReviewClaimError as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "failures": e.failures})
+    return {
+        "created": 0,
+        "updated": sum(1 for result in results if result["status"] == "updated"),
+        "failed": sum(1 for result in results if result["status"] == "error"),
+        "results": results
+    }
+
+@router.post("/{annotation_id}/release")
+def release(
+    annotation_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """Give a claimed annotation back to the review queue without a decision"""
+    if not release_review(db, current_user.id, annotation_id):
+        raise HTTPException(status_code=404, detail="No review claim on this annotation")
+    return {"message": "Review released"}
+
+@router.get("/counts")
+def get_review_counts(
+    project_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+) -> dict:
+    """Annotations per review status in a project, read from maintained counters"""
+    require_project_member(db, project_id, current_user)
+    return review_counts(db, project_id)
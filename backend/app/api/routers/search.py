@@ -0,0 +1,36 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from app.core.dependencies import get_db
+from app.api.endpoints.user.functions import get_current_user
+from app.api.deps import is_project_member
+from app.models.user import User
+from app.services.search_index import SEARCH_KINDS, search
+
+router = APIRouter(prefix="/search", tags=["search"])
+
+MAX_SEARCH_PAGE_SIZE = 100
+
+@router.get("/")
+def search_documents(
+    q: str = Query(..., min_length=1),
+    kind: Optional[List[str]] = Query(None),
+    project_id: Optional[int] = None,
+    limit: int = Query(20, ge=1, le=MAX_SEARCH_PAGE_SIZE),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+) -> dict:
+    """Search annotation text and tags, folder names and image DICOM descriptions.
+
+    Results come from the projects the user is a member of, best match
+    first; pass `next_offset` back as `offset` for the next page.
+    """
+    unknown = set(kind or []) - set(SEARCH_KINDS)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown kind(s): {', '.join(sorted(unknown))}. Use {', '.join(SEARCH_KINDS)}")
+    if project_id is not None and not is_project_member(db, project_id, current_user):
+        raise HTTPException(status_code=404, detail="Project not found")
+    items = search(db, current_user.id, q, kind, project_id, limit + 1, offset)
+    has_more = len(items) > limit
+    return {"items": items[:limit], "next_offset": offset + limit if has_more else None}
@@ -1,16 +1,72 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
 from typing import List
 from app.core.dependencies import get_db
 from app.api.endpoints.user.functions import get_current_user
+from app.api.deps import get_accessible_image, require_project_member
+from app.models.tag import Tag
 from app.models.user import User
+from app.services.tag_model import TagModelError, TagModelUnavailable, top_suggestions
+from app.services.tag_suggestions import get_tag_suggester
+from app.services.tag_vocabulary import AUTOCOMPLETE_TOP_K, get_tag_index
 
 router = APIRouter(prefix="/tags", tags=["tags"])
 
 @router.get("/suggest/{image_id}")
-def suggest_tags(image_id: int, db=Depends(get_db), current_user: User = Depends(get_current_user)):
-    # Stub: Return example tags with confidence scores
-    return [
-        {"tag": "pneumonia", "confidence": 0.85},
-        {"tag": "normal", "confidence": 0.60},
-        {"tag": "fracture", "confidence": 0.40},
-    ] 
\ No newline at end of file
+def suggest_tags(
+    image_id: int,
+    top_k: int = Query(5, ge=1, le=50),
+    min_confidence: float = Query(0.0, ge=0.0, le=1.0),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+) -> List[dict]:
+    """Suggest tags for an image from its downsampled pixels, most confident first.
+
+    Results are cached per instance, and requests arriving together are
+    scored in one batch by the configured model (TAG_MODEL_BACKEND). Without
+    a trained model (TAG_MODEL_PATH) this answers 503.
+    """
+    image = get_accessible_image(db, image_id, current_user)
+    try:
+        suggester = get_tag_suggester()
+        probabilities = suggester.probabilities(image.orthanc_id)
+    except TagModelUnavailable as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except TagModelError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        print(f"Tag suggestion failed for image {image_id}: {e}")
+        raise HTTPException(status_code=502, detail="Could not score image")
+    return top_suggestions(suggester.labels, probabilities, top_k, min_confidence)
+
+@router.get("/autocomplete")
+def autocomplete_tags(
+    project_id: int,
+    q: str = "",
+    limit: int = Query(10, ge=1, le=AUTOCOMPLETE_TOP_K),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+) -> List[dict]:
+    """Project tags starting with `q` (ignoring case and spacing), most used first.
+
+    Served from an in-memory trie of the project's vocabulary, so the
+    annotations themselves are never scanned.
+    """
+    require_project_member(db, project_id, current_user)
+    matches = get_tag_index().complete(db, project_id, q, limit)
+    return [{"tag": name, "count": count} for name, count in matches]
+
+@router.get("/vocabulary")
+def get_tag_vocabulary(
+    project_id: int,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+) -> List[dict]:
+    """The project's tags with the number of annotations carrying each, most used first"""
+    require_project_member(db, project_id, current_user)
+    tags = db.query(Tag.name, Tag.usage_count).filter(
+        Tag.project_id == project_id,
+        Tag.usage_count > 0
+    ).order_by(Tag.usage_count.desc(), Tag.normalized).limit(limit).all()
+    return [{"tag": name, "count": count} for name, count in tags]
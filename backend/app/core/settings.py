@@ -1,4 +1,5 @@
 import logging
+import tempfile
 from pathlib import Path
 from typing import List
 
@@ -37,6 +38,60 @@ class Settings(BaseSettings):
     orthanc_username: str = Field(..., alias="ORTHANC_USERNAME")
     orthanc_password: str = Field(..., alias="ORTHANC_PASSWORD")
 
+    # Local DICOM instance cache
+    instance_cache_dir: str = Field(
+        str(Path(tempfile.gettempdir()) / "radiology-instance-cache"), alias="INSTANCE_CACHE_DIR"
+    )
+    instance_cache_max_mb: int = Field(2048, alias="INSTANCE_CACHE_MAX_MB")
+    instance_prefetch_workers: int = Field(4, alias="INSTANCE_PREFETCH_WORKERS")
+    # Instances larger than this are spooled to disk while exports and pre-labeling read them
+    dicom_spool_max_mb: int = Field(64, alias="DICOM_SPOOL_MAX_MB")
+
+    # Background exports
+    export_dir: str = Field(str(Path(tempfile.gettempdir()) / "radiology-exports"), alias="EXPORT_DIR")
+    export_workers: int = Field(2, alias="EXPORT_WORKERS")
+    export_ttl_hours: int = Field(24, alias="EXPORT_TTL_HOURS")
+    # Running jobs that report no progress for this long (e.g. after a restart) are marked failed
+    export_stale_minutes: int = Field(30, alias="EXPORT_STALE_MINUTES")
+    dataset_export_processes: int = Field(4, alias="DATASET_EXPORT_PROCESSES")
+
+    # Annotation history: a full snapshot every N versions, JSON Patch deltas in between
+    annotation_snapshot_interval: int = Field(10, alias="ANNOTATION_SNAPSHOT_INTERVAL")
+
+    # Live annotation events: annotations a WebSocket client may fall behind by before it must resync
+    annotation_event_queue_size: int = Field(256, alias="ANNOTATION_EVENT_QUEUE_SIZE")
+
+    # Tag suggestions: "numpy" (weights from a .npz) or "onnx"; without TAG_MODEL_PATH suggestions are unavailable
+    tag_model_backend: str = Field("numpy", alias="TAG_MODEL_BACKEND")
+    tag_model_path: str = Field("", alias="TAG_MODEL_PATH")
+    tag_model_labels_raw: str = Field("pneumonia,normal,fracture", alias="TAG_MODEL_LABELS")
+    tag_model_input_size: int = Field(64, alias="TAG_MODEL_INPUT_SIZE")
+    tag_batch_size: int = Field(16, alias="TAG_BATCH_SIZE")
+    tag_batch_wait_ms: float = Field(5, alias="TAG_BATCH_WAIT_MS")
+    tag_suggestion_cache_size: int = Field(10000, alias="TAG_SUGGESTION_CACHE_SIZE")
+    # Autocomplete picks up tag counters changed by other server processes this often
+    tag_index_refresh_seconds: float = Field(5, alias="TAG_INDEX_REFRESH_SECONDS")
+
+    # Pre-labeling of uploaded images with the tag model
+    prelabel_enabled: bool = Field(False, alias="PRELABEL_ENABLED")
+    prelabel_processes: int = Field(2, alias="PRELABEL_PROCESSES")
+    prelabel_batch_size: int = Field(32, alias="PRELABEL_BATCH_SIZE")
+    prelabel_top_k: int = Field(3, alias="PRELABEL_TOP_K")
+    prelabel_min_confidence: float = Field(0.5, alias="PRELABEL_MIN_CONFIDENCE")
+
+    # Image similarity: descriptors of size x size downsampled pixels, computed at upload
+    embedding_enabled: bool = Field(True, alias="EMBEDDING_ENABLED")
+    embedding_dir: str = Field(str(Path(tempfile.gettempdir()) / "radiology-embeddings"), alias="EMBEDDING_DIR")
+    embedding_size: int = Field(16, alias="EMBEDDING_SIZE")
+
+    # Auto-assignment weighs members by the annotations they made over this many days
+    assignment_throughput_days: int = Field(14, alias="ASSIGNMENT_THROUGHPUT_DAYS")
+    # An image claimed from /queue/next goes back in the queue after this long without an annotation
+    queue_claim_minutes: int = Field(30, alias="QUEUE_CLAIM_MINUTES")
+    queue_prefetch_count: int = Field(5, alias="QUEUE_PREFETCH_COUNT")
+    # Annotations claimed from /reviews/claim go back to the review queue after this long without a decision
+    review_claim_minutes: int = Field(30, alias="REVIEW_CLAIM_MINUTES")
+
     # SMTP / Email verification
     smtp_host: str = Field(..., alias="SMTP_HOST")
     smtp_port: int = Field(..., alias="SMTP_PORT")
@@ -70,6 +125,10 @@ class Settings(BaseSettings):
                 origins.append(cleaned)
         return origins
 
+    @property
+    def tag_model_labels(self) -> List[str]:
+        return [label.strip() for label in self.tag_model_labels_raw.split(",") if label.strip()]
+
 
 settings = Settings()
 
@@ -86,6 +145,37 @@ BACKEND_CORS_ORIGINS = settings.cors_origins
 ORTHANC_URL = settings.orthanc_url
 ORTHANC_USERNAME = settings.orthanc_username
 ORTHANC_PASSWORD = settings.orthanc_password
+INSTANCE_CACHE_DIR = settings.instance_cache_dir
+INSTANCE_CACHE_MAX_MB = settings.instance_cache_max_mb
+DICOM_SPOOL_MAX_MB = settings.dicom_spool_max_mb
+INSTANCE_PREFETCH_WORKERS = settings.instance_prefetch_workers
+EXPORT_DIR = settings.export_dir
+EXPORT_WORKERS = settings.export_workers
+EXPORT_TTL_HOURS = settings.export_ttl_hours
+EXPORT_STALE_MINUTES = settings.export_stale_minutes
+DATASET_EXPORT_PROCESSES = settings.dataset_export_processes
+ANNOTATION_SNAPSHOT_INTERVAL = settings.annotation_snapshot_interval
+ANNOTATION_EVENT_QUEUE_SIZE = settings.annotation_event_queue_size
+TAG_MODEL_BACKEND = settings.tag_model_backend
+TAG_MODEL_PATH = settings.tag_model_path
+TAG_MODEL_LABELS = settings.tag_model_labels
+TAG_MODEL_INPUT_SIZE = settings.tag_model_input_size
+TAG_BATCH_SIZE = settings.tag_batch_size
+TAG_BATCH_WAIT_MS = settings.tag_batch_wait_ms
+TAG_SUGGESTION_CACHE_SIZE = settings.tag_suggestion_cache_size
+TAG_INDEX_REFRESH_SECONDS = settings.tag_index_refresh_seconds
+PRELABEL_ENABLED = settings.prelabel_enabled
+PRELABEL_PROCESSES = settings.prelabel_processes
+PRELABEL_BATCH_SIZE = settings.prelabel_batch_size
+PRELABEL_TOP_K = settings.prelabel_top_k
+PRELABEL_MIN_CONFIDENCE = settings.prelabel_min_confidence
+EMBEDDING_ENABLED = settings.embedding_enabled
+EMBEDDING_DIR = settings.embedding_dir
+EMBEDDING_SIZE = settings.embedding_size
+ASSIGNMENT_THROUGHPUT_DAYS = settings.assignment_throughput_days
+QUEUE_CLAIM_MINUTES = settings.queue_claim_minutes
+QUEUE_PREFETCH_COUNT = settings.queue_prefetch_count
+REVIEW_CLAIM_MINUTES = settings.review_claim_minutes
 SMTP_HOST = settings.smtp_host
 SMTP_PORT = settings.smtp_port
 SMTP_USERNAME = settings.smtp_username
@@ -2,7 +2,12 @@ from .user import User
 from .image import Image
 from .project import Project
 from .folder import Folder
-from .annotation import Annotation, AnnotationHistory
+from .annotation import Annotation, AnnotationHistory, AnnotationMask
 from .audit_log import AuditLog
 from .workspace import Workspace, workspace_members
 from .verification_token import VerificationToken
+from .export_job import ExportJob
+from .tag import Tag, TagPairCount, UserTagCount
+from .search import SearchDocument
+from .review import ReviewStatusCount
+from .progress import ProgressCount
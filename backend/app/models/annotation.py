@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, JSON, Enum
+from sqlalchemy import BigInteger, Boolean, Column, Integer, LargeBinary, String, ForeignKey, DateTime, JSON, Enum, Index
 from sqlalchemy.orm import relationship
 from app.core.database import Base
 from .common import CommonModel
@@ -13,28 +13,55 @@ class ReviewStatus(enum.Enum):
 class Annotation(CommonModel):
     __tablename__ = "annotations"
 
-    image_id = Column(Integer, ForeignKey("images.id"), nullable=False)
+    image_id = Column(Integer, ForeignKey("images.id"), nullable=False, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     version = Column(Integer, default=1)
     data = Column(JSON, nullable=False)  # Store full annotation state as JSON
     dicom_metadata = Column(JSON, nullable=True)  # Store DICOM metadata as JSON
     tags = Column(JSON, nullable=True)  # List of tag labels
     reviewer_id = Column(Integer, ForeignKey("users.id"), nullable=True)
-    review_status = Column(Enum(ReviewStatus), default=ReviewStatus.PENDING)
+    review_status = Column(Enum(ReviewStatus), default=ReviewStatus.PENDING, index=True)
+    review_claimed_at = Column(DateTime(timezone=True), nullable=True)  # Set while a reviewer holds it; see /reviews/claim
+    is_prelabel = Column(Boolean, default=False, nullable=False)  # Written by the tag model, not by user_id
     timestamp = Column(DateTime(timezone=True))
 
     image = relationship("Image", back_populates="annotations")
     user = relationship("User", foreign_keys=[user_id], back_populates="annotations")
     reviewer = relationship("User", foreign_keys=[reviewer_id], back_populates="reviewed_annotations")
     history = relationship("AnnotationHistory", back_populates="annotation")
+    masks = relationship("AnnotationMask", back_populates="annotation")
 
 class AnnotationHistory(CommonModel):
     __tablename__ = "annotation_history"
+    __table_args__ = (
+        Index("ix_annotation_history_annotation_version", "annotation_id", "version", unique=True),
+    )
 
     annotation_id = Column(Integer, ForeignKey("annotations.id"), nullable=False)
-    data_snapshot = Column(JSON, nullable=False)
+    version = Column(Integer, nullable=False)
+    is_snapshot = Column(Boolean, default=False, nullable=False)
+    data_snapshot = Column(JSON, nullable=True)  # Full data, on snapshot versions only
+    patch = Column(JSON, nullable=True)  # JSON Patch from the previous version, on the others
     changed_by = Column(Integer, ForeignKey("users.id"), nullable=False)
     changed_at = Column(DateTime(timezone=True))
 
     annotation = relationship("Annotation", back_populates="history")
     user = relationship("User", foreign_keys=[changed_by], back_populates="annotation_history")
+
+class AnnotationMask(CommonModel):
+    """Segmentation mask referenced from annotation data, stored compressed outside the JSON"""
+    __tablename__ = "annotation_masks"
+    __table_args__ = (
+        Index("ix_annotation_masks_annotation_sha256", "annotation_id", "sha256"),
+    )
+
+    annotation_id = Column(Integer, ForeignKey("annotations.id"), nullable=False, index=True)
+    shape = Column(JSON, nullable=False)  # e.g. [rows, columns] or [frames, rows, columns]
+    dtype = Column(String, nullable=False)  # numpy dtype of the decoded array
+    encoding = Column(String, nullable=False)  # "packbits+zlib" for binary masks, "zlib" otherwise
+    sha256 = Column(String(64), nullable=False)  # Of the decoded array bytes
+    nbytes = Column(BigInteger, nullable=False)  # Decoded size
+    payload = Column(LargeBinary, nullable=False)
+    created_by = Column(Integer, ForeignKey("users.id"), nullable=False)
+
+    annotation = relationship("Annotation", back_populates="masks")
@@ -0,0 +1,31 @@
+from sqlalchemy import BigInteger, Column, DateTime, Enum, ForeignKey, Integer, JSON, String, Text
+from sqlalchemy.orm import relationship
+from .common import CommonModel
+import enum
+
+class ExportStatus(enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    EXPIRED = "expired"
+
+class ExportJob(CommonModel):
+    __tablename__ = "export_jobs"
+
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False, index=True)
+    kind = Column(String, nullable=False, default="annotations")
+    params = Column(JSON, nullable=True)  # e.g. image_ids, include_dicom
+    status = Column(Enum(ExportStatus), default=ExportStatus.PENDING, nullable=False)
+    progress = Column(Integer, default=0, nullable=False)
+    total = Column(Integer, default=0, nullable=False)
+    artifact_path = Column(String, nullable=True)
+    artifact_size = Column(BigInteger, nullable=True)
+    error = Column(Text, nullable=True)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    completed_at = Column(DateTime(timezone=True), nullable=True)
+    expires_at = Column(DateTime(timezone=True), nullable=True, index=True)
+
+    user = relationship("User")
+    project = relationship("Project")
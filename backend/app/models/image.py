@@ -9,11 +9,20 @@ class Image(CommonModel):
 
     orthanc_id = Column(String, index=True, nullable=False)
     uploader_id = Column(Integer, ForeignKey("users.id"), nullable=False)
-    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False, index=True)
     folder_id = Column(Integer, ForeignKey('folders.id'), nullable=True)  # Optional folder assignment
-    assigned_user_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    assigned_user_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
+    claimed_at = Column(DateTime(timezone=True), nullable=True)  # Handed out by /queue/next; expires after QUEUE_CLAIM_MINUTES
     upload_time = Column(DateTime(timezone=True))
     dicom_metadata = Column(JSON, nullable=True)
+    study_instance_uid = Column(String, index=True, nullable=True)
+    series_instance_uid = Column(String, index=True, nullable=True)
+    sop_instance_uid = Column(String, index=True, nullable=True)
+    instance_number = Column(Integer, nullable=True)
+    patient_id = Column(String, index=True, nullable=True)
+    study_date = Column(String, nullable=True)
+    modality = Column(String, nullable=True)
+    accession_number = Column(String, nullable=True)
     thumbnail_url = Column(String, nullable=True)
 
     # Relationships
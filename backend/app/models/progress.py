@@ -0,0 +1,16 @@
+from sqlalchemy import Column, ForeignKey, Index, Integer
+from .common import CommonModel
+
+class ProgressCount(CommonModel):
+    """Image counts of one project folder and assignee, kept current with every image and annotation write"""
+    __tablename__ = "progress_counts"
+    __table_args__ = (
+        Index("ix_progress_counts_project_folder_user", "project_id", "folder_id", "user_id", unique=True),
+    )
+
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
+    folder_id = Column(Integer, nullable=False, default=0)  # 0 for images outside any folder
+    user_id = Column(Integer, nullable=False, default=0)  # Assignee; 0 for unassigned images
+    images = Column(Integer, nullable=False, default=0)
+    annotated = Column(Integer, nullable=False, default=0)  # Images with at least one annotation
+    approved = Column(Integer, nullable=False, default=0)  # Images with at least one approved annotation
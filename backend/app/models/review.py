@@ -0,0 +1,13 @@
+from sqlalchemy import Column, ForeignKey, Index, Integer, String
+from .common import CommonModel
+
+class ReviewStatusCount(CommonModel):
+    """How many of a project's annotations are in each review status"""
+    __tablename__ = "review_status_counts"
+    __table_args__ = (
+        Index("ix_review_status_counts_project_status", "project_id", "status", unique=True),
+    )
+
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
+    status = Column(String, nullable=False)  # ReviewStatus value
+    count = Column(Integer, nullable=False, default=0)
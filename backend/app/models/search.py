@@ -0,0 +1,37 @@
+from sqlalchemy import DDL, Column, Index, Integer, String, Text, event
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from .common import CommonModel
+
+# Full-text configuration used for the tsvector column and queries against it
+SEARCH_CONFIG = "english"
+
+# SQLite stand-in for the tsvector column: an FTS5 table keyed by search_documents.id
+SEARCH_FTS_TABLE = "search_documents_fts"
+
+class SearchDocument(CommonModel):
+    """Searchable text of one image, annotation or folder, rewritten whenever its source changes"""
+    __tablename__ = "search_documents"
+    __table_args__ = (
+        Index("ix_search_documents_kind_object", "kind", "object_id", unique=True),
+        Index("ix_search_documents_project", "project_id"),
+        Index("ix_search_documents_image", "image_id"),
+        Index("ix_search_documents_vector", "search_vector", postgresql_using="gin").ddl_if(dialect="postgresql"),
+    )
+
+    kind = Column(String, nullable=False)  # "image", "annotation" or "folder"
+    object_id = Column(Integer, nullable=False)
+    project_id = Column(Integer, nullable=False)
+    image_id = Column(Integer, nullable=True)  # The image itself, or the one an annotation is on
+    content = Column(Text, nullable=False)
+    search_vector = Column(TSVECTOR().with_variant(Text(), "sqlite"), nullable=True)  # Postgres only
+
+event.listen(
+    SearchDocument.__table__,
+    "after_create",
+    DDL(f"CREATE VIRTUAL TABLE {SEARCH_FTS_TABLE} USING fts5(content, tokenize='porter unicode61')").execute_if(dialect="sqlite"),
+)
+event.listen(
+    SearchDocument.__table__,
+    "before_drop",
+    DDL(f"DROP TABLE IF EXISTS {SEARCH_FTS_TABLE}").execute_if(dialect="sqlite"),
+)
@@ -0,0 +1,42 @@
+from sqlalchemy import Column, ForeignKey, Index, Integer, String
+from sqlalchemy.orm import relationship
+from .common import CommonModel
+
+class Tag(CommonModel):
+    """A project's tag vocabulary entry and how many annotations currently carry it"""
+    __tablename__ = "tags"
+    __table_args__ = (
+        Index("ix_tags_project_normalized", "project_id", "normalized", unique=True),
+        Index("ix_tags_project_updated_at", "project_id", "updated_at"),
+    )
+
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
+    name = Column(String, nullable=False)  # Spelling of the first use, shown to users
+    normalized = Column(String, nullable=False)  # Case- and whitespace-folded key
+    usage_count = Column(Integer, nullable=False, default=0)
+
+    project = relationship("Project")
+
+class TagPairCount(CommonModel):
+    """How many annotations of a project carry both tags; tag_a sorts before tag_b"""
+    __tablename__ = "tag_pair_counts"
+    __table_args__ = (
+        Index("ix_tag_pair_counts_project_pair", "project_id", "tag_a", "tag_b", unique=True),
+    )
+
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
+    tag_a = Column(String, nullable=False)  # Normalized tags, as in Tag.normalized
+    tag_b = Column(String, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+class UserTagCount(CommonModel):
+    """How many of a user's annotations in a project carry a tag"""
+    __tablename__ = "user_tag_counts"
+    __table_args__ = (
+        Index("ix_user_tag_counts_project_user_tag", "project_id", "user_id", "normalized", unique=True),
+    )
+
+    project_id = Column(Integer, ForeignKey("projects.id"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    normalized = Column(String, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
@@ -1,8 +1,10 @@
-from pydantic import BaseModel
-from typing import Optional, List, Any
+from pydantic import BaseModel, field_validator
+from typing import Optional, List, Any, Literal
 from datetime import datetime
 import enum
 
+from app.utils.rle import expand_arrays
+
 class ReviewStatus(str, enum.Enum):
     PENDING = "pending"
     APPROVED = "approved"
@@ -25,11 +27,52 @@ class AnnotationBase(BaseModel):
 class AnnotationCreate(AnnotationBase):
     pass
 
+class JsonPatchOperation(BaseModel):
+    op: Literal["add", "remove", "replace", "test"]
+    path: str
+    value: Any = None
+
 class AnnotationUpdate(BaseModel):
-    data: Optional[dict]
+    data: Optional[dict] = None
     dicom_metadata: Optional[dict] = None
-    tags: Optional[List[str]]
-    review_status: Optional[ReviewStatus]
+    tags: Optional[List[str]] = None
+    review_status: Optional[ReviewStatus] = None
+    version: Optional[int] = None  # Version being edited, when If-Match is not sent
+    patch: Optional[List[JsonPatchOperation]] = None  # RFC 6902 operations on `data`, instead of `data`
+
+class AnnotationBulkItem(BaseModel):
+    id: Optional[int] = None  # Annotation to update; omit to create a new one
+    image_id: Optional[int] = None  # Required when creating
+    data: Optional[dict] = None
+    patch: Optional[List[JsonPatchOperation]] = None  # Instead of `data` when updating; needs `version`
+    dicom_metadata: Optional[dict] = None
+    tags: Optional[List[str]] = None
+    review_status: Optional[ReviewStatus] = None
+    version: Optional[int] = None  # Version being edited; the item fails if it is no longer current
+
+class AnnotationBulkRequest(BaseModel):
+    items: List[dict]  # Validated one by one as AnnotationBulkItem so errors are reported per item
+    atomic: bool = False  # Write nothing unless every item succeeds
+
+class AnnotationBulkResult(BaseModel):
+    index: int
+    status: Literal["created", "updated", "error", "skipped"]
+    id: Optional[int] = None
+    version: Optional[int] = None
+    error: Optional[str] = None
+
+class AnnotationBulkResponse(BaseModel):
+    created: int
+    updated: int
+    failed: int
+    results: List[AnnotationBulkResult]
+
+class ReviewDecision(BaseModel):
+    annotation_id: int
+    status: Literal["approved", "rejected"]
+
+class ReviewDecisionRequest(BaseModel):
+    decisions: List[ReviewDecision]
 
 class AnnotationResponse(AnnotationBase):
     id: int
@@ -40,14 +83,44 @@ class AnnotationResponse(AnnotationBase):
     timestamp: Optional[datetime]
     data: dict
     dicom_metadata: Optional[dict]
+
+    # Stored data may hold RLE-compacted arrays; clients always get plain ones
+    _expand_data = field_validator("data")(expand_arrays)
+
     class Config:
         from_attributes = True
 
+class AnnotationPage(BaseModel):
+    items: List[AnnotationResponse]
+    next_after_id: Optional[int] = None  # Pass as after_id for the next page; None on the last page
+
 class AnnotationHistoryResponse(BaseModel):
     id: int
     annotation_id: int
-    data_snapshot: Any
+    version: int
+    is_snapshot: bool
     changed_by: int
     changed_at: Optional[datetime]
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+class AnnotationVersionResponse(BaseModel):
+    annotation_id: int
+    version: int
+    data: Any 
+
+    _expand_data = field_validator("data")(expand_arrays)
+
+class AnnotationMaskResponse(BaseModel):
+    id: int
+    annotation_id: int
+    shape: List[int]
+    dtype: str
+    encoding: str
+    sha256: str
+    nbytes: int
+    created_by: int
+    created_at: Optional[datetime]
+    reference: Optional[dict] = None  # Object to embed in annotation data
+    class Config:
+        from_attributes = True
@@ -0,0 +1,49 @@
+from pydantic import BaseModel, Field
+from typing import Optional, List
+from datetime import datetime
+import enum
+
+class ExportStatus(str, enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+    EXPIRED = "expired"
+
+class ExportKind(str, enum.Enum):
+    ANNOTATIONS = "annotations"  # ZIP of annotation JSON, optionally with DICOMs
+    DATASET = "dataset"  # WebDataset-style tar shards plus manifest.json
+    COCO = "coco"  # COCO detection JSON built from box annotations
+    YOLO = "yolo"  # ZIP of YOLO label files plus classes.txt
+
+class SampleFormat(str, enum.Enum):
+    DICOM = "dicom"
+    NPY = "npy"
+
+class ExportJobCreate(BaseModel):
+    project_id: int
+    kind: ExportKind = ExportKind.ANNOTATIONS
+    image_ids: Optional[List[int]] = None  # Whole project when omitted
+    folder_id: Optional[int] = None  # Limit to a folder and its subfolders
+    include_dicom: bool = False
+    # Dataset exports only
+    shard_size: int = Field(1000, ge=1, le=10000)
+    sample_format: SampleFormat = SampleFormat.DICOM
+
+class ExportJobResponse(BaseModel):
+    id: int
+    user_id: int
+    project_id: int
+    kind: str
+    params: Optional[dict]
+    status: ExportStatus
+    progress: int
+    total: int
+    artifact_size: Optional[int]
+    error: Optional[str]
+    created_at: datetime
+    started_at: Optional[datetime]
+    completed_at: Optional[datetime]
+    expires_at: Optional[datetime]
+    class Config:
+        from_attributes = True
@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, Any
+from typing import Any, List, Optional
 from datetime import datetime
 from .user import UserResponse
 from .folder import FolderResponse
@@ -11,6 +11,10 @@ class ImageBase(BaseModel):
     upload_time: Optional[datetime] = None
     dicom_metadata: Optional[dict] = None
     thumbnail_url: Optional[str] = None
+    study_instance_uid: Optional[str] = None
+    series_instance_uid: Optional[str] = None
+    sop_instance_uid: Optional[str] = None
+    instance_number: Optional[int] = None
 
 class ImageCreate(ImageBase):
     pass
@@ -32,4 +36,9 @@ class ImageResponse(ImageBase):
     folder: Optional[FolderResponse]
     
     class Config:
-        from_attributes = True 
\ No newline at end of file
+        from_attributes = True
+
+class QueueNextResponse(BaseModel):
+    image: ImageResponse
+    claimed_until: datetime
+    prefetch_ids: List[int]
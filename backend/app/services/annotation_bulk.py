@@ -0,0 +1,266 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.core.settings import ANNOTATION_SNAPSHOT_INTERVAL
+from app.models.annotation import Annotation, AnnotationHistory, ReviewStatus
+from app.models.image import Image
+from app.schemas.annotation import AnnotationBulkItem
+from app.services.annotation_events import (
+    ANNOTATION_CREATED,
+    ANNOTATION_REVIEWED,
+    ANNOTATION_UPDATED,
+    publish_annotation_event,
+)
+from app.services.annotation_export import member_image_ids
+from app.services.progress import progress_snapshot, record_progress
+from app.services.review_claims import review_status_error
+from app.services.review_counts import ReviewChange, record_review_changes
+from app.services.search_index import index_documents
+from app.services.tag_vocabulary import TagChange, record_tag_usage
+from app.utils.jsonpatch import JsonPatchError, apply_patch, make_patch
+from app.utils.rle import compact_arrays, expand_arrays
+
+MAX_BULK_ITEMS = 5000
+
+Result = Dict[str, Any]
+
+
+def _validation_message(error: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in detail['loc'])}: {detail['msg']}" for detail in error.errors()
+    )
+
+
+def _parse_items(items: List[Dict[str, Any]], results: List[Optional[Result]]):
+    creates: List[Tuple[int, AnnotationBulkItem]] = []
+    updates: List[Tuple[int, AnnotationBulkItem]] = []
+    seen_ids = set()
+    for index, raw in enumerate(items):
+        try:
+            item = AnnotationBulkItem.model_validate(raw)
+        except ValidationError as e:
+            results[index] = _error(index, _validation_message(e))
+            continue
+        if item.id is None:
+            if item.image_id is None or item.data is None:
+                results[index] = _error(index, "New annotations need image_id and data")
+            elif item.patch is not None:
+                results[index] = _error(index, "patch can only be used to update an annotation")
+            else:
+                creates.append((index, item))
+            continue
+        if item.data is not None and item.patch is not None:
+            results[index] = _error(index, "Send either data or patch, not both")
+        elif item.patch is not None and item.version is None:
+            results[index] = _error(index, "Patching requires version")
+        elif item.id in seen_ids:
+            results[index] = _error(index, "Annotation appears more than once in the batch")
+        else:
+            seen_ids.add(item.id)
+            updates.append((index, item))
+    return creates, updates
+
+
+def _error(index: int, message: str, **extra) -> Result:
+    return {"index": index, "status": "error", "error": message, **extra}
+
+
+def bulk_write_annotations(
+    db: Session,
+    items: List[Dict[str, Any]],
+    user_id: int,
+    atomic: bool = False,
+    prelabel: bool = False
+) -> List[Result]:
+    """Create and update many annotations in one transaction, with a result per item.
+
+    Items without `id` are created, the rest are updated with the same rules
+    as a single PATCH (a `version` that is no longer current is a conflict).
+    Access is checked with one query for every image involved, new rows and
+    all history entries are written with executemany-style INSERTs, and
+    the whole batch is committed once. Items that fail are reported and the
+    rest are still written, unless `atomic` is set. With `prelabel` the new
+    annotations are marked as tag model output, which per-annotator
+    statistics leave out.
+    """
+    results: List[Optional[Result]] = [None] * len(items)
+    creates, updates = _parse_items(items, results)
+
+    existing: Dict[int, Annotation] = {}
+    if updates:
+        rows = db.query(Annotation).filter(Annotation.id.in_([item.id for _, item in updates])).all()
+        existing = {ann.id: ann for ann in rows}
+    image_ids = {item.image_id for _, item in creates} | {ann.image_id for ann in existing.values()}
+    # Image id -> project id, for the images the user may write to
+    accessible: Dict[int, int] = {}
+    if image_ids:
+        accessible = dict(db.execute(
+            select(Image.id, Image.project_id).where(Image.id.in_(member_image_ids(user_id, image_ids=list(image_ids))))
+        ).all())
+
+    now = datetime.now(timezone.utc)
+    create_indexes: List[int] = []
+    create_rows: List[Dict[str, Any]] = []
+    for index, item in creates:
+        if item.image_id not in accessible:
+            results[index] = _error(index, "Image not found")
+            continue
+        create_indexes.append(index)
+        create_rows.append({
+            "image_id": item.image_id,
+            "user_id": user_id,
+            "data": compact_arrays(item.data),
+            "dicom_metadata": item.dicom_metadata,
+            "tags": item.tags,
+            "version": 1,
+            "review_status": ReviewStatus.PENDING,
+            "is_prelabel": prelabel,
+            "is_active": True,
+        })
+
+    planned_updates = []
+    for index, item in updates:
+        ann = existing.get(item.id)
+        if ann is None or ann.image_id not in accessible:
+            results[index] = _error(index, "Annotation not found")
+            continue
+        if item.version is not None and item.version != ann.version:
+            results[index] = _error(index, "Annotation was modified by someone else", id=ann.id, version=ann.version)
+            continue
+        if item.patch is not None:
+            try:
+                new_data = apply_patch(expand_arrays(ann.data), [operation.model_dump() for operation in item.patch])
+            except JsonPatchError as e:
+                results[index] = _error(index, f"Patch could not be applied: {str(e)}", id=ann.id)
+                continue
+            if not isinstance(new_data, dict):
+                results[index] = _error(index, "Patched data must be an object", id=ann.id)
+                continue
+        else:
+            new_data = item.data if item.data is not None else ann.data
+        changes = {}
+        if item.dicom_metadata is not None:
+            changes["dicom_metadata"] = item.dicom_metadata
+        if item.tags is not None:
+            changes["tags"] = item.tags
+        if item.review_status is not None and ReviewStatus(item.review_status.value) != ann.review_status:
+            status = ReviewStatus(item.review_status.value)
+            message = review_status_error(ann, status, user_id)
+            if message is not None:
+                results[index] = _error(index, message, id=ann.id)
+                continue
+            changes["review_status"] = status
+            if status != ReviewStatus.REVISED:
+                changes["reviewer_id"] = user_id
+            changes["review_claimed_at"] = None
+        planned_updates.append((index, ann, compact_arrays(new_data), changes))
+
+    def skip_remaining() -> List[Result]:
+        return [
+            result or {"index": index, "status": "skipped", "error": "Not written because other items failed"}
+            for index, result in enumerate(results)
+        ]
+
+    if atomic and any(result is not None for result in results):
+        return skip_remaining()
+
+    # Images whose progress can change: new annotations, and reviews that may approve or unapprove
+    progress_image_ids = {row["image_id"] for row in create_rows} | {
+        ann.image_id for _, ann, _, changes in planned_updates if "review_status" in changes
+    }
+    progress = progress_snapshot(db, progress_image_ids)
+
+    history_rows: List[Dict[str, Any]] = []
+    tag_changes: List[TagChange] = []
+    review_changes: List[ReviewChange] = []
+    if create_rows:
+        created_ids = db.scalars(
+            insert(Annotation).returning(Annotation.id, sort_by_parameter_order=True),
+            create_rows
+        ).all()
+        for index, annotation_id, row in zip(create_indexes, created_ids, create_rows):
+            results[index] = {"index": index, "status": "created", "id": annotation_id, "version": 1}
+            history_rows.append({
+                "annotation_id": annotation_id,
+                "version": 1,
+                "is_snapshot": True,
+                "data_snapshot": row["data"],
+                "patch": None,
+                "changed_by": user_id,
+                "changed_at": now,
+            })
+            tag_changes.append((accessible[row["image_id"]], None if prelabel else user_id, None, row["tags"]))
+            if not prelabel:
+                review_changes.append((accessible[row["image_id"]], None, ReviewStatus.PENDING))
+
+    if planned_updates:
+        snapshot_versions = dict(db.execute(
+            select(AnnotationHistory.annotation_id, func.max(AnnotationHistory.version))
+            .where(
+                AnnotationHistory.annotation_id.in_([ann.id for _, ann, _, _ in planned_updates]),
+                AnnotationHistory.is_snapshot.is_(True)
+            )
+            .group_by(AnnotationHistory.annotation_id)
+        ).all())
+    for index, ann, new_data, changes in planned_updates:
+        expected_version = ann.version or 1
+        version = expected_version + 1
+        # Conditional on the version read above, like a single save
+        result = db.execute(
+            update(Annotation)
+            .where(Annotation.id == ann.id, Annotation.version == expected_version)
+            .values(data=new_data, version=version, **changes)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            results[index] = _error(index, "Annotation was modified by someone else", id=ann.id)
+            if atomic:
+                db.rollback()
+                return skip_remaining()
+            continue
+        last_snapshot = snapshot_versions.get(ann.id)
+        snapshot = last_snapshot is None or version - last_snapshot >= ANNOTATION_SNAPSHOT_INTERVAL
+        history_rows.append({
+            "annotation_id": ann.id,
+            "version": version,
+            "is_snapshot": snapshot,
+            "data_snapshot": new_data if snapshot else None,
+            "patch": None if snapshot else make_patch(ann.data, new_data),
+            "changed_by": user_id,
+            "changed_at": now,
+        })
+        results[index] = {"index": index, "status": "updated", "id": ann.id, "version": version}
+        if "tags" in changes:
+            author_id = None if ann.is_prelabel else ann.user_id
+            tag_changes.append((accessible[ann.image_id], author_id, ann.tags, changes["tags"]))
+        if "review_status" in changes and not ann.is_prelabel:
+            review_changes.append((accessible[ann.image_id], ann.review_status, changes["review_status"]))
+
+    if history_rows:
+        db.execute(insert(AnnotationHistory), history_rows)
+    record_tag_usage(db, tag_changes)
+    record_review_changes(db, review_changes)
+    record_progress(db, progress, progress_image_ids)
+    index_documents(db, annotation_ids=[result["id"] for result in results if result and result["status"] in ("created", "updated")])
+    db.commit()
+    _publish_results(db, items, results, user_id)
+    return results
+
+
+def _publish_results(db: Session, items: List[Dict[str, Any]], results: List[Result], user_id: int) -> None:
+    written = {result["id"]: result for result in results if result["status"] in ("created", "updated")}
+    if not written:
+        return
+    for ann in db.query(Annotation).filter(Annotation.id.in_(list(written))).all():
+        result = written[ann.id]
+        if result["status"] == "created":
+            event_type = ANNOTATION_CREATED
+        elif items[result["index"]].get("review_status") is not None:
+            event_type = ANNOTATION_REVIEWED
+        else:
+            event_type = ANNOTATION_UPDATED
+        publish_annotation_event(event_type, ann, user_id)
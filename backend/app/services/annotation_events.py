@@ -0,0 +1,174 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set
+
+from fastapi.encoders import jsonable_encoder
+
+from app.core.settings import ANNOTATION_EVENT_QUEUE_SIZE
+from app.models.annotation import Annotation
+from app.schemas.annotation import AnnotationResponse
+
+Event = Dict[str, Any]
+
+ANNOTATION_CREATED = "annotation.created"
+ANNOTATION_UPDATED = "annotation.updated"
+ANNOTATION_REVIEWED = "annotation.reviewed"
+# Sent instead of the backlog when a subscriber fell too far behind
+RESYNC = "resync"
+
+
+class Subscription:
+    """Pending events of one subscriber to one channel.
+
+    Events are keyed by annotation id, so a burst of saves to the same
+    annotation leaves only its newest version waiting. Publishers never
+    block: when a slow subscriber has more than `max_pending` annotations
+    waiting, its backlog is dropped and it receives a single resync event
+    telling it to reload.
+    """
+
+    def __init__(self, channel: str, loop: asyncio.AbstractEventLoop, max_pending: int):
+        self.channel = channel
+        self.max_pending = max(1, max_pending)
+        self.coalesced = 0
+        self.dropped = 0
+        self._loop = loop
+        self._lock = threading.Lock()
+        self._pending: "OrderedDict[Any, Event]" = OrderedDict()
+        self._overflowed = False
+        self._wakeup = asyncio.Event()
+
+    def offer(self, event: Event) -> None:
+        """Queue an event; safe to call from any thread"""
+        key = event.get("annotation_id")
+        with self._lock:
+            if self._overflowed:
+                self.dropped += 1
+                return
+            previous = self._pending.get(key)
+            if previous is not None:
+                # Saves can be published out of order by different worker threads
+                if (previous.get("version") or 0) > (event.get("version") or 0):
+                    self.coalesced += 1
+                    return
+                if previous["type"] == ANNOTATION_CREATED:
+                    event = {**event, "type": ANNOTATION_CREATED}
+                self._pending[key] = event
+                self.coalesced += 1
+            elif len(self._pending) >= self.max_pending:
+                self.dropped += len(self._pending) + 1
+                self._pending.clear()
+                self._overflowed = True
+            else:
+                self._pending[key] = event
+        try:
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            # The subscriber's event loop is gone; it will be unsubscribed
+            pass
+
+    async def next_events(self) -> List[Event]:
+        """Wait for and take everything pending"""
+        while True:
+            with self._lock:
+                if self._overflowed:
+                    self._overflowed = False
+                    self._pending.clear()
+                    return [{"type": RESYNC, "channel": self.channel}]
+                if self._pending:
+                    events = list(self._pending.values())
+                    self._pending.clear()
+                    return events
+                self._wakeup.clear()
+            await self._wakeup.wait()
+
+
+class EventBroker:
+    """Delivers annotation events to subscribers of a channel.
+
+    The default broker only reaches clients connected to this process. A
+    shared broker (e.g. Redis or Postgres LISTEN/NOTIFY) can be installed
+    with `set_event_broker` when running several workers.
+    """
+
+    def publish(self, channel: str, event: Event) -> None:
+        raise NotImplementedError
+
+    def subscribe(self, channel: str) -> Subscription:
+        """Subscribe from inside the event loop that will consume the events"""
+        raise NotImplementedError
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        raise NotImplementedError
+
+
+class InProcessBroker(EventBroker):
+    def __init__(self, max_pending: int = ANNOTATION_EVENT_QUEUE_SIZE):
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._channels: Dict[str, Set[Subscription]] = {}
+
+    def publish(self, channel: str, event: Event) -> None:
+        with self._lock:
+            subscribers = list(self._channels.get(channel, ()))
+        for subscription in subscribers:
+            subscription.offer(event)
+
+    def subscribe(self, channel: str) -> Subscription:
+        subscription = Subscription(channel, asyncio.get_running_loop(), self.max_pending)
+        with self._lock:
+            self._channels.setdefault(channel, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscribers = self._channels.get(subscription.channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._channels[subscription.channel]
+
+    def subscriber_count(self, channel: str) -> int:
+        with self._lock:
+            return len(self._channels.get(channel, ()))
+
+
+_event_broker: Optional[EventBroker] = None
+_event_broker_lock = threading.Lock()
+
+
+def get_event_broker() -> EventBroker:
+    """Get the process-wide event broker"""
+    global _event_broker
+    if _event_broker is None:
+        with _event_broker_lock:
+            if _event_broker is None:
+                _event_broker = InProcessBroker()
+    return _event_broker
+
+
+def set_event_broker(broker: Optional[EventBroker]) -> None:
+    global _event_broker
+    with _event_broker_lock:
+        _event_broker = broker
+
+
+def image_channel(image_id: int) -> str:
+    return f"image:{image_id}"
+
+
+def annotation_event(event_type: str, ann: Annotation, changed_by: int) -> Event:
+    return {
+        "type": event_type,
+        "image_id": ann.image_id,
+        "annotation_id": ann.id,
+        "version": ann.version,
+        "changed_by": changed_by,
+        "annotation": jsonable_encoder(AnnotationResponse.model_validate(ann)),
+    }
+
+
+def publish_annotation_event(event_type: str, ann: Annotation, changed_by: int) -> None:
+    """Tell everyone watching the annotation's image; call after the change is committed"""
+    get_event_broker().publish(image_channel(ann.image_id), annotation_event(event_type, ann, changed_by))
@@ -0,0 +1,145 @@
+import itertools
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import Select, select
+from sqlalchemy.orm import Session
+
+from app.models.annotation import Annotation
+from app.models.folder import Folder
+from app.models.image import Image
+from app.models.project import project_users
+from app.utils.rle import expand_arrays
+from app.utils.orthanc import get_orthanc_client
+from app.utils.zipstream import ZipStreamWriter
+
+# Rows fetched per round trip while walking images and annotations
+EXPORT_CHUNK_SIZE = 500
+
+
+def folder_subtree_ids(folder_id: int) -> Select:
+    """Ids of a folder and all of its descendants"""
+    tree = select(Folder.id).where(Folder.id == folder_id).cte("folder_tree", recursive=True)
+    tree = tree.union_all(select(Folder.id).where(Folder.parent_folder_id == tree.c.id))
+    return select(tree.c.id)
+
+
+def member_image_ids(
+    user_id: int,
+    project_id: Optional[int] = None,
+    image_ids: Optional[List[int]] = None,
+    folder_id: Optional[int] = None
+) -> Select:
+    """Select the ids of images a user may export, narrowed by project, explicit ids or folder subtree"""
+    member_projects = select(project_users.c.project_id).where(project_users.c.user_id == user_id)
+    selected_ids = select(Image.id).where(Image.project_id.in_(member_projects))
+    if project_id is not None:
+        selected_ids = selected_ids.where(Image.project_id == project_id)
+    if image_ids:
+        selected_ids = selected_ids.where(Image.id.in_(image_ids))
+    if folder_id is not None:
+        selected_ids = selected_ids.where(Image.folder_id.in_(folder_subtree_ids(folder_id)))
+    return selected_ids
+
+
+def serialize_annotation(ann: Annotation) -> Dict[str, Any]:
+    return {
+        "id": ann.id,
+        "user_id": ann.user_id,
+        "version": ann.version,
+        "data": expand_arrays(ann.data),
+        "tags": ann.tags,
+        "review_status": ann.review_status.value,
+        "timestamp": ann.timestamp.isoformat() if ann.timestamp else None
+    }
+
+
+def image_annotation_data(image: Image, annotations: Iterable[Annotation]) -> Dict[str, Any]:
+    return {
+        "image_id": image.id,
+        "orthanc_id": image.orthanc_id,
+        "annotations": [serialize_annotation(ann) for ann in annotations]
+    }
+
+
+def iter_image_annotations(db: Session, image_ids: Select) -> Iterator[Tuple[Image, List[Annotation]]]:
+    """Walk images with their annotations in id order, a chunk of rows at a time.
+
+    `image_ids` selects the ids of the images to export. Images and
+    annotations are both read with yield_per and merged on image id, so only
+    one image's annotations are held in memory at once.
+    """
+    images = db.query(Image).filter(Image.id.in_(image_ids)).order_by(Image.id).yield_per(EXPORT_CHUNK_SIZE)
+    annotations = db.query(Annotation).filter(
+        Annotation.image_id.in_(image_ids)
+    ).order_by(Annotation.image_id, Annotation.id).yield_per(EXPORT_CHUNK_SIZE)
+
+    groups = itertools.groupby(annotations, key=lambda ann: ann.image_id)
+    pending = next(groups, None)
+    for image in images:
+        while pending is not None and pending[0] < image.id:
+            pending = next(groups, None)
+        if pending is not None and pending[0] == image.id:
+            image_annotations = list(pending[1])
+            pending = next(groups, None)
+        else:
+            image_annotations = []
+        yield image, image_annotations
+
+
+def _iter_summary(db: Session, image_ids: Select, exported_at: str) -> Iterator[bytes]:
+    total_images = db.query(Image).filter(Image.id.in_(image_ids)).count()
+    total_annotations = db.query(Annotation).filter(Annotation.image_id.in_(image_ids)).count()
+    header = json.dumps({
+        "exported_at": exported_at,
+        "total_images": total_images,
+        "total_annotations": total_annotations,
+    }, indent=2)
+    yield (header[:-2] + ',\n  "images": [\n').encode("utf-8")
+    separator = ""
+    for image, annotations in iter_image_annotations(db, image_ids):
+        yield (separator + json.dumps(image_annotation_data(image, annotations))).encode("utf-8")
+        separator = ",\n"
+    yield b"\n  ]\n}\n"
+
+
+def iter_bulk_export_zip(
+    db: Session,
+    image_ids: Select,
+    include_dicom: bool = False,
+    on_image: Optional[Callable[[Image], None]] = None
+) -> Iterator[bytes]:
+    """Stream a ZIP with one annotation file per image, optional DICOMs and a summary.
+
+    The summary is produced by a second pass over the database rather than
+    accumulated during the first, which keeps memory flat for any export size.
+    `on_image` is called after each image has been written, for progress reporting.
+    """
+    exported_at = datetime.utcnow().isoformat()
+    archive = ZipStreamWriter()
+    client = get_orthanc_client()
+
+    for image, annotations in iter_image_annotations(db, image_ids):
+        yield from archive.write_str(
+            f"annotations_image_{image.id}.json",
+            json.dumps(image_annotation_data(image, annotations), indent=2)
+        )
+        if include_dicom:
+            yield from archive.write_entry(f"dicom_{image.id}_{image.orthanc_id}.dcm", client.iter_dicom_file(image.orthanc_id))
+        if on_image is not None:
+            on_image(image)
+
+    yield from archive.write_entry("annotations_summary.json", _iter_summary(db, image_ids, exported_at))
+    yield from archive.close()
+
+
+def iter_image_with_dicom_zip(image: Image, annotations: Iterable[Annotation], dicom_chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """Stream a ZIP holding one DICOM (piped from Orthanc) and its annotations"""
+    archive = ZipStreamWriter()
+    yield from archive.write_entry(f"dicom_{image.orthanc_id}.dcm", dicom_chunks)
+
+    annotation_data = image_annotation_data(image, annotations)
+    annotation_data["exported_at"] = datetime.utcnow().isoformat()
+    yield from archive.write_str("annotations.json", json.dumps(annotation_data, indent=2))
+    yield from archive.close()
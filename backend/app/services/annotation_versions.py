@@ -0,0 +1,109 @@
+import copy
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func, update
+from sqlalchemy.orm import Session
+
+from app.core.settings import ANNOTATION_SNAPSHOT_INTERVAL
+from app.models.annotation import Annotation, AnnotationHistory
+from app.utils.jsonpatch import apply_patch, make_patch
+
+
+def record_initial_version(db: Session, ann: Annotation, user_id: int) -> AnnotationHistory:
+    """Snapshot the first version of a newly created annotation (call after flush)"""
+    entry = AnnotationHistory(
+        annotation_id=ann.id,
+        version=ann.version,
+        is_snapshot=True,
+        data_snapshot=ann.data,
+        changed_by=user_id,
+        changed_at=datetime.now(timezone.utc)
+    )
+    db.add(entry)
+    return entry
+
+
+def latest_snapshot_version(db: Session, annotation_id: int, at_or_before: Optional[int] = None) -> Optional[int]:
+    query = db.query(func.max(AnnotationHistory.version)).filter(
+        AnnotationHistory.annotation_id == annotation_id,
+        AnnotationHistory.is_snapshot.is_(True)
+    )
+    if at_or_before is not None:
+        query = query.filter(AnnotationHistory.version <= at_or_before)
+    return query.scalar()
+
+
+class VersionConflict(Exception):
+    """The annotation was saved by someone else since the caller read it"""
+
+    def __init__(self, current_version: Optional[int]):
+        super().__init__(f"Annotation is at version {current_version}")
+        self.current_version = current_version
+
+
+def record_new_version(
+    db: Session,
+    ann: Annotation,
+    new_data: Any,
+    user_id: int,
+    changes: Optional[Dict[str, Any]] = None
+) -> AnnotationHistory:
+    """Save `new_data` (and other column `changes`) as the next version of a loaded annotation.
+
+    The row is written with a conditional UPDATE ... WHERE version = <loaded
+    version>, so a concurrent save makes this one fail with VersionConflict
+    instead of silently overwriting it, and no lock is held between read and
+    write. The data change is stored as a delta from the loaded version, or as
+    a full snapshot when ANNOTATION_SNAPSHOT_INTERVAL versions have passed
+    since the last one (or there is none, e.g. for annotations created before
+    history was kept), so rebuilding any version never replays more than
+    that many patches.
+    """
+    expected_version = ann.version or 1
+    version = expected_version + 1
+    result = db.execute(
+        update(Annotation)
+        .where(Annotation.id == ann.id, Annotation.version == expected_version)
+        .values(data=new_data, version=version, **(changes or {}))
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        db.rollback()
+        current = db.query(Annotation.version).filter(Annotation.id == ann.id).scalar()
+        raise VersionConflict(current)
+
+    last_snapshot = latest_snapshot_version(db, ann.id)
+    snapshot = last_snapshot is None or version - last_snapshot >= ANNOTATION_SNAPSHOT_INTERVAL
+    entry = AnnotationHistory(
+        annotation_id=ann.id,
+        version=version,
+        is_snapshot=snapshot,
+        data_snapshot=new_data if snapshot else None,
+        patch=None if snapshot else make_patch(ann.data, new_data),
+        changed_by=user_id,
+        changed_at=datetime.now(timezone.utc)
+    )
+    db.add(entry)
+    db.expire(ann)
+    return entry
+
+
+def reconstruct_version(db: Session, annotation_id: int, version: int) -> Optional[Any]:
+    """Annotation data as of `version`: the nearest snapshot at or before it plus the patches after it"""
+    snapshot_version = latest_snapshot_version(db, annotation_id, at_or_before=version)
+    if snapshot_version is None:
+        return None
+    entries = db.query(AnnotationHistory).filter(
+        AnnotationHistory.annotation_id == annotation_id,
+        AnnotationHistory.version >= snapshot_version,
+        AnnotationHistory.version <= version
+    ).order_by(AnnotationHistory.version).all()
+    if not entries or entries[-1].version != version:
+        return None
+
+    # Copy once so patches can be applied in place without touching loaded rows
+    data = copy.deepcopy(entries[0].data_snapshot)
+    for entry in entries[1:]:
+        data = apply_patch(data, entry.patch or [], in_place=True)
+    return data
@@ -0,0 +1,140 @@
+import heapq
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy import and_, case, exists, func, select, update
+from sqlalchemy.orm import Session
+
+from app.core.settings import ASSIGNMENT_THROUGHPUT_DAYS
+from app.models.annotation import Annotation
+from app.models.image import Image
+from app.models.project import project_users
+from app.services.progress import progress_snapshot, record_progress
+
+
+@dataclass
+class MemberWorkload:
+    user_id: int
+    open_images: int  # Assigned to them and not annotated by anyone yet (pre-labels aside)
+    throughput: int  # Annotations they made in the project over the throughput window, pre-labels excluded
+
+
+def member_workloads(
+    db: Session,
+    project_id: int,
+    user_ids: Optional[Sequence[int]] = None,
+    throughput_days: int = ASSIGNMENT_THROUGHPUT_DAYS
+) -> List[MemberWorkload]:
+    """Open workload and recent throughput of every project member, in one query"""
+    since = datetime.now(timezone.utc) - timedelta(days=throughput_days)
+    open_work = select(
+        Image.assigned_user_id.label("user_id"), func.count(Image.id).label("open_images")
+    ).where(
+        Image.project_id == project_id,
+        Image.assigned_user_id.isnot(None),
+        ~exists().where(Annotation.image_id == Image.id, Annotation.is_prelabel.is_(False))
+    ).group_by(Image.assigned_user_id).subquery()
+    done = select(
+        Annotation.user_id.label("user_id"), func.count(Annotation.id).label("throughput")
+    ).join(Image, Image.id == Annotation.image_id).where(
+        Image.project_id == project_id,
+        Annotation.created_at >= since,
+        Annotation.is_prelabel.is_(False)
+    ).group_by(Annotation.user_id).subquery()
+
+    statement = select(
+        project_users.c.user_id,
+        func.coalesce(open_work.c.open_images, 0),
+        func.coalesce(done.c.throughput, 0)
+    ).outerjoin(
+        open_work, open_work.c.user_id == project_users.c.user_id
+    ).outerjoin(
+        done, done.c.user_id == project_users.c.user_id
+    ).where(project_users.c.project_id == project_id).order_by(project_users.c.user_id)
+    if user_ids is not None:
+        statement = statement.where(project_users.c.user_id.in_(list(user_ids)))
+    return [MemberWorkload(*row) for row in db.execute(statement)]
+
+
+def plan_assignment(workloads: Sequence[MemberWorkload], count: int) -> Dict[int, int]:
+    """How many of `count` new images each member gets.
+
+    Each image goes to the member who would finish their queue soonest with
+    it added: (open + given + 1) / (throughput + 1). Faster members get
+    proportionally more, and members with a backlog get none until the
+    others catch up. The +1 gives members without history a small share.
+    """
+    given = {workload.user_id: 0 for workload in workloads}
+    heap = [((workload.open_images + 1) / (workload.throughput + 1), workload.user_id, workload) for workload in workloads]
+    heapq.heapify(heap)
+    for _ in range(count if heap else 0):
+        _, user_id, workload = heapq.heappop(heap)
+        given[user_id] += 1
+        finish = (workload.open_images + given[user_id] + 1) / (workload.throughput + 1)
+        heapq.heappush(heap, (finish, user_id, workload))
+    return given
+
+
+def auto_assign_images(
+    db: Session,
+    project_id: int,
+    folder_id: Optional[int] = None,
+    user_ids: Optional[Sequence[int]] = None,
+    limit: Optional[int] = None,
+    dry_run: bool = False
+) -> Dict[str, Any]:
+    """Spread a project's unassigned, unannotated images across its members.
+
+    Images are taken in id order and handed out in contiguous runs, so
+    neighbouring slices of a series stay with one person. The plan is
+    written with a single UPDATE whose CASE maps each run's id range to its
+    member; rows assigned by someone else in the meantime are left alone.
+    """
+    workloads = member_workloads(db, project_id, user_ids)
+    unassigned = [
+        Image.project_id == project_id,
+        Image.assigned_user_id.is_(None),
+        # Pre-labels are suggestions; the image still needs a person
+        ~exists().where(Annotation.image_id == Image.id, Annotation.is_prelabel.is_(False)),
+    ]
+    if folder_id is not None:
+        unassigned.append(Image.folder_id == folder_id)
+    query = db.query(Image.id).filter(*unassigned).order_by(Image.id)
+    if limit is not None:
+        query = query.limit(limit)
+    image_ids = [image_id for (image_id,) in query]
+
+    plan = plan_assignment(workloads, len(image_ids)) if workloads else {}
+    runs = []
+    position = 0
+    for user_id, count in plan.items():
+        if count:
+            position += count
+            runs.append((image_ids[position - 1], user_id))
+
+    assigned = 0
+    if runs and not dry_run:
+        progress = progress_snapshot(db, image_ids)
+        result = db.execute(
+            update(Image)
+            .where(and_(*unassigned), Image.id >= image_ids[0], Image.id <= image_ids[-1])
+            .values(assigned_user_id=case(*[(Image.id <= last_id, user_id) for last_id, user_id in runs]))
+            .execution_options(synchronize_session=False)
+        )
+        assigned = result.rowcount
+        record_progress(db, progress, image_ids)
+        db.commit()
+    return {
+        "assigned": assigned,
+        "dry_run": dry_run,
+        "members": [
+            {
+                "user_id": workload.user_id,
+                "open_images": workload.open_images,
+                "throughput": workload.throughput,
+                "new_images": plan.get(workload.user_id, 0),
+            }
+            for workload in workloads
+        ],
+    }
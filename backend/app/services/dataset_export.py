@@ -0,0 +1,178 @@
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import tarfile
+import tempfile
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List
+
+import numpy as np
+import pydicom
+from sqlalchemy import Select
+from sqlalchemy.orm import Session
+
+from app.core.settings import DATASET_EXPORT_PROCESSES, DICOM_SPOOL_MAX_MB
+from app.services.annotation_export import image_annotation_data, iter_image_annotations
+from app.utils.orthanc import get_orthanc_client
+
+DEFAULT_SHARD_SIZE = 1000
+
+
+def sample_key(image_id: int) -> str:
+    # WebDataset groups tar members by the part of the name before the first dot
+    return f"image_{image_id:09d}"
+
+
+def plan_shards(db: Session, image_ids: Select, shard_size: int) -> Iterator[List[Dict[str, Any]]]:
+    """Group the selected images into shards of `shard_size` samples.
+
+    Only ids and annotation JSON travel to the workers; pixel data is fetched
+    from Orthanc inside the worker that writes the shard.
+    """
+    shard: List[Dict[str, Any]] = []
+    for image, annotations in iter_image_annotations(db, image_ids):
+        shard.append({
+            "key": sample_key(image.id),
+            "image_id": image.id,
+            "orthanc_id": image.orthanc_id,
+            "annotations": image_annotation_data(image, annotations),
+        })
+        if len(shard) >= shard_size:
+            yield shard
+            shard = []
+    if shard:
+        yield shard
+
+
+def _add_member(archive: tarfile.TarFile, name: str, fileobj, size: int, mtime: float) -> None:
+    info = tarfile.TarInfo(name)
+    info.size = size
+    info.mtime = mtime
+    archive.addfile(info, fileobj)
+
+
+def _decode_pixels(dicom_file) -> bytes:
+    pixels = pydicom.dcmread(dicom_file).pixel_array
+    buffer = io.BytesIO()
+    np.save(buffer, pixels, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def write_shard(path: str, samples: List[Dict[str, Any]], sample_format: str) -> Dict[str, Any]:
+    """Write one tar shard of samples; runs in a worker process.
+
+    Every sample becomes `<key>.dcm` (or `<key>.npy` with decoded pixels) plus
+    `<key>.json` with its annotations. Samples whose pixels cannot be fetched
+    or decoded are left out and reported back instead of failing the shard.
+    """
+    client = get_orthanc_client()
+    tmp_path = f"{path}.part"
+    mtime = time.time()
+    written = 0
+    failed = []
+    try:
+        with tarfile.open(tmp_path, "w", format=tarfile.PAX_FORMAT) as archive:
+            for sample in samples:
+                try:
+                    with tempfile.SpooledTemporaryFile(max_size=DICOM_SPOOL_MAX_MB * 1024 * 1024) as dicom_file:
+                        for chunk in client.iter_dicom_file(sample["orthanc_id"]):
+                            dicom_file.write(chunk)
+                        if sample_format == "npy":
+                            dicom_file.seek(0)
+                            payload = _decode_pixels(dicom_file)
+                            _add_member(archive, f"{sample['key']}.npy", io.BytesIO(payload), len(payload), mtime)
+                        else:
+                            size = dicom_file.tell()
+                            dicom_file.seek(0)
+                            _add_member(archive, f"{sample['key']}.dcm", dicom_file, size, mtime)
+                except Exception as e:
+                    failed.append({"image_id": sample["image_id"], "error": str(e)})
+                    continue
+                annotations = json.dumps(sample["annotations"]).encode("utf-8")
+                _add_member(archive, f"{sample['key']}.json", io.BytesIO(annotations), len(annotations), mtime)
+                written += 1
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return {
+        "name": os.path.basename(path),
+        "samples": written,
+        "size": os.path.getsize(path),
+        "sha256": digest.hexdigest(),
+        "failed": failed,
+    }
+
+
+def make_shard_pool() -> Executor:
+    # Spawned workers do not inherit the server's threads, sockets or DB connections
+    return ProcessPoolExecutor(
+        max_workers=max(1, DATASET_EXPORT_PROCESSES),
+        mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+def build_dataset_shards(
+    db: Session,
+    image_ids: Select,
+    directory: Path,
+    params: Dict[str, Any],
+    on_progress: Callable[[int], None]
+) -> Dict[str, Any]:
+    """Write a sharded tar dataset plus manifest.json into `directory`.
+
+    Shards are planned here as the database is walked and written in
+    parallel by a process pool. The number of shards in flight is bounded so
+    the plan never has to be held in memory for the whole project.
+    """
+    shard_size = params.get("shard_size") or DEFAULT_SHARD_SIZE
+    sample_format = params.get("sample_format") or "dicom"
+    directory.mkdir(parents=True, exist_ok=True)
+
+    shards: List[Dict[str, Any]] = []
+    failed: List[Dict[str, Any]] = []
+    done = 0
+
+    def collect(future: Future) -> None:
+        nonlocal done
+        result = future.result()
+        shard_failed = result.pop("failed")
+        failed.extend(shard_failed)
+        shards.append(result)
+        done += result["samples"] + len(shard_failed)
+        on_progress(done)
+
+    with make_shard_pool() as pool:
+        pending: List[Future] = []
+        max_pending = max(1, DATASET_EXPORT_PROCESSES) * 2
+        for number, samples in enumerate(plan_shards(db, image_ids, shard_size)):
+            path = directory / f"shard-{number:06d}.tar"
+            pending.append(pool.submit(write_shard, str(path), samples, sample_format))
+            while len(pending) >= max_pending:
+                collect(pending.pop(0))
+        for future in pending:
+            collect(future)
+
+    shards.sort(key=lambda shard: shard["name"])
+    manifest = {
+        "format": "webdataset",
+        "created_at": datetime.utcnow().isoformat(),
+        "sample_format": sample_format,
+        "shard_size": shard_size,
+        "total_samples": sum(shard["samples"] for shard in shards),
+        "shards": shards,
+        "failed": failed,
+    }
+    with open(directory / "manifest.json", "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
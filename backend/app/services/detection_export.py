@@ -0,0 +1,260 @@
+import itertools
+import json
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy import Select
+from sqlalchemy.orm import Session
+
+from app.models.annotation import Annotation
+from app.models.image import Image
+from app.services.annotation_export import EXPORT_CHUNK_SIZE, iter_image_annotations
+from app.services.dataset_export import sample_key
+from app.utils.zipstream import ZipStreamWriter
+
+# Cornerstone tools whose start/end handles span a region; measurements such
+# as Length or ArrowAnnotate have no area and are not exported as boxes
+BOX_TOOLS = ("RectangleRoi", "EllipticalRoi")
+
+
+def tool_box(tool: Dict[str, Any]) -> Optional[Tuple[float, float, float, float]]:
+    """Corner coordinates (x1, y1, x2, y2) of a box-shaped tool, or None"""
+    if tool.get("toolName") not in BOX_TOOLS:
+        return None
+    handles = tool.get("handles") or {}
+    start, end = handles.get("start"), handles.get("end")
+    try:
+        return float(start["x"]), float(start["y"]), float(end["x"]), float(end["y"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def box_label(tool: Dict[str, Any], annotation: Annotation) -> str:
+    """Class of a box: its own label, else the annotation's first tag, else the tool name"""
+    label = tool.get("label") or tool.get("text")
+    if label:
+        return str(label)
+    if annotation.tags:
+        return str(annotation.tags[0])
+    return tool["toolName"]
+
+
+def annotation_box_tools(annotation: Annotation) -> Iterator[Tuple[Dict[str, Any], Tuple[float, float, float, float], str]]:
+    """Box-shaped tools of an annotation, with their corners and class"""
+    for tool in (annotation.data or {}).get("annotations", []):
+        if not isinstance(tool, dict):
+            continue
+        box = tool_box(tool)
+        if box is not None:
+            yield tool, box, box_label(tool, annotation)
+
+
+def annotation_boxes(annotation: Annotation) -> Iterator[Tuple[Tuple[float, float, float, float], str]]:
+    for _, box, label in annotation_box_tools(annotation):
+        yield box, label
+
+
+def image_dimensions(image: Image) -> Tuple[float, float]:
+    """(Columns, Rows) from the stored DICOM metadata, NaN when unknown"""
+    metadata = image.dicom_metadata or {}
+    try:
+        return float(metadata["Columns"]), float(metadata["Rows"])
+    except (KeyError, TypeError, ValueError):
+        return float("nan"), float("nan")
+
+
+class CategoryIndex:
+    """Stable 1-based category ids, assigned in first-seen order"""
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+
+    def ids(self, labels: Iterable[str]) -> np.ndarray:
+        return np.array([self._ids.setdefault(label, len(self._ids) + 1) for label in labels], dtype=np.int64)
+
+    def names(self) -> List[str]:
+        return list(self._ids)
+
+
+@dataclass
+class BoxBatch:
+    """Boxes of a chunk of images as parallel arrays, clipped to the image and in pixels"""
+
+    images: List[Image]
+    widths: np.ndarray  # per image
+    heights: np.ndarray  # per image
+    image_index: np.ndarray  # per box: position in `images`
+    annotation_ids: np.ndarray
+    labels: List[str]
+    x: np.ndarray
+    y: np.ndarray
+    w: np.ndarray
+    h: np.ndarray
+
+
+def build_box_batch(chunk: List[Tuple[Image, List[Annotation]]]) -> BoxBatch:
+    images = [image for image, _ in chunk]
+    dimensions = np.array([image_dimensions(image) for image in images], dtype=np.float64).reshape(-1, 2)
+
+    corners: List[Tuple[float, float, float, float]] = []
+    image_index: List[int] = []
+    annotation_ids: List[int] = []
+    labels: List[str] = []
+    for position, (_, annotations) in enumerate(chunk):
+        for ann in annotations:
+            for box, label in annotation_boxes(ann):
+                corners.append(box)
+                image_index.append(position)
+                annotation_ids.append(ann.id)
+                labels.append(label)
+
+    coords = np.array(corners, dtype=np.float64).reshape(-1, 4)
+    index = np.array(image_index, dtype=np.int64)
+    widths = dimensions[index, 0]
+    heights = dimensions[index, 1]
+
+    # Handles can be dragged in any direction and past the image edge
+    x1 = np.clip(np.minimum(coords[:, 0], coords[:, 2]), 0, widths)
+    x2 = np.clip(np.maximum(coords[:, 0], coords[:, 2]), 0, widths)
+    y1 = np.clip(np.minimum(coords[:, 1], coords[:, 3]), 0, heights)
+    y2 = np.clip(np.maximum(coords[:, 1], coords[:, 3]), 0, heights)
+    w = x2 - x1
+    h = y2 - y1
+    # Unknown dimensions propagate NaN and degenerate boxes have no area: drop both
+    keep = np.isfinite(w) & np.isfinite(h) & (w > 0) & (h > 0)
+
+    return BoxBatch(
+        images=images,
+        widths=dimensions[:, 0],
+        heights=dimensions[:, 1],
+        image_index=index[keep],
+        annotation_ids=np.array(annotation_ids, dtype=np.int64)[keep],
+        labels=[label for label, kept in zip(labels, keep) if kept],
+        x=x1[keep],
+        y=y1[keep],
+        w=w[keep],
+        h=h[keep],
+    )
+
+
+def iter_box_batches(
+    db: Session,
+    image_ids: Select,
+    on_progress: Optional[Callable[[int], None]] = None
+) -> Iterator[BoxBatch]:
+    """Box batches of EXPORT_CHUNK_SIZE images; `on_progress` gets the images done after each"""
+    rows = iter_image_annotations(db, image_ids)
+    done = 0
+    while True:
+        chunk = list(itertools.islice(rows, EXPORT_CHUNK_SIZE))
+        if not chunk:
+            return
+        yield build_box_batch(chunk)
+        done += len(chunk)
+        if on_progress is not None:
+            on_progress(done)
+
+
+def iter_coco_json(db: Session, image_ids: Select, on_progress: Optional[Callable[[int], None]] = None) -> Iterator[bytes]:
+    """Stream a COCO detection file for the selected images.
+
+    Images whose Rows/Columns are unknown are left out, as COCO needs their
+    size. Categories are collected while boxes are written and emitted last.
+    `on_progress` is called with the number of images whose boxes are written.
+    """
+    categories = CategoryIndex()
+    info = {"description": "Radiology annotation export", "date_created": datetime.utcnow().isoformat()}
+    yield f'{{"info": {json.dumps(info)}, "images": ['.encode("utf-8")
+
+    separator = ""
+    images = db.query(Image).filter(Image.id.in_(image_ids)).order_by(Image.id).yield_per(EXPORT_CHUNK_SIZE)
+    for position, image in enumerate(images, start=1):
+        if on_progress is not None and position % EXPORT_CHUNK_SIZE == 0:
+            on_progress(0)  # No boxes written yet, but the job is alive
+        width, height = image_dimensions(image)
+        if not (np.isfinite(width) and np.isfinite(height)):
+            continue
+        yield (separator + json.dumps({
+            "id": image.id,
+            "file_name": f"{sample_key(image.id)}.dcm",
+            "width": int(width),
+            "height": int(height),
+            "orthanc_id": image.orthanc_id,
+        })).encode("utf-8")
+        separator = ","
+
+    yield b'], "annotations": ['
+    separator = ""
+    next_id = 1
+    for batch in iter_box_batches(db, image_ids, on_progress):
+        if not len(batch.x):
+            continue
+        category_ids = categories.ids(batch.labels)
+        image_id_of = np.array([image.id for image in batch.images], dtype=np.int64)[batch.image_index]
+        boxes = np.round(np.stack([batch.x, batch.y, batch.w, batch.h], axis=1), 2)
+        areas = np.round(batch.w * batch.h, 2)
+        ids = range(next_id, next_id + len(boxes))
+        next_id += len(boxes)
+        entries = [
+            json.dumps({
+                "id": box_id,
+                "image_id": image_id,
+                "category_id": category_id,
+                "bbox": box,
+                "area": area,
+                "iscrowd": 0,
+                "annotation_id": annotation_id,
+            })
+            for box_id, image_id, category_id, box, area, annotation_id in zip(
+                ids, image_id_of.tolist(), category_ids.tolist(), boxes.tolist(),
+                areas.tolist(), batch.annotation_ids.tolist()
+            )
+        ]
+        yield (separator + ",".join(entries)).encode("utf-8")
+        separator = ","
+
+    category_entries = [
+        {"id": category_id, "name": name, "supercategory": "finding"}
+        for category_id, name in enumerate(categories.names(), start=1)
+    ]
+    yield f'], "categories": {json.dumps(category_entries)}}}\n'.encode("utf-8")
+
+
+def iter_yolo_zip(db: Session, image_ids: Select, on_progress: Optional[Callable[[int], None]] = None) -> Iterator[bytes]:
+    """Stream a ZIP of YOLO label files (labels/<key>.txt) plus classes.txt.
+
+    Coordinates are box centres and sizes normalised by Columns/Rows.
+    Images of known size without boxes get an empty label file, so they are
+    kept as negatives.
+    """
+    categories = CategoryIndex()
+    archive = ZipStreamWriter()
+
+    for batch in iter_box_batches(db, image_ids, on_progress):
+        classes = categories.ids(batch.labels) - 1
+        widths = batch.widths[batch.image_index]
+        heights = batch.heights[batch.image_index]
+        normalized = np.stack([
+            (batch.x + batch.w / 2) / widths,
+            (batch.y + batch.h / 2) / heights,
+            batch.w / widths,
+            batch.h / heights,
+        ], axis=1)
+
+        # Boxes are ordered by image, so each image's rows are one contiguous slice
+        bounds = np.searchsorted(batch.image_index, np.arange(len(batch.images) + 1))
+        lines = [
+            f"{cls} {cx:.6f} {cy:.6f} {w:.6f} {h:.6f}"
+            for cls, (cx, cy, w, h) in zip(classes.tolist(), normalized.tolist())
+        ]
+        for position, image in enumerate(batch.images):
+            if not (np.isfinite(batch.widths[position]) and np.isfinite(batch.heights[position])):
+                continue
+            start, end = bounds[position], bounds[position + 1]
+            content = "\n".join(lines[start:end])
+            yield from archive.write_str(f"labels/{sample_key(image.id)}.txt", content + "\n" if content else "")
+
+    yield from archive.write_str("classes.txt", "".join(f"{name}\n" for name in categories.names()))
+    yield from archive.close()
@@ -0,0 +1,260 @@
+import io
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pydicom
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.sequence import Sequence as DicomSequence
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid
+
+from app.models.annotation import Annotation
+from app.services.detection_export import annotation_box_tools, tool_box
+from app.services.instance_cache import get_instance_cache
+
+SEGMENTATION_STORAGE = "1.2.840.10008.5.1.4.1.1.66.4"
+SEG_MANUFACTURER = "Radiology Tagging System"
+
+# Attributes copied from the source so the SEG lands in the same patient and study
+PATIENT_STUDY_ATTRIBUTES = (
+    "PatientName", "PatientID", "PatientBirthDate", "PatientSex",
+    "StudyInstanceUID", "StudyDate", "StudyTime", "StudyID", "AccessionNumber", "ReferringPhysicianName",
+)
+
+
+class SegmentationError(ValueError):
+    pass
+
+
+def _code(value: str, scheme: str, meaning: str) -> Dataset:
+    item = Dataset()
+    item.CodeValue = value
+    item.CodingSchemeDesignator = scheme
+    item.CodeMeaning = meaning
+    return item
+
+
+def rasterize_tool(tool: dict, rows: int, columns: int) -> Optional[np.ndarray]:
+    """Boolean mask of the pixels covered by a rectangle or ellipse, or None for other tools.
+
+    Pixel (r, c) is tested at its centre (c + 0.5, r + 0.5) against the shape,
+    using broadcast row/column grids rather than a per-pixel loop.
+    """
+    box = tool_box(tool)
+    if box is None:
+        return None
+    x1, x2 = sorted((box[0], box[2]))
+    y1, y2 = sorted((box[1], box[3]))
+    ys, xs = np.ogrid[0:rows, 0:columns]
+    ys = ys + 0.5
+    xs = xs + 0.5
+
+    if tool["toolName"] == "EllipticalRoi":
+        cx, cy = (x1 + x2) / 2, (y1 + y2) / 2
+        rx, ry = (x2 - x1) / 2, (y2 - y1) / 2
+        if rx <= 0 or ry <= 0:
+            return np.zeros((rows, columns), dtype=bool)
+        return ((xs - cx) / rx) ** 2 + ((ys - cy) / ry) ** 2 <= 1.0
+    return (xs >= x1) & (xs <= x2) & (ys >= y1) & (ys <= y2)
+
+
+def annotation_masks(annotations: Sequence[Annotation], rows: int, columns: int) -> Dict[str, np.ndarray]:
+    """Union of every shape in the annotations, one mask per label"""
+    masks: Dict[str, np.ndarray] = {}
+    for ann in annotations:
+        for tool, _, label in annotation_box_tools(ann):
+            mask = rasterize_tool(tool, rows, columns)
+            if not mask.any():
+                continue
+            if label in masks:
+                masks[label] |= mask
+            else:
+                masks[label] = mask
+    return masks
+
+
+@dataclass
+class SegSource:
+    """A source instance header and the annotations drawn on it"""
+
+    dataset: Dataset
+    annotations: Sequence[Annotation]
+
+
+def read_source_header(orthanc_id: str) -> Dataset:
+    with get_instance_cache().open(orthanc_id) as fp:
+        return pydicom.dcmread(fp, stop_before_pixels=True)
+
+
+def _segment_item(number: int, label: str) -> Dataset:
+    segment = Dataset()
+    segment.SegmentNumber = number
+    segment.SegmentLabel = label[:64]
+    segment.SegmentAlgorithmType = "MANUAL"
+    segment.SegmentedPropertyCategoryCodeSequence = DicomSequence([_code("49755003", "SCT", "Morphologically Altered Structure")])
+    segment.SegmentedPropertyTypeCodeSequence = DicomSequence([_code("49755003", "SCT", "Morphologically Altered Structure")])
+    return segment
+
+
+def _frame_item(source: Dataset, segment_number: int, position_index: int, with_position: bool) -> Dataset:
+    referenced = Dataset()
+    referenced.ReferencedSOPClassUID = source.SOPClassUID
+    referenced.ReferencedSOPInstanceUID = source.SOPInstanceUID
+    referenced.PurposeOfReferenceCodeSequence = DicomSequence([
+        _code("121322", "DCM", "Source image for image processing operation")
+    ])
+    derivation = Dataset()
+    derivation.DerivationCodeSequence = DicomSequence([_code("113076", "DCM", "Segmentation")])
+    derivation.SourceImageSequence = DicomSequence([referenced])
+
+    content = Dataset()
+    content.DimensionIndexValues = [segment_number, position_index] if with_position else [segment_number]
+    identification = Dataset()
+    identification.ReferencedSegmentNumber = segment_number
+
+    frame = Dataset()
+    frame.DerivationImageSequence = DicomSequence([derivation])
+    frame.FrameContentSequence = DicomSequence([content])
+    frame.SegmentIdentificationSequence = DicomSequence([identification])
+    if with_position:
+        position = Dataset()
+        position.ImagePositionPatient = source.ImagePositionPatient
+        frame.PlanePositionSequence = DicomSequence([position])
+    return frame
+
+
+def _dimension_index(pointer: int, functional_group: int, organization_uid: str, label: str) -> Dataset:
+    item = Dataset()
+    item.DimensionOrganizationUID = organization_uid
+    item.DimensionIndexPointer = pointer
+    item.FunctionalGroupPointer = functional_group
+    item.DimensionDescriptionLabel = label
+    return item
+
+
+def build_segmentation(sources: Sequence[SegSource], series_description: str = "Annotations") -> Dataset:
+    """Build a binary DICOM Segmentation from annotations on one or more instances of a series.
+
+    Each distinct label becomes a segment. One frame is written per
+    (segment, source instance) pair with a non-empty mask, on the source
+    image grid, and all frames are bit-packed together as the standard
+    requires for BitsAllocated 1.
+    """
+    if not sources:
+        raise SegmentationError("No source instances")
+    first = sources[0].dataset
+    rows, columns = int(first.Rows), int(first.Columns)
+    for source in sources:
+        if (int(source.dataset.Rows), int(source.dataset.Columns)) != (rows, columns):
+            raise SegmentationError("Source instances do not share the same image size")
+        if source.dataset.SeriesInstanceUID != first.SeriesInstanceUID:
+            raise SegmentationError("Source instances must belong to one series")
+
+    # Sort sources along the stack so frames follow slice order
+    with_position = all("ImagePositionPatient" in source.dataset for source in sources)
+    ordered = sorted(sources, key=lambda source: int(getattr(source.dataset, "InstanceNumber", 0) or 0))
+
+    segment_numbers: Dict[str, int] = {}
+    frames: List[Tuple[int, int, SegSource, np.ndarray]] = []
+    for position_index, source in enumerate(ordered, start=1):
+        for label, mask in annotation_masks(source.annotations, rows, columns).items():
+            number = segment_numbers.setdefault(label, len(segment_numbers) + 1)
+            frames.append((number, position_index, source, mask))
+    if not frames:
+        raise SegmentationError("Annotations contain no shapes that can be rasterized")
+    frames.sort(key=lambda frame: (frame[0], frame[1]))
+
+    now = datetime.now()
+    ds = Dataset()
+    ds.file_meta = FileMetaDataset()
+    ds.file_meta.MediaStorageSOPClassUID = SEGMENTATION_STORAGE
+    ds.file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+
+    for keyword in PATIENT_STUDY_ATTRIBUTES:
+        if keyword in first:
+            setattr(ds, keyword, first.data_element(keyword).value)
+    ds.SOPClassUID = SEGMENTATION_STORAGE
+    ds.SOPInstanceUID = ds.file_meta.MediaStorageSOPInstanceUID
+    ds.Modality = "SEG"
+    ds.SeriesInstanceUID = generate_uid()
+    ds.SeriesNumber = 9000
+    ds.SeriesDescription = series_description[:64]
+    ds.InstanceNumber = 1
+    ds.FrameOfReferenceUID = getattr(first, "FrameOfReferenceUID", None) or generate_uid()
+    ds.PositionReferenceIndicator = ""
+    ds.Manufacturer = SEG_MANUFACTURER
+    ds.ManufacturerModelName = SEG_MANUFACTURER
+    ds.DeviceSerialNumber = "1"
+    ds.SoftwareVersions = "1"
+    ds.ContentDate = ds.SeriesDate = now.strftime("%Y%m%d")
+    ds.ContentTime = ds.SeriesTime = now.strftime("%H%M%S")
+    ds.ContentLabel = "ANNOTATIONS"
+    ds.ContentDescription = series_description[:64]
+    ds.ContentCreatorName = ""
+    ds.InstanceCreationDate = ds.ContentDate
+    ds.InstanceCreationTime = ds.ContentTime
+
+    ds.ImageType = ["DERIVED", "PRIMARY"]
+    ds.SegmentationType = "BINARY"
+    ds.SamplesPerPixel = 1
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.BitsAllocated = 1
+    ds.BitsStored = 1
+    ds.HighBit = 0
+    ds.PixelRepresentation = 0
+    ds.LossyImageCompression = "00"
+    ds.Rows = rows
+    ds.Columns = columns
+    ds.NumberOfFrames = len(frames)
+
+    ds.SegmentSequence = DicomSequence([_segment_item(number, label) for label, number in segment_numbers.items()])
+
+    referenced_instances = []
+    for source in ordered:
+        item = Dataset()
+        item.ReferencedSOPClassUID = source.dataset.SOPClassUID
+        item.ReferencedSOPInstanceUID = source.dataset.SOPInstanceUID
+        referenced_instances.append(item)
+    referenced_series = Dataset()
+    referenced_series.SeriesInstanceUID = first.SeriesInstanceUID
+    referenced_series.ReferencedInstanceSequence = DicomSequence(referenced_instances)
+    ds.ReferencedSeriesSequence = DicomSequence([referenced_series])
+
+    organization_uid = generate_uid()
+    organization = Dataset()
+    organization.DimensionOrganizationUID = organization_uid
+    ds.DimensionOrganizationSequence = DicomSequence([organization])
+    dimension_indices = [_dimension_index(0x0062000B, 0x0062000A, organization_uid, "Segment Number")]
+    if with_position:
+        dimension_indices.append(_dimension_index(0x00200032, 0x00209113, organization_uid, "Image Position Patient"))
+    ds.DimensionIndexSequence = DicomSequence(dimension_indices)
+
+    shared = Dataset()
+    if "PixelSpacing" in first:
+        measures = Dataset()
+        measures.PixelSpacing = first.PixelSpacing
+        measures.SliceThickness = getattr(first, "SliceThickness", None) or 1
+        shared.PixelMeasuresSequence = DicomSequence([measures])
+    if "ImageOrientationPatient" in first:
+        orientation = Dataset()
+        orientation.ImageOrientationPatient = first.ImageOrientationPatient
+        shared.PlaneOrientationSequence = DicomSequence([orientation])
+    ds.SharedFunctionalGroupsSequence = DicomSequence([shared])
+    ds.PerFrameFunctionalGroupsSequence = DicomSequence([
+        _frame_item(source.dataset, number, position_index, with_position)
+        for number, position_index, source, _ in frames
+    ])
+
+    # Frames are packed back to back, least significant bit first, padded only at the very end
+    pixels = np.packbits(np.stack([mask for *_, mask in frames]).ravel(), bitorder="little")
+    ds.PixelData = pixels.tobytes()
+    ds["PixelData"].VR = "OB"
+    return ds
+
+
+def segmentation_bytes(ds: Dataset) -> bytes:
+    buffer = io.BytesIO()
+    ds.save_as(buffer, enforce_file_format=True)
+    return buffer.getvalue()
@@ -0,0 +1,186 @@
+import threading
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from fastapi import BackgroundTasks
+
+from app.core.database import SessionLocal
+from app.core.settings import EMBEDDING_DIR, EMBEDDING_ENABLED, EMBEDDING_SIZE
+from app.models.image import Image
+from app.services.instance_cache import get_instance_cache
+from app.services.tag_model import read_pixels
+
+# Candidate rows scored per matrix product, bounding the memory a search copies out of the map
+SEARCH_CHUNK_ROWS = 65536
+
+# Project id written for removed images; never matches a real project
+REMOVED_PROJECT_ID = -1
+
+# Replaced in tests
+session_factory = SessionLocal
+
+
+def describe_pixels(pixels: np.ndarray) -> np.ndarray:
+    """Descriptor of a downsampled image: zero-mean and unit length, so a dot product is a correlation"""
+    vector = pixels.astype(np.float32).ravel()
+    vector = vector - vector.mean()
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm > 0 else vector
+
+
+def embed_instance(fp: BinaryIO, size: int) -> np.ndarray:
+    return describe_pixels(read_pixels(fp, size))
+
+
+class EmbeddingIndex:
+    """Image descriptors in an append-only file, searched by brute force.
+
+    Each record is (image_id, project_id, float32 vector) at a fixed size,
+    and the file is mapped with np.memmap, so the index survives restarts
+    and lives in the page cache rather than the Python heap. Re-embedding or
+    removing an image appends a record; the newest record of an image wins.
+    Other processes' appends are seen on the next call. Vectors describe
+    `size` x `size` downsampled images.
+    """
+
+    def __init__(self, directory: str, size: int):
+        self.size = size
+        self.dimension = size * size
+        self.dtype = np.dtype([("image_id", "<i8"), ("project_id", "<i8"), ("vector", "<f4", (self.dimension,))])
+        self.path = Path(directory) / f"embeddings-{self.dimension}.f32"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._records = np.zeros(0, dtype=self.dtype)
+        self._latest: Dict[int, int] = {}  # Image id -> row of its newest record
+        self._live = np.zeros(0, dtype=bool)
+
+    def _refresh(self) -> None:
+        size = self.path.stat().st_size if self.path.exists() else 0
+        rows = size // self.dtype.itemsize
+        if rows == len(self._records):
+            return
+        records = np.memmap(self.path, dtype=self.dtype, mode="r", shape=(rows,))
+        start = len(self._records)
+        live = np.concatenate([self._live, np.ones(rows - start, dtype=bool)])
+        for row, image_id in enumerate(records["image_id"][start:].tolist(), start):
+            previous = self._latest.get(image_id)
+            if previous is not None:
+                live[previous] = False
+            self._latest[image_id] = row
+        self._records = records
+        self._live = live
+
+    def add(self, entries: Iterable[Tuple[int, int, np.ndarray]]) -> None:
+        """Store (image_id, project_id, vector) records with one append"""
+        entries = list(entries)
+        if not entries:
+            return
+        batch = np.zeros(len(entries), dtype=self.dtype)
+        for row, (image_id, project_id, vector) in enumerate(entries):
+            batch[row] = (image_id, project_id, vector)
+        with self._lock:
+            with open(self.path, "ab") as fp:
+                fp.write(batch.tobytes())
+            self._refresh()
+
+    def remove(self, image_ids: Iterable[int]) -> None:
+        self.add((image_id, REMOVED_PROJECT_ID, np.zeros(self.dimension, dtype=np.float32)) for image_id in image_ids)
+
+    def get(self, image_id: int) -> Optional[np.ndarray]:
+        with self._lock:
+            self._refresh()
+            row = self._latest.get(image_id)
+            if row is None or self._records[row]["project_id"] == REMOVED_PROJECT_ID:
+                return None
+            return np.array(self._records[row]["vector"])
+
+    def search(
+        self,
+        vector: np.ndarray,
+        project_ids: Sequence[int],
+        top_k: int,
+        exclude_image_id: Optional[int] = None
+    ) -> List[Tuple[int, float]]:
+        """The top_k (image_id, score) pairs among images of `project_ids`, best first"""
+        with self._lock:
+            self._refresh()
+            records = self._records
+            mask = self._live.copy()
+        if not len(records) or top_k < 1:
+            return []
+        mask &= np.isin(records["project_id"], np.asarray(project_ids, dtype=np.int64))
+        if exclude_image_id is not None:
+            mask &= records["image_id"] != exclude_image_id
+        candidates = np.flatnonzero(mask)
+
+        query = np.asarray(vector, dtype=np.float32)
+        best_rows = []
+        best_scores = []
+        for start in range(0, len(candidates), SEARCH_CHUNK_ROWS):
+            rows = candidates[start:start + SEARCH_CHUNK_ROWS]
+            scores = records["vector"][rows] @ query
+            keep = min(top_k, len(scores))
+            top = np.argpartition(-scores, keep - 1)[:keep]
+            best_rows.append(rows[top])
+            best_scores.append(scores[top])
+        if not best_rows:
+            return []
+        rows = np.concatenate(best_rows)
+        scores = np.concatenate(best_scores)
+        order = np.argsort(-scores, kind="stable")[:top_k]
+        image_ids = records["image_id"][rows[order]]
+        return [(int(image_id), float(score)) for image_id, score in zip(image_ids, scores[order])]
+
+
+_embedding_index: Optional[EmbeddingIndex] = None
+_embedding_index_lock = threading.Lock()
+
+
+def get_embedding_index() -> EmbeddingIndex:
+    """Get the process-wide embedding index"""
+    global _embedding_index
+    if _embedding_index is None:
+        with _embedding_index_lock:
+            if _embedding_index is None:
+                _embedding_index = EmbeddingIndex(EMBEDDING_DIR, EMBEDDING_SIZE)
+    return _embedding_index
+
+
+def embed_images(image_ids: Sequence[int]) -> int:
+    """Compute and store descriptors for images; returns how many were stored.
+
+    An instance uploaded into several folders is decoded once. Instances
+    that cannot be fetched or decoded are skipped with a warning.
+    """
+    db = session_factory()
+    try:
+        rows = db.query(Image.id, Image.project_id, Image.orthanc_id).filter(Image.id.in_(list(image_ids))).all()
+        images_by_instance: Dict[str, List[Tuple[int, int]]] = {}
+        for image_id, project_id, orthanc_id in rows:
+            images_by_instance.setdefault(orthanc_id, []).append((image_id, project_id))
+
+        index = get_embedding_index()
+        entries = []
+        cache = get_instance_cache()
+        for orthanc_id, images in images_by_instance.items():
+            try:
+                with cache.open(orthanc_id) as fp:
+                    vector = embed_instance(fp, index.size)
+            except Exception as e:
+                print(f"Warning: could not embed instance {orthanc_id}: {e}")
+                continue
+            entries.extend((image_id, project_id, vector) for image_id, project_id in images)
+        index.add(entries)
+        return len(entries)
+    except Exception as e:
+        print(f"Embedding failed for images {list(image_ids)}: {e}")
+        return 0
+    finally:
+        db.close()
+
+
+def schedule_embedding(background_tasks: BackgroundTasks, image_ids: Sequence[int]) -> None:
+    """Embed images after the upload response is sent, when EMBEDDING_ENABLED is set"""
+    if EMBEDDING_ENABLED and image_ids:
+        background_tasks.add_task(embed_images, list(image_ids))
@@ -0,0 +1,250 @@
+import os
+import secrets
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Iterator, Optional, Set
+
+from sqlalchemy import Select, update
+from sqlalchemy.orm import Session
+
+from app.core.database import SessionLocal
+from app.core.settings import EXPORT_DIR, EXPORT_STALE_MINUTES, EXPORT_TTL_HOURS, EXPORT_WORKERS
+from app.models.export_job import ExportJob, ExportStatus
+from app.models.image import Image
+from app.services.annotation_export import iter_bulk_export_zip, member_image_ids
+from app.services.dataset_export import build_dataset_shards
+from app.services.detection_export import iter_coco_json, iter_yolo_zip
+
+# Minimum seconds between progress writes while an export is running
+PROGRESS_INTERVAL = 1.0
+
+# Workers open their own sessions; tests point this at the test database
+session_factory = SessionLocal
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+# Jobs this process is building; never reaped, whatever their heartbeat says
+_active_jobs: Set[int] = set()
+
+
+def get_export_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=max(1, EXPORT_WORKERS), thread_name_prefix="export-job")
+        return _executor
+
+
+def export_image_ids(job: ExportJob) -> Select:
+    """Ids of the images an export covers, limited to projects the requester still belongs to"""
+    params = job.params or {}
+    return member_image_ids(
+        job.user_id,
+        project_id=job.project_id,
+        image_ids=params.get("image_ids"),
+        folder_id=params.get("folder_id")
+    )
+
+
+def artifact_path_for(job: ExportJob) -> Path:
+    # Random suffix so artifact names cannot be guessed from job ids
+    suffix = ARTIFACT_SUFFIXES.get(job.kind, ".zip")
+    return Path(EXPORT_DIR) / f"export_{job.id}_{secrets.token_hex(8)}{suffix}"
+
+
+def write_artifact(path: Path, chunks: Iterator[bytes]) -> None:
+    tmp_path = path.with_name(path.name + ".part")
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in chunks:
+                f.write(chunk)
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def build_annotation_zip(db: Session, job: ExportJob, image_ids: Select, path: Path, on_progress: Callable[[int], None]) -> None:
+    done = 0
+
+    def on_image(image: Image) -> None:
+        nonlocal done
+        done += 1
+        on_progress(done)
+
+    include_dicom = bool((job.params or {}).get("include_dicom"))
+    write_artifact(path, iter_bulk_export_zip(db, image_ids, include_dicom=include_dicom, on_image=on_image))
+
+
+def build_dataset(db: Session, job: ExportJob, image_ids: Select, path: Path, on_progress: Callable[[int], None]) -> None:
+    build_dataset_shards(db, image_ids, path, job.params or {}, on_progress)
+
+
+def build_coco(db: Session, job: ExportJob, image_ids: Select, path: Path, on_progress: Callable[[int], None]) -> None:
+    write_artifact(path, iter_coco_json(db, image_ids, on_progress))
+
+
+def build_yolo(db: Session, job: ExportJob, image_ids: Select, path: Path, on_progress: Callable[[int], None]) -> None:
+    write_artifact(path, iter_yolo_zip(db, image_ids, on_progress))
+
+
+# Artifact builders by job kind: each writes `path` (a file or a directory) and
+# calls on_progress regularly, since progress writes are the job's heartbeat
+EXPORT_BUILDERS = {
+    "annotations": build_annotation_zip,
+    "dataset": build_dataset,
+    "coco": build_coco,
+    "yolo": build_yolo,
+}
+ARTIFACT_SUFFIXES = {
+    "dataset": "",
+    "coco": ".json",
+}
+ARTIFACT_MEDIA_TYPES = {
+    "coco": "application/json",
+}
+
+
+def artifact_size(path: Path) -> int:
+    if path.is_dir():
+        return sum(child.stat().st_size for child in path.iterdir())
+    return path.stat().st_size
+
+
+def submit_export_job(job_id: int) -> None:
+    get_export_executor().submit(run_export_job, job_id)
+
+
+def run_export_job(job_id: int) -> None:
+    """Build an export artifact on disk, recording progress on the job row as it goes"""
+    db = session_factory()
+    progress_db = session_factory()
+    path = None
+    try:
+        job = db.get(ExportJob, job_id)
+        if job is None or job.status != ExportStatus.PENDING:
+            return
+
+        image_ids = export_image_ids(job)
+        _active_jobs.add(job_id)
+        job.status = ExportStatus.RUNNING
+        job.started_at = datetime.utcnow()
+        job.total = db.query(Image).filter(Image.id.in_(image_ids)).count()
+        db.commit()
+
+        path = artifact_path_for(job)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Progress goes through a second session: committing the main one would
+        # close the server-side cursors the export is still reading from
+        last_write = time.monotonic()
+
+        def on_progress(done: int) -> None:
+            nonlocal last_write
+            if time.monotonic() - last_write >= PROGRESS_INTERVAL:
+                progress_db.execute(update(ExportJob).where(ExportJob.id == job_id).values(progress=done))
+                progress_db.commit()
+                last_write = time.monotonic()
+
+        EXPORT_BUILDERS[job.kind](db, job, image_ids, path, on_progress)
+
+        completed_at = datetime.utcnow()
+        job.status = ExportStatus.COMPLETED
+        job.progress = job.total
+        job.artifact_path = str(path)
+        job.artifact_size = artifact_size(path)
+        job.completed_at = completed_at
+        job.expires_at = completed_at + timedelta(hours=EXPORT_TTL_HOURS)
+        db.commit()
+        print(f"Export job {job_id} completed: {job.total} images, {job.artifact_size} bytes")
+    except Exception as e:
+        print(f"Export job {job_id} failed: {e}")
+        db.rollback()
+        if path is not None and path.exists():
+            remove_path(path)
+        db.execute(update(ExportJob).where(ExportJob.id == job_id).values(
+            status=ExportStatus.FAILED,
+            error=str(e),
+            completed_at=datetime.utcnow()
+        ))
+        db.commit()
+    finally:
+        _active_jobs.discard(job_id)
+        progress_db.close()
+        db.close()
+
+
+def remove_path(path: Path) -> None:
+    if path.is_dir():
+        shutil.rmtree(path, ignore_errors=True)
+    else:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def remove_artifact(job: ExportJob) -> None:
+    if job.artifact_path:
+        remove_path(Path(job.artifact_path))
+    job.artifact_path = None
+
+
+def remove_project_exports(db: Session, project_id: int) -> None:
+    """Delete a project's export jobs and their artifacts, in the caller's transaction"""
+    for job in db.query(ExportJob).filter(ExportJob.project_id == project_id).all():
+        remove_artifact(job)
+        db.delete(job)
+
+
+def purge_expired_exports(db: Session) -> int:
+    """Delete artifacts past their expiry and mark their jobs expired"""
+    expired = db.query(ExportJob).filter(
+        ExportJob.status == ExportStatus.COMPLETED,
+        ExportJob.expires_at < datetime.utcnow()
+    ).all()
+    for job in expired:
+        remove_artifact(job)
+        job.status = ExportStatus.EXPIRED
+    if expired:
+        db.commit()
+    return len(expired)
+
+
+def fail_stale_exports(db: Session) -> int:
+    """Mark running jobs whose heartbeat stopped as failed.
+
+    Jobs live in an in-process pool, so a restart leaves them running
+    forever. Builders report progress regularly and every progress write
+    touches `updated_at`; a running job untouched for EXPORT_STALE_MINUTES
+    whose worker is gone is failed, its partial artifact removed, and it can
+    then be deleted like any other. Pending jobs are only waiting for a
+    worker and are never failed by age.
+    """
+    cutoff = datetime.utcnow() - timedelta(minutes=EXPORT_STALE_MINUTES)
+    stale_filter = (ExportJob.status == ExportStatus.RUNNING, ExportJob.updated_at < cutoff)
+    stale_ids = [
+        job_id for job_id, in db.query(ExportJob.id).filter(*stale_filter)
+        if job_id not in _active_jobs
+    ]
+    failed = 0
+    for job_id in stale_ids:
+        # Conditional, so a job that beat again since the query is left alone
+        claimed = db.execute(
+            update(ExportJob).where(ExportJob.id == job_id, *stale_filter).values(
+                status=ExportStatus.FAILED,
+                error="Export was interrupted before it finished",
+                completed_at=datetime.utcnow()
+            )
+        ).rowcount
+        db.commit()
+        if claimed:
+            failed += 1
+            for path in Path(EXPORT_DIR).glob(f"export_{job_id}_*"):
+                remove_path(path)
+    return failed
@@ -0,0 +1,233 @@
+import mmap
+import struct
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import BinaryIO, Iterator, List, Tuple
+
+import pydicom
+from pydicom.uid import DeflatedExplicitVRLittleEndian
+
+from app.services.instance_cache import get_instance_cache
+
+PIXEL_DATA_TAG = (0x7FE0, 0x0010)
+ITEM_TAG = (0xFFFE, 0xE000)
+SEQUENCE_DELIMITER_TAG = (0xFFFE, 0xE0DD)
+UNDEFINED_LENGTH = 0xFFFFFFFF
+FRAME_INDEX_CACHE_SIZE = 512
+
+# Media types for frames in each encapsulated transfer syntax (PS3.18 table 8.7.3-2)
+FRAME_MEDIA_TYPES = {
+    "1.2.840.10008.1.2.4.50": "image/jpeg",
+    "1.2.840.10008.1.2.4.51": "image/jpeg",
+    "1.2.840.10008.1.2.4.57": "image/jpeg",
+    "1.2.840.10008.1.2.4.70": "image/jpeg",
+    "1.2.840.10008.1.2.4.80": "image/jls",
+    "1.2.840.10008.1.2.4.81": "image/jls",
+    "1.2.840.10008.1.2.4.90": "image/jp2",
+    "1.2.840.10008.1.2.4.91": "image/jp2",
+    "1.2.840.10008.1.2.5": "image/x-dicom-rle",
+}
+
+Span = Tuple[int, int]
+
+
+class FrameIndexError(ValueError):
+    pass
+
+
+@dataclass
+class FrameIndex:
+    """Byte ranges of every frame inside a DICOM file.
+
+    Each frame is a list of (offset, length) spans: one span for native pixel
+    data, one per fragment for encapsulated pixel data.
+    """
+
+    transfer_syntax_uid: str
+    frames: List[List[Span]]
+
+    @property
+    def number_of_frames(self) -> int:
+        return len(self.frames)
+
+    @property
+    def media_type(self) -> str:
+        media_type = FRAME_MEDIA_TYPES.get(self.transfer_syntax_uid, "application/octet-stream")
+        return f"{media_type}; transfer-syntax={self.transfer_syntax_uid}"
+
+    def frame_length(self, number: int) -> int:
+        return sum(length for _, length in self.frames[number - 1])
+
+
+def _read_tag(buf, offset: int, little_endian: bool) -> Tuple[int, int]:
+    return struct.unpack_from("<HH" if little_endian else ">HH", buf, offset)
+
+
+def _pixel_data_header(buf, offset: int, implicit_vr: bool, little_endian: bool) -> Tuple[int, int]:
+    """Return (value offset, value length) of the Pixel Data element starting at `offset`"""
+    if _read_tag(buf, offset, little_endian) != PIXEL_DATA_TAG:
+        raise FrameIndexError("Pixel Data element not found where expected")
+    ulong = "<I" if little_endian else ">I"
+    if implicit_vr:
+        return offset + 8, struct.unpack_from(ulong, buf, offset + 4)[0]
+    return offset + 12, struct.unpack_from(ulong, buf, offset + 8)[0]
+
+
+def _read_fragments(buf, offset: int) -> Tuple[List[int], List[Span]]:
+    """Parse the Basic Offset Table and fragment items of encapsulated pixel data"""
+    items: List[Span] = []
+    item_starts: List[int] = []
+    while offset + 8 <= len(buf):
+        tag = _read_tag(buf, offset, True)
+        length = struct.unpack_from("<I", buf, offset + 4)[0]
+        if tag == SEQUENCE_DELIMITER_TAG:
+            break
+        if tag != ITEM_TAG or length == UNDEFINED_LENGTH:
+            raise FrameIndexError("Malformed encapsulated Pixel Data")
+        item_starts.append(offset)
+        items.append((offset + 8, length))
+        offset += 8 + length
+    if not items:
+        raise FrameIndexError("Encapsulated Pixel Data has no Basic Offset Table item")
+
+    bot_offset, bot_length = items[0]
+    basic_offsets = list(struct.unpack_from(f"<{bot_length // 4}I", buf, bot_offset)) if bot_length else []
+    first_fragment = item_starts[1] if len(item_starts) > 1 else offset
+    # Keep fragment item positions relative to the first fragment, as the offset table is
+    fragments = [(start - first_fragment, span) for start, span in zip(item_starts[1:], items[1:])]
+    return basic_offsets, fragments
+
+
+def _group_fragments(dataset, buf, basic_offsets: List[int], fragments, number_of_frames: int) -> List[List[Span]]:
+    positions = [position for position, _ in fragments]
+    spans = [span for _, span in fragments]
+
+    extended = getattr(dataset, "ExtendedOffsetTable", None)
+    if extended:
+        extended_offsets = list(struct.unpack(f"<{len(extended) // 8}Q", extended))
+        extended_lengths = list(struct.unpack(f"<{len(dataset.ExtendedOffsetTableLengths) // 8}Q",
+                                              dataset.ExtendedOffsetTableLengths))
+        lookup = {position: span for position, span in fragments}
+        return [
+            [(lookup[offset][0], length)]
+            for offset, length in zip(extended_offsets, extended_lengths)
+        ]
+
+    if basic_offsets:
+        boundaries = basic_offsets + [float("inf")]
+        frames: List[List[Span]] = [[] for _ in basic_offsets]
+        frame = 0
+        for position, span in zip(positions, spans):
+            while position >= boundaries[frame + 1]:
+                frame += 1
+            frames[frame].append(span)
+        return frames
+
+    if number_of_frames == 1:
+        return [spans]
+    if len(spans) == number_of_frames:
+        return [[span] for span in spans]
+
+    # No offset table and several fragments per frame: split on JPEG/JPEG 2000 start markers
+    frames = []
+    for span in spans:
+        start = bytes(buf[span[0]:span[0] + 4])
+        if not frames or start[:2] == b"\xff\xd8" or start == b"\xff\x4f\xff\x51":
+            frames.append([])
+        frames[-1].append(span)
+    if len(frames) != number_of_frames:
+        raise FrameIndexError("Cannot determine frame boundaries without an offset table")
+    return frames
+
+
+def build_frame_index(fp: BinaryIO) -> FrameIndex:
+    """Locate every frame of an instance file without decoding or copying pixel data"""
+    dataset = pydicom.dcmread(fp, stop_before_pixels=True)
+    pixel_offset = fp.tell()
+    transfer_syntax = str(dataset.file_meta.TransferSyntaxUID)
+    if transfer_syntax == DeflatedExplicitVRLittleEndian:
+        raise FrameIndexError("Deflated transfer syntax cannot be indexed in place")
+    implicit_vr, little_endian = dataset.original_encoding
+    number_of_frames = int(getattr(dataset, "NumberOfFrames", 1) or 1)
+
+    with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        if pixel_offset >= len(buf):
+            raise FrameIndexError("Instance has no Pixel Data")
+        value_offset, value_length = _pixel_data_header(buf, pixel_offset, implicit_vr, little_endian)
+
+        if value_length != UNDEFINED_LENGTH:
+            bits = dataset.Rows * dataset.Columns * int(getattr(dataset, "SamplesPerPixel", 1)) * dataset.BitsAllocated
+            if bits % 8:
+                raise FrameIndexError("Frames are not byte aligned")
+            frame_length = bits // 8
+            if frame_length * number_of_frames > value_length:
+                raise FrameIndexError("Pixel Data is shorter than the declared frames")
+            frames = [[(value_offset + i * frame_length, frame_length)] for i in range(number_of_frames)]
+        else:
+            basic_offsets, fragments = _read_fragments(buf, value_offset)
+            frames = _group_fragments(dataset, buf, basic_offsets, fragments, number_of_frames)
+
+    return FrameIndex(transfer_syntax_uid=transfer_syntax, frames=frames)
+
+
+_index_cache: "OrderedDict[str, FrameIndex]" = OrderedDict()
+_index_lock = threading.Lock()
+
+
+def get_frame_index(orthanc_id: str) -> FrameIndex:
+    """Frame index of a cached instance, parsed once and kept in a small LRU"""
+    with _index_lock:
+        index = _index_cache.get(orthanc_id)
+        if index is not None:
+            _index_cache.move_to_end(orthanc_id)
+            return index
+    with get_instance_cache().open(orthanc_id) as fp:
+        index = build_frame_index(fp)
+    with _index_lock:
+        _index_cache[orthanc_id] = index
+        while len(_index_cache) > FRAME_INDEX_CACHE_SIZE:
+            _index_cache.popitem(last=False)
+    return index
+
+
+def iter_frames(orthanc_id: str, index: FrameIndex, numbers: List[int], chunk_size: int = 1024 * 1024) -> Iterator[Iterator[bytes]]:
+    """Yield one chunk iterator per requested frame, read from a memory map of the cached file.
+
+    Only the bytes of the requested frames are paged in and copied out; the
+    rest of the instance is never read.
+    """
+    with get_instance_cache().open(orthanc_id) as fp, \
+            mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        for number in numbers:
+            yield _iter_spans(buf, index.frames[number - 1], chunk_size)
+
+
+def _iter_spans(buf, spans: List[Span], chunk_size: int) -> Iterator[bytes]:
+    for offset, length in spans:
+        end = offset + length
+        while offset < end:
+            step = min(chunk_size, end - offset)
+            yield buf[offset:offset + step]
+            offset += step
+
+
+def parse_frame_numbers(frame_list: str) -> List[int]:
+    """Parse '3', '2-7' or '1,4,6-8' into 1-based frame numbers"""
+    numbers: List[int] = []
+    for item in frame_list.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        start, sep, end = item.partition("-")
+        try:
+            first = int(start)
+            last = int(end) if sep else first
+        except ValueError:
+            raise FrameIndexError(f"Invalid frame range: {item}")
+        if first < 1 or last < first:
+            raise FrameIndexError(f"Invalid frame range: {item}")
+        numbers.extend(range(first, last + 1))
+    if not numbers:
+        raise FrameIndexError("No frames requested")
+    return numbers
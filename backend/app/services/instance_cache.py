@@ -0,0 +1,165 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Iterator, Optional
+
+from app.core.settings import INSTANCE_CACHE_DIR, INSTANCE_CACHE_MAX_MB, INSTANCE_PREFETCH_WORKERS
+from app.utils.orthanc import get_orthanc_client
+
+_ORTHANC_ID_RE = re.compile(r"^[A-Za-z0-9-]+$")
+
+
+class InstanceCache:
+    """Disk-backed LRU cache of DICOM instance files pulled from Orthanc.
+
+    Files are keyed by Orthanc instance id. Concurrent requests for the same
+    instance share a single download, and ``prefetch`` warms the cache on a
+    small worker pool so the next slices of a stack are local before the
+    viewer asks for them.
+    """
+
+    def __init__(self, directory: str, max_bytes: int, workers: int):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+        self._total_bytes = 0
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="instance-prefetch")
+        self._load_existing()
+
+    def _load_existing(self) -> None:
+        files = sorted(self.directory.glob("*.dcm"), key=lambda p: p.stat().st_mtime)
+        for path in files:
+            size = path.stat().st_size
+            self._entries[path.stem] = size
+            self._total_bytes += size
+
+    def path_for(self, orthanc_id: str) -> Path:
+        if not _ORTHANC_ID_RE.match(orthanc_id):
+            raise ValueError(f"Invalid Orthanc instance id: {orthanc_id}")
+        return self.directory / f"{orthanc_id}.dcm"
+
+    def is_cached(self, orthanc_id: str) -> bool:
+        with self._lock:
+            return orthanc_id in self._entries
+
+    def get_path(self, orthanc_id: str) -> Path:
+        """Return the local path of an instance, downloading it if needed"""
+        path = self.path_for(orthanc_id)
+        with self._lock:
+            if orthanc_id in self._entries and path.exists():
+                self._entries.move_to_end(orthanc_id)
+                return path
+            future = self._inflight.get(orthanc_id)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[orthanc_id] = future
+        if not owner:
+            return future.result()
+
+        try:
+            self._download(orthanc_id, path)
+            future.set_result(path)
+            return path
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(orthanc_id, None)
+
+    def _download(self, orthanc_id: str, path: Path) -> None:
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.part")
+        size = 0
+        try:
+            with open(tmp_path, "wb") as f:
+                for chunk in get_orthanc_client().iter_dicom_file(orthanc_id):
+                    f.write(chunk)
+                    size += len(chunk)
+            os.replace(tmp_path, path)
+        finally:
+            if tmp_path.exists():
+                tmp_path.unlink()
+        with self._lock:
+            previous = self._entries.pop(orthanc_id, 0)
+            self._entries[orthanc_id] = size
+            self._total_bytes += size - previous
+            self._evict_locked(keep=orthanc_id)
+
+    def _evict_locked(self, keep: Optional[str] = None) -> None:
+        while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+            oldest, size = next(iter(self._entries.items()))
+            if oldest == keep:
+                break
+            self._entries.pop(oldest)
+            self._total_bytes -= size
+            try:
+                (self.directory / f"{oldest}.dcm").unlink()
+            except FileNotFoundError:
+                pass
+
+    def prefetch(self, orthanc_ids: Iterable[str]) -> None:
+        """Warm the cache in the background for the given instances"""
+        for orthanc_id in orthanc_ids:
+            with self._lock:
+                if orthanc_id in self._entries or orthanc_id in self._inflight:
+                    continue
+            self._executor.submit(self._prefetch_one, orthanc_id)
+
+    def _prefetch_one(self, orthanc_id: str) -> None:
+        try:
+            self.get_path(orthanc_id)
+        except Exception as e:
+            print(f"Warning: prefetch of instance {orthanc_id} failed: {e}")
+
+    def open(self, orthanc_id: str) -> BinaryIO:
+        """Open a cached instance for reading, re-fetching it if it was evicted meanwhile"""
+        try:
+            return open(self.get_path(orthanc_id), "rb")
+        except FileNotFoundError:
+            with self._lock:
+                size = self._entries.pop(orthanc_id, 0)
+                self._total_bytes -= size
+            return open(self.get_path(orthanc_id), "rb")
+
+    def iter_file(self, orthanc_id: str, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+        """Stream a cached instance file in chunks"""
+        yield from read_chunks(self.open(orthanc_id), chunk_size)
+
+
+def read_chunks(f: BinaryIO, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+    """Read an open file in chunks and close it afterwards.
+
+    The handle keeps the data readable even if the cache evicts (unlinks)
+    the file while it is being streamed.
+    """
+    with f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+_instance_cache: Optional[InstanceCache] = None
+_instance_cache_lock = threading.Lock()
+
+
+def get_instance_cache() -> InstanceCache:
+    """Get the process-wide instance cache"""
+    global _instance_cache
+    if _instance_cache is None:
+        with _instance_cache_lock:
+            if _instance_cache is None:
+                _instance_cache = InstanceCache(
+                    INSTANCE_CACHE_DIR,
+                    INSTANCE_CACHE_MAX_MB * 1024 * 1024,
+                    INSTANCE_PREFETCH_WORKERS,
+                )
+    return _instance_cache
@@ -0,0 +1,116 @@
+import hashlib
+import io
+import zlib
+from typing import Any, Dict, Optional
+
+import numpy as np
+from sqlalchemy.orm import Session, defer
+
+from app.models.annotation import AnnotationMask
+
+MASK_REFERENCE_ENCODING = "mask-ref"
+ALLOWED_MASK_DTYPES = ("bool", "uint8", "uint16", "int16", "uint32", "int32")
+ZLIB_LEVEL = 6
+
+
+class MaskFormatError(ValueError):
+    pass
+
+
+def normalize_mask(array: np.ndarray) -> np.ndarray:
+    if array.dtype.name not in ALLOWED_MASK_DTYPES:
+        raise MaskFormatError(f"Unsupported mask dtype {array.dtype.name}; use one of {', '.join(ALLOWED_MASK_DTYPES)}")
+    if array.ndim not in (1, 2, 3) or array.size == 0:
+        raise MaskFormatError("Masks must be non-empty 1D, 2D or 3D arrays")
+    # Stored little-endian and C-ordered so the digest does not depend on the uploader's layout
+    return np.ascontiguousarray(array, dtype=array.dtype.newbyteorder("<"))
+
+
+def encode_mask(array: np.ndarray) -> Dict[str, Any]:
+    """Compress a mask: binary masks are bit-packed first (8 pixels per byte), then zlib'd"""
+    array = normalize_mask(array)
+    raw = array.tobytes()
+    if array.dtype == np.bool_ or (array.dtype.kind == "u" and array.max() <= 1):
+        encoding = "packbits+zlib"
+        payload = zlib.compress(np.packbits(array.ravel().astype(bool), bitorder="little").tobytes(), ZLIB_LEVEL)
+    else:
+        encoding = "zlib"
+        payload = zlib.compress(raw, ZLIB_LEVEL)
+    return {
+        "shape": list(array.shape),
+        "dtype": array.dtype.name,
+        "encoding": encoding,
+        "sha256": hashlib.sha256(raw).hexdigest(),
+        "nbytes": len(raw),
+        "payload": payload,
+    }
+
+
+def decode_mask(mask: AnnotationMask) -> np.ndarray:
+    shape = tuple(mask.shape)
+    dtype = np.dtype(mask.dtype).newbyteorder("<")
+    data = zlib.decompress(mask.payload)
+    if mask.encoding == "packbits+zlib":
+        count = int(np.prod(shape))
+        bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8), count=count, bitorder="little")
+        return bits.astype(dtype).reshape(shape)
+    if mask.encoding == "zlib":
+        return np.frombuffer(data, dtype=dtype).reshape(shape)
+    raise MaskFormatError(f"Unknown mask encoding {mask.encoding}")
+
+
+def load_npy(body: bytes) -> np.ndarray:
+    try:
+        return np.load(io.BytesIO(body), allow_pickle=False)
+    except Exception as e:
+        raise MaskFormatError(f"Body is not a valid .npy array: {e}")
+
+
+def load_raw(body: bytes, shape: str, dtype: str) -> np.ndarray:
+    try:
+        dims = tuple(int(dim) for dim in shape.split(","))
+        array = np.frombuffer(body, dtype=np.dtype(dtype).newbyteorder("<"))
+        return array.reshape(dims)
+    except (TypeError, ValueError) as e:
+        raise MaskFormatError(f"Body does not match shape {shape} and dtype {dtype}: {e}")
+
+
+def to_npy(array: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.save(buffer, array, allow_pickle=False)
+    return buffer.getvalue()
+
+
+def store_mask(db: Session, annotation_id: int, array: np.ndarray, user_id: int) -> AnnotationMask:
+    """Store a mask for an annotation, reusing an identical one already stored (e.g. by an autosave)"""
+    encoded = encode_mask(array)
+    existing = find_mask(db, annotation_id, encoded["sha256"], encoded["shape"], encoded["dtype"])
+    if existing is not None:
+        return existing
+    mask = AnnotationMask(annotation_id=annotation_id, created_by=user_id, **encoded)
+    db.add(mask)
+    db.commit()
+    db.refresh(mask)
+    return mask
+
+
+def find_mask(db: Session, annotation_id: int, sha256: str, shape, dtype: str) -> Optional[AnnotationMask]:
+    candidates = db.query(AnnotationMask).options(defer(AnnotationMask.payload)).filter(
+        AnnotationMask.annotation_id == annotation_id,
+        AnnotationMask.sha256 == sha256
+    ).all()
+    for mask in candidates:
+        if mask.shape == shape and mask.dtype == dtype:
+            return mask
+    return None
+
+
+def mask_reference(mask: AnnotationMask) -> Dict[str, Any]:
+    """The object to place in annotation data where the mask belongs"""
+    return {
+        "encoding": MASK_REFERENCE_ENCODING,
+        "mask_id": mask.id,
+        "shape": mask.shape,
+        "dtype": mask.dtype,
+        "sha256": mask.sha256,
+    }
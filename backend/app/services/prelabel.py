@@ -0,0 +1,156 @@
+import multiprocessing
+import tempfile
+import threading
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from fastapi import BackgroundTasks
+from sqlalchemy import exists
+
+from app.core.database import SessionLocal
+from app.core.settings import (
+    DICOM_SPOOL_MAX_MB,
+    PRELABEL_BATCH_SIZE,
+    PRELABEL_ENABLED,
+    PRELABEL_MIN_CONFIDENCE,
+    PRELABEL_PROCESSES,
+    PRELABEL_TOP_K,
+)
+from app.models.annotation import Annotation
+from app.models.image import Image
+from app.services.annotation_bulk import bulk_write_annotations
+from app.services.tag_model import TagModel, load_tag_model, read_pixels, tag_model_configured, top_suggestions
+from app.utils.orthanc import get_orthanc_client
+
+PRELABEL_SOURCE = "prelabel"
+
+# Replaced in tests
+session_factory = SessionLocal
+
+_worker_model: Optional[TagModel] = None
+
+
+def _get_worker_model() -> TagModel:
+    # Loaded once per worker process and reused for every batch it scores
+    global _worker_model
+    if _worker_model is None:
+        _worker_model = load_tag_model()
+    return _worker_model
+
+
+def score_batch(orthanc_ids: List[str]) -> Dict[str, Any]:
+    """Score a batch of instances in one forward pass; runs in a worker process.
+
+    Instances that cannot be fetched or decoded are reported in `failed`
+    and left out of the pass instead of failing the batch.
+    """
+    model = _get_worker_model()
+    client = get_orthanc_client()
+    inputs = []
+    scored = []
+    failed = []
+    for orthanc_id in orthanc_ids:
+        try:
+            with tempfile.SpooledTemporaryFile(max_size=DICOM_SPOOL_MAX_MB * 1024 * 1024) as dicom_file:
+                for chunk in client.iter_dicom_file(orthanc_id):
+                    dicom_file.write(chunk)
+                dicom_file.seek(0)
+                inputs.append(read_pixels(dicom_file, model.input_size))
+            scored.append(orthanc_id)
+        except Exception as e:
+            failed.append({"orthanc_id": orthanc_id, "error": str(e)})
+    probabilities = model.predict(np.stack(inputs)).tolist() if inputs else []
+    return {
+        "labels": model.labels,
+        "model": model.version,
+        "scores": dict(zip(scored, probabilities)),
+        "failed": failed,
+    }
+
+
+_pool: Optional[Executor] = None
+_pool_lock = threading.Lock()
+
+
+def get_prelabel_pool() -> Executor:
+    """Process pool kept for the life of the server so each worker loads the model once"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=max(1, PRELABEL_PROCESSES),
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+    return _pool
+
+
+def prelabel_items(result: Dict[str, Any], images_by_instance: Dict[str, List[int]]) -> List[Dict[str, Any]]:
+    items = []
+    for orthanc_id, probabilities in result["scores"].items():
+        suggestions = top_suggestions(result["labels"], np.asarray(probabilities), PRELABEL_TOP_K, PRELABEL_MIN_CONFIDENCE)
+        if not suggestions:
+            continue
+        for image_id in images_by_instance[orthanc_id]:
+            items.append({
+                "image_id": image_id,
+                "tags": [suggestion["tag"] for suggestion in suggestions],
+                "data": {
+                    "annotations": [],
+                    "prelabel": {"source": PRELABEL_SOURCE, "model": result["model"], "suggestions": suggestions},
+                },
+            })
+    return items
+
+
+def prelabel_images(image_ids: Sequence[int], user_id: int) -> int:
+    """Write the tag model's suggestions as PENDING annotations on newly uploaded images.
+
+    Images that already have an annotation are skipped. Instances are
+    scored in batches of PRELABEL_BATCH_SIZE on the process pool, and each
+    batch's annotations are written with one bulk insert as it completes.
+    Returns the number of annotations written.
+    """
+    db = session_factory()
+    written = 0
+    try:
+        rows = db.query(Image.id, Image.orthanc_id).filter(
+            Image.id.in_(list(image_ids)),
+            ~exists().where(Annotation.image_id == Image.id)
+        ).all()
+        # The same instance can be uploaded into several folders; score it once
+        images_by_instance: Dict[str, List[int]] = {}
+        for image_id, orthanc_id in rows:
+            images_by_instance.setdefault(orthanc_id, []).append(image_id)
+        instances = list(images_by_instance)
+        batch_size = max(1, PRELABEL_BATCH_SIZE)
+
+        pool = get_prelabel_pool()
+        futures = [
+            pool.submit(score_batch, instances[start:start + batch_size])
+            for start in range(0, len(instances), batch_size)
+        ]
+        for future in futures:
+            result = future.result()
+            for failure in result["failed"]:
+                print(f"Warning: pre-labeling skipped instance {failure['orthanc_id']}: {failure['error']}")
+            items = prelabel_items(result, images_by_instance)
+            if items:
+                results = bulk_write_annotations(db, items, user_id, prelabel=True)
+                written += sum(1 for item in results if item["status"] == "created")
+    except Exception as e:
+        print(f"Pre-labeling failed for images {list(image_ids)}: {e}")
+    finally:
+        db.close()
+    return written
+
+
+def schedule_prelabel(background_tasks: BackgroundTasks, image_ids: Sequence[int], user_id: int) -> None:
+    """Pre-label images after the upload response is sent, when PRELABEL_ENABLED is set and a model is configured"""
+    if not PRELABEL_ENABLED or not image_ids:
+        return
+    if not tag_model_configured():
+        print("Warning: PRELABEL_ENABLED is set but TAG_MODEL_PATH is not; skipping pre-labeling")
+        return
+    background_tasks.add_task(prelabel_images, list(image_ids), user_id)
@@ -0,0 +1,164 @@
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import case, delete, exists, func, insert, literal_column, select
+from sqlalchemy.orm import Session
+
+from app.models.annotation import Annotation, ReviewStatus
+from app.models.folder import Folder
+from app.models.image import Image
+from app.models.progress import ProgressCount
+from app.models.user import User
+from app.utils.upsert import apply_count_deltas
+
+PROGRESS_KEYS = ("project_id", "folder_id", "user_id")
+PROGRESS_COLUMNS = ("images", "annotated", "approved")
+
+
+class ImageProgress(NamedTuple):
+    """What an image contributes to the counters"""
+    project_id: int
+    folder_id: int  # 0 outside any folder
+    user_id: int  # Assignee, 0 when unassigned
+    annotated: bool
+    approved: bool
+
+
+def _state_columns():
+    # Pre-labels are model suggestions and do not make an image annotated
+    by_people = (Annotation.image_id == Image.id, Annotation.is_prelabel.is_(False))
+    annotated = exists().where(*by_people)
+    approved = exists().where(*by_people, Annotation.review_status == ReviewStatus.APPROVED)
+    # Literal zeros, so the expressions in GROUP BY match the selected ones under any driver
+    none = literal_column("0")
+    return (
+        Image.project_id,
+        func.coalesce(Image.folder_id, none),
+        func.coalesce(Image.assigned_user_id, none),
+        annotated,
+        approved,
+    )
+
+
+def progress_snapshot(db: Session, image_ids: Iterable[int], lock: bool = True) -> Dict[int, ImageProgress]:
+    """Current progress state of images.
+
+    Taken before a write and passed to record_progress afterwards. The image
+    rows are locked FOR UPDATE, so two transactions changing one image (say,
+    both adding its first annotation) take turns instead of both counting it.
+    """
+    ids = list(image_ids)
+    if not ids:
+        return {}
+    statement = select(Image.id, *_state_columns()).where(Image.id.in_(ids))
+    if lock:
+        statement = statement.with_for_update(of=Image)
+    return {row[0]: ImageProgress(*row[1:]) for row in db.execute(statement)}
+
+
+def record_progress(db: Session, before: Dict[int, ImageProgress], image_ids: Iterable[int]) -> None:
+    """Move the counters of written images from their `before` state to their current one.
+
+    Pending changes are flushed first; images missing from `before` are new
+    and images no longer found were deleted. Runs in the caller's transaction.
+    """
+    db.flush()
+    after = progress_snapshot(db, image_ids, lock=False)
+    totals: Dict[str, Dict[Tuple[int, int, int], int]] = {column: {} for column in PROGRESS_COLUMNS}
+    for states, sign in ((before.values(), -1), (after.values(), 1)):
+        for state in states:
+            key = (state.project_id, state.folder_id, state.user_id)
+            for column, counted in zip(PROGRESS_COLUMNS, (True, state.annotated, state.approved)):
+                if counted:
+                    totals[column][key] = totals[column].get(key, 0) + sign
+    for column in PROGRESS_COLUMNS:
+        deltas = {key: delta for key, delta in totals[column].items() if delta}
+        apply_count_deltas(db, ProgressCount, PROGRESS_KEYS, column, deltas)
+
+
+def remove_project_progress(db: Session, project_id: int) -> None:
+    db.execute(delete(ProgressCount).where(ProgressCount.project_id == project_id))
+
+
+def rebuild_progress(db: Session, project_id: Optional[int] = None) -> int:
+    """Recompute the counters of one project (or all) with a single GROUP BY; returns the rows written"""
+    project, folder, user, annotated, approved = _state_columns()
+    statement = select(
+        project, folder, user,
+        func.count(Image.id),
+        func.sum(case((annotated, 1), else_=0)),
+        func.sum(case((approved, 1), else_=0))
+    ).group_by(project, folder, user)
+    removed = delete(ProgressCount)
+    if project_id is not None:
+        statement = statement.where(Image.project_id == project_id)
+        removed = removed.where(ProgressCount.project_id == project_id)
+    rows = [
+        {
+            "project_id": row_project, "folder_id": row_folder, "user_id": row_user,
+            "images": images, "annotated": int(annotated_count), "approved": int(approved_count), "is_active": True,
+        }
+        for row_project, row_folder, row_user, images, annotated_count, approved_count in db.execute(statement)
+    ]
+    db.execute(removed)
+    if rows:
+        db.execute(insert(ProgressCount), rows)
+    db.commit()
+    return len(rows)
+
+
+def _totals(rows: Iterable[Dict[str, int]]) -> Dict[str, int]:
+    totals = {"images": 0, "assigned": 0, "annotated": 0, "approved": 0}
+    for row in rows:
+        for column in PROGRESS_COLUMNS:
+            totals[column] += row[column]
+        if row["user_id"]:
+            totals["assigned"] += row["images"]
+    return totals
+
+
+def project_progress(db: Session, project_id: int) -> Dict[str, Any]:
+    """Image totals of a project, per folder and per assignee, read from the counters.
+
+    There is one counter row per folder and assignee that has images, so
+    this reads O(folders x assignees) rows whatever the number of images.
+    """
+    rows = [
+        dict(zip(("folder_id", "user_id", *PROGRESS_COLUMNS), row))
+        for row in db.query(
+            ProgressCount.folder_id, ProgressCount.user_id,
+            ProgressCount.images, ProgressCount.annotated, ProgressCount.approved
+        ).filter(ProgressCount.project_id == project_id, ProgressCount.images > 0)
+    ]
+    by_folder: Dict[int, List[Dict[str, int]]] = {}
+    by_user: Dict[int, List[Dict[str, int]]] = {}
+    for row in rows:
+        by_folder.setdefault(row["folder_id"], []).append(row)
+        if row["user_id"]:
+            by_user.setdefault(row["user_id"], []).append(row)
+
+    folders = db.query(Folder.id, Folder.name).filter(Folder.project_id == project_id).order_by(Folder.id).all()
+    folder_rows = [
+        {"folder_id": folder_id, "name": name, **_totals(by_folder.get(folder_id, []))}
+        for folder_id, name in folders
+    ]
+    if 0 in by_folder:
+        folder_rows.insert(0, {"folder_id": None, "name": None, **_totals(by_folder[0])})
+
+    emails = dict(db.query(User.id, User.email).filter(User.id.in_(list(by_user)))) if by_user else {}
+    user_rows = []
+    for user_id in sorted(by_user):
+        totals = _totals(by_user[user_id])
+        del totals["assigned"]
+        user_rows.append({"user_id": user_id, "email": emails.get(user_id), **totals})
+
+    return {"project_id": project_id, **_totals(rows), "folders": folder_rows, "users": user_rows}
+
+
+if __name__ == "__main__":
+    from app.core.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        print(f"Wrote {rebuild_progress(session)} progress rows")
+    finally:
+        session.close()
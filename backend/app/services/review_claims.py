@@ -0,0 +1,41 @@
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from app.core.settings import REVIEW_CLAIM_MINUTES
+from app.models.annotation import Annotation, ReviewStatus
+
+# Statuses that wait for a reviewer: new annotations and ones revised after a rejection
+AWAITING_REVIEW = (ReviewStatus.PENDING, ReviewStatus.REVISED)
+
+
+def claim_ttl() -> timedelta:
+    return timedelta(minutes=REVIEW_CLAIM_MINUTES)
+
+
+def holds_review_claim(ann: Annotation, reviewer_id: int, now: Optional[datetime] = None) -> bool:
+    """Whether the reviewer holds an unexpired claim on an annotation that still awaits review"""
+    claimed_at = ann.review_claimed_at
+    if claimed_at is None or ann.reviewer_id != reviewer_id or ann.user_id == reviewer_id:
+        return False
+    if claimed_at.tzinfo is None:  # SQLite drops the zone
+        claimed_at = claimed_at.replace(tzinfo=timezone.utc)
+    now = now or datetime.now(timezone.utc)
+    return ann.review_status in AWAITING_REVIEW and claimed_at >= now - claim_ttl()
+
+
+def review_status_error(ann: Annotation, status: ReviewStatus, user_id: int) -> Optional[str]:
+    """Why the user may not set an annotation's review status, or None when they may.
+
+    Approving and rejecting go through the review queue: they need a live
+    claim from /reviews/claim, which authors never get on their own work.
+    Authors mark their rejected annotations as revised to send them back.
+    """
+    if status in (ReviewStatus.APPROVED, ReviewStatus.REJECTED):
+        if not holds_review_claim(ann, user_id):
+            return "Approving or rejecting needs a review claim from /reviews/claim"
+    elif status == ReviewStatus.REVISED:
+        if ann.user_id != user_id or ann.review_status != ReviewStatus.REJECTED:
+            return "Only the author can mark a rejected annotation as revised"
+    elif status != ann.review_status:
+        return "Annotations cannot be sent back to pending"
+    return None
@@ -0,0 +1,49 @@
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from app.models.annotation import ReviewStatus
+from app.models.review import ReviewStatusCount
+from app.utils.upsert import apply_count_deltas
+
+# (project_id, old status or None for a new annotation, new status) for one annotation write
+ReviewChange = Tuple[int, Optional[ReviewStatus], Optional[ReviewStatus]]
+
+
+def _value(status) -> Optional[str]:
+    if status is None:
+        return None
+    return status.value if isinstance(status, ReviewStatus) else ReviewStatus(status).value
+
+
+def record_review_changes(db: Session, changes: Iterable[ReviewChange]) -> None:
+    """Move per-project review status counters for annotation writes, in the caller's transaction.
+
+    Callers leave out pre-label annotations, which are not counted.
+    """
+    totals: Dict[Tuple[int, str], int] = {}
+    for project_id, old_status, new_status in changes:
+        old, new = _value(old_status), _value(new_status)
+        if project_id is None or old == new:
+            continue
+        if old is not None:
+            totals[(project_id, old)] = totals.get((project_id, old), 0) - 1
+        if new is not None:
+            totals[(project_id, new)] = totals.get((project_id, new), 0) + 1
+    apply_count_deltas(db, ReviewStatusCount, ("project_id", "status"), "count", totals)
+
+
+def review_counts(db: Session, project_id: int) -> Dict[str, int]:
+    """Annotations per review status, with every status present"""
+    counts = {status.value: 0 for status in ReviewStatus}
+    counts.update(
+        db.query(ReviewStatusCount.status, ReviewStatusCount.count)
+        .filter(ReviewStatusCount.project_id == project_id)
+        .all()
+    )
+    return counts
+
+
+def remove_project_review_counts(db: Session, project_id: int) -> None:
+    db.execute(delete(ReviewStatusCount).where(ReviewStatusCount.project_id == project_id))
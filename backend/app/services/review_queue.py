@@ -0,0 +1,139 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Sequence, Tuple
+
+from sqlalchemy import and_, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.models.annotation import Annotation
+from app.models.image import Image
+from app.services.annotation_bulk import bulk_write_annotations
+from app.services.review_claims import AWAITING_REVIEW, claim_ttl, holds_review_claim
+
+# Most annotations claimed or decided per request
+MAX_REVIEW_BATCH = 500
+
+
+class ReviewClaimError(Exception):
+    """Decisions were sent for annotations the reviewer does not hold"""
+
+    def __init__(self, failures: List[Dict[str, Any]]):
+        super().__init__("Some annotations are not claimed by this reviewer")
+        self.failures = failures
+
+
+def claim_reviews(
+    db: Session,
+    reviewer_id: int,
+    project_id: int,
+    count: int,
+    shards: int = 1,
+    shard: int = 0
+) -> List[int]:
+    """Claim up to `count` annotations awaiting review; returns their ids, oldest first.
+
+    Claims the reviewer still holds come first, so asking again (after a
+    reload) does not grab more work. New ones are picked with FOR UPDATE
+    SKIP LOCKED, so concurrent reviewers split the queue without waiting on
+    each other, and reviewers never get their own annotations. With
+    `shards` > 1 only annotations whose id falls in `shard` are taken,
+    letting a team divide a project's queue up front.
+    """
+    now = datetime.now(timezone.utc)
+    # Pre-labels are model suggestions, not work awaiting review
+    in_project = and_(
+        Annotation.image_id.in_(select(Image.id).where(Image.project_id == project_id)),
+        Annotation.is_prelabel.is_(False)
+    )
+    held = list(db.execute(
+        select(Annotation.id).where(
+            in_project,
+            Annotation.review_status.in_(AWAITING_REVIEW),
+            Annotation.reviewer_id == reviewer_id,
+            Annotation.review_claimed_at >= now - claim_ttl()
+        ).order_by(Annotation.id).limit(count)
+    ).scalars())
+
+    claimable = [
+        in_project,
+        Annotation.review_status.in_(AWAITING_REVIEW),
+        Annotation.user_id != reviewer_id,
+        or_(Annotation.review_claimed_at.is_(None), Annotation.review_claimed_at < now - claim_ttl()),
+    ]
+    if shards > 1:
+        claimable.append(Annotation.id % shards == shard)
+    wanted = count - len(held)
+    claimed: List[int] = []
+    if wanted > 0:
+        candidates = list(db.execute(
+            select(Annotation.id).where(*claimable).order_by(Annotation.id).limit(wanted).with_for_update(skip_locked=True)
+        ).scalars())
+        if candidates:
+            # Conditional, for databases without row locks
+            db.execute(
+                update(Annotation)
+                .where(Annotation.id.in_(candidates), *claimable)
+                .values(reviewer_id=reviewer_id, review_claimed_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            claimed = list(db.execute(
+                select(Annotation.id).where(
+                    Annotation.id.in_(candidates),
+                    Annotation.reviewer_id == reviewer_id,
+                    Annotation.review_claimed_at == now
+                )
+            ).scalars())
+    db.commit()
+    return sorted(held + claimed)
+
+
+def decide_reviews(db: Session, reviewer_id: int, decisions: Sequence[Tuple[int, str]]) -> List[Dict[str, Any]]:
+    """Approve or reject claimed annotations in one transaction.
+
+    Every annotation must be held by the reviewer under a claim that has not
+    expired, otherwise nothing is written and ReviewClaimError lists the
+    offenders. The decisions are then written as one atomic bulk update, so
+    each is a new version with history, counters and live events like any
+    other review.
+    """
+    ids = [annotation_id for annotation_id, _ in decisions]
+    rows = {
+        ann.id: ann for ann in
+        db.query(Annotation).filter(Annotation.id.in_(ids)).all()
+    }
+    now = datetime.now(timezone.utc)
+    failures = []
+    seen = set()
+    for annotation_id, _ in decisions:
+        ann = rows.get(annotation_id)
+        if annotation_id in seen:
+            failures.append({"annotation_id": annotation_id, "error": "Annotation appears more than once"})
+        elif ann is None:
+            failures.append({"annotation_id": annotation_id, "error": "Annotation not found"})
+        elif not holds_review_claim(ann, reviewer_id, now):
+            failures.append({"annotation_id": annotation_id, "error": "Not claimed by you for review, or the claim expired"})
+        seen.add(annotation_id)
+    if failures:
+        raise ReviewClaimError(failures)
+
+    items = [
+        {"id": annotation_id, "version": rows[annotation_id].version, "review_status": status}
+        for annotation_id, status in decisions
+    ]
+    return bulk_write_annotations(db, items, reviewer_id, atomic=True)
+
+
+def release_review(db: Session, reviewer_id: int, annotation_id: int) -> bool:
+    """Put a claimed annotation back in the review queue"""
+    released = db.execute(
+        update(Annotation)
+        .where(
+            Annotation.id == annotation_id,
+            Annotation.reviewer_id == reviewer_id,
+            Annotation.review_claimed_at.isnot(None),
+            Annotation.review_status.in_(AWAITING_REVIEW)
+        )
+        .values(review_claimed_at=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return released == 1
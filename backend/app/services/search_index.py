@@ -0,0 +1,225 @@
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+from sqlalchemy import bindparam, cast, column, delete, func, literal_column, or_, select, table, text, update
+from sqlalchemy.dialects.postgresql import REGCONFIG
+from sqlalchemy.orm import Session
+
+from app.models.annotation import Annotation
+from app.models.folder import Folder
+from app.models.image import Image
+from app.models.project import project_users
+from app.models.search import SEARCH_CONFIG, SEARCH_FTS_TABLE, SearchDocument
+from app.utils.rle import is_rle
+from app.utils.upsert import dialect_insert
+
+KIND_IMAGE = "image"
+KIND_ANNOTATION = "annotation"
+KIND_FOLDER = "folder"
+SEARCH_KINDS = (KIND_IMAGE, KIND_ANNOTATION, KIND_FOLDER)
+
+# DICOM attributes of an image that are searched
+IMAGE_TEXT_ATTRIBUTES = ("StudyDescription", "SeriesDescription", "BodyPartExamined", "ProtocolName", "Modality")
+
+# Longer documents are cut; annotation data can hold a lot of incidental strings
+MAX_CONTENT_LENGTH = 20000
+
+EXCERPT_LENGTH = 200
+
+_fts = table(SEARCH_FTS_TABLE, column("rowid"), column("content"))
+
+
+def _json_strings(value: Any, out: List[str]) -> None:
+    if isinstance(value, str):
+        out.append(value)
+    elif isinstance(value, dict):
+        if not is_rle(value):
+            for item in value.values():
+                _json_strings(item, out)
+    elif isinstance(value, list):
+        for item in value:
+            _json_strings(item, out)
+
+
+def annotation_text(data: Any, tags: Optional[Sequence[str]]) -> str:
+    """Tags and every string in an annotation's data (labels, notes, tool names)"""
+    strings = [str(tag) for tag in tags or []]
+    _json_strings(data, strings)
+    return " ".join(strings)[:MAX_CONTENT_LENGTH]
+
+
+def image_text(dicom_metadata: Optional[dict]) -> str:
+    metadata = dicom_metadata or {}
+    return " ".join(str(metadata[key]) for key in IMAGE_TEXT_ATTRIBUTES if metadata.get(key))[:MAX_CONTENT_LENGTH]
+
+
+def _documents(db: Session, annotation_ids, image_ids, folder_ids) -> List[Dict[str, Any]]:
+    documents = []
+    if annotation_ids:
+        rows = db.query(Annotation.id, Annotation.image_id, Annotation.data, Annotation.tags, Image.project_id).join(
+            Image, Image.id == Annotation.image_id
+        ).filter(Annotation.id.in_(annotation_ids))
+        documents.extend(
+            {"kind": KIND_ANNOTATION, "object_id": ann_id, "project_id": project_id, "image_id": image_id,
+             "content": annotation_text(data, tags)}
+            for ann_id, image_id, data, tags, project_id in rows
+        )
+    if image_ids:
+        rows = db.query(Image.id, Image.project_id, Image.dicom_metadata).filter(Image.id.in_(image_ids))
+        documents.extend(
+            {"kind": KIND_IMAGE, "object_id": image_id, "project_id": project_id, "image_id": image_id,
+             "content": image_text(metadata)}
+            for image_id, project_id, metadata in rows
+        )
+    if folder_ids:
+        rows = db.query(Folder.id, Folder.project_id, Folder.name, Folder.description).filter(Folder.id.in_(folder_ids))
+        documents.extend(
+            {"kind": KIND_FOLDER, "object_id": folder_id, "project_id": project_id, "image_id": None,
+             "content": " ".join(part for part in (name, description) if part)[:MAX_CONTENT_LENGTH]}
+            for folder_id, project_id, name, description in rows
+        )
+    return documents
+
+
+def index_documents(
+    db: Session,
+    annotation_ids: Iterable[int] = (),
+    image_ids: Iterable[int] = (),
+    folder_ids: Iterable[int] = ()
+) -> None:
+    """Rewrite the search documents of changed objects, in the caller's transaction.
+
+    Documents are upserted in one statement. On Postgres their tsvector is
+    then computed in the database; on SQLite the FTS5 rows are replaced.
+    """
+    annotation_ids, image_ids, folder_ids = list(annotation_ids), list(image_ids), list(folder_ids)
+    documents = _documents(db, annotation_ids, image_ids, folder_ids)
+    if not documents:
+        return
+    insert = dialect_insert(db)
+    statement = insert(SearchDocument.__table__)
+    statement = statement.on_conflict_do_update(
+        index_elements=[SearchDocument.kind, SearchDocument.object_id],
+        set_={
+            "project_id": statement.excluded.project_id,
+            "image_id": statement.excluded.image_id,
+            "content": statement.excluded.content,
+            "updated_at": func.now(),
+        }
+    )
+    db.execute(statement, [{**document, "is_active": True} for document in documents])
+
+    written = or_(*[
+        (SearchDocument.kind == kind) & SearchDocument.object_id.in_(ids)
+        for kind, ids in ((KIND_ANNOTATION, annotation_ids), (KIND_IMAGE, image_ids), (KIND_FOLDER, folder_ids)) if ids
+    ])
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(
+            update(SearchDocument)
+            .where(written)
+            .values(search_vector=func.to_tsvector(cast(SEARCH_CONFIG, REGCONFIG), SearchDocument.content))
+            .execution_options(synchronize_session=False)
+        )
+    else:
+        rows = db.execute(select(SearchDocument.id, SearchDocument.content).where(written)).all()
+        db.execute(delete(_fts).where(_fts.c.rowid.in_([row_id for row_id, _ in rows])))
+        db.execute(
+            _fts.insert().values(rowid=bindparam("row_id"), content=bindparam("row_content")),
+            [{"row_id": row_id, "row_content": content} for row_id, content in rows]
+        )
+
+
+def remove_documents(db: Session, condition) -> None:
+    """Delete the search documents matching a condition on SearchDocument"""
+    if db.get_bind().dialect.name != "postgresql":
+        db.execute(delete(_fts).where(_fts.c.rowid.in_(select(SearchDocument.id).where(condition))))
+    db.execute(delete(SearchDocument).where(condition).execution_options(synchronize_session=False))
+
+
+def remove_image_documents(db: Session, image_ids: Sequence[int]) -> None:
+    """Delete the documents of images and of the annotations on them"""
+    remove_documents(db, SearchDocument.image_id.in_(list(image_ids)))
+
+
+def remove_folder_documents(db: Session, folder_ids: Sequence[int]) -> None:
+    remove_documents(db, (SearchDocument.kind == KIND_FOLDER) & SearchDocument.object_id.in_(list(folder_ids)))
+
+
+def remove_project_documents(db: Session, project_id: int) -> None:
+    remove_documents(db, SearchDocument.project_id == project_id)
+
+
+def search(
+    db: Session,
+    user_id: int,
+    query: str,
+    kinds: Optional[Sequence[str]] = None,
+    project_id: Optional[int] = None,
+    limit: int = 20,
+    offset: int = 0
+) -> List[Dict[str, Any]]:
+    """Documents matching every word of `query` in the user's projects, best match first.
+
+    Postgres ranks with ts_rank over the tsvector column; SQLite with FTS5's
+    bm25. Either way a higher `score` is a better match.
+    """
+    terms = re.findall(r"\w+", query)
+    if not terms:
+        return []
+    member_projects = select(project_users.c.project_id).where(project_users.c.user_id == user_id)
+    columns = [SearchDocument.kind, SearchDocument.object_id, SearchDocument.project_id, SearchDocument.image_id, SearchDocument.content]
+
+    if db.get_bind().dialect.name == "postgresql":
+        tsquery = func.plainto_tsquery(cast(SEARCH_CONFIG, REGCONFIG), " ".join(terms))
+        score = func.ts_rank(SearchDocument.search_vector, tsquery)
+        statement = select(*columns, score.label("score")).where(SearchDocument.search_vector.bool_op("@@")(tsquery))
+        order = score.desc()
+    else:
+        # Quoted terms so user input is never parsed as FTS5 query syntax
+        match = " ".join('"' + term.replace('"', '""') + '"' for term in terms)
+        rank = literal_column(f"bm25({SEARCH_FTS_TABLE})")
+        statement = select(*columns, (-rank).label("score")).select_from(_fts).join(
+            SearchDocument, SearchDocument.id == _fts.c.rowid
+        ).where(text(f"{SEARCH_FTS_TABLE} MATCH :match").bindparams(match=match))
+        order = rank
+
+    statement = statement.where(SearchDocument.project_id.in_(member_projects))
+    if kinds:
+        statement = statement.where(SearchDocument.kind.in_(list(kinds)))
+    if project_id is not None:
+        statement = statement.where(SearchDocument.project_id == project_id)
+    rows = db.execute(statement.order_by(order, SearchDocument.id).limit(limit).offset(offset)).all()
+    return [
+        {
+            "kind": kind,
+            "id": object_id,
+            "project_id": row_project_id,
+            "image_id": image_id,
+            "excerpt": content[:EXCERPT_LENGTH],
+            "score": float(score),
+        }
+        for kind, object_id, row_project_id, image_id, content, score in rows
+    ]
+
+
+def rebuild_search_index(db: Session, batch_size: int = 1000) -> int:
+    """Index every annotation, image and folder; returns the number of documents written"""
+    written = 0
+    for model, argument in ((Annotation, "annotation_ids"), (Image, "image_ids"), (Folder, "folder_ids")):
+        ids = [row_id for (row_id,) in db.query(model.id).order_by(model.id)]
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            index_documents(db, **{argument: batch})
+            db.commit()
+            written += len(batch)
+    return written
+
+
+if __name__ == "__main__":
+    from app.core.database import SessionLocal
+
+    session = SessionLocal()
+    try:
+        print(f"Indexed {rebuild_search_index(session)} documents")
+    finally:
+        session.close()
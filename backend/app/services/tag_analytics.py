@@ -0,0 +1,208 @@
+from itertools import islice
+from typing import Any, Dict, List
+
+import numpy as np
+from sqlalchemy import bindparam, delete, func, insert, update
+from sqlalchemy.orm import Session
+
+from app.models.annotation import Annotation
+from app.models.image import Image
+from app.models.tag import Tag, TagPairCount, UserTagCount
+from app.services.tag_vocabulary import get_tag_index, tag_names
+
+# Annotations turned into one incidence matrix at a time during a rebuild
+REBUILD_CHUNK_SIZE = 4096
+
+
+def _grow(matrix: np.ndarray, rows: int, columns: int) -> np.ndarray:
+    if matrix.shape == (rows, columns):
+        return matrix
+    return np.pad(matrix, ((0, rows - matrix.shape[0]), (0, columns - matrix.shape[1])))
+
+
+def rebuild_tag_analytics(db: Session, project_id: int) -> Dict[str, int]:
+    """Recompute a project's tag counters from its annotations and replace the stored ones.
+
+    The incremental counters are kept by record_tag_usage; this is for
+    backfills and repairs. Annotations are read in chunks, each chunk
+    becomes a 0/1 annotation × tag matrix X, and the co-occurrence matrix
+    accumulates X.T @ X (its diagonal being the tag counts) while per-author
+    counts are summed by row. Writes made during a rebuild may be missed
+    until the next one.
+    """
+    keys: Dict[str, int] = {}
+    names: List[str] = []
+    authors: Dict[int, int] = {}
+    cooccurrence = np.zeros((0, 0), dtype=np.int64)
+    per_user = np.zeros((0, 0), dtype=np.int64)
+    annotation_count = 0
+
+    rows = db.query(Annotation.user_id, Annotation.is_prelabel, Annotation.tags).join(
+        Image, Image.id == Annotation.image_id
+    ).filter(Image.project_id == project_id).yield_per(REBUILD_CHUNK_SIZE)
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, REBUILD_CHUNK_SIZE))
+        if not chunk:
+            break
+        annotation_count += len(chunk)
+        row_index: List[int] = []
+        tag_index: List[int] = []
+        author_index = np.empty(len(chunk), dtype=np.intp)
+        for row, (user_id, is_prelabel, tags) in enumerate(chunk):
+            # Pre-labels count towards the tags but not towards anyone's labelling
+            author = None if is_prelabel else user_id
+            author_index[row] = authors.setdefault(author, len(authors))
+            for key, name in tag_names(tags).items():
+                if key not in keys:
+                    keys[key] = len(keys)
+                    names.append(name)
+                row_index.append(row)
+                tag_index.append(keys[key])
+
+        # Per-chunk products are at most REBUILD_CHUNK_SIZE, exact in float32
+        incidence = np.zeros((len(chunk), len(keys)), dtype=np.float32)
+        incidence[row_index, tag_index] = 1
+        cooccurrence = _grow(cooccurrence, len(keys), len(keys))
+        cooccurrence += (incidence.T @ incidence).astype(np.int64)
+        per_user = _grow(per_user, len(authors), len(keys))
+        np.add.at(per_user, author_index, incidence.astype(np.int64))
+
+    key_list = list(keys)
+    _replace_tag_counts(db, project_id, key_list, names, np.diagonal(cooccurrence))
+
+    db.execute(delete(TagPairCount).where(TagPairCount.project_id == project_id))
+    first, second = np.nonzero(np.triu(cooccurrence, k=1))
+    pair_rows = []
+    for i, j in zip(first.tolist(), second.tolist()):
+        tag_a, tag_b = sorted((key_list[i], key_list[j]))
+        pair_rows.append({
+            "project_id": project_id, "tag_a": tag_a, "tag_b": tag_b,
+            "count": int(cooccurrence[i, j]), "is_active": True,
+        })
+    if pair_rows:
+        db.execute(insert(TagPairCount), pair_rows)
+
+    db.execute(delete(UserTagCount).where(UserTagCount.project_id == project_id))
+    user_ids = list(authors)
+    user_rows = [
+        {
+            "project_id": project_id, "user_id": user_ids[i], "normalized": key_list[j],
+            "count": int(per_user[i, j]), "is_active": True,
+        }
+        for i, j in zip(*(index.tolist() for index in np.nonzero(per_user)))
+        if user_ids[i] is not None
+    ]
+    if user_rows:
+        db.execute(insert(UserTagCount), user_rows)
+    db.commit()
+    get_tag_index().mark_stale([project_id])
+    annotators = sum(1 for user_id in authors if user_id is not None)
+    return {"annotations": annotation_count, "tags": len(keys), "pairs": len(pair_rows), "annotators": annotators}
+
+
+def _replace_tag_counts(db: Session, project_id: int, keys: List[str], names: List[str], counts: np.ndarray) -> None:
+    # Vocabulary rows are updated in place, not replaced, so autocomplete sees the new counts
+    existing = {
+        key for (key,) in db.query(Tag.normalized).filter(Tag.project_id == project_id)
+    }
+    db.execute(
+        update(Tag)
+        .where(Tag.project_id == project_id, Tag.usage_count != 0, Tag.normalized.notin_(keys))
+        .values(usage_count=0, updated_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+    table = Tag.__table__
+    updates = [
+        {"target_key": key, "new_count": int(count)}
+        for key, count in zip(keys, counts.tolist()) if key in existing
+    ]
+    if updates:
+        db.execute(
+            update(table)
+            .where(table.c.project_id == project_id, table.c.normalized == bindparam("target_key"))
+            .values(usage_count=bindparam("new_count"), updated_at=func.now()),
+            updates
+        )
+    inserts = [
+        {"project_id": project_id, "normalized": key, "name": name, "usage_count": int(count), "is_active": True}
+        for key, name, count in zip(keys, names, counts.tolist()) if key not in existing
+    ]
+    if inserts:
+        db.execute(insert(Tag), inserts)
+
+
+def _project_annotation_counts(db: Session, project_id: int, include_prelabel: bool = True) -> Dict[int, int]:
+    query = db.query(Annotation.user_id, func.count(Annotation.id)).join(
+        Image, Image.id == Annotation.image_id
+    ).filter(Image.project_id == project_id)
+    if not include_prelabel:
+        query = query.filter(Annotation.is_prelabel.is_(False))
+    return dict(query.group_by(Annotation.user_id).all())
+
+
+def label_distribution(db: Session, project_id: int, limit: int) -> Dict[str, Any]:
+    """The most used tags with their counts and share of the project's annotations"""
+    total = sum(_project_annotation_counts(db, project_id).values())
+    tags = db.query(Tag.name, Tag.usage_count).filter(
+        Tag.project_id == project_id,
+        Tag.usage_count > 0
+    ).order_by(Tag.usage_count.desc(), Tag.normalized).limit(limit).all()
+    return {
+        "annotations": total,
+        "labels": [
+            {"tag": name, "count": count, "share": count / total if total else 0.0}
+            for name, count in tags
+        ],
+    }
+
+
+def cooccurrence_matrix(db: Session, project_id: int, limit: int) -> Dict[str, Any]:
+    """Symmetric co-occurrence counts among the `limit` most used tags.
+
+    counts[i][j] is the number of annotations carrying both tags i and j;
+    the diagonal holds each tag's own count.
+    """
+    tags = db.query(Tag.normalized, Tag.name, Tag.usage_count).filter(
+        Tag.project_id == project_id,
+        Tag.usage_count > 0
+    ).order_by(Tag.usage_count.desc(), Tag.normalized).limit(limit).all()
+    position = {key: index for index, (key, _, _) in enumerate(tags)}
+    matrix = np.zeros((len(tags), len(tags)), dtype=np.int64)
+    np.fill_diagonal(matrix, [count for _, _, count in tags])
+    if tags:
+        pairs = db.query(TagPairCount.tag_a, TagPairCount.tag_b, TagPairCount.count).filter(
+            TagPairCount.project_id == project_id,
+            TagPairCount.count > 0,
+            TagPairCount.tag_a.in_(list(position)),
+            TagPairCount.tag_b.in_(list(position))
+        ).all()
+        if pairs:
+            first = np.array([position[tag_a] for tag_a, _, _ in pairs])
+            second = np.array([position[tag_b] for _, tag_b, _ in pairs])
+            counts = np.array([count for _, _, count in pairs])
+            matrix[first, second] = counts
+            matrix[second, first] = counts
+    return {"tags": [name for _, name, _ in tags], "counts": matrix.tolist()}
+
+
+def annotator_label_rates(db: Session, project_id: int) -> List[Dict[str, Any]]:
+    """Per author: annotation count, and for each tag they used its count and rate (pre-labels excluded)"""
+    totals = _project_annotation_counts(db, project_id, include_prelabel=False)
+    names = dict(db.query(Tag.normalized, Tag.name).filter(Tag.project_id == project_id).all())
+    labels: Dict[int, List[Dict[str, Any]]] = {}
+    rows = db.query(UserTagCount.user_id, UserTagCount.normalized, UserTagCount.count).filter(
+        UserTagCount.project_id == project_id,
+        UserTagCount.count > 0
+    ).order_by(UserTagCount.user_id, UserTagCount.count.desc(), UserTagCount.normalized)
+    for user_id, key, count in rows:
+        total = totals.get(user_id, 0)
+        labels.setdefault(user_id, []).append({
+            "tag": names.get(key, key),
+            "count": count,
+            "rate": count / total if total else 0.0,
+        })
+    return [
+        {"user_id": user_id, "annotations": total, "labels": labels.get(user_id, [])}
+        for user_id, total in sorted(totals.items())
+    ]
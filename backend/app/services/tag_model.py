@@ -0,0 +1,158 @@
+import os
+from abc import ABC, abstractmethod
+from typing import BinaryIO, List, Optional, Sequence
+
+import numpy as np
+import pydicom
+
+from app.core.settings import TAG_MODEL_BACKEND, TAG_MODEL_INPUT_SIZE, TAG_MODEL_LABELS, TAG_MODEL_PATH
+
+class TagModelError(RuntimeError):
+    pass
+
+
+class TagModelUnavailable(TagModelError):
+    """No trained model is configured"""
+
+
+def _sigmoid(x: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-x))
+
+
+def _resize_area(image: np.ndarray, size: int) -> np.ndarray:
+    """Downsample a 2D image to size x size by averaging the pixels of each output cell"""
+    rows, columns = image.shape
+    if rows < size or columns < size:
+        # Too small to average; sample the nearest pixel instead
+        row_index = (np.arange(size) * rows // size)[:, None]
+        column_index = (np.arange(size) * columns // size)[None, :]
+        return image[row_index, column_index]
+    row_edges = np.linspace(0, rows, size + 1).astype(np.int64)
+    column_edges = np.linspace(0, columns, size + 1).astype(np.int64)
+    sums = np.add.reduceat(np.add.reduceat(image, row_edges[:-1], axis=0), column_edges[:-1], axis=1)
+    counts = np.outer(np.diff(row_edges), np.diff(column_edges))
+    return sums / counts
+
+
+def prepare_pixels(dataset: pydicom.Dataset, size: int = TAG_MODEL_INPUT_SIZE) -> np.ndarray:
+    """Model input for one instance: a size x size float32 image scaled to [0, 1].
+
+    Multi-frame instances use their middle frame and colour images their
+    luminance. Intensities are windowed to the 1st-99th percentile so
+    scanner-specific ranges do not dominate.
+    """
+    pixels = dataset.pixel_array.astype(np.float32)
+    if getattr(dataset, "SamplesPerPixel", 1) > 1:
+        pixels = pixels @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    if pixels.ndim == 3:
+        pixels = pixels[pixels.shape[0] // 2]
+    if pixels.ndim != 2:
+        raise TagModelError(f"Unsupported pixel array shape {pixels.shape}")
+
+    pixels = pixels * float(getattr(dataset, "RescaleSlope", 1) or 1) + float(getattr(dataset, "RescaleIntercept", 0) or 0)
+    low, high = np.percentile(pixels, (1, 99))
+    scaled = np.clip((pixels - low) / (high - low), 0, 1) if high > low else np.zeros_like(pixels)
+    if getattr(dataset, "PhotometricInterpretation", "") == "MONOCHROME1":
+        scaled = 1 - scaled
+    return _resize_area(scaled, size).astype(np.float32)
+
+
+def read_pixels(fp: BinaryIO, size: int = TAG_MODEL_INPUT_SIZE) -> np.ndarray:
+    try:
+        dataset = pydicom.dcmread(fp)
+        return prepare_pixels(dataset, size)
+    except TagModelError:
+        raise
+    except Exception as e:
+        raise TagModelError(f"Could not decode pixels: {e}")
+
+
+class TagModel(ABC):
+    """Multi-label classifier: (N, size, size) float32 images in, (N, labels) probabilities out"""
+
+    labels: List[str]
+    input_size: int
+    version: str
+
+    @abstractmethod
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        ...
+
+
+class NumpyTagModel(TagModel):
+    """Logistic layer over the flattened downsampled image, in plain NumPy.
+
+    Weights come from a .npz file with `weights` (size*size, labels),
+    `bias` (labels,) and optionally `labels`.
+    """
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, labels: Sequence[str], input_size: int, version: str):
+        if weights.shape != (input_size * input_size, len(labels)) or bias.shape != (len(labels),):
+            raise TagModelError("Model weights do not match the input size and labels")
+        self.weights = weights.astype(np.float32)
+        self.bias = bias.astype(np.float32)
+        self.labels = list(labels)
+        self.input_size = input_size
+        self.version = version
+
+    @classmethod
+    def load(cls, path: str, labels: Sequence[str], input_size: int) -> "NumpyTagModel":
+        with np.load(path, allow_pickle=False) as archive:
+            if "labels" in archive:
+                labels = [str(label) for label in archive["labels"]]
+            return cls(archive["weights"], archive["bias"], labels, input_size, f"numpy:{path}:{os.path.getmtime(path)}")
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        features = batch.reshape(len(batch), -1)
+        return _sigmoid(features @ self.weights + self.bias)
+
+
+class OnnxTagModel(TagModel):
+    """ONNX model taking (N, 1, size, size) float32 and returning one logit per label"""
+
+    def __init__(self, path: str, labels: Sequence[str], input_size: int):
+        try:
+            import onnxruntime
+        except ImportError:
+            raise TagModelError("TAG_MODEL_BACKEND=onnx requires the onnxruntime package")
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.labels = list(labels)
+        self.input_size = input_size
+        self.version = f"onnx:{path}:{os.path.getmtime(path)}"
+
+    def predict(self, batch: np.ndarray) -> np.ndarray:
+        logits = self.session.run(None, {self.input_name: batch[:, None, :, :].astype(np.float32)})[0]
+        if logits.shape[-1] != len(self.labels):
+            raise TagModelError(f"Model returned {logits.shape[-1]} outputs for {len(self.labels)} labels")
+        return _sigmoid(logits)
+
+
+def tag_model_configured(path: Optional[str] = TAG_MODEL_PATH) -> bool:
+    """Whether a trained model is configured; both backends need TAG_MODEL_PATH"""
+    return bool(path)
+
+
+def load_tag_model(
+    backend: str = TAG_MODEL_BACKEND,
+    path: Optional[str] = TAG_MODEL_PATH,
+    labels: Sequence[str] = TAG_MODEL_LABELS,
+    input_size: int = TAG_MODEL_INPUT_SIZE
+) -> TagModel:
+    if backend not in ("numpy", "onnx"):
+        raise TagModelError(f"Unknown tag model backend: {backend}")
+    if not tag_model_configured(path):
+        raise TagModelUnavailable("No tag model is configured (set TAG_MODEL_PATH)")
+    if backend == "onnx":
+        return OnnxTagModel(path, labels, input_size)
+    return NumpyTagModel.load(path, labels, input_size)
+
+
+def top_suggestions(labels: Sequence[str], probabilities: np.ndarray, top_k: int, min_confidence: float = 0.0) -> List[dict]:
+    order = np.argsort(-probabilities, kind="stable")[:top_k]
+    return [
+        {"tag": labels[i], "confidence": round(float(probabilities[i]), 4)}
+        for i in order if probabilities[i] >= min_confidence
+    ]
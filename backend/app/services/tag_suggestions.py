@@ -0,0 +1,130 @@
+import queue
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from app.core.settings import TAG_BATCH_SIZE, TAG_BATCH_WAIT_MS, TAG_SUGGESTION_CACHE_SIZE
+from app.services.instance_cache import get_instance_cache
+from app.services.tag_model import TagModel, load_tag_model, read_pixels
+
+
+class MicroBatcher:
+    """Groups concurrent predictions into one forward pass.
+
+    The first request starts a batch; others arriving within `max_wait`
+    seconds join it, up to `max_batch`. A single worker thread runs the
+    model, so callers never contend for it and a burst of N requests costs
+    about one pass instead of N.
+    """
+
+    def __init__(self, model: TagModel, max_batch: int, max_wait: float):
+        self.model = model
+        self.max_batch = max(1, max_batch)
+        self.max_wait = max(0.0, max_wait)
+        self.batches_run = 0
+        self._queue: "queue.Queue[Tuple[np.ndarray, Future]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="tag-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, pixels: np.ndarray) -> Future:
+        future: Future = Future()
+        self._queue.put((pixels, future))
+        return future
+
+    def _collect(self) -> List[Tuple[np.ndarray, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            try:
+                outputs = self.model.predict(np.stack([pixels for pixels, _ in batch]))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches_run += 1
+            for (_, future), row in zip(batch, outputs):
+                future.set_result(row)
+
+
+class TagSuggester:
+    """Tag probabilities per Orthanc instance: cached, with concurrent misses batched.
+
+    Results are cached by instance and model version; an instance being
+    scored is scored once however many requests ask for it at the same time.
+    """
+
+    def __init__(self, model: TagModel, max_batch: int, max_wait: float, cache_size: int):
+        self.model = model
+        self.batcher = MicroBatcher(model, max_batch, max_wait)
+        self.cache_size = max(1, cache_size)
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._inflight: dict = {}
+
+    @property
+    def labels(self) -> List[str]:
+        return self.model.labels
+
+    def probabilities(self, orthanc_id: str) -> np.ndarray:
+        key = f"{self.model.version}:{orthanc_id}"
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+        if not owner:
+            return future.result()
+
+        try:
+            with get_instance_cache().open(orthanc_id) as fp:
+                pixels = read_pixels(fp, self.model.input_size)
+            result = self.batcher.submit(pixels).result()
+            future.set_result(result)
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+        with self._lock:
+            self._cache[key] = result
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return result
+
+
+_tag_suggester: Optional[TagSuggester] = None
+_tag_suggester_lock = threading.Lock()
+
+
+def get_tag_suggester() -> TagSuggester:
+    """Get the process-wide suggester, loading the configured model on first use"""
+    global _tag_suggester
+    if _tag_suggester is None:
+        with _tag_suggester_lock:
+            if _tag_suggester is None:
+                _tag_suggester = TagSuggester(
+                    load_tag_model(),
+                    TAG_BATCH_SIZE,
+                    TAG_BATCH_WAIT_MS / 1000,
+                    TAG_SUGGESTION_CACHE_SIZE,
+                )
+    return _tag_suggester
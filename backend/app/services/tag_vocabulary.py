@@ -0,0 +1,221 @@
+import heapq
+import threading
+import time
+import unicodedata
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from itertools import combinations
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import delete
+from sqlalchemy.orm import Session
+
+from app.core.settings import TAG_INDEX_REFRESH_SECONDS
+from app.models.tag import Tag, TagPairCount, UserTagCount
+from app.utils.upsert import apply_count_deltas
+
+# Completions cached per trie node; also the largest page /tags/autocomplete serves
+AUTOCOMPLETE_TOP_K = 20
+
+# Re-read rows this far behind the watermark so writes within one clock tick are not missed
+REFRESH_OVERLAP = timedelta(seconds=1)
+
+# (project_id, annotation author's user_id or None for pre-labels, old tags, new tags) for one annotation write
+TagChange = Tuple[int, Optional[int], Optional[Sequence[str]], Optional[Sequence[str]]]
+
+
+def normalize_tag(tag: Any) -> str:
+    """Vocabulary key: Unicode-normalized, whitespace-collapsed and case-folded"""
+    return " ".join(unicodedata.normalize("NFKC", str(tag)).split()).casefold()
+
+
+def tag_names(tags: Optional[Sequence[str]]) -> Dict[str, str]:
+    """Distinct tags of one annotation: vocabulary key -> display name as first written"""
+    names: Dict[str, str] = {}
+    for tag in tags or []:
+        key = normalize_tag(tag)
+        if key:
+            names.setdefault(key, " ".join(str(tag).split()))
+    return names
+
+
+def _tag_pairs(keys: Iterable[str]) -> set:
+    return set(combinations(sorted(keys), 2))
+
+
+def record_tag_usage(db: Session, changes: Iterable[TagChange]) -> None:
+    """Update per-project tag aggregates for annotation writes, in the caller's transaction.
+
+    Keeps three counters: annotations per tag, per pair of tags carried
+    together, and per tag for each annotation's author. A tag counts once
+    per annotation that carries it. All changes are summed first and each
+    table is then written with one upsert and one update, so the counters
+    never need a scan of the annotations.
+    """
+    tag_totals: Dict[Tuple[int, str], int] = {}
+    names: Dict[Tuple[int, str], Dict[str, Any]] = {}
+    pair_totals: Dict[Tuple[int, str, str], int] = {}
+    user_totals: Dict[Tuple[int, int, str], int] = {}
+    for project_id, user_id, old_tags, new_tags in changes:
+        if project_id is None:
+            continue
+        old = tag_names(old_tags)
+        new = tag_names(new_tags)
+        for keys, delta in ((new.keys() - old.keys(), 1), (old.keys() - new.keys(), -1)):
+            for key in keys:
+                tag_totals[(project_id, key)] = tag_totals.get((project_id, key), 0) + delta
+                names.setdefault((project_id, key), {"name": new.get(key) or old[key]})
+                if user_id is not None:
+                    user_totals[(project_id, user_id, key)] = user_totals.get((project_id, user_id, key), 0) + delta
+        old_pairs = _tag_pairs(old)
+        new_pairs = _tag_pairs(new)
+        for pairs, delta in ((new_pairs - old_pairs, 1), (old_pairs - new_pairs, -1)):
+            for tag_a, tag_b in pairs:
+                pair_totals[(project_id, tag_a, tag_b)] = pair_totals.get((project_id, tag_a, tag_b), 0) + delta
+
+    apply_count_deltas(db, Tag, ("project_id", "normalized"), "usage_count", tag_totals, names)
+    apply_count_deltas(db, TagPairCount, ("project_id", "tag_a", "tag_b"), "count", pair_totals)
+    apply_count_deltas(db, UserTagCount, ("project_id", "user_id", "normalized"), "count", user_totals)
+    get_tag_index().mark_stale({project_id for project_id, _ in tag_totals})
+
+
+class _TrieNode:
+    __slots__ = ("children", "top", "dirty")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.top: List[str] = []  # Best keys in this subtree, best first
+        self.dirty = False  # `top` may be missing a key; rebuilt on the next lookup
+
+
+class TagTrie:
+    """Prefix trie over normalized tags, ranked by usage count.
+
+    Every node keeps the best AUTOCOMPLETE_TOP_K keys below it, so a lookup
+    is a walk down the prefix and a slice. Count increases update those
+    lists along one path; a decrease that might let an unlisted key overtake
+    only marks the node, which is rebuilt if it is ever asked for.
+    """
+
+    def __init__(self, top_k: int = AUTOCOMPLETE_TOP_K):
+        self.top_k = top_k
+        self.root = _TrieNode()
+        self.counts: Dict[str, int] = {}
+        self.names: Dict[str, str] = {}
+
+    def _rank(self, key: str) -> Tuple[int, str]:
+        return (-self.counts[key], key)
+
+    def set(self, key: str, name: str, count: int) -> None:
+        previous = self.counts.get(key)
+        self.counts[key] = count
+        self.names[key] = name
+        node = self.root
+        path = [node]
+        for char in key:
+            node = node.children.setdefault(char, _TrieNode())
+            path.append(node)
+
+        for node in path:
+            if node.dirty:
+                continue
+            if key in node.top:
+                # A full list may now be outranked by a key it does not hold
+                if previous is not None and count < previous and len(node.top) >= self.top_k:
+                    node.dirty = True
+                else:
+                    node.top.sort(key=self._rank)
+            elif len(node.top) < self.top_k or self._rank(key) < self._rank(node.top[-1]):
+                node.top.append(key)
+                node.top.sort(key=self._rank)
+                del node.top[self.top_k:]
+
+    def _rebuild(self, node: _TrieNode, prefix: str) -> None:
+        keys = []
+        stack = [(node, prefix)]
+        while stack:
+            current, text = stack.pop()
+            if text in self.counts:
+                keys.append(text)
+            stack.extend((child, text + char) for char, child in current.children.items())
+        node.top = heapq.nsmallest(self.top_k, keys, key=self._rank)
+        node.dirty = False
+
+    def complete(self, prefix: str, limit: int) -> List[Tuple[str, int]]:
+        node = self.root
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return []
+        if node.dirty:
+            self._rebuild(node, prefix)
+        return [(self.names[key], self.counts[key]) for key in node.top[:limit]]
+
+
+@dataclass
+class _ProjectTrie:
+    trie: TagTrie
+    watermark: Optional[datetime] = None
+    checked_at: float = field(default_factory=time.monotonic)
+
+
+class TagIndex:
+    """Autocomplete tries per project, loaded on first use and refreshed incrementally.
+
+    A refresh reads only the vocabulary rows updated since the last one
+    (at most every `refresh_seconds`, or right away after a local write), so
+    counters changed by other server processes show up too.
+    """
+
+    def __init__(self, refresh_seconds: float):
+        self.refresh_seconds = refresh_seconds
+        self._lock = threading.Lock()
+        self._projects: Dict[int, _ProjectTrie] = {}
+
+    def mark_stale(self, project_ids: Iterable[int]) -> None:
+        with self._lock:
+            for project_id in project_ids:
+                entry = self._projects.get(project_id)
+                if entry is not None:
+                    entry.checked_at = float("-inf")
+
+    def _load(self, db: Session, project_id: int, entry: Optional[_ProjectTrie]) -> _ProjectTrie:
+        query = db.query(Tag.name, Tag.normalized, Tag.usage_count, Tag.updated_at).filter(Tag.project_id == project_id)
+        if entry is None:
+            entry = _ProjectTrie(TagTrie())
+        elif entry.watermark is not None:
+            query = query.filter(Tag.updated_at >= entry.watermark - REFRESH_OVERLAP)
+        for name, key, count, updated_at in query:
+            entry.trie.set(key, name, count)
+            if updated_at is not None and (entry.watermark is None or updated_at > entry.watermark):
+                entry.watermark = updated_at
+        entry.checked_at = time.monotonic()
+        return entry
+
+    def complete(self, db: Session, project_id: int, prefix: str, limit: int) -> List[Tuple[str, int]]:
+        with self._lock:
+            entry = self._projects.get(project_id)
+            if entry is None or time.monotonic() - entry.checked_at >= self.refresh_seconds:
+                entry = self._projects[project_id] = self._load(db, project_id, entry)
+            return entry.trie.complete(normalize_tag(prefix), min(limit, AUTOCOMPLETE_TOP_K))
+
+
+_tag_index: Optional[TagIndex] = None
+_tag_index_lock = threading.Lock()
+
+
+def get_tag_index() -> TagIndex:
+    """Get the process-wide autocomplete index"""
+    global _tag_index
+    if _tag_index is None:
+        with _tag_index_lock:
+            if _tag_index is None:
+                _tag_index = TagIndex(TAG_INDEX_REFRESH_SECONDS)
+    return _tag_index
+
+
+def remove_project_tags(db: Session, project_id: int) -> None:
+    """Drop a project's vocabulary and tag counters, in the caller's transaction"""
+    for model in (Tag, TagPairCount, UserTagCount):
+        db.execute(delete(model).where(model.project_id == project_id))
+    get_tag_index().mark_stale([project_id])
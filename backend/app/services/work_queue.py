@@ -0,0 +1,85 @@
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import exists, or_, select, update
+from sqlalchemy.orm import Session
+
+from app.core.settings import QUEUE_CLAIM_MINUTES
+from app.models.annotation import Annotation
+from app.models.image import Image
+
+# Attempts before giving up when every candidate is taken between the SELECT and the UPDATE
+MAX_CLAIM_ATTEMPTS = 5
+
+
+def _claim_ttl() -> timedelta:
+    return timedelta(minutes=QUEUE_CLAIM_MINUTES)
+
+
+def _open_images(user_id: int, project_id: Optional[int], now: datetime) -> list:
+    conditions = [
+        Image.assigned_user_id == user_id,
+        # An image that only has a pre-label still needs its annotator
+        ~exists().where(Annotation.image_id == Image.id, Annotation.is_prelabel.is_(False)),
+        or_(Image.claimed_at.is_(None), Image.claimed_at < now - _claim_ttl()),
+    ]
+    if project_id is not None:
+        conditions.append(Image.project_id == project_id)
+    return conditions
+
+
+def claim_next_image(
+    db: Session,
+    user_id: int,
+    project_id: Optional[int] = None,
+    prefetch: int = 0
+) -> Optional[Tuple[int, datetime, List[int]]]:
+    """Claim the caller's next unannotated image; returns (image id, claim expiry, next ids).
+
+    The candidate row is locked with FOR UPDATE SKIP LOCKED, so concurrent
+    callers (the same annotator in two tabs) each get a different image
+    without waiting on each other. The claim is a timestamp; an image that
+    is still not annotated when it expires is handed out again. The next
+    `prefetch` ids are only peeked at, not claimed.
+    """
+    now = datetime.now(timezone.utc)
+    conditions = _open_images(user_id, project_id, now)
+    for _ in range(MAX_CLAIM_ATTEMPTS):
+        image_id = db.execute(
+            select(Image.id).where(*conditions).order_by(Image.id).limit(1).with_for_update(skip_locked=True)
+        ).scalar()
+        if image_id is None:
+            db.rollback()
+            return None
+        # Conditional, for databases without row locks
+        claimed = db.execute(
+            update(Image)
+            .where(Image.id == image_id, *conditions)
+            .values(claimed_at=now)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        if claimed == 1:
+            break
+        db.rollback()
+    else:
+        return None
+
+    upcoming = [
+        upcoming_id for (upcoming_id,) in db.execute(
+            select(Image.id).where(*conditions, Image.id > image_id).order_by(Image.id).limit(prefetch)
+        )
+    ] if prefetch > 0 else []
+    db.commit()
+    return image_id, now + _claim_ttl(), upcoming
+
+
+def release_image(db: Session, user_id: int, image_id: int) -> bool:
+    """Put a claimed image back in its assignee's queue"""
+    released = db.execute(
+        update(Image)
+        .where(Image.id == image_id, Image.assigned_user_id == user_id, Image.claimed_at.isnot(None))
+        .values(claimed_at=None)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.commit()
+    return released == 1
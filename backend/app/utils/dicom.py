@@ -0,0 +1,123 @@
+import re
+from typing import Any, Dict, Iterable, Optional
+
+from pydicom.datadict import dictionary_VR, tag_for_keyword
+
+# Image columns that mirror DICOM attributes, keyed by attribute keyword
+INDEXED_ATTRIBUTES = {
+    "StudyInstanceUID": "study_instance_uid",
+    "SeriesInstanceUID": "series_instance_uid",
+    "SOPInstanceUID": "sop_instance_uid",
+    "PatientID": "patient_id",
+    "StudyDate": "study_date",
+    "Modality": "modality",
+    "AccessionNumber": "accession_number",
+}
+
+_INTEGER_VRS = {"IS", "SL", "SS", "UL", "US", "SV", "UV"}
+_FLOAT_VRS = {"DS", "FL", "FD"}
+_BULK_VRS = {"OB", "OD", "OF", "OL", "OV", "OW", "UN"}
+_HEX_TAG_RE = re.compile(r"^([0-9A-Fa-f]{4}),?([0-9A-Fa-f]{4})$")
+
+
+def _as_int(value: Any) -> Optional[int]:
+    try:
+        return int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def _as_str(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def dicom_index_fields(dicom_metadata: Optional[dict]) -> Dict[str, Any]:
+    """Pull the indexed columns of an Image out of Orthanc's simplified tag dict"""
+    metadata = dicom_metadata or {}
+    fields: Dict[str, Any] = {
+        column: _as_str(metadata.get(keyword)) for keyword, column in INDEXED_ATTRIBUTES.items()
+    }
+    fields["instance_number"] = _as_int(metadata.get("InstanceNumber"))
+    return fields
+
+
+def resolve_tag(key: str) -> Optional[int]:
+    """Resolve an attribute keyword or 8-digit hex tag (e.g. '0020000D') to an integer tag"""
+    match = _HEX_TAG_RE.match(key)
+    if match:
+        return int(match.group(1) + match.group(2), 16)
+    return tag_for_keyword(key)
+
+
+def tag_to_hex(tag: int) -> str:
+    return f"{tag:08X}"
+
+
+def _vr_for(tag: int) -> Optional[str]:
+    try:
+        vr = dictionary_VR(tag)
+    except KeyError:
+        return None
+    # Ambiguous VRs such as "US or SS" resolve to the first alternative
+    return vr.split(" or ")[0]
+
+
+def _convert_values(vr: str, value: Any) -> Optional[list]:
+    if value is None or value == "":
+        return None
+    if vr == "SQ":
+        items = value if isinstance(value, list) else [value]
+        return [to_dicom_json(item) for item in items if isinstance(item, dict)]
+    raw = value if isinstance(value, list) else str(value).split("\\")
+    values = []
+    for item in raw:
+        if vr == "PN":
+            values.append({"Alphabetic": str(item)})
+        elif vr in _INTEGER_VRS:
+            number = _as_int(item)
+            if number is not None:
+                values.append(number)
+        elif vr in _FLOAT_VRS:
+            try:
+                values.append(float(str(item).strip()))
+            except ValueError:
+                continue
+        else:
+            values.append(str(item))
+    return values or None
+
+
+def to_dicom_json(metadata: Optional[dict], keywords: Optional[Iterable[str]] = None) -> Dict[str, Any]:
+    """Convert Orthanc's simplified tag dict into the DICOM JSON model (PS3.18 F.2).
+
+    When `keywords` is given only those attributes are emitted. Bulk binary
+    attributes are skipped; callers add BulkDataURIs where needed.
+    """
+    metadata = metadata or {}
+    selected = metadata.keys() if keywords is None else keywords
+    result: Dict[str, Any] = {}
+    for key in selected:
+        if key not in metadata:
+            continue
+        tag = resolve_tag(key)
+        if tag is None:
+            continue
+        vr = _vr_for(tag)
+        if vr is None or vr in _BULK_VRS:
+            continue
+        element: Dict[str, Any] = {"vr": vr}
+        values = _convert_values(vr, metadata[key])
+        if values is not None:
+            element["Value"] = values
+        result[tag_to_hex(tag)] = element
+    return dict(sorted(result.items()))
+
+
+def dicom_json_element(vr: str, *values: Any) -> Dict[str, Any]:
+    element: Dict[str, Any] = {"vr": vr}
+    if values:
+        element["Value"] = list(values)
+    return element
@@ -0,0 +1,148 @@
+import copy
+from typing import Any, Dict, List
+
+# RFC 6902 JSON Patch: diffing and applying the add/remove/replace/test subset
+
+Patch = List[Dict[str, Any]]
+
+
+class JsonPatchError(ValueError):
+    pass
+
+
+def escape_pointer_token(token: Any) -> str:
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def parse_pointer(pointer: str) -> List[str]:
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise JsonPatchError(f"Invalid JSON pointer: {pointer}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def make_patch(old: Any, new: Any) -> Patch:
+    """Operations turning `old` into `new`.
+
+    Objects are diffed key by key and arrays element by element after
+    trimming their common prefix and suffix, so a change deep inside a large
+    document produces a patch proportional to the change, not the document.
+    """
+    patch: Patch = []
+    _diff(old, new, "", patch)
+    return patch
+
+
+def _diff(old: Any, new: Any, path: str, patch: Patch) -> None:
+    if type(old) is type(new) and old == new:
+        return
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key in old:
+            if key not in new:
+                patch.append({"op": "remove", "path": f"{path}/{escape_pointer_token(key)}"})
+        for key, value in new.items():
+            child = f"{path}/{escape_pointer_token(key)}"
+            if key in old:
+                _diff(old[key], value, child, patch)
+            else:
+                patch.append({"op": "add", "path": child, "value": copy.deepcopy(value)})
+        return
+    if isinstance(old, list) and isinstance(new, list):
+        _diff_lists(old, new, path, patch)
+        return
+    patch.append({"op": "replace", "path": path, "value": copy.deepcopy(new)})
+
+
+def _diff_lists(old: list, new: list, path: str, patch: Patch) -> None:
+    prefix = 0
+    limit = min(len(old), len(new))
+    while prefix < limit and type(old[prefix]) is type(new[prefix]) and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while (suffix < limit - prefix and type(old[-1 - suffix]) is type(new[-1 - suffix])
+           and old[-1 - suffix] == new[-1 - suffix]):
+        suffix += 1
+
+    old_middle = len(old) - prefix - suffix
+    new_middle = len(new) - prefix - suffix
+    for offset in range(min(old_middle, new_middle)):
+        _diff(old[prefix + offset], new[prefix + offset], f"{path}/{prefix + offset}", patch)
+    for offset in range(old_middle, new_middle):
+        patch.append({"op": "add", "path": f"{path}/{prefix + offset}", "value": copy.deepcopy(new[prefix + offset])})
+    for _ in range(new_middle, old_middle):
+        patch.append({"op": "remove", "path": f"{path}/{prefix + new_middle}"})
+
+
+def _resolve_parent(doc: Any, tokens: List[str]):
+    parent = doc
+    for token in tokens[:-1]:
+        try:
+            parent = parent[int(token)] if isinstance(parent, list) else parent[token]
+        except (KeyError, IndexError, ValueError, TypeError):
+            raise JsonPatchError(f"Path not found: /{'/'.join(tokens)}")
+    return parent
+
+
+def _list_index(container: list, token: str, allow_end: bool) -> int:
+    if token == "-" and allow_end:
+        return len(container)
+    try:
+        index = int(token)
+    except ValueError:
+        raise JsonPatchError(f"Invalid array index: {token}")
+    if index < 0 or index > len(container) or (index == len(container) and not allow_end):
+        raise JsonPatchError(f"Array index out of range: {token}")
+    return index
+
+
+def apply_patch(doc: Any, patch: Patch, in_place: bool = False) -> Any:
+    """Apply a patch, returning the new document (a copy unless `in_place`)"""
+    if not in_place:
+        doc = copy.deepcopy(doc)
+    for operation in patch:
+        op = operation.get("op")
+        tokens = parse_pointer(operation.get("path", ""))
+        value = operation.get("value")
+
+        if not tokens:
+            if op in ("add", "replace"):
+                doc = copy.deepcopy(value)
+                continue
+            if op == "test":
+                if doc != value:
+                    raise JsonPatchError("Test operation failed at /")
+                continue
+            raise JsonPatchError(f"Cannot {op} the document root")
+
+        parent = _resolve_parent(doc, tokens)
+        token = tokens[-1]
+        if isinstance(parent, list):
+            if op == "add":
+                parent.insert(_list_index(parent, token, allow_end=True), copy.deepcopy(value))
+            elif op == "remove":
+                del parent[_list_index(parent, token, allow_end=False)]
+            elif op == "replace":
+                parent[_list_index(parent, token, allow_end=False)] = copy.deepcopy(value)
+            elif op == "test":
+                if parent[_list_index(parent, token, allow_end=False)] != value:
+                    raise JsonPatchError(f"Test operation failed at {operation['path']}")
+            else:
+                raise JsonPatchError(f"Unsupported operation: {op}")
+        elif isinstance(parent, dict):
+            if op == "add":
+                parent[token] = copy.deepcopy(value)
+            elif op in ("remove", "replace", "test"):
+                if token not in parent:
+                    raise JsonPatchError(f"Path not found: {operation['path']}")
+                if op == "remove":
+                    del parent[token]
+                elif op == "replace":
+                    parent[token] = copy.deepcopy(value)
+                elif parent[token] != value:
+                    raise JsonPatchError(f"Test operation failed at {operation['path']}")
+            else:
+                raise JsonPatchError(f"Unsupported operation: {op}")
+        else:
+            raise JsonPatchError(f"Path not found: {operation['path']}")
+    return doc
@@ -0,0 +1,145 @@
+import re
+import tempfile
+import uuid
+from typing import AsyncIterable, AsyncIterator, BinaryIO, Dict, Iterable, Iterator, Optional, Tuple
+
+CRLF = b"\r\n"
+
+Part = Tuple[Dict[str, str], Iterable[bytes]]
+
+# Parts larger than this spill from memory to a temporary file while parsing
+SPOOL_MAX_MEMORY = 8 * 1024 * 1024
+
+_BOUNDARY_RE = re.compile(r'boundary="?([^";]+)"?', re.IGNORECASE)
+
+
+class MultipartError(ValueError):
+    pass
+
+
+def new_boundary() -> str:
+    return f"radiology-{uuid.uuid4().hex}"
+
+
+def multipart_related_media_type(boundary: str, part_type: str = "application/dicom") -> str:
+    return f'multipart/related; type="{part_type}"; boundary={boundary}'
+
+
+def iter_multipart_related(parts: Iterable[Part], boundary: str) -> Iterator[bytes]:
+    """Serialize parts as a multipart/related body without buffering part payloads"""
+    delimiter = b"--" + boundary.encode("ascii")
+    for headers, body in parts:
+        head = delimiter + CRLF
+        for name, value in headers.items():
+            head += f"{name}: {value}".encode("latin-1") + CRLF
+        yield head + CRLF
+        for chunk in body:
+            if chunk:
+                yield chunk
+        yield CRLF
+    yield delimiter + b"--" + CRLF
+
+
+def parse_boundary(content_type: Optional[str]) -> str:
+    """Extract the boundary parameter from a multipart Content-Type header"""
+    if not content_type or not content_type.lower().startswith("multipart/"):
+        raise MultipartError("Expected a multipart request body")
+    match = _BOUNDARY_RE.search(content_type)
+    if not match:
+        raise MultipartError("Multipart Content-Type is missing its boundary")
+    return match.group(1)
+
+
+def _parse_headers(raw: bytes) -> Dict[str, str]:
+    headers = {}
+    for line in raw.decode("latin-1").split("\r\n"):
+        if not line:
+            continue
+        name, sep, value = line.partition(":")
+        if not sep:
+            raise MultipartError(f"Malformed part header: {line!r}")
+        headers[name.strip().lower()] = value.strip()
+    return headers
+
+
+async def aiter_multipart_parts(
+    stream: AsyncIterable[bytes],
+    boundary: str,
+    max_part_size: Optional[int] = None,
+) -> AsyncIterator[Tuple[Dict[str, str], BinaryIO]]:
+    """Incrementally split a multipart body into parts as it arrives.
+
+    Each part is yielded as soon as its closing delimiter has been read, with
+    lower-cased headers and a spooled file positioned at the start of the part
+    body. Only the delimiter-sized tail of the stream is held in memory between
+    chunks, so request size does not bound memory use.
+    """
+    delimiter = b"--" + boundary.encode("latin-1")
+    body_delimiter = CRLF + delimiter
+    buffer = bytearray()
+    state = "preamble"
+    headers: Dict[str, str] = {}
+    part: Optional[BinaryIO] = None
+    part_size = 0
+
+    async for chunk in stream:
+        buffer += chunk
+        while True:
+            if state == "preamble":
+                index = buffer.find(delimiter)
+                if index < 0:
+                    del buffer[:max(0, len(buffer) - len(delimiter))]
+                    break
+                del buffer[:index + len(delimiter)]
+                state = "delimiter"
+            elif state == "delimiter":
+                if len(buffer) < 2:
+                    break
+                if buffer[:2] == b"--":
+                    return
+                line_end = buffer.find(CRLF)
+                if line_end < 0:
+                    break
+                # Transport padding after the delimiter is allowed before CRLF
+                if buffer[:line_end].strip(b" \t"):
+                    raise MultipartError("Malformed multipart delimiter")
+                del buffer[:line_end + 2]
+                state = "headers"
+            elif state == "headers":
+                index = buffer.find(CRLF + CRLF)
+                if buffer.startswith(CRLF):
+                    index, header_end = 0, 2
+                elif index >= 0:
+                    header_end = index + 4
+                else:
+                    break
+                headers = _parse_headers(bytes(buffer[:index]))
+                del buffer[:header_end]
+                part = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_MEMORY)
+                part_size = 0
+                state = "body"
+            else:
+                index = buffer.find(body_delimiter)
+                if index < 0:
+                    flush = len(buffer) - len(body_delimiter)
+                    if flush > 0:
+                        part.write(buffer[:flush])
+                        part_size += flush
+                        del buffer[:flush]
+                else:
+                    part.write(buffer[:index])
+                    part_size += index
+                    del buffer[:index + len(body_delimiter)]
+                if max_part_size is not None and part_size > max_part_size:
+                    part.close()
+                    raise MultipartError(f"Multipart part exceeds {max_part_size} bytes")
+                if index < 0:
+                    break
+                part.seek(0)
+                yield headers, part
+                part = None
+                state = "delimiter"
+
+    if part is not None:
+        part.close()
+    raise MultipartError("Multipart body ended before the closing delimiter")
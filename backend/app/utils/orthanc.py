@@ -1,12 +1,33 @@
+import threading
 import requests
-from typing import Optional
+from typing import Iterator, Optional
 
 from app.core.settings import ORTHANC_PASSWORD, ORTHANC_URL, ORTHANC_USERNAME
 
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def get_orthanc_session() -> requests.Session:
+    """Shared keep-alive session so repeated Orthanc calls reuse pooled connections"""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                session.auth = (ORTHANC_USERNAME, ORTHANC_PASSWORD)
+                adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=32)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+
 class OrthancClient:
     def __init__(self):
         self.url = ORTHANC_URL
         self.auth = (ORTHANC_USERNAME, ORTHANC_PASSWORD)
+        self.session = get_orthanc_session()
     
     def upload_dicom(self, file) -> str:
         """Upload DICOM file to Orthanc server"""
@@ -42,6 +63,24 @@ class OrthancClient:
             print(f"Error downloading from Orthanc: {e}")
             raise Exception(f"Failed to download from Orthanc server: {str(e)}")
     
+    def iter_dicom_file(self, orthanc_id: str, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+        """Stream a DICOM file from Orthanc in chunks over the shared session"""
+        return self.iter_instance_resource(orthanc_id, "file", chunk_size)
+    
+    def iter_instance_resource(self, orthanc_id: str, resource: str, chunk_size: int = 1024 * 1024) -> Iterator[bytes]:
+        """Stream a sub-resource of an instance, e.g. 'frames/0/raw' or 'content/0008-0016'"""
+        url = f"{self.url}/instances/{orthanc_id}/{resource}"
+        
+        try:
+            with self.session.get(url, stream=True, timeout=30) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(chunk_size=chunk_size):
+                    if chunk:
+                        yield chunk
+        except requests.exceptions.RequestException as e:
+            print(f"Error streaming from Orthanc: {e}")
+            raise Exception(f"Failed to download from Orthanc server: {str(e)}")
+    
     def get_dicom_metadata(self, orthanc_id: str) -> Optional[dict]:
         """Get DICOM metadata from Orthanc server"""
         url = f"{self.url}/instances/{orthanc_id}/tags?simplify"
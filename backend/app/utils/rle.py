@@ -0,0 +1,92 @@
+from typing import Any, Dict, List
+
+import numpy as np
+
+# Integer arrays at least this long (e.g. brush labelmaps) are stored run-length encoded
+RLE_MIN_LENGTH = 4096
+RLE_ENCODING = "rle"
+
+
+def rle_encode(values) -> Dict[str, Any]:
+    """Run-length encode a flat sequence of integers into {"encoding", "length", "values", "counts"}"""
+    array = np.asarray(values)
+    if array.size == 0:
+        return {"encoding": RLE_ENCODING, "length": 0, "values": [], "counts": []}
+    starts = np.concatenate(([0], np.flatnonzero(array[1:] != array[:-1]) + 1))
+    counts = np.diff(np.concatenate((starts, [array.size])))
+    return {
+        "encoding": RLE_ENCODING,
+        "length": int(array.size),
+        "values": array[starts].tolist(),
+        "counts": counts.tolist(),
+    }
+
+
+def rle_decode(encoded: Dict[str, Any]) -> List[int]:
+    values = np.asarray(encoded["values"], dtype=np.int64)
+    counts = np.asarray(encoded["counts"], dtype=np.int64)
+    if counts.sum() != encoded["length"]:
+        raise ValueError("RLE counts do not add up to the declared length")
+    return np.repeat(values, counts).tolist()
+
+
+def is_rle(value: Any) -> bool:
+    """Whether value has the exact shape rle_encode produces; user data that merely says "rle" does not"""
+    return (
+        isinstance(value, dict)
+        and value.keys() == {"encoding", "length", "values", "counts"}
+        and value["encoding"] == RLE_ENCODING
+        and isinstance(value["length"], int) and not isinstance(value["length"], bool)
+        and isinstance(value["values"], list) and isinstance(value["counts"], list)
+        and len(value["values"]) == len(value["counts"])
+    )
+
+
+def _as_int_array(value: list):
+    # Cheap rejections first so ordinary lists of objects are not converted
+    if not isinstance(value[0], int) or isinstance(value[0], bool):
+        return None
+    try:
+        array = np.asarray(value)
+    except (ValueError, OverflowError):
+        return None
+    if array.ndim != 1 or array.dtype.kind not in "iu":
+        return None
+    return array
+
+
+def expand_arrays(doc: Any) -> Any:
+    """Undo compact_arrays: replace every RLE object in a JSON document with the plain array.
+
+    Objects that look like RLE but do not decode (bad counts or values) are
+    returned unchanged rather than failing the whole document.
+    """
+    if is_rle(doc):
+        try:
+            return rle_decode(doc)
+        except (ValueError, TypeError):
+            return doc
+    if isinstance(doc, dict):
+        return {key: expand_arrays(value) for key, value in doc.items()}
+    if isinstance(doc, list):
+        return [expand_arrays(value) for value in doc]
+    return doc
+
+
+def compact_arrays(doc: Any, min_length: int = RLE_MIN_LENGTH) -> Any:
+    """Replace long integer arrays in a JSON document with their RLE form when that is smaller.
+
+    Mask-like data (long runs of the same label) shrinks by orders of
+    magnitude; arrays that would not at least halve are left alone.
+    """
+    if isinstance(doc, dict):
+        return {key: compact_arrays(value, min_length) for key, value in doc.items()}
+    if isinstance(doc, list):
+        if len(doc) >= min_length:
+            array = _as_int_array(doc)
+            if array is not None:
+                encoded = rle_encode(array)
+                if len(encoded["counts"]) * 2 <= len(doc) // 2:
+                    return encoded
+        return [compact_arrays(value, min_length) for value in doc]
+    return doc
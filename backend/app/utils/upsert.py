@@ -0,0 +1,56 @@
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+from sqlalchemy import bindparam, case, func, update
+from sqlalchemy.orm import Session
+
+
+def dialect_insert(db: Session):
+    """The bound database's insert() construct, which supports INSERT ... ON CONFLICT"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f"Upserts need INSERT ... ON CONFLICT, which {dialect} does not support")
+    return insert
+
+
+def apply_count_deltas(
+    db: Session,
+    model,
+    keys: Sequence[str],
+    count_column: str,
+    totals: Dict[Tuple, int],
+    extra: Optional[Dict[Tuple, Dict[str, Any]]] = None
+) -> None:
+    """Add summed deltas to a counter table keyed by a unique index on `keys`.
+
+    Increases are upserted in one statement and decreases (clamped at zero)
+    applied in another; `extra` holds columns set only when a row is created.
+    """
+    table = model.__table__
+    increments = [
+        {**dict(zip(keys, key)), **(extra or {}).get(key, {}), count_column: delta, "is_active": True}
+        for key, delta in totals.items() if delta > 0
+    ]
+    decrements = [
+        {**{f"target_{column}": value for column, value in zip(keys, key)}, "delta": -delta}
+        for key, delta in totals.items() if delta < 0
+    ]
+    count = table.c[count_column]
+    if increments:
+        insert = dialect_insert(db)
+        statement = insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c[column] for column in keys],
+            set_={count_column: count + statement.excluded[count_column], "updated_at": func.now()}
+        )
+        db.execute(statement, increments)
+    if decrements:
+        db.execute(
+            update(table)
+            .where(*[table.c[column] == bindparam(f"target_{column}") for column in keys])
+            .values({count_column: case((count > bindparam("delta"), count - bindparam("delta")), else_=0)}),
+            decrements
+        )
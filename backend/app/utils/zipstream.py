@@ -0,0 +1,69 @@
+import io
+import time
+import zipfile
+from typing import Iterable, Iterator, List
+
+
+class _ZipSink(io.RawIOBase):
+    """Write-only, non-seekable buffer that zipfile writes into and we drain.
+
+    Because it cannot seek, zipfile emits data descriptors after each entry
+    instead of patching local headers, which is what makes streaming possible.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ZipStreamWriter:
+    """Build a ZIP archive incrementally, handing out bytes as entries are written.
+
+    Memory use is bounded by the largest single chunk passed in, not by the
+    archive size, so archives of any size can be sent straight to a client.
+    """
+
+    def __init__(self, compression: int = zipfile.ZIP_DEFLATED):
+        self._sink = _ZipSink()
+        self._zip = zipfile.ZipFile(self._sink, mode="w", compression=compression)
+
+    def _drain(self) -> Iterator[bytes]:
+        data = self._sink.drain()
+        if data:
+            yield data
+
+    def write_entry(self, name: str, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        """Add an entry whose content arrives as an iterable of byte chunks"""
+        info = zipfile.ZipInfo(name, date_time=time.localtime(time.time())[:6])
+        info.compress_type = self._zip.compression
+        with self._zip.open(info, mode="w", force_zip64=True) as entry:
+            for chunk in chunks:
+                entry.write(chunk)
+                yield from self._drain()
+        yield from self._drain()
+
+    def write_str(self, name: str, data: str) -> Iterator[bytes]:
+        return self.write_entry(name, [data.encode("utf-8")])
+
+    def close(self) -> Iterator[bytes]:
+        """Write the central directory"""
+        self._zip.close()
+        yield from self._drain()
@@ -7,7 +7,7 @@ import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app.core.database import Base, engine
-from app.models import Annotation, AnnotationHistory, AuditLog, Image, Project, User, VerificationToken, Workspace, workspace_members
+from app.models import Annotation, AnnotationHistory, AnnotationMask, AuditLog, ExportJob, Image, ProgressCount, Project, ReviewStatusCount, SearchDocument, Tag, TagPairCount, User, UserTagCount, VerificationToken, Workspace, workspace_members
 from app.models.folder import Folder
 
 def create_tables():
@@ -1,7 +1,13 @@
+import io
 import os
 import pytest
+import itertools
+import numpy as np
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.uid import ExplicitVRLittleEndian, generate_uid
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
 from fastapi.testclient import TestClient
 
 os.environ.setdefault("DB_HOST", "localhost")
@@ -35,10 +41,12 @@ from app.core.database import Base  # noqa: E402
 from app.core.dependencies import get_db  # noqa: E402
 from app.services import email as email_service  # noqa: E402
 from app.api.endpoints.user import functions as user_functions  # noqa: E402
+from app.models import Folder, Image, Project, User, Workspace, workspace_members  # noqa: E402
+from app.models.project import project_users  # noqa: E402
 
 
 TEST_DATABASE_URL = "sqlite:///:memory:"
-engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False})
+engine = create_engine(TEST_DATABASE_URL, connect_args={"check_same_thread": False}, poolclass=StaticPool)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 # Create tables once for the in-memory DB
@@ -83,3 +91,120 @@ REPO_ROOT = PROJECT_ROOT.parent
 for p in (PROJECT_ROOT, REPO_ROOT):
     if str(p) not in sys.path:
         sys.path.insert(0, str(p))
+
+
+_ids = itertools.count(1)
+
+
+@pytest.fixture()
+def make_user(db_session):
+    def _make_user(**overrides):
+        user = User(
+            email=overrides.pop("email", f"user{next(_ids)}@example.com"),
+            password=user_functions.pwd_context.hash("strongpassword123"),
+            is_email_verified=True,
+            **overrides,
+        )
+        db_session.add(user)
+        db_session.commit()
+        db_session.refresh(user)
+        return user
+
+    return _make_user
+
+
+@pytest.fixture()
+def auth_headers():
+    def _auth_headers(user):
+        token = user_functions.create_access_token({"id": user.id, "email": user.email, "role": user.role.value})
+        return {"Authorization": f"Bearer {token}"}
+
+    return _auth_headers
+
+
+@pytest.fixture()
+def make_project(db_session):
+    """Create a workspace, project and root folder owned by `owner`, with optional extra members"""
+    def _make_project(owner, members=()):
+        workspace = Workspace(name=f"Workspace {next(_ids)}", owner_id=owner.id)
+        db_session.add(workspace)
+        db_session.commit()
+        db_session.execute(workspace_members.insert().values(workspace_id=workspace.id, user_id=owner.id, role="owner"))
+        project = Project(name=f"Project {next(_ids)}", owner_id=owner.id, workspace_id=workspace.id)
+        db_session.add(project)
+        db_session.commit()
+        db_session.execute(project_users.insert().values(project_id=project.id, user_id=owner.id, role="owner"))
+        for member in members:
+            db_session.execute(project_users.insert().values(project_id=project.id, user_id=member.id, role="member"))
+        folder = Folder(name="Root", project_id=project.id)
+        db_session.add(folder)
+        db_session.commit()
+        db_session.refresh(project)
+        db_session.refresh(folder)
+        return project, folder
+
+    return _make_project
+
+
+@pytest.fixture()
+def make_image(db_session):
+    """Create an image record in `folder` of `project`, uploaded by `owner`"""
+    def _make_image(owner, project, folder, orthanc_id, **fields):
+        image = Image(orthanc_id=orthanc_id, uploader_id=owner.id, project_id=project.id, folder_id=folder.id, **fields)
+        db_session.add(image)
+        db_session.commit()
+        return image
+
+    return _make_image
+
+
+@pytest.fixture()
+def make_rect():
+    """Cornerstone tool data for a box drawn from (x1, y1) to (x2, y2)"""
+    def _make_rect(x1, y1, x2, y2, tool="RectangleRoi", **extra):
+        return {"toolName": tool, "handles": {"start": {"x": x1, "y": y1}, "end": {"x": x2, "y": y2}}, **extra}
+
+    return _make_rect
+
+
+@pytest.fixture()
+def make_dicom():
+    """Encode a 2D pixel array as a Part 10 DICOM file; extra keywords become dataset attributes"""
+    def _make_dicom(pixels: np.ndarray, **attributes) -> bytes:
+        ds = Dataset()
+        ds.file_meta = FileMetaDataset()
+        ds.file_meta.MediaStorageSOPClassUID = "1.2.840.10008.5.1.4.1.1.7"
+        ds.file_meta.MediaStorageSOPInstanceUID = generate_uid()
+        ds.file_meta.TransferSyntaxUID = ExplicitVRLittleEndian
+        ds.SOPClassUID = ds.file_meta.MediaStorageSOPClassUID
+        ds.SOPInstanceUID = ds.file_meta.MediaStorageSOPInstanceUID
+        ds.Rows, ds.Columns = pixels.shape
+        ds.SamplesPerPixel = 1
+        ds.PhotometricInterpretation = "MONOCHROME2"
+        ds.BitsAllocated = ds.BitsStored = pixels.dtype.itemsize * 8
+        ds.HighBit = ds.BitsStored - 1
+        ds.PixelRepresentation = 0
+        ds.PixelData = pixels.tobytes()
+        for keyword, value in attributes.items():
+            setattr(ds, keyword, value)
+        buffer = io.BytesIO()
+        ds.save_as(buffer, enforce_file_format=True)
+        return buffer.getvalue()
+
+    return _make_dicom
+
+
+class FakeInstanceCache:
+    def __init__(self, files):
+        self.files = files
+        self.opened = []
+
+    def open(self, orthanc_id):
+        self.opened.append(orthanc_id)
+        return io.BytesIO(self.files[orthanc_id])
+
+
+@pytest.fixture()
+def make_instance_cache():
+    """Stand-in for the instance cache serving the given {orthanc_id: DICOM bytes}"""
+    return FakeInstanceCache
@@ -0,0 +1,75 @@
+from app.models import AnnotationHistory
+from tests.conftest import TestingSessionLocal
+
+
+def test_bulk_creates_and_updates_with_per_item_results(client, make_user, make_project, make_image, auth_headers):
+    owner = make_user()
+    stranger = make_user()
+    project, folder = make_project(owner)
+    other_project, other_folder = make_project(stranger)
+    headers = auth_headers(owner)
+    image = make_image(owner, project, folder, "bulk-1")
+    foreign = make_image(stranger, other_project, other_folder, "bulk-2")
+    box = {"annotations": [{"toolName": "RectangleRoi", "handles": {"start": {"x": 1, "y": 1}, "end": {"x": 4, "y": 4}}}]}
+    existing = client.post("/annotations/", json={"image_id": image.id, "data": box, "tags": []}, headers=headers).json()
+
+    items = [{"image_id": image.id, "data": {"annotations": [], "n": n}, "tags": ["ai"]} for n in range(200)]
+    items += [
+        {"image_id": foreign.id, "data": {}},
+        {"image_id": image.id},
+        {"id": existing["id"], "version": 1, "patch": [{"op": "replace", "path": "/annotations/0/handles/end/x", "value": 8}]},
+        {"id": existing["id"] + 10_000, "data": {}},
+        {"image_id": "not-a-number", "data": {}},
+    ]
+    resp = client.post("/annotations/bulk", json={"items": items}, headers=headers)
+
+    assert resp.status_code == 200
+    body = resp.json()
+    assert (body["created"], body["updated"], body["failed"]) == (200, 1, 4)
+    results = body["results"]
+    assert [result["index"] for result in results] == list(range(len(items)))
+    assert all(result["status"] == "created" and result["version"] == 1 for result in results[:200])
+    assert len({result["id"] for result in results[:200]}) == 200
+    assert results[200]["error"] == "Image not found"
+    assert results[201]["error"] == "New annotations need image_id and data"
+    assert results[202] == {"index": 202, "status": "updated", "id": existing["id"], "version": 2, "error": None}
+    assert results[203]["error"] == "Annotation not found"
+    assert results[204]["error"].startswith("image_id")
+
+    listed = client.get(f"/annotations/image/{image.id}", headers=headers).json()
+    assert len(listed) == 201
+    updated = client.get(f"/annotations/{existing['id']}", headers=headers).json()
+    assert updated["data"]["annotations"][0]["handles"]["end"]["x"] == 8
+
+    db = TestingSessionLocal()
+    try:
+        created_id = results[0]["id"]
+        history = db.query(AnnotationHistory).filter(AnnotationHistory.annotation_id == created_id).all()
+        assert [(entry.version, entry.is_snapshot) for entry in history] == [(1, True)]
+        assert client.get(f"/annotations/{existing['id']}/versions/1", headers=headers).json()["data"] == box
+    finally:
+        db.close()
+
+    # A stale version is a per-item conflict
+    stale = client.post("/annotations/bulk", json={"items": [{"id": existing["id"], "version": 1, "data": {}}]}, headers=headers)
+    assert stale.json()["results"][0]["status"] == "error"
+    assert stale.json()["results"][0]["version"] == 2
+
+    # Annotations of projects the caller is not a member of are not found, item by item
+    foreign_write = client.post("/annotations/bulk", json={"items": [{"id": existing["id"], "data": {}}]}, headers=auth_headers(stranger))
+    assert foreign_write.json()["results"][0]["error"] == "Annotation not found"
+
+
+def test_atomic_bulk_writes_nothing_on_failure(client, make_user, make_project, make_image, auth_headers):
+    owner = make_user()
+    project, folder = make_project(owner)
+    headers = auth_headers(owner)
+    image = make_image(owner, project, folder, "bulk-3")
+
+    resp = client.post(
+        "/annotations/bulk",
+        json={"atomic": True, "items": [{"image_id": image.id, "data": {}}, {"image_id": image.id}]},
+        headers=headers,
+    )
+    assert [result["status"] for result in resp.json()["results"]] == ["skipped", "error"]
+    assert client.get(f"/annotations/image/{image.id}", headers=headers).json() == []
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from app.services.annotation_events import (
+    ANNOTATION_CREATED,
+    ANNOTATION_UPDATED,
+    RESYNC,
+    InProcessBroker,
+)
+
+
+def test_subscription_coalesces_and_resyncs_slow_clients():
+    async def scenario():
+        broker = InProcessBroker(max_pending=2)
+        subscription = broker.subscribe("image:1")
+        broker.publish("image:1", {"type": ANNOTATION_CREATED, "annotation_id": 1, "version": 1})
+        for version in range(2, 6):
+            broker.publish("image:1", {"type": ANNOTATION_UPDATED, "annotation_id": 1, "version": version})
+        broker.publish("image:1", {"type": ANNOTATION_UPDATED, "annotation_id": 1, "version": 3})  # late, stale
+        broker.publish("image:2", {"type": ANNOTATION_UPDATED, "annotation_id": 9, "version": 1})
+
+        events = await subscription.next_events()
+        assert events == [{"type": ANNOTATION_CREATED, "annotation_id": 1, "version": 5}]
+        assert subscription.coalesced == 5
+
+        for annotation_id in range(3):
+            broker.publish("image:1", {"type": ANNOTATION_UPDATED, "annotation_id": annotation_id, "version": 2})
+        assert await subscription.next_events() == [{"type": RESYNC, "channel": "image:1"}]
+
+        broker.unsubscribe(subscription)
+        assert broker.subscriber_count("image:1") == 0
+
+    asyncio.run(scenario())
+
+
+def test_socket_pushes_annotation_changes(client, make_user, make_project, make_image, auth_headers):
+    owner = make_user()
+    outsider = make_user()
+    reviewer = make_user()
+    project, folder = make_project(owner, members=(reviewer,))
+    headers = auth_headers(owner)
+    image = make_image(owner, project, folder, "ws-1")
+    token = headers["Authorization"].split()[1]
+
+    with pytest.raises(WebSocketDisconnect):
+        with client.websocket_connect(f"/annotations/image/{image.id}/ws?token={auth_headers(outsider)['Authorization'].split()[1]}") as ws:
+            ws.receive_json()
+
+    with client.websocket_connect(f"/annotations/image/{image.id}/ws?token={token}") as ws:
+        snapshot = ws.receive_json()
+        assert snapshot == {"type": "snapshot", "image_id": image.id, "annotations": []}
+
+        # Outsiders cannot write to the image, so nothing reaches its subscribers
+        body = {"image_id": image.id, "data": {}, "tags": ["nodule"]}
+        assert client.post("/annotations/", json=body, headers=auth_headers(outsider)).status_code == 404
+        assert client.post("/annotations/", json={**body, "image_id": 999999}, headers=headers).status_code == 404
+
+        created = client.post("/annotations/", json={"image_id": image.id, "data": {}, "tags": []}, headers=headers).json()
+        event = ws.receive_json()
+        assert event["type"] == "annotation.created"
+        assert (event["annotation_id"], event["version"]) == (created["id"], 1)
+
+        client.post("/reviews/claim", params={"project_id": project.id}, headers=auth_headers(reviewer))
+        client.post(
+            "/reviews/decisions",
+            json={"decisions": [{"annotation_id": created["id"], "status": "approved"}]},
+            headers=auth_headers(reviewer),
+        )
+        event = ws.receive_json()
+        assert event["type"] == "annotation.reviewed"
+        assert event["version"] == 2
+        assert event["annotation"]["review_status"] == "approved"
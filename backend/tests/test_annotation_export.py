@@ -0,0 +1,62 @@
+import io
+import json
+import zipfile
+
+from app.models import Annotation
+from app.models.annotation import ReviewStatus
+from app.utils.orthanc import OrthancClient
+from app.utils.zipstream import ZipStreamWriter
+
+
+def test_zip_stream_writer_produces_readable_archive():
+    archive = ZipStreamWriter()
+    payload = b"".join([
+        *archive.write_entry("big.bin", (bytes([n]) * 4096 for n in range(64))),
+        *archive.write_str("note.txt", "hello"),
+        *archive.close(),
+    ])
+
+    with zipfile.ZipFile(io.BytesIO(payload)) as zf:
+        assert zf.read("note.txt") == b"hello"
+        assert zf.read("big.bin") == b"".join(bytes([n]) * 4096 for n in range(64))
+
+
+def test_project_bulk_export_streams_annotations_and_dicoms(
+    client, db_session, make_user, make_project, make_image, auth_headers, monkeypatch
+):
+    owner = make_user()
+    project, folder = make_project(owner)
+    other_project, other_folder = make_project(make_user())
+    images = [make_image(owner, project, folder, f"export-{n}") for n in range(3)]
+    foreign = make_image(owner, other_project, other_folder, "foreign")
+    for image in (images[0], images[0], images[2]):
+        db_session.add(Annotation(
+            image_id=image.id, user_id=owner.id, version=1, tags=["nodule"],
+            data={"annotations": [{"toolName": "RectangleRoi"}]}, review_status=ReviewStatus.PENDING,
+        ))
+    db_session.commit()
+
+    def fake_iter_dicom_file(self, orthanc_id, chunk_size=1024 * 1024):
+        yield f"DICM-{orthanc_id}".encode()
+
+    monkeypatch.setattr(OrthancClient, "iter_dicom_file", fake_iter_dicom_file)
+
+    resp = client.post(
+        "/annotations/bulk-export",
+        params={"project_id": project.id, "include_dicom": True},
+        headers=auth_headers(owner),
+    )
+
+    assert resp.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(resp.content)) as zf:
+        names = set(zf.namelist())
+        assert f"dicom_{images[1].id}_export-1.dcm" in names
+        assert zf.read(f"dicom_{images[2].id}_export-2.dcm") == b"DICM-export-2"
+        first = json.loads(zf.read(f"annotations_image_{images[0].id}.json"))
+        assert len(first["annotations"]) == 2
+        assert first["annotations"][0]["data"] == {"annotations": [{"toolName": "RectangleRoi"}]}
+        summary = json.loads(zf.read("annotations_summary.json"))
+    assert summary["total_images"] == 3
+    assert summary["total_annotations"] == 3
+    assert [entry["image_id"] for entry in summary["images"]] == [image.id for image in images]
+    assert f"annotations_image_{foreign.id}.json" not in names
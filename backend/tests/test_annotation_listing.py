@@ -0,0 +1,73 @@
+def test_image_listing_checks_access_and_revalidates(client, make_user, make_project, make_image, auth_headers):
+    owner = make_user()
+    outsider = make_user()
+    project, folder = make_project(owner)
+    headers = auth_headers(owner)
+    image = make_image(owner, project, folder, "list-1")
+    created = client.post("/annotations/", json={"image_id": image.id, "data": {}, "tags": []}, headers=headers).json()
+
+    assert client.get(f"/annotations/image/{image.id}", headers=auth_headers(outsider)).status_code == 404
+
+    first = client.get(f"/annotations/image/{image.id}", headers=headers)
+    etag = first.headers["ETag"]
+    cached = client.get(f"/annotations/image/{image.id}", headers={**headers, "If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.content == b""
+
+    client.patch(
+        f"/annotations/{created['id']}",
+        json={"data": {"saved": True}, "tags": None, "review_status": None},
+        headers={**headers, "If-Match": '"1"'},
+    )
+    changed = client.get(f"/annotations/image/{image.id}", headers={**headers, "If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert changed.json()[0]["data"] == {"saved": True}
+
+
+def test_project_listing_pages_and_filters(client, make_user, make_project, make_image, auth_headers):
+    owner = make_user()
+    member = make_user()
+    outsider = make_user()
+    project, folder = make_project(owner, members=[member])
+    other_project, other_folder = make_project(owner)
+    headers = auth_headers(owner)
+    images = [make_image(owner, project, folder, f"list-p{n}") for n in range(3)]
+    elsewhere = make_image(owner, other_project, other_folder, "list-other")
+
+    items = [
+        {"image_id": images[n % 3].id, "data": {"n": n}, "tags": ["nodule"] if n % 2 else ["100%_sure"]}
+        for n in range(7)
+    ]
+    items.append({"image_id": elsewhere.id, "data": {}, "tags": ["nodule"]})
+    client.post("/annotations/bulk", json={"items": items}, headers=headers)
+    client.post("/annotations/", json={"image_id": images[0].id, "data": {}, "tags": []}, headers=auth_headers(member))
+
+    seen = []
+    after_id = None
+    while True:
+        params = {"limit": 3, **({"after_id": after_id} if after_id else {})}
+        page = client.get(f"/annotations/project/{project.id}", params=params, headers=headers).json()
+        seen += [item["id"] for item in page["items"]]
+        after_id = page["next_after_id"]
+        if after_id is None:
+            break
+    assert len(seen) == 8
+    assert seen == sorted(seen)
+
+    def count(**params):
+        return len(client.get(f"/annotations/project/{project.id}", params=params, headers=headers).json()["items"])
+
+    assert count(tag="nodule") == 3
+    assert count(tag="100%_sure") == 4
+    assert count(tag="100") == 0
+    assert count(user_id=member.id) == 1
+    assert count(image_id=images[1].id) == 2
+    assert count(review_status="pending") == 8
+    assert count(review_status="approved") == 0
+
+    first = client.get(f"/annotations/project/{project.id}", headers=headers)
+    assert client.get(
+        f"/annotations/project/{project.id}", headers={**headers, "If-None-Match": first.headers["ETag"]}
+    ).status_code == 304
+    assert client.get(f"/annotations/project/{project.id}", headers=auth_headers(outsider)).status_code == 404
@@ -0,0 +1,81 @@
+import io
+
+import numpy as np
+
+
+def _annotation(client, image, headers):
+    return client.post("/annotations/", json={"image_id": image.id, "data": {}, "tags": []}, headers=headers).json()
+
+
+def test_binary_mask_round_trip_and_dedup(client, make_user, make_project, make_image, auth_headers):
+    owner = make_user()
+    project, folder = make_project(owner)
+    headers = auth_headers(owner)
+    ann = _annotation(client, make_image(owner, project, folder, "mask-1"), headers)
+
+    mask = np.zeros((512, 512), dtype=np.uint8)
+    mask[100:200, 150:300] = 1
+    buffer = io.BytesIO()
+    np.save(buffer, mask)
+
+    resp = client.post(
+        f"/annotations/{ann['id']}/masks", content=buffer.getvalue(),
+        headers={**headers, "Content-Type": "application/x-npy"}
+    )
+    assert resp.status_code == 201
+    stored = resp.json()
+    assert stored["encoding"] == "packbits+zlib"
+    assert stored["shape"] == [512, 512]
+    assert stored["reference"] == {
+        "encoding": "mask-ref", "mask_id": stored["id"], "shape": [512, 512], "dtype": "uint8", "sha256": stored["sha256"]
+    }
+
+    # The same pixels sent raw resolve to the stored mask
+    again = client.post(
+        f"/annotations/{ann['id']}/masks?shape=512,512&dtype=uint8", content=mask.tobytes(),
+        headers={**headers, "Content-Type": "application/octet-stream"}
+    )
+    assert again.json()["id"] == stored["id"]
+    assert len(client.get(f"/annotations/{ann['id']}/masks", headers=headers).json()) == 1
+
+    npy = client.get(f"/annotations/masks/{stored['id']}", headers=headers)
+    assert npy.headers["X-Mask-Shape"] == "512,512"
+    assert np.array_equal(np.load(io.BytesIO(npy.content)), mask)
+
+    raw = client.get(f"/annotations/masks/{stored['id']}?format=raw", headers=headers)
+    assert np.array_equal(np.frombuffer(raw.content, dtype=np.uint8).reshape(512, 512), mask)
+
+    packed = client.get(f"/annotations/masks/{stored['id']}?format=packed", headers=headers)
+    assert len(packed.content) * 100 < mask.nbytes
+
+
+def test_mask_upload_validation_and_access(client, make_user, make_project, make_image, auth_headers):
+    owner = make_user()
+    outsider = make_user()
+    project, folder = make_project(owner)
+    headers = auth_headers(owner)
+    ann = _annotation(client, make_image(owner, project, folder, "mask-1"), headers)
+
+    labels = np.arange(12, dtype=np.int16).reshape(3, 4)
+    bad = client.post(
+        f"/annotations/{ann['id']}/masks?shape=5,5&dtype=int16", content=labels.tobytes(),
+        headers={**headers, "Content-Type": "application/octet-stream"}
+    )
+    assert bad.status_code == 422
+
+    floats = io.BytesIO()
+    np.save(floats, labels.astype(np.float32))
+    assert client.post(
+        f"/annotations/{ann['id']}/masks", content=floats.getvalue(),
+        headers={**headers, "Content-Type": "application/x-npy"}
+    ).status_code == 422
+
+    ok = client.post(
+        f"/annotations/{ann['id']}/masks?shape=3,4&dtype=int16", content=labels.tobytes(),
+        headers={**headers, "Content-Type": "application/octet-stream"}
+    ).json()
+    assert ok["encoding"] == "zlib"
+    fetched = client.get(f"/annotations/masks/{ok['id']}", headers=headers)
+    assert np.array_equal(np.load(io.BytesIO(fetched.content)), labels)
+
+    assert client.get(f"/annotations/masks/{ok['id']}", headers=auth_headers(outsider)).status_code in (403, 404)
@@ -0,0 +1,92 @@
+from app.models import Annotation, AnnotationHistory
+from app.utils.rle import compact_arrays, expand_arrays, is_rle, rle_decode, rle_encode
+
+
+def test_rle_round_trip_and_compaction():
+    labelmap = [0] * 5000 + [2] * 300 + [0] * 4000
+    encoded = rle_encode(labelmap)
+    assert encoded["values"] == [0, 2, 0]
+    assert encoded["counts"] == [5000, 300, 4000]
+    assert rle_decode(encoded) == labelmap
+
+    doc = {"annotations": [{"toolName": "Brush", "pixels": labelmap, "handles": [1, 2]}], "noise": list(range(5000))}
+    compacted = compact_arrays(doc)
+    assert is_rle(compacted["annotations"][0]["pixels"])
+    assert compacted["annotations"][0]["handles"] == [1, 2]
+    assert compacted["noise"] == list(range(5000))  # no runs, left as is
+    assert expand_arrays(compacted) == doc
+
+
+def test_expand_arrays_leaves_partial_rle_lookalikes_alone():
+    lookalikes = [
+        {"encoding": "rle", "values": [1], "counts": [3]},
+        {"encoding": "rle", "length": "3", "values": [1], "counts": [3]},
+        {"encoding": "rle", "length": 4, "values": [1], "counts": [3]},
+        {"encoding": "rle", "length": 3, "values": ["x"], "counts": [3]},
+        {"encoding": "rle", "length": 3, "values": [1], "counts": [3], "note": "user data"},
+    ]
+    assert not is_rle(lookalikes[0]) and not is_rle(lookalikes[-1])
+    assert expand_arrays({"annotations": lookalikes}) == {"annotations": lookalikes}
+
+
+def _create(client, image, headers):
+    data = {"annotations": [{"toolName": "RectangleRoi", "handles": {"start": {"x": 1, "y": 1}, "end": {"x": 5, "y": 5}}}]}
+    return client.post("/annotations/", json={"image_id": image.id, "data": data, "tags": []}, headers=headers).json()
+
+
+def test_patch_updates_are_applied_server_side(client, db_session, make_user, make_project, make_image, auth_headers):
+    owner = make_user()
+    project, folder = make_project(owner)
+    headers = auth_headers(owner)
+    created = _create(client, make_image(owner, project, folder, "patch-1"), headers)
+    labelmap = [0] * 8000 + [1] * 100
+
+    resp = client.patch(
+        f"/annotations/{created['id']}",
+        json={
+            "patch": [
+                {"op": "test", "path": "/annotations/0/toolName", "value": "RectangleRoi"},
+                {"op": "replace", "path": "/annotations/0/handles/end/x", "value": 9},
+                {"op": "add", "path": "/annotations/-", "value": {"toolName": "Brush", "pixels": labelmap}},
+            ],
+        },
+        headers={**headers, "If-Match": '"1"'},
+    )
+
+    assert resp.status_code == 200
+    data = resp.json()["data"]
+    assert data["annotations"][0]["handles"]["end"]["x"] == 9
+    assert data["annotations"][1]["pixels"] == labelmap
+    db_session.expire_all()
+    stored = db_session.get(Annotation, created["id"]).data["annotations"][1]["pixels"]
+    assert stored["encoding"] == "rle" and rle_decode(stored) == labelmap
+    entry = db_session.query(AnnotationHistory).filter(
+        AnnotationHistory.annotation_id == created["id"], AnnotationHistory.version == 2
+    ).one()
+    assert entry.patch[0] == {"op": "replace", "path": "/annotations/0/handles/end/x", "value": 9}
+
+
+def test_patch_requires_version_and_valid_operations(client, make_user, make_project, make_image, auth_headers):
+    owner = make_user()
+    project, folder = make_project(owner)
+    headers = auth_headers(owner)
+    created = _create(client, make_image(owner, project, folder, "patch-1"), headers)
+    body = {"patch": [{"op": "remove", "path": "/annotations/3"}]}
+
+    assert client.patch(f"/annotations/{created['id']}", json=body, headers=headers).status_code == 428
+    resp = client.patch(f"/annotations/{created['id']}", json={**body, "version": 1}, headers=headers)
+    assert resp.status_code == 422
+    assert client.get(f"/annotations/{created['id']}", headers=headers).json()["version"] == 1
+
+
+def test_user_data_marked_rle_round_trips(client, make_user, make_project, make_image, auth_headers):
+    owner = make_user()
+    project, folder = make_project(owner)
+    headers = auth_headers(owner)
+    image = make_image(owner, project, folder, "patch-2")
+    data = {"annotations": [{"toolName": "Brush", "pixels": {"encoding": "rle", "values": [1], "counts": [2]}}]}
+
+    created = client.post("/annotations/", json={"image_id": image.id, "data": data, "tags": []}, headers=headers)
+
+    assert created.status_code == 200
+    assert client.get(f"/annotations/{created.json()['id']}", headers=headers).json()["data"] == data
@@ -0,0 +1,134 @@
+import pytest
+from sqlalchemy import update
+
+from app.models import Annotation, AnnotationHistory
+from app.models.annotation import ReviewStatus
+from app.services import annotation_versions
+from app.utils.jsonpatch import JsonPatchError, apply_patch, make_patch
+
+
+@pytest.mark.parametrize("old, new", [
+    ({"a": 1, "b": [1, 2, 3]}, {"a": 2, "b": [1, 2, 3], "c": None}),
+    ({"annotations": [{"x": 1}, {"x": 2}, {"x": 3}]}, {"annotations": [{"x": 1}, {"x": 9}, {"x": 3}, {"x": 4}]}),
+    ({"annotations": [1, 2, 3, 4, 5]}, {"annotations": [1, 5]}),
+    ({"a/b": {"~c": True}}, {"a/b": {"~c": 1}}),
+    ([1, 2], {"now": "an object"}),
+])
+def test_patch_round_trip(old, new):
+    patch = make_patch(old, new)
+    assert apply_patch(old, patch) == new
+
+
+def test_patch_is_proportional_to_change():
+    old = {"annotations": [{"toolName": "RectangleRoi", "handles": {"start": {"x": n, "y": n}}} for n in range(500)]}
+    new = apply_patch(old, [{"op": "replace", "path": "/annotations/250/handles/start/x", "value": -1}])
+    assert make_patch(old, new) == [{"op": "replace", "path": "/annotations/250/handles/start/x", "value": -1}]
+    with pytest.raises(JsonPatchError):
+        apply_patch(old, [{"op": "remove", "path": "/annotations/900"}])
+
+
+def test_updates_store_deltas_and_rebuild_any_version(
+    client, db_session, make_user, make_project, make_image, auth_headers, monkeypatch
+):
+    monkeypatch.setattr(annotation_versions, "ANNOTATION_SNAPSHOT_INTERVAL", 3)
+    owner = make_user()
+    project, folder = make_project(owner)
+    image = make_image(owner, project, folder, "versions-1")
+    headers = auth_headers(owner)
+
+    resp = client.post("/annotations/", json={"image_id": image.id, "data": {"annotations": []}, "tags": []}, headers=headers)
+    annotation_id = resp.json()["id"]
+    states = [{"annotations": []}]
+    for n in range(1, 7):
+        data = {"annotations": [{"toolName": "Length", "value": value} for value in range(n)]}
+        resp = client.patch(f"/annotations/{annotation_id}", json={"data": data, "tags": [f"v{n + 1}"], "review_status": None}, headers=headers)
+        assert resp.json()["version"] == n + 1
+        states.append(data)
+
+    rows = db_session.query(AnnotationHistory).filter(
+        AnnotationHistory.annotation_id == annotation_id
+    ).order_by(AnnotationHistory.version).all()
+    assert [(row.version, row.is_snapshot) for row in rows] == [
+        (1, True), (2, False), (3, False), (4, True), (5, False), (6, False), (7, True)
+    ]
+    assert rows[1].patch == [{"op": "add", "path": "/annotations/0", "value": {"toolName": "Length", "value": 0}}]
+
+    for version, expected in enumerate(states, start=1):
+        resp = client.get(f"/annotations/{annotation_id}/versions/{version}", headers=headers)
+        assert resp.json()["data"] == expected
+
+    resp = client.get(f"/annotations/{annotation_id}/history", params={"limit": 3}, headers=headers)
+    page = resp.json()
+    assert [entry["version"] for entry in page] == [7, 6, 5]
+    assert "data_snapshot" not in page[0]
+    resp = client.get(f"/annotations/{annotation_id}/history", params={"limit": 3, "before_version": 5}, headers=headers)
+    assert [entry["version"] for entry in resp.json()] == [4, 3, 2]
+
+    assert client.get(f"/annotations/{annotation_id}/versions/42", headers=headers).status_code == 404
+    assert client.get(f"/annotations/{annotation_id}/history", headers=auth_headers(make_user())).status_code == 404
+
+
+def test_stale_saves_get_409_with_current_version(client, make_user, make_project, make_image, auth_headers):
+    owner = make_user()
+    editor = make_user()
+    project, folder = make_project(owner, members=[editor])
+    image = make_image(owner, project, folder, "versions-2")
+
+    created = client.post(
+        "/annotations/", json={"image_id": image.id, "data": {"annotations": []}, "tags": []}, headers=auth_headers(owner)
+    ).json()
+    read = client.get(f"/annotations/{created['id']}", headers=auth_headers(editor))
+    assert read.headers["etag"] == '"1"'
+    outsider = client.patch(
+        f"/annotations/{created['id']}",
+        json={"data": {}, "tags": ["outsider"], "review_status": None},
+        headers={**auth_headers(make_user()), "If-Match": '"1"'},
+    )
+    assert outsider.status_code == 404
+
+    first = client.patch(
+        f"/annotations/{created['id']}",
+        json={"data": {"annotations": [{"toolName": "Length"}]}, "tags": ["owner"], "review_status": None},
+        headers={**auth_headers(owner), "If-Match": '"1"'},
+    )
+    assert first.status_code == 200
+    assert first.headers["etag"] == '"2"'
+
+    second = client.patch(
+        f"/annotations/{created['id']}",
+        json={"data": {"annotations": []}, "tags": ["editor"], "review_status": None},
+        headers={**auth_headers(editor), "If-Match": read.headers["etag"]},
+    )
+    assert second.status_code == 409
+    detail = second.json()["detail"]
+    assert detail["current_version"] == 2
+    assert detail["annotation"]["tags"] == ["owner"]
+
+    retry = client.patch(
+        f"/annotations/{created['id']}",
+        json={"data": {"annotations": []}, "tags": ["editor"], "review_status": None, "version": 2},
+        headers=auth_headers(editor),
+    )
+    assert retry.status_code == 200
+    assert retry.json()["version"] == 3
+    assert retry.json()["tags"] == ["editor"]
+
+
+def test_conditional_update_rejects_concurrent_write(db_session, make_user, make_project, make_image):
+    owner = make_user()
+    project, folder = make_project(owner)
+    image = make_image(owner, project, folder, "versions-3")
+    ann = Annotation(image_id=image.id, user_id=owner.id, version=1, data={"annotations": []}, tags=[],
+                     review_status=ReviewStatus.PENDING)
+    db_session.add(ann)
+    db_session.commit()
+
+    # Another writer commits version 2 after this session loaded version 1
+    db_session.execute(update(Annotation).where(Annotation.id == ann.id).values(version=2))
+    db_session.commit()
+    ann.version = 1
+    db_session.expire(ann, ["data"])
+
+    with pytest.raises(annotation_versions.VersionConflict) as conflict:
+        annotation_versions.record_new_version(db_session, ann, {"annotations": [1]}, owner.id)
+    assert conflict.value.current_version == 2
@@ -0,0 +1,51 @@
+from app.models import Annotation, Image
+from app.services.assignment import MemberWorkload, plan_assignment
+
+
+def test_plan_favours_fast_members_without_backlog():
+    assert plan_assignment([MemberWorkload(1, 0, 3), MemberWorkload(2, 0, 0)], 5) == {1: 4, 2: 1}
+    # A backlog holds a member back until the others catch up
+    assert plan_assignment([MemberWorkload(1, 6, 0), MemberWorkload(2, 0, 0)], 4) == {1: 0, 2: 4}
+    assert plan_assignment([], 3) == {}
+
+
+def test_auto_assign_spreads_unassigned_images(client, db_session, make_user, make_project, make_image, auth_headers):
+    owner = make_user()
+    fast = make_user()
+    slow = make_user()
+    project, folder = make_project(owner, members=(fast, slow))
+
+    def image(**fields):
+        return make_image(owner, project, folder, "assign", **fields)
+
+    done = image(assigned_user_id=fast.id)
+    db_session.add(Annotation(image_id=done.id, user_id=fast.id, data={}, tags=[], version=1))
+    annotated = image()
+    db_session.add(Annotation(image_id=annotated.id, user_id=owner.id, data={}, tags=[], version=1))
+    db_session.commit()
+    fresh = [image() for _ in range(5)]
+    params = {"project_id": project.id, "user_ids": [fast.id, slow.id]}
+
+    assert client.post("/images/auto-assign", params=params, headers=auth_headers(fast)).status_code == 403
+    preview = client.post("/images/auto-assign", params={**params, "dry_run": True}, headers=auth_headers(owner)).json()
+    assert preview["assigned"] == 0
+    assert {member["user_id"]: member["new_images"] for member in preview["members"]} == {fast.id: 4, slow.id: 1}
+    assert {member["user_id"]: member["throughput"] for member in preview["members"]} == {fast.id: 1, slow.id: 0}
+
+    result = client.post("/images/auto-assign", params=params, headers=auth_headers(owner)).json()
+    assert result["assigned"] == 5
+    db_session.expire_all()
+    assert [db_session.get(Image, img.id).assigned_user_id for img in fresh] == [fast.id] * 4 + [slow.id]
+    assert db_session.get(Image, annotated.id).assigned_user_id is None
+
+    # Nothing is left to hand out, and open work now counts against both
+    again = client.post("/images/auto-assign", params=params, headers=auth_headers(owner)).json()
+    assert again["assigned"] == 0
+    assert {member["user_id"]: member["open_images"] for member in again["members"]} == {fast.id: 4, slow.id: 1}
+
+    # Images that only carry a pre-label still need a person
+    prelabeled = image()
+    db_session.add(Annotation(image_id=prelabeled.id, user_id=owner.id, data={}, tags=["pneumonia"], version=1, is_prelabel=True))
+    db_session.commit()
+    last = client.post("/images/auto-assign", params=params, headers=auth_headers(owner)).json()
+    assert last["assigned"] == 1
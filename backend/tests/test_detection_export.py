@@ -0,0 +1,82 @@
+import io
+import zipfile
+
+import pytest
+
+from app.models import Annotation
+from app.models.annotation import ReviewStatus
+
+
+@pytest.fixture
+def boxed_project(db_session, make_user, make_project, make_image, make_rect):
+    owner = make_user()
+    project, folder = make_project(owner)
+    sized = make_image(owner, project, folder, "boxes-1", dicom_metadata={"Rows": "100", "Columns": "200"})
+    empty = make_image(owner, project, folder, "boxes-2", dicom_metadata={"Rows": 50, "Columns": 50})
+    unsized = make_image(owner, project, folder, "boxes-3")
+    db_session.add_all([
+        Annotation(
+            image_id=sized.id, user_id=owner.id, version=1, tags=["nodule"], review_status=ReviewStatus.PENDING,
+            data={"annotations": [
+                make_rect(150, 80, 50, 20),  # dragged up and left
+                make_rect(190, 90, 250, 130, tool="EllipticalRoi", label="mass"),  # runs off the edge
+                make_rect(10, 10, 10, 40),  # no width
+                {"toolName": "Length", "handles": {"start": {"x": 0, "y": 0}, "end": {"x": 5, "y": 5}}},
+            ]},
+        ),
+        Annotation(
+            image_id=unsized.id, user_id=owner.id, version=1, tags=[], review_status=ReviewStatus.PENDING,
+            data={"annotations": [make_rect(1, 1, 5, 5)]},
+        ),
+    ])
+    db_session.commit()
+    return owner, project, sized, empty
+
+
+def test_coco_export_normalizes_boxes_from_annotation_data(client, boxed_project, auth_headers):
+    owner, project, sized, empty = boxed_project
+
+    resp = client.get(f"/annotations/project/{project.id}/export", params={"format": "coco"}, headers=auth_headers(owner))
+
+    assert resp.status_code == 200
+    coco = resp.json()
+    assert [(image["id"], image["width"], image["height"]) for image in coco["images"]] == [
+        (sized.id, 200, 100), (empty.id, 50, 50)
+    ]
+    assert [category["name"] for category in coco["categories"]] == ["nodule", "mass"]
+    assert [(ann["image_id"], ann["category_id"], ann["bbox"], ann["area"]) for ann in coco["annotations"]] == [
+        (sized.id, 1, [50.0, 20.0, 100.0, 60.0], 6000.0),
+        (sized.id, 2, [190.0, 90.0, 10.0, 10.0], 100.0),
+    ]
+
+
+def test_yolo_export_writes_label_files(client, boxed_project, auth_headers):
+    owner, project, sized, empty = boxed_project
+
+    resp = client.get(f"/annotations/project/{project.id}/export", params={"format": "yolo"}, headers=auth_headers(owner))
+
+    assert resp.status_code == 200
+    with zipfile.ZipFile(io.BytesIO(resp.content)) as zf:
+        assert zf.read("classes.txt") == b"nodule\nmass\n"
+        assert zf.read(f"labels/image_{sized.id:09d}.txt").decode().splitlines() == [
+            "0 0.500000 0.500000 0.500000 0.600000",
+            "1 0.975000 0.950000 0.050000 0.100000",
+        ]
+        assert zf.read(f"labels/image_{empty.id:09d}.txt") == b""
+        assert len([name for name in zf.namelist() if name.startswith("labels/")]) == 2
+
+
+def test_csv_download_reads_boxes_from_annotation_data(client, boxed_project, make_user, auth_headers):
+    owner, project, sized, _ = boxed_project
+
+    resp = client.get(f"/annotations/image/{sized.id}/download", params={"format": "csv"}, headers=auth_headers(owner))
+
+    assert resp.status_code == 200
+    lines = resp.text.splitlines()
+    assert lines[0] == "annotation_id,user_id,version,x,y,w,h,label,tags,review_status,timestamp"
+    assert lines[1].split(",")[3:8] == ["50.0", "20.0", "100.0", "60.0", "nodule"]
+    assert len(lines) == 4
+
+    # Only project members can download
+    resp = client.get(f"/annotations/image/{sized.id}/download", params={"format": "json"}, headers=auth_headers(make_user()))
+    assert resp.status_code == 404
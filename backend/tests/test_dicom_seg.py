@@ -0,0 +1,112 @@
+import io
+
+import numpy as np
+import pydicom
+from pydicom.dataset import Dataset
+
+from app.api.routers import annotation as annotation_router
+from app.models import Annotation
+from app.models.annotation import ReviewStatus
+from app.services.dicom_seg import SEGMENTATION_STORAGE, rasterize_tool
+
+
+def _source(sop, number):
+    ds = Dataset()
+    ds.SOPClassUID = "1.2.840.10008.5.1.4.1.1.2"
+    ds.SOPInstanceUID = sop
+    ds.StudyInstanceUID = "1.2.3"
+    ds.SeriesInstanceUID = "1.2.3.4"
+    ds.PatientID = "PAT-1"
+    ds.PatientName = "Doe^Jane"
+    ds.InstanceNumber = number
+    ds.Rows = 6
+    ds.Columns = 8
+    ds.PixelSpacing = [0.5, 0.5]
+    ds.ImageOrientationPatient = [1, 0, 0, 0, 1, 0]
+    ds.ImagePositionPatient = [0, 0, number * 2.5]
+    ds.FrameOfReferenceUID = "1.2.3.9"
+    return ds
+
+
+def test_rasterize_rectangle_and_ellipse(make_rect):
+    rectangle = rasterize_tool(make_rect(6, 4, 2, 1), 6, 8)
+    assert rectangle.sum() == 12
+    assert rectangle[1:4, 2:6].all()
+
+    ellipse = rasterize_tool(make_rect(0, 0, 8, 6, tool="EllipticalRoi"), 6, 8)
+    assert ellipse[3, 4] and not ellipse[0, 0] and not ellipse[5, 7]
+    assert rasterize_tool({"toolName": "Length"}, 6, 8) is None
+
+
+def test_series_dicom_seg_references_sources_and_packs_masks(
+    client, db_session, make_user, make_project, make_image, make_rect, auth_headers, monkeypatch
+):
+    owner = make_user()
+    project, folder = make_project(owner)
+    images = [
+        make_image(owner, project, folder, f"seg-{number}",
+                   series_instance_uid="1.2.3.4", sop_instance_uid=f"1.2.3.4.{number}", instance_number=number)
+        for number in (2, 1)
+    ]
+    second, first = images
+    db_session.add_all([
+        Annotation(image_id=first.id, user_id=owner.id, version=1, tags=["nodule"], review_status=ReviewStatus.PENDING,
+                   data={"annotations": [make_rect(0, 0, 2, 2), make_rect(4, 4, 8, 6, label="cyst")]}),
+        Annotation(image_id=second.id, user_id=owner.id, version=1, tags=["nodule"], review_status=ReviewStatus.PENDING,
+                   data={"annotations": [make_rect(6, 0, 8, 1), {"toolName": "Length"}]}),
+    ])
+    db_session.commit()
+
+    headers = {image.orthanc_id: _source(image.sop_instance_uid, image.instance_number) for image in images}
+    monkeypatch.setattr(annotation_router, "read_source_header", lambda orthanc_id: headers[orthanc_id])
+
+    resp = client.get(
+        "/annotations/series/1.2.3.4/export-dicom-seg",
+        params={"project_id": project.id},
+        headers=auth_headers(owner),
+    )
+
+    assert resp.status_code == 200
+    seg = pydicom.dcmread(io.BytesIO(resp.content))
+    assert seg.SOPClassUID == SEGMENTATION_STORAGE
+    assert seg.Modality == "SEG"
+    assert seg.StudyInstanceUID == "1.2.3"
+    assert seg.PatientID == "PAT-1"
+    assert [item.SegmentLabel for item in seg.SegmentSequence] == ["nodule", "cyst"]
+    assert seg.NumberOfFrames == 3
+    referenced = seg.ReferencedSeriesSequence[0].ReferencedInstanceSequence
+    assert [item.ReferencedSOPInstanceUID for item in referenced] == ["1.2.3.4.1", "1.2.3.4.2"]
+
+    frames = seg.PerFrameFunctionalGroupsSequence
+    assert [
+        (frame.SegmentIdentificationSequence[0].ReferencedSegmentNumber,
+         frame.DerivationImageSequence[0].SourceImageSequence[0].ReferencedSOPInstanceUID)
+        for frame in frames
+    ] == [(1, "1.2.3.4.1"), (1, "1.2.3.4.2"), (2, "1.2.3.4.1")]
+
+    # 3 frames of 6x8 one-bit pixels, packed without padding between frames
+    assert len(seg.PixelData) == 3 * 6 * 8 // 8
+    pixels = np.unpackbits(np.frombuffer(seg.PixelData, dtype=np.uint8), bitorder="little").reshape(3, 6, 8)
+    assert pixels[0, :2, :2].all() and pixels[0].sum() == 4
+    assert pixels[1, 0, 6:].all() and pixels[1].sum() == 2
+    assert pixels[2, 4:, 4:].all() and pixels[2].sum() == 8
+    assert np.array_equal(seg.pixel_array.astype(bool), pixels.astype(bool))
+
+
+def test_dicom_seg_can_be_stored_in_orthanc(client, db_session, make_user, make_project, make_image, make_rect, auth_headers, monkeypatch):
+    owner = make_user()
+    project, folder = make_project(owner)
+    image = make_image(owner, project, folder, "seg-store")
+    db_session.add(Annotation(image_id=image.id, user_id=owner.id, version=1, tags=[], review_status=ReviewStatus.PENDING,
+                              data={"annotations": [make_rect(1, 1, 3, 3)]}))
+    db_session.commit()
+    uploads = []
+    monkeypatch.setattr(annotation_router, "read_source_header", lambda orthanc_id: _source("1.2.3.4.7", 7))
+    monkeypatch.setattr(annotation_router, "upload_to_orthanc", lambda f: uploads.append(f.read()) or "orthanc-seg")
+
+    resp = client.get(f"/annotations/image/{image.id}/export-dicom-seg", params={"store": True}, headers=auth_headers(owner))
+
+    assert resp.status_code == 200
+    assert resp.json()["orthanc_id"] == "orthanc-seg"
+    assert resp.json()["segments"] == ["RectangleRoi"]
+    assert pydicom.dcmread(io.BytesIO(uploads[0])).Modality == "SEG"
@@ -0,0 +1,147 @@
+import numpy as np
+
+from app.api.routers import dicomweb
+from app.models import Image
+from app.utils.dicom import dicom_index_fields
+from app.utils.multipart import iter_multipart_related
+
+
+def _metadata(study, series, sop, number=1, modality="CT"):
+    return {
+        "StudyInstanceUID": study,
+        "SeriesInstanceUID": series,
+        "SOPInstanceUID": sop,
+        "SOPClassUID": "1.2.840.10008.5.1.4.1.1.2",
+        "InstanceNumber": str(number),
+        "Modality": modality,
+        "PatientID": "PAT-1",
+        "PatientName": "Doe^Jane",
+        "StudyDate": "20240105",
+        "Rows": 512,
+    }
+
+
+def _add_image(make_image, project, folder, uploader, metadata):
+    return make_image(
+        uploader, project, folder, f"orthanc-{metadata['SOPInstanceUID']}",
+        dicom_metadata=metadata, **dicom_index_fields(metadata),
+    )
+
+
+def test_qido_studies_only_returns_accessible_studies(client, make_user, make_project, make_image, auth_headers):
+    owner = make_user()
+    stranger = make_user()
+    project, folder = make_project(owner)
+    other_project, other_folder = make_project(stranger)
+    _add_image(make_image, project, folder, owner, _metadata("1.1.1", "1.1.1.1", "1.1.1.1.1", 1))
+    _add_image(make_image, project, folder, owner, _metadata("1.1.1", "1.1.1.1", "1.1.1.1.2", 2))
+    _add_image(make_image, project, folder, owner, _metadata("1.1.1", "1.1.1.2", "1.1.1.2.1", 1, "MR"))
+    _add_image(make_image, other_project, other_folder, stranger, _metadata("9.9.9", "9.9.9.1", "9.9.9.1.1"))
+
+    resp = client.get("/dicomweb/studies", params={"project_id": project.id}, headers=auth_headers(owner))
+
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("application/dicom+json")
+    studies = resp.json()
+    assert len(studies) == 1
+    study = studies[0]
+    assert study["0020000D"] == {"vr": "UI", "Value": ["1.1.1"]}
+    assert study["00100010"] == {"vr": "PN", "Value": [{"Alphabetic": "Doe^Jane"}]}
+    assert study["00080061"]["Value"] == ["CT", "MR"]
+    assert study["00201206"]["Value"] == [2]
+    assert study["00201208"]["Value"] == [3]
+
+    resp = client.get("/dicomweb/studies", params={"StudyInstanceUID": "9.9.9"}, headers=auth_headers(owner))
+    assert resp.json() == []
+
+    resp = client.get(
+        "/dicomweb/studies/1.1.1/series/1.1.1.1/instances",
+        params={"project_id": project.id},
+        headers=auth_headers(owner),
+    )
+    assert [item["00080018"]["Value"][0] for item in resp.json()] == ["1.1.1.1.1", "1.1.1.1.2"]
+
+
+def test_stow_rs_streams_parts_into_project(client, db_session, make_user, make_project, auth_headers, monkeypatch):
+    owner = make_user()
+    project, folder = make_project(owner)
+    uploads = []
+
+    def fake_upload(part):
+        part.seek(0)
+        uploads.append(part.read())
+        return f"stow-{len(uploads)}"
+
+    def fake_metadata(orthanc_id):
+        number = orthanc_id.split("-")[1]
+        return _metadata("2.2.2", "2.2.2.1", f"2.2.2.1.{number}", int(number))
+
+    monkeypatch.setattr(dicomweb, "upload_to_orthanc", fake_upload)
+    monkeypatch.setattr(dicomweb, "fetch_dicom_metadata", fake_metadata)
+
+    parts = [
+        ({"Content-Type": "application/dicom"}, [b"first-instance"]),
+        ({"Content-Type": "application/dicom"}, [b"second-instance"]),
+        ({"Content-Type": "text/plain"}, [b"not dicom"]),
+    ]
+    body = b"".join(iter_multipart_related(parts, "stowboundary"))
+
+    resp = client.post(
+        "/dicomweb/studies",
+        params={"project_id": project.id, "folder_id": folder.id},
+        content=body,
+        headers={
+            **auth_headers(owner),
+            "Content-Type": 'multipart/related; type="application/dicom"; boundary=stowboundary',
+        },
+    )
+
+    assert resp.status_code == 202
+    result = resp.json()
+    assert uploads == [b"first-instance", b"second-instance"]
+    assert [item["00081155"]["Value"][0] for item in result["00081199"]["Value"]] == ["2.2.2.1.1", "2.2.2.1.2"]
+    assert len(result["00081198"]["Value"]) == 1
+    stored = db_session.query(Image).filter(Image.study_instance_uid == "2.2.2").all()
+    assert {image.project_id for image in stored} == {project.id}
+    assert len(stored) == 2
+
+
+def test_stow_rs_rejects_other_studies_before_storing(
+    client, make_user, make_project, make_dicom, auth_headers, monkeypatch
+):
+    owner = make_user()
+    project, folder = make_project(owner)
+    uploads = []
+
+    def fake_upload(part):
+        part.seek(0)
+        uploads.append(part.read())
+        return "stow-study-1"
+
+    monkeypatch.setattr(dicomweb, "upload_to_orthanc", fake_upload)
+    monkeypatch.setattr(dicomweb, "fetch_dicom_metadata", lambda orthanc_id: _metadata("3.3.3", "3.3.3.1", "3.3.3.1.1"))
+
+    pixels = np.zeros((2, 2), dtype=np.uint8)
+    matching = make_dicom(pixels, StudyInstanceUID="3.3.3")
+    other = make_dicom(pixels, StudyInstanceUID="4.4.4", SOPInstanceUID="4.4.4.1.1")
+    parts = [
+        ({"Content-Type": "application/dicom"}, [matching]),
+        ({"Content-Type": "application/dicom"}, [other]),
+    ]
+    body = b"".join(iter_multipart_related(parts, "stowboundary"))
+
+    resp = client.post(
+        "/dicomweb/studies/3.3.3",
+        params={"project_id": project.id, "folder_id": folder.id},
+        content=body,
+        headers={
+            **auth_headers(owner),
+            "Content-Type": 'multipart/related; type="application/dicom"; boundary=stowboundary',
+        },
+    )
+
+    assert resp.status_code == 202
+    assert uploads == [matching]
+    failed = resp.json()["00081198"]["Value"]
+    assert [item["00081155"]["Value"][0] for item in failed] == ["4.4.4.1.1"]
+    assert failed[0]["00081197"]["Value"] == [dicomweb.STOW_STUDY_MISMATCH]
@@ -0,0 +1,204 @@
+import io
+import tarfile
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+from sqlalchemy import select, update
+
+from app.models import Annotation, ExportJob, Folder, Image, ReviewStatusCount, Tag, TagPairCount, UserTagCount
+from app.models.annotation import ReviewStatus
+from app.models.export_job import ExportStatus
+from app.services import dataset_export, detection_export, export_jobs
+from app.utils.orthanc import OrthancClient
+from tests.conftest import TestingSessionLocal
+
+
+def _run_inline(monkeypatch, tmp_path):
+    monkeypatch.setattr(export_jobs, "session_factory", TestingSessionLocal)
+    monkeypatch.setattr(export_jobs, "EXPORT_DIR", str(tmp_path))
+    monkeypatch.setattr(export_jobs, "submit_export_job", export_jobs.run_export_job)
+
+
+def test_export_job_builds_artifact_and_serves_ranges(
+    client, db_session, make_user, make_project, make_image, auth_headers, monkeypatch, tmp_path
+):
+    _run_inline(monkeypatch, tmp_path)
+    owner = make_user()
+    project, folder = make_project(owner)
+    for n in range(3):
+        image = make_image(owner, project, folder, f"job-{n}")
+        db_session.add(Annotation(
+            image_id=image.id, user_id=owner.id, version=1, tags=[],
+            data={"annotations": []}, review_status=ReviewStatus.PENDING,
+        ))
+    db_session.commit()
+
+    resp = client.post("/exports/", json={"project_id": project.id}, headers=auth_headers(owner))
+    assert resp.status_code == 202
+    job = resp.json()
+    assert job["status"] == "completed"
+    assert job["progress"] == job["total"] == 3
+
+    resp = client.get(f"/exports/{job['id']}/download", headers=auth_headers(owner))
+    assert resp.status_code == 200
+    assert resp.headers["accept-ranges"] == "bytes"
+    with zipfile.ZipFile(io.BytesIO(resp.content)) as zf:
+        assert len([name for name in zf.namelist() if name.startswith("annotations_image_")]) == 3
+    full = resp.content
+
+    resp = client.get(
+        f"/exports/{job['id']}/download",
+        headers={**auth_headers(owner), "Range": "bytes=10-19"},
+    )
+    assert resp.status_code == 206
+    assert resp.content == full[10:20]
+
+    # Other users cannot see the job
+    resp = client.get(f"/exports/{job['id']}", headers=auth_headers(make_user()))
+    assert resp.status_code == 404
+
+
+def test_expired_exports_are_purged(client, db_session, make_user, make_project, auth_headers, monkeypatch, tmp_path):
+    _run_inline(monkeypatch, tmp_path)
+    owner = make_user()
+    project, _ = make_project(owner)
+    artifact = tmp_path / "old.zip"
+    artifact.write_bytes(b"PK")
+    job = ExportJob(
+        user_id=owner.id, project_id=project.id, kind="annotations", params={},
+        status=ExportStatus.COMPLETED, progress=0, total=0, artifact_path=str(artifact),
+        expires_at=datetime.utcnow() - timedelta(hours=1),
+    )
+    db_session.add(job)
+    db_session.commit()
+
+    resp = client.get(f"/exports/{job.id}/download", headers=auth_headers(owner))
+
+    assert resp.status_code == 410
+    assert not artifact.exists()
+    db_session.refresh(job)
+    assert job.status == ExportStatus.EXPIRED
+
+
+def test_interrupted_exports_fail_and_can_be_deleted(
+    client, db_session, make_user, make_project, auth_headers, monkeypatch, tmp_path
+):
+    _run_inline(monkeypatch, tmp_path)
+    owner = make_user()
+    project, _ = make_project(owner)
+    statuses = [ExportStatus.RUNNING, ExportStatus.RUNNING, ExportStatus.RUNNING, ExportStatus.PENDING]
+    jobs = [
+        ExportJob(user_id=owner.id, project_id=project.id, kind="annotations", params={},
+                  status=status, progress=0, total=0)
+        for status in statuses
+    ]
+    db_session.add_all(jobs)
+    db_session.commit()
+    orphan, live, busy, queued = jobs
+    partials = {job.id: tmp_path / f"export_{job.id}_abc.zip.part" for job in (orphan, busy)}
+    for partial in partials.values():
+        partial.write_bytes(b"PK")
+    db_session.execute(
+        update(ExportJob).where(ExportJob.id.in_([orphan.id, busy.id, queued.id]))
+        .values(updated_at=datetime.utcnow() - timedelta(hours=2))
+    )
+    db_session.commit()
+    # Still being built here, just quiet for a while
+    monkeypatch.setattr(export_jobs, "_active_jobs", {busy.id})
+
+    assert client.delete(f"/exports/{live.id}", headers=auth_headers(owner)).status_code == 409
+    resp = client.get(f"/exports/{orphan.id}", headers=auth_headers(owner))
+    assert resp.json()["status"] == "failed"
+    assert not partials[orphan.id].exists()
+    assert client.delete(f"/exports/{orphan.id}", headers=auth_headers(owner)).status_code == 200
+
+    assert client.get(f"/exports/{busy.id}", headers=auth_headers(owner)).json()["status"] == "running"
+    assert partials[busy.id].exists()
+    assert client.get(f"/exports/{queued.id}", headers=auth_headers(owner)).json()["status"] == "pending"
+
+
+def test_box_exports_report_progress(db_session, make_user, make_project, make_image, monkeypatch):
+    monkeypatch.setattr(detection_export, "EXPORT_CHUNK_SIZE", 2)
+    owner = make_user()
+    project, folder = make_project(owner)
+    for n in range(5):
+        make_image(owner, project, folder, f"beat-{n}", dicom_metadata={"Rows": 10, "Columns": 10})
+    image_ids = select(Image.id).where(Image.project_id == project.id)
+
+    for iter_export in (detection_export.iter_coco_json, detection_export.iter_yolo_zip):
+        reported = []
+        b"".join(iter_export(db_session, image_ids, reported.append))
+        assert reported[-3:] == [2, 4, 5]
+
+
+def test_deleting_a_project_removes_its_exports_and_counters(
+    client, db_session, make_user, make_project, make_image, auth_headers, monkeypatch, tmp_path
+):
+    _run_inline(monkeypatch, tmp_path)
+    owner = make_user()
+    project, folder = make_project(owner)
+    image = make_image(owner, project, folder, "gone-1")
+    resp = client.post(
+        "/annotations/", json={"image_id": image.id, "data": {"annotations": []}, "tags": ["nodule", "mass"]},
+        headers=auth_headers(owner),
+    )
+    assert resp.status_code == 200
+    job = client.post("/exports/", json={"project_id": project.id}, headers=auth_headers(owner)).json()
+    artifact = db_session.get(ExportJob, job["id"]).artifact_path
+    assert artifact and tmp_path.joinpath(artifact).exists()
+
+    project_id, image_id = project.id, image.id
+    assert client.delete(f"/projects/{project_id}", headers=auth_headers(owner)).status_code == 200
+
+    db_session.expire_all()
+    assert not tmp_path.joinpath(artifact).exists()
+    for model in (ExportJob, Tag, TagPairCount, UserTagCount, ReviewStatusCount, Folder, Image):
+        assert db_session.query(model).filter(model.project_id == project_id).count() == 0
+    assert db_session.query(Annotation).filter(Annotation.image_id == image_id).count() == 0
+
+
+def test_dataset_export_writes_shards_for_folder_subtree(
+    client, db_session, make_user, make_project, make_image, make_dicom, auth_headers, monkeypatch, tmp_path
+):
+    _run_inline(monkeypatch, tmp_path)
+    monkeypatch.setattr(dataset_export, "make_shard_pool", lambda: ThreadPoolExecutor(max_workers=2))
+    owner = make_user()
+    project, root = make_project(owner)
+    child = Folder(name="child", project_id=project.id, parent_folder_id=root.id)
+    other = Folder(name="other", project_id=project.id)
+    db_session.add_all([child, other])
+    db_session.commit()
+    images = [make_image(owner, project, folder, f"ds-{n}") for n, folder in enumerate([root, child, child, other, child])]
+
+    def fake_iter_dicom_file(self, orthanc_id, chunk_size=1024 * 1024):
+        yield make_dicom(np.full((2, 2), int(orthanc_id.split("-")[1]), dtype=np.uint8))
+
+    monkeypatch.setattr(OrthancClient, "iter_dicom_file", fake_iter_dicom_file)
+
+    resp = client.post(
+        "/exports/",
+        json={"project_id": project.id, "kind": "dataset", "folder_id": root.id, "shard_size": 2, "sample_format": "npy"},
+        headers=auth_headers(owner),
+    )
+    job = resp.json()
+    assert job["status"] == "completed"
+    assert job["total"] == 4
+
+    manifest = client.get(f"/exports/{job['id']}/download", headers=auth_headers(owner)).json()
+    assert manifest["total_samples"] == 4
+    assert [shard["name"] for shard in manifest["shards"]] == ["shard-000000.tar", "shard-000001.tar"]
+
+    resp = client.get(f"/exports/{job['id']}/files/shard-000001.tar", headers=auth_headers(owner))
+    with tarfile.open(fileobj=io.BytesIO(resp.content)) as archive:
+        names = archive.getnames()
+        assert names == [
+            f"image_{images[2].id:09d}.npy", f"image_{images[2].id:09d}.json",
+            f"image_{images[4].id:09d}.npy", f"image_{images[4].id:09d}.json",
+        ]
+        pixels = np.load(io.BytesIO(archive.extractfile(names[0]).read()))
+    assert pixels.tolist() == [[2, 2], [2, 2]]
+
+    resp = client.get(f"/exports/{job['id']}/files/..%2Fsecret", headers=auth_headers(owner))
+    assert resp.status_code in (400, 404)
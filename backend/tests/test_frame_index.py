@@ -0,0 +1,101 @@
+import io
+
+import pytest
+from pydicom.dataset import Dataset, FileMetaDataset
+from pydicom.encaps import encapsulate
+from pydicom.uid import ExplicitVRLittleEndian, JPEGBaseline8Bit, generate_uid
+
+from app.services import frame_index, instance_cache
+from app.services.frame_index import build_frame_index, parse_frame_numbers
+from app.utils.orthanc import OrthancClient
+
+
+def _dataset(transfer_syntax, frames, pixel_data):
+    ds = Dataset()
+    ds.file_meta = FileMetaDataset()
+    ds.file_meta.TransferSyntaxUID = transfer_syntax
+    ds.file_meta.MediaStorageSOPClassUID = "1.2.840.10008.5.1.4.1.1.3.1"
+    ds.file_meta.MediaStorageSOPInstanceUID = generate_uid()
+    ds.SOPClassUID = ds.file_meta.MediaStorageSOPClassUID
+    ds.SOPInstanceUID = ds.file_meta.MediaStorageSOPInstanceUID
+    ds.Rows = 2
+    ds.Columns = 3
+    ds.SamplesPerPixel = 1
+    ds.BitsAllocated = 8
+    ds.BitsStored = 8
+    ds.HighBit = 7
+    ds.PixelRepresentation = 0
+    ds.PhotometricInterpretation = "MONOCHROME2"
+    ds.NumberOfFrames = frames
+    ds.PixelData = pixel_data
+    if transfer_syntax != ExplicitVRLittleEndian:
+        ds["PixelData"].VR = "OB"
+        ds["PixelData"].is_undefined_length = True
+    buffer = io.BytesIO()
+    ds.save_as(buffer, enforce_file_format=True)
+    return buffer.getvalue()
+
+
+def _index(tmp_path, data):
+    path = tmp_path / "instance.dcm"
+    path.write_bytes(data)
+    with open(path, "rb") as fp:
+        return build_frame_index(fp), data
+
+
+def _frame_bytes(data, index, number):
+    return b"".join(data[offset:offset + length] for offset, length in index.frames[number - 1])
+
+
+def test_native_frames_are_located_by_size(tmp_path):
+    frames = [bytes([n] * 6) for n in range(4)]
+    index, data = _index(tmp_path, _dataset(ExplicitVRLittleEndian, 4, b"".join(frames)))
+
+    assert index.number_of_frames == 4
+    assert [_frame_bytes(data, index, n) for n in range(1, 5)] == frames
+
+
+def test_encapsulated_frames_use_basic_offset_table(tmp_path):
+    frames = [b"\xff\xd8" + bytes([n]) * 9 + b"\xff\xd9" for n in range(3)]
+    pixel_data = encapsulate(frames, fragments_per_frame=2, has_bot=True)
+    index, data = _index(tmp_path, _dataset(JPEGBaseline8Bit, 3, pixel_data))
+
+    assert index.number_of_frames == 3
+    assert index.media_type.startswith("image/jpeg")
+    assert [_frame_bytes(data, index, n).rstrip(b"\x00") for n in range(1, 4)] == frames
+
+
+def test_parse_frame_numbers():
+    assert parse_frame_numbers("1,4,6-8") == [1, 4, 6, 7, 8]
+    with pytest.raises(frame_index.FrameIndexError):
+        parse_frame_numbers("0")
+
+
+def test_frames_endpoint_serves_only_requested_frames(
+    client, make_user, make_project, make_image, auth_headers, tmp_path, monkeypatch
+):
+    frames = [bytes([n] * 6) for n in range(5)]
+    data = _dataset(ExplicitVRLittleEndian, 5, b"".join(frames))
+
+    def fake_iter_dicom_file(self, orthanc_id, chunk_size=1024 * 1024):
+        yield data
+
+    monkeypatch.setattr(OrthancClient, "iter_dicom_file", fake_iter_dicom_file)
+    monkeypatch.setattr(instance_cache, "_instance_cache", instance_cache.InstanceCache(str(tmp_path), 1 << 20, 1))
+
+    owner = make_user()
+    project, folder = make_project(owner)
+    image = make_image(owner, project, folder, "multiframe-1")
+
+    single = client.get(f"/images/{image.id}/frames/3", headers=auth_headers(owner))
+    assert single.status_code == 200
+    assert single.content == frames[2]
+
+    several = client.get(f"/images/{image.id}/frames/2-3", headers=auth_headers(owner))
+    assert several.status_code == 200
+    assert several.headers["content-type"].startswith("multipart/related")
+    assert frames[1] in several.content and frames[2] in several.content
+    assert frames[0] not in several.content
+
+    missing = client.get(f"/images/{image.id}/frames/9", headers=auth_headers(owner))
+    assert missing.status_code == 404
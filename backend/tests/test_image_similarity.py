@@ -0,0 +1,89 @@
+import io
+
+import numpy as np
+
+from app.api.routers import image as image_router
+from app.services import embedding_index
+from app.services.embedding_index import EmbeddingIndex, describe_pixels
+from tests.conftest import TestingSessionLocal
+
+
+def _gradient(angle):
+    y, x = np.mgrid[0:4, 0:4]
+    return describe_pixels(np.cos(angle) * x + np.sin(angle) * y)
+
+
+def test_index_search_scopes_and_persists(tmp_path):
+    index = EmbeddingIndex(str(tmp_path), 4)
+    index.add([(1, 10, _gradient(0.0)), (2, 10, _gradient(0.3)), (3, 10, _gradient(1.5)), (4, 20, _gradient(0.1))])
+
+    results = index.search(_gradient(0.0), [10], top_k=5, exclude_image_id=1)
+    assert [image_id for image_id, _ in results] == [2, 3]
+    assert results[0][1] > results[1][1]
+    assert [image_id for image_id, _ in index.search(_gradient(0.0), [10, 20], top_k=2)] == [1, 4]
+
+    # The newest record of an image wins, and removed images drop out
+    index.add([(3, 10, _gradient(0.05))])
+    index.remove([2])
+    assert [image_id for image_id, _ in index.search(_gradient(0.0), [10], top_k=5)] == [1, 3]
+    assert index.get(2) is None
+
+    reopened = EmbeddingIndex(str(tmp_path), 4)
+    assert np.allclose(reopened.get(3), _gradient(0.05))
+    assert [image_id for image_id, _ in reopened.search(_gradient(0.0), [10], top_k=5)] == [1, 3]
+
+
+def test_similar_endpoint(
+    client, make_user, make_project, make_image, make_dicom, make_instance_cache, auth_headers, monkeypatch, tmp_path
+):
+    owner = make_user()
+    outsider = make_user()
+    project, folder = make_project(owner)
+    other_project, other_folder = make_project(outsider)
+    query, close, far = (make_image(owner, project, folder, f"similar-{n}") for n in range(3))
+    hidden = make_image(outsider, other_project, other_folder, "similar-hidden")
+
+    index = EmbeddingIndex(str(tmp_path), 4)
+    index.add([
+        (close.id, project.id, _gradient(0.2)),
+        (far.id, project.id, _gradient(1.5)),
+        (hidden.id, other_project.id, _gradient(0.0)),
+    ])
+    pixels = np.tile(np.arange(32, dtype=np.uint16) * 100, (32, 1))
+    cache = make_instance_cache({"similar-0": make_dicom(pixels)})
+    monkeypatch.setattr(image_router, "get_embedding_index", lambda: index)
+    monkeypatch.setattr(image_router, "get_instance_cache", lambda: cache)
+
+    resp = client.get(f"/images/{query.id}/similar", headers=auth_headers(owner))
+    assert resp.status_code == 200
+    assert [match["image_id"] for match in resp.json()] == [close.id, far.id]
+    assert resp.json()[0]["score"] > 0.9
+
+    # The query image was embedded on demand and is not read again
+    client.get(f"/images/{query.id}/similar", params={"top_k": 1}, headers=auth_headers(owner))
+    assert cache.opened == ["similar-0"]
+    assert client.get(f"/images/{query.id}/similar", headers=auth_headers(outsider)).status_code == 404
+
+
+def test_upload_embeds_new_images(
+    client, make_user, make_project, make_dicom, make_instance_cache, auth_headers, monkeypatch, tmp_path
+):
+    owner = make_user()
+    project, folder = make_project(owner)
+    index = EmbeddingIndex(str(tmp_path), 4)
+    pixels = np.tile(np.arange(32, dtype=np.uint16) * 100, (32, 1))
+    monkeypatch.setattr(embedding_index, "session_factory", TestingSessionLocal)
+    monkeypatch.setattr(embedding_index, "get_embedding_index", lambda: index)
+    monkeypatch.setattr(embedding_index, "get_instance_cache", lambda: make_instance_cache({"embed-1": make_dicom(pixels)}))
+    monkeypatch.setattr(image_router, "upload_to_orthanc", lambda f: "embed-1")
+    monkeypatch.setattr(image_router, "fetch_dicom_metadata", lambda orthanc_id: {})
+
+    resp = client.post(
+        "/images/upload",
+        files={"file": ("scan.dcm", io.BytesIO(b"DICM"), "application/dicom")},
+        data={"project_id": project.id, "folder_id": folder.id},
+        headers=auth_headers(owner),
+    )
+
+    assert resp.status_code == 200
+    assert index.get(resp.json()["id"]) is not None
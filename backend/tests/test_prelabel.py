@@ -0,0 +1,131 @@
+import io
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from app.api.routers import image as image_router
+from app.models import Annotation, Tag, UserTagCount
+from app.models.annotation import ReviewStatus
+from app.services import embedding_index, prelabel
+from app.services.tag_model import NumpyTagModel
+from tests.conftest import TestingSessionLocal
+
+
+def _fake_scores(orthanc_ids):
+    scores = {orthanc_id: [0.9, 0.2, 0.7] for orthanc_id in orthanc_ids if orthanc_id != "broken"}
+    failed = [{"orthanc_id": "broken", "error": "not a DICOM file"}] if "broken" in orthanc_ids else []
+    return {"labels": ["pneumonia", "normal", "fracture"], "model": "test", "scores": scores, "failed": failed}
+
+
+def _use_fakes(monkeypatch, batches):
+    def score(orthanc_ids):
+        batches.append(list(orthanc_ids))
+        return _fake_scores(orthanc_ids)
+
+    pool = ThreadPoolExecutor(max_workers=1)
+    monkeypatch.setattr(prelabel, "session_factory", TestingSessionLocal)
+    monkeypatch.setattr(prelabel, "get_prelabel_pool", lambda: pool)
+    monkeypatch.setattr(prelabel, "score_batch", score)
+    monkeypatch.setattr(prelabel, "PRELABEL_BATCH_SIZE", 2)
+
+
+def test_prelabel_writes_pending_annotations_in_batches(db_session, make_user, make_project, make_image, monkeypatch):
+    owner = make_user()
+    project, folder = make_project(owner)
+    orthanc_ids = ["pre-1", "pre-2", "pre-3", "broken", "pre-1"]
+    images = [make_image(owner, project, folder, orthanc_id) for orthanc_id in orthanc_ids]
+    annotated = make_image(owner, project, folder, "pre-annotated")
+    db_session.add(Annotation(image_id=annotated.id, user_id=owner.id, data={}, tags=[], version=1))
+    db_session.commit()
+    batches = []
+    _use_fakes(monkeypatch, batches)
+
+    written = prelabel.prelabel_images([image.id for image in images] + [annotated.id], owner.id)
+
+    assert written == 4
+    assert sorted(len(batch) for batch in batches) == [2, 2]  # pre-1 is scored once for both of its images
+    anns = db_session.query(Annotation).filter(Annotation.image_id.in_([image.id for image in images])).all()
+    assert sorted(ann.image_id for ann in anns) == sorted(image.id for image in images if image.orthanc_id != "broken")
+    for ann in anns:
+        assert ann.tags == ["pneumonia", "fracture"]
+        assert ann.review_status == ReviewStatus.PENDING
+        assert ann.data["prelabel"]["model"] == "test"
+        assert ann.is_prelabel
+    # Model output counts towards the tags, not towards the uploader's labelling
+    assert db_session.query(Tag).filter(Tag.project_id == project.id, Tag.normalized == "pneumonia").one().usage_count == 4
+    assert db_session.query(UserTagCount).filter(UserTagCount.project_id == project.id).count() == 0
+    assert db_session.query(Annotation).filter(Annotation.image_id == annotated.id).count() == 1
+
+    # Running again finds nothing left to pre-label
+    assert prelabel.prelabel_images([image.id for image in images], owner.id) == 0
+
+
+def test_upload_schedules_prelabeling(client, db_session, make_user, make_project, auth_headers, monkeypatch):
+    owner = make_user()
+    project, folder = make_project(owner)
+    batches = []
+    _use_fakes(monkeypatch, batches)
+    monkeypatch.setattr(prelabel, "PRELABEL_ENABLED", True)
+    monkeypatch.setattr(prelabel, "tag_model_configured", lambda: True)
+    monkeypatch.setattr(embedding_index, "EMBEDDING_ENABLED", False)
+    monkeypatch.setattr(image_router, "upload_to_orthanc", lambda f: "uploaded-1")
+    monkeypatch.setattr(image_router, "fetch_dicom_metadata", lambda orthanc_id: {})
+
+    resp = client.post(
+        "/images/upload",
+        files={"file": ("scan.dcm", io.BytesIO(b"DICM"), "application/dicom")},
+        data={"project_id": project.id, "folder_id": folder.id},
+        headers=auth_headers(owner),
+    )
+
+    assert resp.status_code == 200
+    assert batches == [["uploaded-1"]]
+    ann = db_session.query(Annotation).filter(Annotation.image_id == resp.json()["id"]).one()
+    assert ann.user_id == owner.id
+
+
+def test_score_batch_runs_one_forward_pass(monkeypatch):
+    class FakeClient:
+        def iter_dicom_file(self, orthanc_id):
+            if orthanc_id == "missing":
+                raise RuntimeError("404")
+            yield b"not dicom" if orthanc_id == "garbage" else b""
+
+    class Model(NumpyTagModel):
+        calls = []
+
+        def predict(self, batch):
+            self.calls.append(len(batch))
+            return super().predict(batch)
+
+    model = Model(np.zeros((16, 1)), np.zeros(1), ["pneumonia"], 4, "test")
+    monkeypatch.setattr(prelabel, "_worker_model", model)
+    monkeypatch.setattr(prelabel, "get_orthanc_client", lambda: FakeClient())
+    monkeypatch.setattr(prelabel, "read_pixels", lambda fp, size: np.zeros((size, size), dtype=np.float32))
+
+    result = prelabel.score_batch(["a", "missing", "b"])
+    assert Model.calls == [2]
+    assert list(result["scores"]) == ["a", "b"]
+    assert result["failed"][0]["orthanc_id"] == "missing"
+
+
+def test_upload_skips_prelabeling_without_a_trained_model(client, make_user, make_project, auth_headers, monkeypatch):
+    owner = make_user()
+    project, folder = make_project(owner)
+    batches = []
+    _use_fakes(monkeypatch, batches)
+    monkeypatch.setattr(prelabel, "PRELABEL_ENABLED", True)
+    monkeypatch.setattr(prelabel, "tag_model_configured", lambda: False)
+    monkeypatch.setattr(embedding_index, "EMBEDDING_ENABLED", False)
+    monkeypatch.setattr(image_router, "upload_to_orthanc", lambda f: "uploaded-2")
+    monkeypatch.setattr(image_router, "fetch_dicom_metadata", lambda orthanc_id: {})
+
+    resp = client.post(
+        "/images/upload",
+        files={"file": ("scan.dcm", io.BytesIO(b"DICM"), "application/dicom")},
+        data={"project_id": project.id, "folder_id": folder.id},
+        headers=auth_headers(owner),
+    )
+
+    assert resp.status_code == 200
+    assert batches == []
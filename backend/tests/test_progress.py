@@ -0,0 +1,52 @@
+from app.models import Annotation, Folder
+from app.services.progress import rebuild_progress
+from tests.conftest import TestingSessionLocal
+
+
+def test_progress_counters_follow_writes_and_match_rebuild(client, db_session, make_user, make_project, make_image, auth_headers):
+    owner = make_user()
+    annotator = make_user()
+    reviewer = make_user()
+    project, folder = make_project(owner, members=(annotator, reviewer))
+    other_folder = Folder(name="Follow-up", project_id=project.id)
+    db_session.add(other_folder)
+    db_session.commit()
+    images = [make_image(owner, project, folder, f"progress-{n}") for n in range(4)]
+    db_session.add(Annotation(image_id=images[0].id, user_id=owner.id, data={}, tags=[], version=1))
+    # Pre-labels do not make an image annotated
+    db_session.add(Annotation(image_id=images[3].id, user_id=owner.id, data={}, tags=["normal"], version=1, is_prelabel=True))
+    db_session.commit()
+    # Rows written outside the API are counted by a rebuild
+    assert rebuild_progress(db_session, project.id) == 1
+    headers = auth_headers(owner)
+    url = f"/progress/projects/{project.id}"
+
+    body = client.get(url, headers=headers).json()
+    assert (body["images"], body["assigned"], body["annotated"], body["approved"]) == (4, 0, 1, 0)
+
+    client.post("/images/auto-assign", params={"project_id": project.id, "user_ids": [annotator.id]}, headers=headers)
+    created = client.post("/annotations/", json={"image_id": images[1].id, "data": {}, "tags": []}, headers=auth_headers(annotator)).json()
+    # A second annotation on an annotated image does not count it twice
+    client.post("/annotations/", json={"image_id": images[1].id, "data": {}, "tags": []}, headers=auth_headers(annotator))
+    client.post("/reviews/claim", params={"project_id": project.id}, headers=auth_headers(reviewer))
+    decision = {"decisions": [{"annotation_id": created["id"], "status": "approved"}]}
+    assert client.post("/reviews/decisions", json=decision, headers=auth_headers(reviewer)).status_code == 200
+    assert client.patch(f"/images/{images[2].id}", json={"folder_id": other_folder.id}, headers=headers).status_code == 200
+
+    body = client.get(url, headers=headers).json()
+    assert (body["images"], body["assigned"], body["annotated"], body["approved"]) == (4, 3, 2, 1)
+    folders = {row["folder_id"]: row for row in body["folders"]}
+    assert (folders[folder.id]["images"], folders[folder.id]["annotated"], folders[folder.id]["approved"]) == (3, 2, 1)
+    assert (folders[other_folder.id]["images"], folders[other_folder.id]["assigned"]) == (1, 1)
+    assert [(row["user_id"], row["images"], row["annotated"], row["approved"]) for row in body["users"]] == [(annotator.id, 3, 1, 1)]
+
+    # Incremental counters agree with a full rebuild
+    session = TestingSessionLocal()
+    try:
+        rebuild_progress(session)
+    finally:
+        session.close()
+    assert client.get(url, headers=headers).json() == body
+
+    outsider = make_user()
+    assert client.get(url, headers=auth_headers(outsider)).status_code == 404
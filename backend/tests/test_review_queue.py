@@ -0,0 +1,153 @@
+from datetime import datetime, timedelta, timezone
+
+from app.models import Annotation
+from app.services.annotation_bulk import bulk_write_annotations
+
+
+def test_reviewers_claim_disjoint_batches_and_decide_atomically(client, db_session, make_user, make_project, make_image, auth_headers):
+    annotator = make_user()
+    first_reviewer = make_user()
+    second_reviewer = make_user()
+    project, folder = make_project(annotator, members=(first_reviewer, second_reviewer))
+    image = make_image(annotator, project, folder, "review-1")
+    items = [{"image_id": image.id, "data": {"n": n}, "tags": []} for n in range(5)]
+    results = client.post("/annotations/bulk", json={"items": items}, headers=auth_headers(annotator)).json()["results"]
+    ids = [result["id"] for result in results]
+    params = {"project_id": project.id, "count": 3}
+
+    # Authors never review their own work
+    assert client.post("/reviews/claim", params=params, headers=auth_headers(annotator)).json() == []
+
+    first = [ann["id"] for ann in client.post("/reviews/claim", params=params, headers=auth_headers(first_reviewer)).json()]
+    second = [ann["id"] for ann in client.post("/reviews/claim", params=params, headers=auth_headers(second_reviewer)).json()]
+    assert first == ids[:3]
+    assert second == ids[3:]
+    # Asking again returns the held batch rather than more work
+    again = client.post("/reviews/claim", params=params, headers=auth_headers(first_reviewer)).json()
+    assert [ann["id"] for ann in again] == first
+
+    # A decision on someone else's claim rejects the whole batch
+    mixed = {"decisions": [
+        {"annotation_id": first[0], "status": "approved"},
+        {"annotation_id": second[0], "status": "approved"},
+    ]}
+    resp = client.post("/reviews/decisions", json=mixed, headers=auth_headers(first_reviewer))
+    assert resp.status_code == 409
+    assert [failure["annotation_id"] for failure in resp.json()["detail"]["failures"]] == [second[0]]
+    assert db_session.query(Annotation).filter(Annotation.id == first[0]).one().review_status.value == "pending"
+
+    decisions = {"decisions": [
+        {"annotation_id": first[0], "status": "approved"},
+        {"annotation_id": first[1], "status": "approved"},
+        {"annotation_id": first[2], "status": "rejected"},
+    ]}
+    body = client.post("/reviews/decisions", json=decisions, headers=auth_headers(first_reviewer)).json()
+    assert body["updated"] == 3
+    assert all(result["version"] == 2 for result in body["results"])
+
+    counts = client.get("/reviews/counts", params={"project_id": project.id}, headers=auth_headers(annotator)).json()
+    assert counts == {"pending": 2, "approved": 2, "rejected": 1, "revised": 0}
+
+
+def test_release_and_expired_claims_return_to_queue(client, db_session, make_user, make_project, make_image, auth_headers):
+    annotator = make_user()
+    reviewer = make_user()
+    other_reviewer = make_user()
+    project, folder = make_project(annotator, members=(reviewer, other_reviewer))
+    image = make_image(annotator, project, folder, "review-2")
+    ids = [
+        client.post("/annotations/", json={"image_id": image.id, "data": {}, "tags": []}, headers=auth_headers(annotator)).json()["id"]
+        for _ in range(4)
+    ]
+    params = {"project_id": project.id, "count": 10}
+
+    # Shards split the queue by id
+    even = client.post("/reviews/claim", params={**params, "shards": 2, "shard": 0}, headers=auth_headers(reviewer)).json()
+    assert all(ann["id"] % 2 == 0 for ann in even) and len(even) == 2
+    assert client.post("/reviews/claim", params={**params, "shards": 2, "shard": 2}, headers=auth_headers(reviewer)).status_code == 422
+
+    assert client.post(f"/reviews/{even[0]['id']}/release", headers=auth_headers(reviewer)).status_code == 200
+    assert client.post(f"/reviews/{even[0]['id']}/release", headers=auth_headers(reviewer)).status_code == 404
+    db_session.query(Annotation).filter(Annotation.id == even[1]["id"]).update(
+        {Annotation.review_claimed_at: datetime.now(timezone.utc) - timedelta(days=1)}
+    )
+    db_session.commit()
+
+    taken = client.post("/reviews/claim", params=params, headers=auth_headers(other_reviewer)).json()
+    assert sorted(ann["id"] for ann in taken) == sorted(ids)
+
+    outsider = make_user()
+    assert client.post("/reviews/claim", params=params, headers=auth_headers(outsider)).status_code == 404
+
+
+def test_review_status_needs_a_live_claim(client, db_session, make_user, make_project, make_image, auth_headers):
+    author = make_user()
+    reviewer = make_user()
+    project, folder = make_project(author, members=(reviewer,))
+    image = make_image(author, project, folder, "review-3")
+    created = client.post("/annotations/", json={"image_id": image.id, "data": {}, "tags": []}, headers=auth_headers(author)).json()
+    approve = {"data": None, "tags": None, "review_status": "approved"}
+
+    # Neither the author nor an unclaimed reviewer can approve directly
+    assert client.patch(f"/annotations/{created['id']}", json=approve, headers={**auth_headers(author), "If-Match": '"1"'}).status_code == 403
+    assert client.patch(f"/annotations/{created['id']}", json=approve, headers={**auth_headers(reviewer), "If-Match": '"1"'}).status_code == 403
+    bulk = client.post("/annotations/bulk", json={"items": [{"id": created["id"], "review_status": "approved"}]}, headers=auth_headers(author))
+    assert bulk.json()["results"][0]["status"] == "error"
+
+    # Expired claims cannot be decided
+    client.post("/reviews/claim", params={"project_id": project.id}, headers=auth_headers(reviewer))
+    db_session.query(Annotation).filter(Annotation.id == created["id"]).update(
+        {Annotation.review_claimed_at: datetime.now(timezone.utc) - timedelta(days=1)}
+    )
+    db_session.commit()
+    reject = {"decisions": [{"annotation_id": created["id"], "status": "rejected"}]}
+    assert client.post("/reviews/decisions", json=reject, headers=auth_headers(reviewer)).status_code == 409
+
+    client.post("/reviews/claim", params={"project_id": project.id}, headers=auth_headers(reviewer))
+    assert client.post("/reviews/decisions", json=reject, headers=auth_headers(reviewer)).status_code == 200
+
+    # The author sends a rejected annotation back as revised
+    revise = {"data": {"fixed": True}, "tags": None, "review_status": "revised"}
+    assert client.patch(f"/annotations/{created['id']}", json=revise, headers={**auth_headers(reviewer), "If-Match": '"2"'}).status_code == 403
+    resp = client.patch(f"/annotations/{created['id']}", json=revise, headers={**auth_headers(author), "If-Match": '"2"'})
+    assert resp.json()["review_status"] == "revised"
+
+
+def test_repeating_the_status_keeps_the_reviewers_claim(client, make_user, make_project, make_image, auth_headers):
+    author = make_user()
+    reviewer = make_user()
+    project, folder = make_project(author, members=(reviewer,))
+    image = make_image(author, project, folder, "review-4")
+    created = client.post("/annotations/", json={"image_id": image.id, "data": {}, "tags": []}, headers=auth_headers(author)).json()
+    client.post("/reviews/claim", params={"project_id": project.id}, headers=auth_headers(reviewer))
+
+    # The author keeps editing while the annotation is claimed, resending its status
+    resp = client.patch(
+        f"/annotations/{created['id']}", json={"data": {"edited": True}, "review_status": "pending"},
+        headers={**auth_headers(author), "If-Match": '"1"'},
+    )
+    assert resp.status_code == 200
+    assert resp.json()["reviewer_id"] == reviewer.id
+    bulk = client.post(
+        "/annotations/bulk", json={"items": [{"id": created["id"], "version": 2, "data": {"edited": 2}, "review_status": "pending"}]},
+        headers=auth_headers(author),
+    )
+    assert bulk.json()["results"][0]["status"] == "updated"
+
+    approve = {"decisions": [{"annotation_id": created["id"], "status": "approved"}]}
+    resp = client.post("/reviews/decisions", json=approve, headers=auth_headers(reviewer))
+    assert resp.status_code == 200
+
+
+def test_prelabels_are_not_claimed_or_counted(client, db_session, make_user, make_project, make_image, auth_headers):
+    uploader = make_user()
+    reviewer = make_user()
+    project, folder = make_project(uploader, members=(reviewer,))
+    image = make_image(uploader, project, folder, "review-5")
+    bulk_write_annotations(db_session, [{"image_id": image.id, "data": {"prelabel": {}}, "tags": ["nodule"]}], uploader.id, prelabel=True)
+    created = client.post("/annotations/", json={"image_id": image.id, "data": {}, "tags": []}, headers=auth_headers(uploader)).json()
+
+    claimed = client.post("/reviews/claim", params={"project_id": project.id}, headers=auth_headers(reviewer)).json()
+    assert [ann["id"] for ann in claimed] == [created["id"]]
+    counts = client.get("/reviews/counts", params={"project_id": project.id}, headers=auth_headers(reviewer)).json()
+    assert counts["pending"] == 1
@@ -0,0 +1,60 @@
+from app.services.search_index import annotation_text, rebuild_search_index
+
+
+def test_annotation_text_skips_encoded_masks():
+    data = {"annotations": [{"tool": "Length", "note": "Spiculated margin", "labelmap": {"encoding": "rle", "length": 3, "values": ["x"], "counts": [3]}}]}
+    assert annotation_text(data, ["Nodule"]) == "Nodule Length Spiculated margin"
+
+
+def test_search_is_ranked_paged_and_scoped(client, db_session, make_user, make_project, make_image, auth_headers):
+    owner = make_user()
+    outsider = make_user()
+    project, folder = make_project(owner)
+    other_project, other_folder = make_project(outsider)
+    headers = auth_headers(owner)
+    chest = make_image(owner, project, folder, "search-1",
+                       dicom_metadata={"StudyDescription": "CT Chest with contrast", "Modality": "CT"})
+    head = make_image(owner, project, folder, "search-2", dicom_metadata={"StudyDescription": "MR Head"})
+    hidden = make_image(outsider, other_project, other_folder, "search-3")
+
+    # Images created outside the upload endpoints are indexed by a rebuild
+    assert rebuild_search_index(db_session) >= 3
+
+    ann = client.post("/annotations/", json={
+        "image_id": chest.id, "tags": ["Nodule"], "data": {"annotations": [{"note": "chest nodule, spiculated"}]},
+    }, headers=headers).json()
+    client.post("/annotations/", json={
+        "image_id": hidden.id, "tags": ["Nodule"], "data": {},
+    }, headers=auth_headers(outsider))
+    client.post("/folders/", json={"name": "Chest follow-up", "project_id": project.id}, headers=headers)
+
+    def search(**params):
+        resp = client.get("/search/", params=params, headers=headers)
+        assert resp.status_code == 200
+        return resp.json()
+
+    results = search(q="chest")
+    assert {(item["kind"], item["image_id"]) for item in results["items"]} == {
+        ("image", chest.id), ("annotation", chest.id), ("folder", None)
+    }
+    assert [item["kind"] for item in search(q="Spiculated nodules")["items"]] == ["annotation"]
+    assert search(q="nodule", kind="annotation")["items"][0]["id"] == ann["id"]
+    assert search(q="mr head")["items"][0]["id"] == head.id
+
+    first = search(q="chest", limit=2)
+    rest = search(q="chest", limit=2, offset=first["next_offset"])
+    assert len(first["items"]) == 2 and rest["next_offset"] is None
+    assert {item["id"] for item in first["items"] + rest["items"]} == {item["id"] for item in results["items"]}
+
+    # Edits replace the document
+    client.patch(
+        f"/annotations/{ann['id']}",
+        json={"data": {"annotations": [{"note": "benign calcification"}]}, "tags": [], "review_status": None},
+        headers={**headers, "If-Match": '"1"'},
+    )
+    assert search(q="spiculated")["items"] == []
+    assert [item["id"] for item in search(q="calcification")["items"]] == [ann["id"]]
+
+    assert client.get("/search/", params={"q": "x", "kind": "study"}, headers=headers).status_code == 400
+    assert client.get("/search/", params={"q": "x", "project_id": other_project.id}, headers=headers).status_code == 404
+    assert search(q="AND OR \"(")["items"] == []
@@ -0,0 +1,51 @@
+from app.models import TagPairCount, UserTagCount
+
+
+def test_aggregates_follow_writes_and_match_rebuild(client, db_session, make_user, make_project, make_image, auth_headers):
+    owner = make_user()
+    member = make_user()
+    outsider = make_user()
+    project, folder = make_project(owner, members=(member,))
+    image = make_image(owner, project, folder, "analytics-1")
+    headers = auth_headers(owner)
+
+    first = client.post("/annotations/", json={"image_id": image.id, "data": {}, "tags": ["Nodule", "Mass"]}, headers=headers).json()
+    client.post("/annotations/bulk", json={"items": [
+        {"image_id": image.id, "data": {}, "tags": ["nodule", "Effusion"]},
+        {"image_id": image.id, "data": {}, "tags": ["Mass"]},
+    ]}, headers=auth_headers(member))
+    client.patch(
+        f"/annotations/{first['id']}",
+        json={"data": None, "tags": ["Nodule", "Effusion"], "review_status": None},
+        headers={**headers, "If-Match": '"1"'},
+    )
+
+    def analytics():
+        labels = client.get(f"/analytics/projects/{project.id}/labels", headers=headers).json()
+        matrix = client.get(f"/analytics/projects/{project.id}/cooccurrence", headers=headers).json()
+        annotators = client.get(f"/analytics/projects/{project.id}/annotators", headers=headers).json()
+        return labels, matrix, annotators
+
+    labels, matrix, annotators = analytics()
+    assert labels["annotations"] == 3
+    assert {item["tag"]: item["count"] for item in labels["labels"]} == {"Nodule": 2, "Effusion": 2, "Mass": 1}
+    position = {tag: index for index, tag in enumerate(matrix["tags"])}
+    counts = matrix["counts"]
+    assert counts[position["Nodule"]][position["Effusion"]] == 2
+    assert counts[position["Effusion"]][position["Nodule"]] == 2
+    assert counts[position["Nodule"]][position["Mass"]] == 0
+    assert counts[position["Mass"]][position["Mass"]] == 1
+    rates = {row["user_id"]: {label["tag"]: label["rate"] for label in row["labels"]} for row in annotators}
+    assert rates[owner.id] == {"Effusion": 1.0, "Nodule": 1.0}
+    assert rates[member.id] == {"Effusion": 0.5, "Mass": 0.5, "Nodule": 0.5}
+
+    # Throw the counters off, then recompute them from the annotations
+    db_session.query(TagPairCount).delete()
+    db_session.query(UserTagCount).update({UserTagCount.count: 7})
+    db_session.commit()
+    assert client.post(f"/analytics/projects/{project.id}/rebuild", headers=auth_headers(member)).status_code == 403
+    summary = client.post(f"/analytics/projects/{project.id}/rebuild", headers=headers).json()
+    assert summary == {"annotations": 3, "tags": 3, "pairs": 1, "annotators": 2}
+    assert analytics() == (labels, matrix, annotators)
+
+    assert client.get(f"/analytics/projects/{project.id}/labels", headers=auth_headers(outsider)).status_code == 404
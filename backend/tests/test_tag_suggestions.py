@@ -0,0 +1,99 @@
+import io
+import threading
+
+import numpy as np
+import pytest
+
+from app.api.routers import tag as tag_router
+from app.services import tag_suggestions
+from app.services.tag_model import NumpyTagModel, TagModelUnavailable, load_tag_model, prepare_pixels
+from app.services.tag_suggestions import TagSuggester
+
+
+class CountingModel(NumpyTagModel):
+    def __init__(self):
+        # "bright" fires on the mean intensity of the image, "dark" on its absence
+        size = 8
+        weights = np.zeros((size * size, 2), dtype=np.float32)
+        weights[:, 0] = 20 / (size * size)
+        weights[:, 1] = -20 / (size * size)
+        super().__init__(weights, np.array([-10, 10]), ["bright", "dark"], size, "test")
+        self.batch_sizes = []
+
+    def predict(self, batch):
+        self.batch_sizes.append(len(batch))
+        return super().predict(batch)
+
+
+def _mostly_bright(rows=40, columns=32):
+    pixels = np.zeros((rows, columns), dtype=np.uint16)
+    pixels[:, : columns * 3 // 4] = 1000
+    return pixels
+
+
+def test_prepare_pixels_downsamples_to_unit_range(make_dicom):
+    from pydicom import dcmread
+
+    pixels = np.tile(np.arange(300, dtype=np.uint16), (200, 1))
+    prepared = prepare_pixels(dcmread(io.BytesIO(make_dicom(pixels))), 16)
+    assert prepared.shape == (16, 16)
+    assert prepared.dtype == np.float32
+    assert 0 <= prepared.min() < 0.05 and 0.95 < prepared.max() <= 1
+    assert np.all(np.diff(prepared[0]) >= 0)  # left-to-right ramp survives
+
+
+def test_concurrent_requests_share_batches_and_cache(make_dicom, make_instance_cache, monkeypatch):
+    files = {f"inst-{n}": make_dicom(_mostly_bright() if n % 2 else np.zeros((40, 30), dtype=np.uint16)) for n in range(8)}
+    cache = make_instance_cache(files)
+    monkeypatch.setattr(tag_suggestions, "get_instance_cache", lambda: cache)
+    model = CountingModel()
+    suggester = TagSuggester(model, max_batch=8, max_wait=0.2, cache_size=100)
+
+    results = {}
+    start = threading.Barrier(8)
+
+    def score(orthanc_id):
+        start.wait()
+        results[orthanc_id] = suggester.probabilities(orthanc_id)
+
+    threads = [threading.Thread(target=score, args=(orthanc_id,)) for orthanc_id in files]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sum(model.batch_sizes) == 8
+    assert len(model.batch_sizes) < 8
+    assert results["inst-1"][0] > 0.5 > results["inst-0"][0]
+
+    suggester.probabilities("inst-1")
+    assert sum(model.batch_sizes) == 8
+    assert cache.opened.count("inst-1") == 1
+
+
+def test_suggest_endpoint(
+    client, make_user, make_project, make_image, make_dicom, make_instance_cache, auth_headers, monkeypatch
+):
+    owner = make_user()
+    outsider = make_user()
+    project, folder = make_project(owner)
+    image = make_image(owner, project, folder, "inst-bright")
+    monkeypatch.setattr(tag_suggestions, "get_instance_cache", lambda: make_instance_cache({"inst-bright": make_dicom(_mostly_bright())}))
+    suggester = TagSuggester(CountingModel(), max_batch=4, max_wait=0, cache_size=10)
+    monkeypatch.setattr(tag_router, "get_tag_suggester", lambda: suggester)
+
+    resp = client.get(f"/tags/suggest/{image.id}", params={"top_k": 1}, headers=auth_headers(owner))
+    assert resp.status_code == 200
+    assert [item["tag"] for item in resp.json()] == ["bright"]
+    assert client.get(f"/tags/suggest/{image.id}", headers=auth_headers(outsider)).status_code == 404
+
+
+def test_suggest_without_a_model_is_unavailable(client, make_user, make_project, make_image, auth_headers, monkeypatch):
+    owner = make_user()
+    project, folder = make_project(owner)
+    image = make_image(owner, project, folder, "inst-none")
+    with pytest.raises(TagModelUnavailable):
+        load_tag_model("numpy", "")
+    monkeypatch.setattr(tag_router, "get_tag_suggester", lambda: load_tag_model("numpy", ""))
+
+    assert client.get(f"/tags/suggest/{image.id}", headers=auth_headers(owner)).status_code == 503
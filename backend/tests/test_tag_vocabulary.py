@@ -0,0 +1,61 @@
+from app.services.tag_vocabulary import TagTrie, normalize_tag
+
+
+def test_trie_ranks_by_usage_and_follows_decreases():
+    trie = TagTrie(top_k=2)
+    for key, count in [("nodule", 5), ("node", 3), ("normal", 4), ("mass", 9)]:
+        trie.set(key, key.title(), count)
+
+    assert trie.complete("no", 5) == [("Nodule", 5), ("Normal", 4)]
+    assert trie.complete("", 1) == [("Mass", 9)]
+    assert trie.complete("x", 5) == []
+
+    # "node" was not cached under "no"; it must surface once the others drop below it
+    trie.set("nodule", "Nodule", 1)
+    trie.set("normal", "Normal", 2)
+    assert trie.complete("no", 2) == [("Node", 3), ("Normal", 2)]
+    trie.set("node", "Node", 10)
+    assert trie.complete("", 2) == [("Node", 10), ("Mass", 9)]
+
+
+def test_normalize_tag():
+    assert normalize_tag("  Ground   Glass ") == "ground glass"
+    assert normalize_tag("ＣＴ") == "ct"
+
+
+def test_counters_follow_annotation_writes(client, make_user, make_project, make_image, auth_headers):
+    owner = make_user()
+    outsider = make_user()
+    project, folder = make_project(owner)
+    headers = auth_headers(owner)
+    image = make_image(owner, project, folder, "vocab-1")
+
+    first = client.post("/annotations/", json={"image_id": image.id, "data": {}, "tags": ["Nodule", "nodule "]}, headers=headers).json()
+    client.post("/annotations/bulk", json={"items": [
+        {"image_id": image.id, "data": {}, "tags": ["nodule", "Normal"]},
+        {"image_id": image.id, "data": {}, "tags": ["node"]},
+    ]}, headers=headers)
+
+    def vocabulary():
+        resp = client.get("/tags/vocabulary", params={"project_id": project.id}, headers=headers)
+        return {item["tag"]: item["count"] for item in resp.json()}
+
+    assert vocabulary() == {"Nodule": 2, "Normal": 1, "node": 1}
+    complete = client.get("/tags/autocomplete", params={"project_id": project.id, "q": "NO"}, headers=headers).json()
+    assert complete[0] == {"tag": "Nodule", "count": 2}
+    assert {item["tag"] for item in complete} == {"Nodule", "Normal", "node"}
+
+    client.patch(
+        f"/annotations/{first['id']}",
+        json={"data": None, "tags": ["Mass"], "review_status": None},
+        headers={**headers, "If-Match": '"1"'},
+    )
+    assert vocabulary() == {"Nodule": 1, "Normal": 1, "node": 1, "Mass": 1}
+    # Writes the caller may not make leave the counters alone
+    outsider_write = {"image_id": image.id, "data": {}, "tags": ["Mass"]}
+    assert client.post("/annotations/", json=outsider_write, headers=auth_headers(outsider)).status_code == 404
+    assert vocabulary() == {"Nodule": 1, "Normal": 1, "node": 1, "Mass": 1}
+    complete = client.get("/tags/autocomplete", params={"project_id": project.id, "q": "m"}, headers=headers).json()
+    assert complete == [{"tag": "Mass", "count": 1}]
+
+    assert client.get("/tags/autocomplete", params={"project_id": project.id, "q": "n"}, headers=auth_headers(outsider)).status_code == 404
@@ -0,0 +1,103 @@
+import pytest
+
+from app.services import instance_cache
+from app.utils.orthanc import OrthancClient
+
+
+@pytest.fixture()
+def local_cache(tmp_path, monkeypatch):
+    fetched = []
+
+    def fake_iter_dicom_file(self, orthanc_id, chunk_size=1024 * 1024):
+        fetched.append(orthanc_id)
+        yield f"DICOM:{orthanc_id}".encode()
+
+    monkeypatch.setattr(OrthancClient, "iter_dicom_file", fake_iter_dicom_file)
+    cache = instance_cache.InstanceCache(str(tmp_path), 10 * 1024 * 1024, 2)
+    monkeypatch.setattr(instance_cache, "_instance_cache", cache)
+    cache.fetched = fetched
+    return cache
+
+
+def _make_series(make_image, project, folder, uploader, count):
+    return [
+        make_image(uploader, project, folder, f"inst-{project.id}-{number}",
+                   series_instance_uid=f"1.2.3.{project.id}", instance_number=number)
+        for number in range(1, count + 1)
+    ]
+
+
+def test_wado_batch_streams_multipart_and_prefetches_next_slices(
+    client, make_user, make_project, make_image, auth_headers, local_cache
+):
+    owner = make_user()
+    project, folder = make_project(owner)
+    images = _make_series(make_image, project, folder, owner, 6)
+
+    resp = client.get(
+        "/images/wado/batch",
+        params={"ids": [images[1].id, images[0].id], "prefetch": 2},
+        headers=auth_headers(owner),
+    )
+
+    assert resp.status_code == 200
+    content_type = resp.headers["content-type"]
+    assert content_type.startswith("multipart/related")
+    boundary = content_type.split("boundary=")[1]
+    parts = [p for p in resp.content.split(f"--{boundary}".encode()) if p.strip(b"-\r\n")]
+    assert [p.split(b"\r\n\r\n", 1)[1].rstrip(b"\r\n") for p in parts] == [
+        f"DICOM:{images[1].orthanc_id}".encode(),
+        f"DICOM:{images[0].orthanc_id}".encode(),
+    ]
+    assert resp.headers["x-prefetch-image-ids"] == f"{images[2].id},{images[3].id}"
+
+    local_cache._executor.shutdown(wait=True)
+    assert local_cache.is_cached(images[2].orthanc_id)
+    assert local_cache.is_cached(images[3].orthanc_id)
+    assert not local_cache.is_cached(images[4].orthanc_id)
+
+
+def test_wado_batch_rejects_images_outside_membership(
+    client, make_user, make_project, make_image, auth_headers, local_cache
+):
+    owner = make_user()
+    outsider = make_user()
+    project, folder = make_project(owner)
+    other_project, other_folder = make_project(outsider)
+    mine = _make_series(make_image, project, folder, owner, 1)
+    theirs = _make_series(make_image, other_project, other_folder, outsider, 1)
+
+    resp = client.get(
+        "/images/wado/batch",
+        params={"ids": [mine[0].id, theirs[0].id]},
+        headers=auth_headers(owner),
+    )
+
+    assert resp.status_code == 404
+    assert local_cache.fetched == []
+
+
+def test_wado_image_survives_eviction_after_lookup(
+    client, make_user, make_project, make_image, auth_headers, local_cache, monkeypatch
+):
+    owner = make_user()
+    project, folder = make_project(owner)
+    image = _make_series(make_image, project, folder, owner, 1)[0]
+    get_cached_path = local_cache.get_path
+    evicted = []
+
+    def get_path_then_evict(orthanc_id):
+        # Another request pushes the instance out right after it was looked up
+        path = get_cached_path(orthanc_id)
+        if not evicted:
+            evicted.append(orthanc_id)
+            path.unlink()
+        return path
+
+    monkeypatch.setattr(local_cache, "get_path", get_path_then_evict)
+
+    resp = client.get(f"/images/wado/{image.id}", headers=auth_headers(owner))
+
+    assert resp.status_code == 200
+    assert resp.content == f"DICOM:{image.orthanc_id}".encode()
+    assert resp.headers["content-length"] == str(len(resp.content))
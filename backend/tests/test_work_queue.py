@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta, timezone
+
+from app.models import Annotation, Image
+
+
+def test_next_claims_in_order_and_prefetches(client, db_session, make_user, make_project, make_image, auth_headers):
+    annotator = make_user()
+    other = make_user()
+    project, folder = make_project(annotator, members=(other,))
+    images = [make_image(annotator, project, folder, f"queue-{n}", assigned_user_id=annotator.id) for n in range(4)]
+    unassigned = make_image(annotator, project, folder, "queue-x")
+    db_session.add(Annotation(image_id=images[1].id, user_id=annotator.id, data={}, tags=[], version=1))
+    db_session.commit()
+    headers = auth_headers(annotator)
+
+    first = client.post("/queue/next", params={"prefetch": 5}, headers=headers).json()
+    assert first["image"]["id"] == images[0].id
+    assert first["prefetch_ids"] == [images[2].id, images[3].id]
+
+    second = client.post("/queue/next", params={"prefetch": 1}, headers=headers).json()
+    assert second["image"]["id"] == images[2].id
+    assert second["prefetch_ids"] == [images[3].id]
+
+    assert client.post(f"/queue/{images[0].id}/release", headers=headers).status_code == 200
+    assert client.post(f"/queue/{images[0].id}/release", headers=headers).status_code == 404
+    assert client.post("/queue/next", headers=headers).json()["image"]["id"] == images[0].id
+    assert client.post("/queue/next", headers=headers).json()["image"]["id"] == images[3].id
+    assert client.post("/queue/next", headers=headers).status_code == 204
+
+    # Expired claims go back in the queue
+    db_session.query(Image).filter(Image.id == images[2].id).update(
+        {Image.claimed_at: datetime.now(timezone.utc) - timedelta(days=1)}
+    )
+    db_session.commit()
+    assert client.post("/queue/next", headers=headers).json()["image"]["id"] == images[2].id
+
+    assert client.post("/queue/next", headers=auth_headers(other)).status_code == 204
+
+
+def test_prelabeled_images_stay_in_the_queue(client, db_session, make_user, make_project, make_image, auth_headers):
+    annotator = make_user()
+    project, folder = make_project(annotator)
+    image = make_image(annotator, project, folder, "queue-pre", assigned_user_id=annotator.id)
+    db_session.add(Annotation(image_id=image.id, user_id=annotator.id, data={}, tags=["normal"], version=1, is_prelabel=True))
+    db_session.commit()
+
+    assert client.post("/queue/next", headers=auth_headers(annotator)).json()["image"]["id"] == image.id